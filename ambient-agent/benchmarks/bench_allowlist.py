@@ -0,0 +1,74 @@
+"""Benchmark allowlist lookups per event.
+
+Run from the ambient-agent directory:
+
+    python benchmarks/bench_allowlist.py [events] [rules]
+"""
+
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.allowlist import Allowlist, Rule
+
+
+def make_rules(count: int) -> list:
+    rng = random.Random(1)
+    rules = [
+        Rule("ntp", comms=("chronyd",), ports=((123, 123),)),
+        Rule("ssh", comms=("sshd",)),
+        Rule("kworkers", comms=("kworker*",)),
+    ]
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            rules.append(Rule(f"net-{i}", addresses=(f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24",)))
+        elif kind == 1:
+            rules.append(Rule(f"host-{i}", addresses=(f"192.0.{rng.randrange(256)}.{rng.randrange(256)}",)))
+        elif kind == 2:
+            rules.append(Rule(f"svc-{i}", comms=(f"svc{i}",), ports=((8000 + i, 8000 + i),)))
+        else:
+            rules.append(Rule(f"app-{i}", comms=(f"app{i}*",), addresses=("172.16.0.0/12",)))
+    return rules
+
+
+def make_flows(count: int, distinct: int) -> list:
+    rng = random.Random(2)
+    comms = ["chronyd", "sshd", "curl", "nc", "java", "kworker/0:1", "svc2", "app3-worker"]
+    keys = [
+        (rng.choice(comms), 1000 + rng.randrange(50),
+         f"{rng.choice([10, 172, 192, 203])}.{rng.choice([0, 16, rng.randrange(256)])}."
+         f"{rng.randrange(256)}.{rng.randrange(256)}",
+         rng.choice([22, 80, 123, 443, 8002, rng.randrange(1, 65536)]))
+        for _ in range(distinct)
+    ]
+    return [keys[rng.randrange(distinct)] for _ in range(count)]
+
+
+def bench(label: str, func, count: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed / count * 1e9:10.0f} ns/event")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rule_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    allowlist = Allowlist(make_rules(rule_count))
+    events = make_flows(count, distinct=count // 20)
+    print(f"{count:,} events, {len(set(events)):,} distinct flows, {len(allowlist.rules)} rules\n")
+    
+    bench("match, uncached", lambda: [allowlist._match(c, d, p) for c, _, d, p in events], count)
+    bench("match, cached", lambda: [allowlist.match(c, d, p) for c, _, d, p in events], count)
+    bench("match, cached (second pass)", lambda: [allowlist.match(c, d, p) for c, _, d, p in events], count)
+    flows = Counter(events)
+    bench("filter_flows (pre-aggregated per cycle)", lambda: allowlist.filter_flows(flows), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark codecs on event dumps and alerts.
+
+Run from the ambient-agent directory:
+
+    python benchmarks/bench_compression.py [dumps] [lines per dump]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.compression import CODECS, SEED_DICTIONARY, get_codec, train_dictionary
+
+COMMS = ["curl", "sshd", "chronyd", "dnf", "java", "python3", "nc", "rsyslogd", "httpd", "postgres"]
+
+
+def make_dump(rng: random.Random, lines: int) -> bytes:
+    """A get_network_events_history answer with realistic variety."""
+    start = rng.randrange(86400)
+    out = []
+    for i in range(lines):
+        t = start + i * rng.randrange(1, 4)
+        comm = rng.choice(COMMS)
+        out.append(
+            f"2025-10-22 {t // 3600 % 24:02d}:{t // 60 % 60:02d}:{t % 60:02d} "
+            f"{rng.choice(['TCP', 'TCP', 'UDP'])} {rng.choice(['CONNECT', 'CONNECT', 'ACCEPT', 'CLOSE'])} "
+            f"pid={1000 + COMMS.index(comm) * 37} comm={comm} saddr=10.0.0.5 sport={rng.randrange(32768, 61000)} "
+            f"daddr={rng.choice(['203.0.113', '198.51.100', '10.20.0'])}.{rng.randrange(1, 255)} "
+            f"dport={rng.choice([22, 53, 80, 123, 443, 5432, 8080, rng.randrange(1, 65536)])}"
+        )
+    return "\n".join(out).encode()
+
+
+def bench(label: str, codec, payloads: list):
+    start = time.perf_counter()
+    compressed = [codec.compress(p) for p in payloads]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for c in compressed:
+        codec.decompress(c)
+    decompress_time = time.perf_counter() - start
+    raw = sum(map(len, payloads))
+    ratio = raw / sum(map(len, compressed))
+    print(f"{label:<28} {ratio:7.2f}x {raw / compress_time / 1e6:10.1f} MB/s {raw / decompress_time / 1e6:10.1f} MB/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rng = random.Random(1)
+    training = [make_dump(rng, lines) for _ in range(200)]
+    dumps = [make_dump(rng, lines) for _ in range(count)]
+    large = [make_dump(rng, 20_000) for _ in range(3)]
+    available = [name for name, codec in CODECS.items() if codec.available()]
+    print(f"Codecs installed: {', '.join(available)}")
+    
+    for title, payloads in ((f"{count} dumps of {lines} lines (~{len(dumps[0]) // 1024 + 1} KiB)", dumps),
+                            (f"3 dumps of 20,000 lines ({len(large[0]) / 2**20:.1f} MiB)", large)):
+        print(f"\n{title}\n{'codec':<28} {'ratio':>8} {'compress':>15} {'decompress':>15}")
+        bench("zlib level 1", get_codec("zlib", level=1), payloads)
+        bench("zlib level 6", get_codec("zlib"), payloads)
+        bench("zlib + seed dictionary", get_codec("zlib", SEED_DICTIONARY), payloads)
+        bench("zlib + trained dictionary", get_codec("zlib", train_dictionary(training, codec="zlib")), payloads)
+        if "lz4" in available:
+            bench("lz4", get_codec("lz4"), payloads)
+        if "zstd" in available:
+            bench("zstd level 3", get_codec("zstd"), payloads)
+            bench("zstd + seed dictionary", get_codec("zstd", SEED_DICTIONARY), payloads)
+            bench("zstd + trained dictionary", get_codec("zstd", train_dictionary(training, codec="zstd")), payloads)
+
+
+if __name__ == "__main__":
+    main()
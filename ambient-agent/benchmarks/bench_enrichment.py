@@ -0,0 +1,64 @@
+"""Benchmark IP enrichment lookups.
+
+Run from the ambient-agent directory:
+
+    python benchmarks/bench_enrichment.py [networks] [lookups]
+"""
+
+import ipaddress
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.enrichment import IPEnricher, PrefixDatabase, build_database
+
+
+def make_networks(count: int) -> list:
+    """Random prefixes, roughly shaped like an ASN dump."""
+    rng = random.Random(1)
+    networks = []
+    for i in range(count):
+        length = rng.choice([16, 19, 20, 22, 23, 24, 24, 24])
+        address = ipaddress.ip_address(rng.getrandbits(32))
+        networks.append((f"{address}/{length}", f"AS{64512 + i % 5000} Example Org {i % 5000}"))
+    return networks
+
+
+def bench(label: str, func, count: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed / count * 1e6:10.2f} µs/lookup")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    rng = random.Random(2)
+    addresses = [str(ipaddress.ip_address(rng.getrandbits(32))) for _ in range(lookups)]
+    hot = [rng.choice(addresses[:500]) for _ in range(lookups)]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/asn.ipdb"
+        start = time.perf_counter()
+        ranges = build_database(make_networks(count), path)
+        print(f"Built {ranges:,} ranges from {count:,} networks in {time.perf_counter() - start:.1f} s "
+              f"({Path(path).stat().st_size / 2**20:.1f} MiB)\n")
+        
+        database = PrefixDatabase(path)
+        enricher = IPEnricher(zones={"internal": ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]},
+                              databases={"asn": database})
+        bench("database lookup (mmap binary search)", lambda: [database.lookup(a) for a in addresses], lookups)
+        bench("enricher.tags, distinct addresses", lambda: [enricher._lookup(a) for a in addresses], lookups)
+        bench("enricher.tags, 500 hot addresses (LRU)", lambda: [enricher.tags(a) for a in hot], lookups)
+        text = "\n".join(f"[MEDIUM] Unusual port: pid 812 (x) to {a} port 4444" for a in addresses[:1000])
+        bench("annotate (1000-line anomaly text)", lambda: enricher.annotate(text), 1000)
+        enricher.close()
+
+
+if __name__ == "__main__":
+    main()
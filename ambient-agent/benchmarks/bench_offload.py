@@ -0,0 +1,64 @@
+"""Benchmark event-loop lag while preparing a large events text.
+
+Compares running prepare_events() inline on the event loop with the
+thread and process executors. Run from the ambient-agent directory:
+
+    python benchmarks/bench_offload.py [events]
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.metrics import metrics
+from src.offload import CPUExecutor, LoopLagMonitor, prepare_events
+
+
+def make_text(count: int) -> str:
+    return "\n".join(
+        f"2025-10-09 09:{i // 60 % 60:02d}:{i % 60:02d} TCP CONNECT pid={4000 + i % 97} comm=proc-{i % 97} "
+        f"saddr=10.0.0.5 sport={40000 + i % 1000} daddr=203.0.{i % 251}.{i % 7} dport={1 + i % 1024}"
+        for i in range(count)
+    )
+
+
+async def run(kind: str, text: str, cycles: int):
+    executor = CPUExecutor(kind, max_workers=2)
+    monitor = LoopLagMonitor(interval=0.01)
+    # Warm up the pool outside the measurement
+    await executor.run_on_text(prepare_events, text[:1000])
+    
+    metrics.reset()
+    monitor.start()
+    elapsed = 0.0
+    try:
+        for _ in range(cycles):
+            # Let the monitor tick between cycles so a blocked loop is observed
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            await executor.run_on_text(prepare_events, text)
+            elapsed += time.perf_counter() - start
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+        executor.shutdown()
+    
+    lags = sorted(metrics.samples("event_loop_lag_seconds")) or [0.0]
+    p95 = lags[int(len(lags) * 0.95) - 1] if len(lags) > 1 else lags[0]
+    print(f"{kind:<8} {elapsed / cycles * 1000:10.0f} ms/cycle {p95 * 1000:10.1f} ms p95 lag "
+          f"{lags[-1] * 1000:10.1f} ms max lag")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    text = make_text(count)
+    print(f"{count:,} events, {len(text) / 1e6:.1f} MB of text\n")
+    for kind in ("inline", "thread", "process"):
+        asyncio.run(run(kind, text, cycles=3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark sketch throughput in events per second.
+
+Run from the ambient-agent directory:
+
+    python benchmarks/bench_sketches.py [events]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.events import NetworkEvent
+from src.sketches import CountMinSketch, HyperLogLog, TrafficSketches, hash64
+
+
+def make_events(count: int, processes: int, destinations: int, ports: int) -> list:
+    rng = random.Random(42)
+    return [
+        NetworkEvent(0.0, 1000 + p, f"proc-{p}", "TCP", "10.0.0.5", 40000,
+                     f"203.0.{d // 256}.{d % 256}", 1 + rng.randrange(ports), "CONNECT")
+        for p, d in ((rng.randrange(processes), rng.randrange(destinations)) for _ in range(count))
+    ]
+
+
+def bench(label: str, func, count: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<48} {count / elapsed / 1e6:8.2f} M events/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    keys = [f"10.0.{i // 256 % 256}.{i % 256}:{i}" for i in range(count)]
+    hashes = [hash64(key) for key in keys]
+    
+    print(f"{count:,} events\n")
+    bench("hash64 (8-byte BLAKE2b)", lambda: [hash64(key) for key in keys], count)
+    
+    hll = HyperLogLog(12)
+    bench("HyperLogLog.add_hash (pre-hashed)", lambda: list(map(hll.add_hash, hashes)), count)
+    
+    cms = CountMinSketch(epsilon=0.001, delta=0.01)
+    bench("CountMinSketch.add_hash (pre-hashed)", lambda: list(map(cms.add_hash, hashes)), count)
+    
+    # Realistic traffic repeats flows, which TrafficSketches aggregates first
+    for label, flows in (("TrafficSketches, busy host (repeated flows)", (50, 100, 4)),
+                         ("TrafficSketches, worst case (unique flows)", (5000, 65536, 65535))):
+        events = make_events(count, *flows)
+        sketches = TrafficSketches()
+        bench(label, lambda: sketches.observe(events, now=0), count)
+
+
+if __name__ == "__main__":
+    main()
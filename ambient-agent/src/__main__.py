@@ -6,10 +6,17 @@ For cron-based scheduling, use langgraph dev + cron API.
 
 import asyncio
 import logging
-from datetime import datetime
+import signal
 
 from .agent import build_agent
+from .config import load_config, get_targets
+from .clock import clock
+from .metrics import metrics
+from .nodes import router, dispatcher, recorder, executor, profiler
+from .offload import LoopLagMonitor
+from .sharding import ShardCoordinator, get_replica_id
 from .state import NetworkSecurityState
+from .webhook import CycleTrigger, WebhookServer
 
 # Configure logging
 logging.basicConfig(
@@ -21,91 +28,208 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def run_once():
-    """
-    Run the agent once (for single execution or cron).
-    """
-    logger.info("🚀 Running Ambient Network Security Agent (single execution)")
-    
-    agent = build_agent()
-    
-    # Initialize state
-    initial_state = NetworkSecurityState(
+def initial_state(iteration: int, target: dict, triggered_at: float = 0.0) -> NetworkSecurityState:
+    """Build the initial state for one monitoring cycle of a target."""
+    return NetworkSecurityState(
+        target=target,
         current_events="",
         current_stats="",
+        local_findings=[],
         detected_anomalies=[],
         investigated_pids=[],
+        severity="",
         messages=[],
         recommendations=[],
         alerts=[],
         historical_baseline={},
-        iteration=1,
-        last_run=datetime.now().isoformat()
+        iteration=iteration,
+        triggered_at=triggered_at,
+        last_run=clock.now().isoformat()
     )
+
+
+async def run_cycle(agent, iteration: int, targets: list[dict], triggered_at: float = 0.0) -> list[dict]:
+    """
+    Run one monitoring cycle for all targets concurrently.
+    
+    All targets share the LLM dispatcher, so their LLM calls are ordered
+    by severity and low-severity ones can be batched together.
+    """
+    if recorder:
+        recorder.record_cycle(iteration, targets)
     
-    # Run the agent
-    result = await agent.ainvoke(initial_state)
+    with profiler.cycle(iteration):
+        results = await asyncio.gather(
+            *(agent.ainvoke(initial_state(iteration, target, triggered_at)) for target in targets),
+            return_exceptions=True
+        )
+    if recorder:
+        recorder.flush()
     
     # Log summary
     logger.info(f"\n{'='*80}")
-    logger.info(f"Execution complete")
-    logger.info(f"  Anomalies detected: {len(result.get('detected_anomalies', []))}")
-    logger.info(f"  Alerts sent: {len(result.get('alerts', []))}")
-    logger.info(f"  Recommendations: {len(result.get('recommendations', []))}")
+    logger.info(f"Cycle #{iteration} complete")
+    for target, result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.error(f"  {target['host']}: ❌ cycle failed: {result}")
+            continue
+        logger.info(
+            f"  {target['host']}: "
+            f"anomalies={len(result.get('detected_anomalies', []))} "
+            f"alerts={len(result.get('alerts', []))} "
+            f"recommendations={len(result.get('recommendations', []))}"
+        )
     logger.info(f"{'='*80}\n")
+    metrics.log_summary()
+    router.log_usage()
     
-    return result
+    return results
+
+
+async def run_once():
+    """
+    Run the agent once (for single execution or cron).
+    """
+    logger.info("🚀 Running Ambient Network Security Agent (single execution)")
+    
+    agent = build_agent()
+    targets = get_targets(load_config())
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+    
+    try:
+        return await run_cycle(agent, 1, targets)
+    finally:
+        await lag_monitor.stop()
+        executor.shutdown()
+        await dispatcher.close()
+        if recorder:
+            recorder.close()
 
 
 async def run_loop():
     """
     Run the agent continuously in a loop (for non-cron deployment).
+    
+    Each target runs its own loop: a cycle every `monitoring_interval`
+    seconds, or immediately when the webhook receives an event for it.
     """
     logger.info("🚀 Starting Ambient Network Security Agent (continuous mode)")
     
     agent = build_agent()
+    config = load_config()
+    targets = get_targets(config)
+    webhook_config = config.get("webhook", {})
+    
+    # Stop cleanly on SIGTERM (pod shutdown) so leases are handed off at once
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    
+    # With sharding, events are accepted only for targets leased to this replica
+    sharding_config = config.get("sharding", {})
+    trigger = CycleTrigger(
+        [target["host"] for target in targets],
+        debounce_seconds=webhook_config.get("debounce_seconds", 30),
+        max_triggers_per_minute=webhook_config.get("max_triggers_per_minute", 30),
+        owned=set() if sharding_config.get("enabled", False) else None
+    )
+    
+    server = None
+    if webhook_config.get("enabled", False):
+        server = WebhookServer(
+            trigger,
+            host=webhook_config.get("host", "0.0.0.0"),
+            port=webhook_config.get("port", 8080),
+            path=webhook_config.get("path", "/events"),
+            token=webhook_config.get("token", "")
+        )
+        await server.start()
+    
+    # Event-loop lag shows whether parsing and detection still block the loop
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+    
+    try:
+        if sharding_config.get("enabled", False):
+            coordinator = ShardCoordinator(
+                sharding_config.get("shared_dir", "./data/shards"),
+                get_replica_id(config),
+                lease_seconds=sharding_config.get("lease_seconds", 90),
+                vnodes=sharding_config.get("vnodes", 64)
+            )
+            await run_sharded(agent, targets, trigger, coordinator)
+        else:
+            await asyncio.gather(*(run_target_loop(agent, target, trigger) for target in targets))
+    finally:
+        await lag_monitor.stop()
+        executor.shutdown()
+        await dispatcher.close()
+        if server:
+            await server.stop()
+        if recorder:
+            recorder.close()
+
+
+async def run_sharded(agent, targets: list[dict], trigger: CycleTrigger, coordinator: ShardCoordinator):
+    """
+    Run target loops only for the targets leased to this replica.
+    
+    Every renew interval the assignment is rebalanced: loops of targets
+    that moved to another replica are stopped before their lease is
+    released, and loops of newly acquired targets are started.
+    """
+    logger.info(f"🧩 Sharding targets as replica {coordinator.replica_id}")
+    tasks: dict[str, asyncio.Task] = {}
+    
+    try:
+        while True:
+            owned = coordinator.rebalance([target["host"] for target in targets])
+            trigger.set_owned(owned)
+            
+            for host, task in list(tasks.items()):
+                if host in owned and not task.done():
+                    continue
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                del tasks[host]
+                if host not in owned:
+                    coordinator.release(host)
+            
+            for target in targets:
+                if target["host"] in owned and target["host"] not in tasks:
+                    tasks[target["host"]] = asyncio.create_task(run_target_loop(agent, target, trigger))
+            
+            logger.debug(f"Replica {coordinator.replica_id} monitors {sorted(tasks)}")
+            await asyncio.sleep(coordinator.renew_interval)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        coordinator.shutdown()
+
+
+async def run_target_loop(agent, target: dict, trigger: CycleTrigger):
+    """Run scheduled and triggered cycles for one target."""
     iteration = 0
+    triggered_at = 0.0
     
     while True:
         try:
             iteration += 1
-            logger.info(f"\n{'='*80}")
-            logger.info(f"Starting monitoring cycle #{iteration}")
-            logger.info(f"{'='*80}\n")
-            
-            # Initialize state for this cycle
-            initial_state = NetworkSecurityState(
-                current_events="",
-                current_stats="",
-                detected_anomalies=[],
-                investigated_pids=[],
-                messages=[],
-                recommendations=[],
-                alerts=[],
-                historical_baseline={},
-                iteration=iteration,
-                last_run=datetime.now().isoformat()
-            )
+            trigger.cycle_started(target["host"])
             
-            # Run the agent
-            result = await agent.ainvoke(initial_state)
-            
-            # Log summary
             logger.info(f"\n{'='*80}")
-            logger.info(f"Cycle #{iteration} complete")
-            logger.info(f"  Anomalies detected: {len(result.get('detected_anomalies', []))}")
-            logger.info(f"  Alerts sent: {len(result.get('alerts', []))}")
-            logger.info(f"  Recommendations: {len(result.get('recommendations', []))}")
+            kind = "triggered" if triggered_at else "scheduled"
+            logger.info(f"Starting {kind} monitoring cycle #{iteration} for {target['host']}")
             logger.info(f"{'='*80}\n")
             
-            # Sleep for configured interval
-            from .config import load_config
-            config = load_config()
-            sleep_time = config["agent"]["monitoring_interval"]
+            await run_cycle(agent, iteration, [target], triggered_at)
             
-            logger.info(f"😴 Sleeping for {sleep_time} seconds...\n")
-            await asyncio.sleep(sleep_time)
+            # Sleep for configured interval, or until the webhook fires
+            sleep_time = load_config()["agent"]["monitoring_interval"]
             
+            logger.info(f"😴 Sleeping for up to {sleep_time} seconds...\n")
+            triggered_at = await trigger.wait(target["host"], sleep_time) or 0.0
+        
         except KeyboardInterrupt:
             logger.info("\n\n🛑 Agent stopped by user")
             break
@@ -113,12 +237,18 @@ async def run_loop():
             logger.error(f"❌ Error in agent loop: {e}", exc_info=True)
             logger.info("Retrying in 60 seconds...")
             await asyncio.sleep(60)
+            triggered_at = 0.0
 
 
 def main():
     """Entry point - defaults to continuous loop mode."""
     import sys
     
+    # Profile every cycle run by this process
+    if "--profile" in sys.argv:
+        profiler.enabled = True
+        profiler.every_n_cycles = 1
+    
     # Check if --once flag is provided
     if "--once" in sys.argv:
         try:
@@ -128,7 +258,7 @@ def main():
     else:
         try:
             asyncio.run(run_loop())
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             logger.info("Exiting...")
 
 
@@ -14,6 +14,7 @@ from .nodes import (
     update_baseline,
     should_investigate,
     should_alert,
+    profiler,
 )
 
 logger = logging.getLogger(__name__)
@@ -38,14 +39,14 @@ def build_agent():
     # Create the state graph
     workflow = StateGraph(NetworkSecurityState)
     
-    # Add nodes
-    workflow.add_node("monitor", monitor_events)
-    workflow.add_node("analyze", analyze_anomalies)
-    workflow.add_node("investigate", investigate_processes)
-    workflow.add_node("llm_analysis", llm_analysis)
-    workflow.add_node("report", generate_report)
-    workflow.add_node("alert", send_alert)
-    workflow.add_node("baseline", update_baseline)
+    # Add nodes (profiled in sampled cycles)
+    workflow.add_node("monitor", profiler.wrap("monitor", monitor_events))
+    workflow.add_node("analyze", profiler.wrap("analyze", analyze_anomalies))
+    workflow.add_node("investigate", profiler.wrap("investigate", investigate_processes))
+    workflow.add_node("llm_analysis", profiler.wrap("llm_analysis", llm_analysis))
+    workflow.add_node("report", profiler.wrap("report", generate_report))
+    workflow.add_node("alert", profiler.wrap("alert", send_alert))
+    workflow.add_node("baseline", profiler.wrap("baseline", update_baseline))
     
     # Define edges
     workflow.add_edge(START, "monitor")
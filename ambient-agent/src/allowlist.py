@@ -0,0 +1,447 @@
+"""Allowlist of known-good traffic, dropped before detection and the LLM.
+
+Rules come from ``allowlist.rules`` in the config and from the
+"Whitelist Processes" the ``baseline_learning`` prompt suggests. A rule
+constrains any of ``comm`` (exact name or glob), ``daddr`` (address or
+CIDR) and ``dport`` (port or range such as ``8000-8100``), and matches an
+event when all of its constraints match:
+
+    allowlist:
+      rules:
+        - {name: ntp, comm: chronyd, dport: 123}
+        - {name: mirrors, daddr: [203.0.113.0/24], dport: 443}
+
+Rules are compiled into hash sets of exact names and addresses, a CIDR
+prefix trie, sorted port ranges and one regular expression for the globs.
+Lookups of recurring flows are cached.
+
+Findings of the anomaly tool are only filtered with
+``allowlist.filter_findings``. Even then, HIGH and CRITICAL findings are
+only dropped by a configured rule that constrains the address or port:
+a learned or comm-only rule would let any binary named like an allowed
+process hide its findings.
+"""
+
+import bisect
+import fnmatch
+import ipaddress
+import logging
+import re
+import socket
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+GLOB_CHARS = set("*?[")
+_V4_MAPPED = bytes(10) + b"\xff\xff"
+CACHE_SIZE = 65536
+
+_WHITELIST = re.compile(r"Whitelist Processes:\s*\[?([^\]\n]*)\]?", re.IGNORECASE)
+_SEVERITY_TAG = re.compile(r"\[(?:CRITICAL|HIGH|MEDIUM|LOW)\]")
+_SEVERE_TAG = re.compile(r"\[(?:CRITICAL|HIGH)\]")
+_FINDING_COMM = [
+    re.compile(r"pid[ =]\d+ \(([^()\s]+)\)"),     # pid 1002 (nc)
+    re.compile(r"(\S+) \(pid \d+\)"),             # nc (pid 1002)
+    re.compile(r"comm=(\S+)"),
+]
+_FINDING_ADDR = re.compile(r"(?:daddr=|\bto |\bon )(\d{1,3}(?:\.\d{1,3}){3}|[0-9a-fA-F:]*:[0-9a-fA-F:]+)")
+_FINDING_PORT = re.compile(r"(?:dport=|\bport )(\d+)")
+
+
+def _pack_address(address: str) -> Optional[bytes]:
+    """Packed address, with IPv4-mapped IPv6 addresses as IPv4."""
+    try:
+        return socket.inet_pton(socket.AF_INET, address)
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, address)
+    except OSError:
+        return None
+    return packed[12:] if packed.startswith(_V4_MAPPED) else packed
+
+
+class _TrieNode:
+    __slots__ = ("children", "values")
+    
+    def __init__(self):
+        self.children: Dict[int, "_TrieNode"] = {}
+        # Byte value -> (prefix length, value) of the longest prefix ending in this byte
+        self.values: Dict[int, Tuple[int, Any]] = {}
+
+
+class PrefixTrie:
+    """
+    Multibit trie (one byte per level) of IPv4 and IPv6 networks.
+    
+    Prefixes that end inside a byte are expanded to every byte value they
+    cover, so a lookup is at most 4 (IPv4) or 16 (IPv6) dict lookups.
+    """
+    
+    def __init__(self):
+        self._roots = {4: _TrieNode(), 16: _TrieNode()}
+        self._default: Dict[int, Any] = {}
+        self.size = 0
+    
+    def insert(self, network: str, value: Any):
+        net = ipaddress.ip_network(network, strict=False)
+        packed = net.network_address.packed
+        length = net.prefixlen
+        self.size += 1
+        if length == 0:
+            self._default[len(packed)] = value
+            return
+        
+        node = self._roots[len(packed)]
+        depth = (length - 1) // 8
+        for byte in packed[:depth]:
+            node = node.children.setdefault(byte, _TrieNode())
+        span = 1 << (8 * (depth + 1) - length)
+        base = packed[depth] & ~(span - 1)
+        for byte in range(base, base + span):
+            existing = node.values.get(byte)
+            if existing is None or existing[0] <= length:
+                node.values[byte] = (length, value)
+    
+    def lookup(self, address: str) -> Any:
+        """Value of the longest network containing the address, or None."""
+        packed = _pack_address(address)
+        if packed is None:
+            return None
+        node = self._roots[len(packed)]
+        found = self._default.get(len(packed))
+        for byte in packed:
+            entry = node.values.get(byte)
+            if entry is not None:
+                found = entry[1]
+            node = node.children.get(byte)
+            if node is None:
+                break
+        return found
+
+
+class PortRanges:
+    """Sorted, merged port ranges."""
+    
+    def __init__(self, ranges: Iterable[Tuple[int, int]] = ()):
+        merged: List[List[int]] = []
+        for low, high in sorted(ranges):
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        self._starts = [low for low, _ in merged]
+        self._ends = [high for _, high in merged]
+    
+    def __contains__(self, port: int) -> bool:
+        i = bisect.bisect_right(self._starts, port) - 1
+        return i >= 0 and port <= self._ends[i]
+    
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+
+def _as_list(value) -> List:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def parse_port_ranges(value) -> List[Tuple[int, int]]:
+    """Parse ``443``, ``"8000-8100"`` or a list of them."""
+    ranges = []
+    for item in _as_list(value):
+        low, _, high = str(item).partition("-")
+        ranges.append((int(low), int(high or low)))
+    return ranges
+
+
+@dataclass
+class Rule:
+    """One allowlist rule; unset fields match anything."""
+    name: str
+    comms: Tuple[str, ...] = ()
+    addresses: Tuple[str, ...] = ()
+    ports: Tuple[Tuple[int, int], ...] = ()
+    learned: bool = False
+    
+    @property
+    def can_drop_severe(self) -> bool:
+        """Whether the rule may drop HIGH and CRITICAL findings (configured, not comm-only)."""
+        return not self.learned and bool(self.addresses or self.ports)
+    
+    @classmethod
+    def from_config(cls, entry: Dict, index: int = 0) -> "Rule":
+        return cls(
+            name=entry.get("name") or f"rule-{index}",
+            comms=tuple(str(c) for c in _as_list(entry.get("comm"))),
+            addresses=tuple(str(a) for a in _as_list(entry.get("daddr"))),
+            ports=tuple(parse_port_ranges(entry.get("dport"))),
+        )
+
+
+class _CompiledRule:
+    """Address and port constraints of a rule that also constrains other fields."""
+    
+    __slots__ = ("name", "exact", "trie", "ports")
+    
+    def __init__(self, rule: Rule):
+        self.name = rule.name
+        self.exact = {a for a in rule.addresses if "/" not in a} or None
+        self.trie = None
+        cidrs = [a for a in rule.addresses if "/" in a]
+        if cidrs:
+            self.trie = PrefixTrie()
+            for cidr in cidrs:
+                self.trie.insert(cidr, True)
+        self.ports = PortRanges(rule.ports) if rule.ports else None
+    
+    def matches(self, daddr: Optional[str], dport: Optional[int]) -> bool:
+        if self.exact is not None or self.trie is not None:
+            if not daddr:
+                return False
+            if not ((self.exact and daddr in self.exact) or (self.trie and self.trie.lookup(daddr))):
+                return False
+        if self.ports is not None and (not dport or dport not in self.ports):
+            return False
+        return True
+
+
+class Allowlist:
+    """Compiled allowlist rules."""
+    
+    def __init__(self, rules: Iterable[Rule], filter_findings: bool = False):
+        """
+        Args:
+            rules: Rules to compile
+            filter_findings: Also drop finding lines about allowed traffic (``filter_findings``)
+        """
+        self.rules = list(rules)
+        self.findings_enabled = filter_findings
+        self._severe = {rule.name for rule in self.rules if rule.can_drop_severe}
+        
+        # Single-field rules: one hash lookup, trie walk or bisect each
+        self._comms: Dict[str, str] = {}
+        self._addresses: Dict[str, str] = {}
+        self._networks = PrefixTrie()
+        self._ports: List[Tuple[Tuple[int, int], str]] = []
+        
+        # Rules combining fields, indexed by exact comm, glob or neither
+        self._by_comm: Dict[str, List[_CompiledRule]] = {}
+        self._globs: List[Tuple[re.Pattern, Optional[_CompiledRule], str]] = []
+        self._any_comm: List[_CompiledRule] = []
+        
+        for rule in self.rules:
+            self._add(rule)
+        
+        self._port_ranges = PortRanges(r for r, _ in self._ports)
+        # One combined expression rejects names that match no glob at all
+        self._any_glob = None
+        if self._globs:
+            self._any_glob = re.compile("|".join(f"(?:{regex.pattern})" for regex, _, _ in self._globs))
+        self._cache: Dict[Tuple, Optional[str]] = {}
+        self.dropped: Counter = Counter()
+    
+    def _add(self, rule: Rule):
+        constraints = sum(bool(field) for field in (rule.comms, rule.addresses, rule.ports))
+        if constraints == 0:
+            logger.warning(f"⚠️  Ignoring allowlist rule {rule.name} without comm, daddr or dport")
+            return
+        
+        if constraints == 1 and rule.addresses:
+            for address in rule.addresses:
+                if "/" in address:
+                    self._networks.insert(address, rule.name)
+                else:
+                    self._addresses[address] = rule.name
+            return
+        if constraints == 1 and rule.ports:
+            self._ports.extend((r, rule.name) for r in rule.ports)
+            return
+        
+        compiled = _CompiledRule(rule) if constraints > 1 else None
+        if not rule.comms:
+            self._any_comm.append(compiled)
+        for comm in rule.comms:
+            if GLOB_CHARS & set(comm):
+                self._globs.append((re.compile(fnmatch.translate(comm)), compiled, rule.name))
+            elif compiled is None:
+                self._comms[comm] = rule.name
+            else:
+                self._by_comm.setdefault(comm, []).append(compiled)
+    
+    def match(self, comm: Optional[str], daddr: Optional[str] = None, dport: Optional[int] = None) -> Optional[str]:
+        """
+        Name of the first rule allowing the traffic, or None.
+        
+        Missing fields (e.g. findings without a port) only match rules that
+        don't constrain them.
+        """
+        key = (comm, daddr, dport)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        
+        name = self._match(comm, daddr, dport)
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = name
+        return name
+    
+    def _match(self, comm, daddr, dport) -> Optional[str]:
+        if comm in self._comms:
+            return self._comms[comm]
+        if daddr:
+            name = self._addresses.get(daddr) or self._networks.lookup(daddr)
+            if name:
+                return name
+        if dport and self._port_ranges and dport in self._port_ranges:
+            return next(name for (low, high), name in self._ports if low <= dport <= high)
+        
+        if comm:
+            for compiled in self._by_comm.get(comm, ()):
+                if compiled.matches(daddr, dport):
+                    return compiled.name
+            if self._any_glob is not None and self._any_glob.match(comm):
+                for regex, compiled, name in self._globs:
+                    if regex.match(comm) and (compiled is None or compiled.matches(daddr, dport)):
+                        return name
+        for compiled in self._any_comm:
+            if compiled.matches(daddr, dport):
+                return compiled.name
+        return None
+    
+    def filter_flows(self, flows: Counter) -> Counter:
+        """
+        Drop allowed flows keyed by (comm, pid, daddr, dport).
+        
+        Returns:
+            The flows that aren't allowlisted
+        """
+        kept: Counter = Counter()
+        for key, count in flows.items():
+            comm, _, daddr, dport = key
+            name = self.match(comm, daddr, dport)
+            if name is None:
+                kept[key] = count
+            else:
+                self.dropped[name] += count
+                metrics.incr("allowlist_dropped_events", count, rule=name)
+        return kept
+    
+    def filter_findings(self, text: str) -> str:
+        """
+        Drop finding lines that are about allowlisted traffic, if enabled.
+        
+        HIGH and CRITICAL lines are only dropped by configured rules that
+        constrain the address or port.
+        """
+        if not self.findings_enabled:
+            return text
+        lines = []
+        for line in text.splitlines():
+            if _SEVERITY_TAG.search(line):
+                comm = next((m.group(1) for p in _FINDING_COMM if (m := p.search(line))), None)
+                if comm:
+                    addr = _FINDING_ADDR.search(line)
+                    port = _FINDING_PORT.search(line)
+                    name = self.match(comm, addr.group(1) if addr else None, int(port.group(1)) if port else None)
+                    if name and _SEVERE_TAG.search(line) and name not in self._severe:
+                        metrics.incr("allowlist_kept_severe_findings", rule=name)
+                        name = None
+                    if name:
+                        self.dropped[name] += 1
+                        metrics.incr("allowlist_dropped_findings", rule=name)
+                        continue
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def parse_whitelist(text: str) -> List[str]:
+    """Process names from a "Whitelist Processes: [a, b]" line of the baseline answer."""
+    match = _WHITELIST.search(text or "")
+    if not match:
+        return []
+    names = [name.strip().strip("'\"`") for name in match.group(1).split(",")]
+    return [name for name in names if name and name.lower() not in ("none", "n/a")]
+
+
+class AllowlistRegistry:
+    """Configured rules plus processes learned from the baseline, per target."""
+    
+    def __init__(self, rules: Iterable[Rule] = (), learn: bool = False, min_votes: int = 2,
+                 max_learned: int = 50, never: Iterable[str] = (), filter_findings: bool = False):
+        """
+        Args:
+            rules: Configured rules
+            learn: Allow processes suggested by the baseline LLM (comm-only rules)
+            min_votes: Suggestions in this many baseline answers before a process is allowed
+            max_learned: Learned processes per target
+            never: Globs of process names that are never learned
+            filter_findings: Also drop finding lines about allowed traffic
+        """
+        self.rules = list(rules)
+        self.findings_enabled = filter_findings
+        self.learn_enabled = learn
+        self.min_votes = min_votes
+        self.max_learned = max_learned
+        self.never = re.compile("|".join(fnmatch.translate(p) for p in never)) if never else None
+        self._votes: Dict[str, Counter] = {}
+        self._learned: Dict[str, List[str]] = {}
+        self._compiled: Dict[str, Allowlist] = {}
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "AllowlistRegistry":
+        settings = config.get("allowlist", {})
+        learn = settings.get("learn", {})
+        return cls(
+            rules=[Rule.from_config(entry, i) for i, entry in enumerate(settings.get("rules") or [])],
+            learn=learn.get("enabled", False),
+            min_votes=learn.get("min_votes", 2),
+            max_learned=learn.get("max_entries", 50),
+            never=learn.get("never", []),
+            filter_findings=settings.get("filter_findings", False)
+        )
+    
+    def get(self, host: str) -> Allowlist:
+        """Compiled allowlist of a target."""
+        if host not in self._compiled:
+            learned = [Rule(name=f"learned:{comm}", comms=(comm,), learned=True) for comm in self._learned.get(host, [])]
+            self._compiled[host] = Allowlist(self.rules + learned, self.findings_enabled)
+        return self._compiled[host]
+    
+    def learned(self, host: str) -> List[str]:
+        return list(self._learned.get(host, []))
+    
+    def learn(self, host: str, names: Iterable[str]) -> List[str]:
+        """
+        Count suggested processes and allow those with enough votes.
+        
+        Globs, names on the ``never`` list and names beyond ``max_learned``
+        are ignored.
+        
+        Returns:
+            Processes newly allowed
+        """
+        if not self.learn_enabled:
+            return []
+        votes = self._votes.setdefault(host, Counter())
+        learned = self._learned.setdefault(host, [])
+        added = []
+        # Event comm names are truncated to 15 characters (TASK_COMM_LEN)
+        for name in {name[:15] for name in names}:
+            if GLOB_CHARS & set(name) or (self.never and self.never.match(name)):
+                continue
+            votes[name] += 1
+            if votes[name] >= self.min_votes and name not in learned and len(learned) < self.max_learned:
+                learned.append(name)
+                added.append(name)
+        if added:
+            logger.info(f"📝 Learned allowlisted processes for {host}: {', '.join(sorted(added))}")
+            self._compiled.pop(host, None)
+        return added
@@ -0,0 +1,503 @@
+"""Local archive of network events.
+
+Events fetched each cycle are appended to a binary archive so history can
+be queried locally instead of over SSH. The layout is one directory per
+target with one segment file per hour:
+
+    <path>/<target>/2025102210.seg
+    <path>/<target>/index.json   # min/max time and count per segment
+
+Segments hold fixed-size records sorted by time, so reads memory-map the
+segment and binary-search the requested time range. Old segments are
+compacted (sorted) and deleted after ``retention_hours``.
+
+Query from the command line:
+
+    python -m src.archive --host bastion.example.com --minutes 1440 --summary
+"""
+
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .events import NetworkEvent
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NEVT"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+# timestamp, pid, sport, dport, protocol, event type, comm (TASK_COMM_LEN), saddr, daddr
+RECORD = struct.Struct("<dIHHBB16s16s16s")
+TIMESTAMP = struct.Struct("<d")
+
+PROTOCOLS = ["", "TCP", "UDP", "ICMP"]
+EVENT_TYPES = ["", "CONNECT", "ACCEPT", "CLOSE", "SEND", "RECV"]
+
+_V4_MAPPED = bytes(10) + b"\xff\xff"
+
+
+def _pack_addr(addr: str) -> bytes:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return bytes(16)
+    return ip.packed if ip.version == 6 else _V4_MAPPED + ip.packed
+
+
+def _unpack_addr(packed: bytes) -> str:
+    if packed == bytes(16):
+        return ""
+    if packed.startswith(_V4_MAPPED):
+        return str(ipaddress.IPv4Address(packed[12:]))
+    return str(ipaddress.IPv6Address(packed))
+
+
+def _code(table: List[str], value: str) -> int:
+    return table.index(value) if value in table else 0
+
+
+def encode_event(event: NetworkEvent) -> bytes:
+    """Encode an event as a fixed-size record."""
+    return RECORD.pack(
+        event.timestamp,
+        event.pid & 0xFFFFFFFF,
+        event.sport & 0xFFFF,
+        event.dport & 0xFFFF,
+        _code(PROTOCOLS, event.protocol),
+        _code(EVENT_TYPES, event.event_type),
+        event.comm.encode()[:15],
+        _pack_addr(event.saddr),
+        _pack_addr(event.daddr),
+    )
+
+
+def decode_event(fields: tuple) -> NetworkEvent:
+    """Decode the unpacked fields of a record into an event."""
+    timestamp, pid, sport, dport, protocol, event_type, comm, saddr, daddr = fields
+    return NetworkEvent(
+        timestamp=timestamp,
+        pid=pid,
+        comm=comm.rstrip(b"\0").decode(errors="replace"),
+        protocol=PROTOCOLS[protocol] if protocol < len(PROTOCOLS) else "",
+        saddr=_unpack_addr(saddr),
+        sport=sport,
+        daddr=_unpack_addr(daddr),
+        dport=dport,
+        event_type=EVENT_TYPES[event_type] if event_type < len(EVENT_TYPES) else "",
+    )
+
+
+def encode_events(events: Iterable[NetworkEvent]) -> bytes:
+    """
+    Encode events as time-sorted records.
+    
+    Events without a timestamp are left out: they can't be placed in time,
+    and the same event fetched again by an overlapping window couldn't be
+    told apart from a new one.
+    
+    Args:
+        events: Parsed events
+    
+    Returns:
+        Concatenated records, ready for ``EventArchive.append_records``
+    """
+    stamped = sorted((event for event in events if event.timestamp), key=lambda event: event.timestamp)
+    return b"".join(map(encode_event, stamped))
+
+
+def _timestamp_at(data, base: int, i: int) -> float:
+    return TIMESTAMP.unpack_from(data, base + i * RECORD.size)[0]
+
+
+def _bisect_time(data, base: int, lo: int, hi: int, timestamp: float, right: bool) -> int:
+    """First record index in [lo, hi) after (right) or at/after (left) a timestamp."""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = _timestamp_at(data, base, mid)
+        if value < timestamp or (right and value == timestamp):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def new_records(records: bytes, high_water: float, seen: Optional[Counter]) -> bytes:
+    """
+    Records not stored yet by a consumer of overlapping fetch windows.
+    
+    Records after ``high_water`` are new. Records at ``high_water`` are new
+    unless they are among ``seen``, the records stored at that timestamp
+    before (None: none of them are new).
+    
+    Args:
+        records: Time-sorted records from ``encode_events``
+        high_water: Newest timestamp stored
+        seen: Records stored at ``high_water``, with their counts
+    
+    Returns:
+        The new records, time-sorted
+    """
+    count = len(records) // RECORD.size
+    first = _bisect_time(records, 0, 0, count, high_water, right=False)
+    after = _bisect_time(records, 0, first, count, high_water, right=True)
+    if first == after or seen is None:
+        return records[after * RECORD.size:]
+    
+    remaining = Counter(seen)
+    tied = []
+    for i in range(first, after):
+        record = records[i * RECORD.size:(i + 1) * RECORD.size]
+        if remaining[record] > 0:
+            remaining[record] -= 1
+        else:
+            tied.append(record)
+    return b"".join(tied) + records[after * RECORD.size:]
+
+
+def newest_records(records: bytes, high_water: float, seen: Optional[Counter]) -> Tuple[float, Optional[Counter]]:
+    """
+    High water mark and records seen at it after storing new records.
+    
+    Args:
+        records: New records from ``new_records``
+        high_water: Newest timestamp stored before
+        seen: Records stored at ``high_water`` before
+    
+    Returns:
+        (high_water, seen) to pass to the next ``new_records`` call
+    """
+    count = len(records) // RECORD.size
+    if not count:
+        return high_water, seen
+    newest = _timestamp_at(records, 0, count - 1)
+    first = _bisect_time(records, 0, 0, count, newest, right=False)
+    tied = Counter(records[i * RECORD.size:(i + 1) * RECORD.size] for i in range(first, count))
+    if newest == high_water and seen:
+        tied += seen
+    return newest, tied
+
+
+def _segment_name(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%d%H")
+
+
+def _segment_start(name: str) -> float:
+    return datetime.strptime(name, "%Y%m%d%H").replace(tzinfo=timezone.utc).timestamp()
+
+
+class EventArchive:
+    """Append-only, hour-partitioned event archive per target."""
+    
+    def __init__(self, path: str, retention_hours: float = 48, compact_after_hours: float = 2):
+        """
+        Args:
+            path: Root directory of the archive
+            retention_hours: Segments older than this are deleted
+            compact_after_hours: Closed segments older than this are compacted
+        """
+        self.path = Path(path)
+        self.retention_hours = retention_hours
+        self.compact_after_hours = compact_after_hours
+        self._indexes: Dict[str, dict] = {}
+    
+    # ---- Layout and index ----
+    
+    def _target_dir(self, host: str) -> Path:
+        return self.path / re.sub(r"[^A-Za-z0-9._-]", "_", host)
+    
+    def _index(self, host: str) -> dict:
+        if host not in self._indexes:
+            index_file = self._target_dir(host) / "index.json"
+            index = {"segments": {}, "high_water": 0.0, "maintained_at": 0.0}
+            if index_file.exists():
+                index.update(json.loads(index_file.read_text()))
+            self._indexes[host] = index
+        return self._indexes[host]
+    
+    def _save_index(self, host: str):
+        index_file = self._target_dir(host) / "index.json"
+        tmp = index_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._index(host)))
+        os.replace(tmp, index_file)
+    
+    def segments(self, host: str, start: float = 0.0, end: float = float("inf")) -> List[Path]:
+        """Segments of a target whose time range overlaps [start, end]."""
+        target_dir = self._target_dir(host)
+        return [
+            target_dir / f"{name}.seg"
+            for name, info in sorted(self._index(host)["segments"].items())
+            if info["count"] and info["min"] <= end and info["max"] >= start
+        ]
+    
+    # ---- Writing ----
+    
+    def append(self, host: str, events: Iterable[NetworkEvent]) -> int:
+        """
+        Append events of a cycle to the archive.
+        
+        Events before the newest archived timestamp, or archived at it
+        already, are skipped, so overlapping analysis windows don't store
+        events twice. Events without a timestamp are not archived.
+        
+        Args:
+            host: Target host
+            events: Parsed events
+        
+        Returns:
+            Number of events written
+        """
+        return self.append_records(host, encode_events(events))
+    
+    def append_records(self, host: str, records: bytes) -> int:
+        """
+        Append already encoded, time-sorted records (see ``encode_events``).
+        
+        Args:
+            host: Target host
+            records: Concatenated records
+        
+        Returns:
+            Number of records written
+        """
+        index = self._index(host)
+        # Archived records at the high water mark (indexes written before they were kept: all of them)
+        seen = index.get("high_water_records")
+        seen = Counter({bytes.fromhex(record): n for record, n in seen.items()}) if seen is not None else None
+        records = new_records(records, index["high_water"], seen)
+        count = len(records) // RECORD.size
+        if not count:
+            return 0
+        
+        target_dir = self._target_dir(host)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        
+        with metrics.timer("archive_append_seconds"):
+            start = 0
+            while start < count:
+                # Records up to the end of this record's hour go into one segment
+                timestamp = _timestamp_at(records, 0, start)
+                hour_end = (timestamp // 3600 + 1) * 3600
+                end = _bisect_time(records, 0, start, count, hour_end, right=False)
+                
+                name = _segment_name(timestamp)
+                segment = target_dir / f"{name}.seg"
+                with open(segment, "ab") as f:
+                    if f.tell() == 0:
+                        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+                    f.write(records[start * RECORD.size:end * RECORD.size])
+                
+                info = index["segments"].setdefault(
+                    name, {"min": timestamp, "max": 0.0, "count": 0, "compacted": False}
+                )
+                info["min"] = min(info["min"], timestamp)
+                info["max"] = max(info["max"], _timestamp_at(records, 0, end - 1))
+                info["count"] += end - start
+                start = end
+            
+            high_water, seen = newest_records(records, index["high_water"], seen)
+            index["high_water"] = high_water
+            index["high_water_records"] = {record.hex(): n for record, n in seen.items()}
+            self._save_index(host)
+        
+        metrics.incr("archive_events_written", count)
+        return count
+    
+    # ---- Reading ----
+    
+    def _read_segment(self, segment: Path, start: float, end: float) -> Iterator[tuple]:
+        if segment.stat().st_size <= HEADER.size:
+            return
+        with open(segment, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, record_size = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or record_size != RECORD.size:
+                logger.warning(f"⚠️  Skipping unreadable archive segment {segment}")
+                return
+            
+            count = (len(data) - HEADER.size) // RECORD.size
+            first = _bisect_time(data, HEADER.size, 0, count, start, right=False)
+            last = _bisect_time(data, HEADER.size, first, count, end, right=True)
+            
+            view = data[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+            yield from RECORD.iter_unpack(view)
+    
+    def query(self, host: str, start: float, end: Optional[float] = None, pid: Optional[int] = None,
+              comm: Optional[str] = None, daddr: Optional[str] = None, dport: Optional[int] = None,
+              limit: Optional[int] = None) -> List[NetworkEvent]:
+        """
+        Query archived events of a target.
+        
+        Args:
+            host: Target host
+            start: Start of the time range (epoch seconds)
+            end: End of the time range (default: now)
+            pid, comm, daddr, dport: Optional exact-match filters
+            limit: Maximum number of events to return (oldest first)
+        
+        Returns:
+            Matching events in time order
+        """
+        end = time.time() if end is None else end
+        results: List[NetworkEvent] = []
+        
+        with metrics.timer("archive_query_seconds"):
+            for segment in self.segments(host, start, end):
+                for fields in self._read_segment(segment, start, end):
+                    if pid is not None and fields[1] != pid:
+                        continue
+                    if dport is not None and fields[3] != dport:
+                        continue
+                    event = decode_event(fields)
+                    if comm is not None and event.comm != comm:
+                        continue
+                    if daddr is not None and event.daddr != daddr:
+                        continue
+                    results.append(event)
+                    if limit and len(results) >= limit:
+                        return results
+        return results
+    
+    def summarize(self, host: str, start: float, end: Optional[float] = None, top: int = 10) -> str:
+        """
+        Summarize archived events of a target like get_network_event_stats.
+        
+        Args:
+            host: Target host
+            start: Start of the time range (epoch seconds)
+            end: End of the time range (default: now)
+            top: Entries listed per section
+        
+        Returns:
+            Text with total events and top processes, destinations and ports
+        """
+        events = self.query(host, start, end)
+        sections = {
+            "Top Processes": Counter(event.comm for event in events),
+            "Top Destinations": Counter(event.daddr for event in events if event.daddr),
+            "Top Ports": Counter(event.dport for event in events if event.dport),
+        }
+        lines = [f"Total events: {len(events)}"]
+        for title, counts in sections.items():
+            lines.append(f"{title}:")
+            lines.extend(f"  {key}: {count}" for key, count in counts.most_common(top))
+        return "\n".join(lines)
+    
+    # ---- Maintenance ----
+    
+    def maintain(self, host: str, now: Optional[float] = None, interval: float = 3600) -> bool:
+        """
+        Apply retention and compaction, at most once per ``interval``.
+        
+        Returns:
+            True if maintenance ran
+        """
+        now = time.time() if now is None else now
+        index = self._index(host)
+        if now - index["maintained_at"] < interval:
+            return False
+        
+        self.enforce_retention(host, now)
+        self.compact(host, now)
+        index["maintained_at"] = now
+        self._save_index(host)
+        return True
+    
+    def enforce_retention(self, host: str, now: Optional[float] = None) -> int:
+        """Delete segments that ended more than ``retention_hours`` ago."""
+        now = time.time() if now is None else now
+        index = self._index(host)
+        cutoff = now - self.retention_hours * 3600
+        
+        expired = [name for name in index["segments"] if _segment_start(name) + 3600 <= cutoff]
+        for name in expired:
+            (self._target_dir(host) / f"{name}.seg").unlink(missing_ok=True)
+            del index["segments"][name]
+        
+        if expired:
+            self._save_index(host)
+            logger.info(f"🗑️  Archive retention removed {len(expired)} segments of {host}")
+        return len(expired)
+    
+    def compact(self, host: str, now: Optional[float] = None) -> int:
+        """
+        Rewrite closed segments sorted by time.
+        
+        Returns:
+            Number of segments compacted
+        """
+        now = time.time() if now is None else now
+        index = self._index(host)
+        compacted = 0
+        
+        for name, info in index["segments"].items():
+            if info["compacted"] or _segment_start(name) + 3600 + self.compact_after_hours * 3600 > now:
+                continue
+            
+            segment = self._target_dir(host) / f"{name}.seg"
+            data = segment.read_bytes()
+            # Identical records are kept: repeats of one connection within a second are
+            # real events, and overlapping fetch windows are deduplicated when appending
+            records = sorted((
+                data[offset:offset + RECORD.size]
+                for offset in range(HEADER.size, len(data) - RECORD.size + 1, RECORD.size)
+            ), key=lambda record: TIMESTAMP.unpack_from(record)[0])
+            
+            tmp = segment.with_suffix(".tmp")
+            tmp.write_bytes(HEADER.pack(MAGIC, VERSION, RECORD.size) + b"".join(records))
+            os.replace(tmp, segment)
+            
+            info.update(count=len(records), compacted=True)
+            compacted += 1
+        
+        if compacted:
+            self._save_index(host)
+        return compacted
+
+
+def main():
+    """Query the archive from the command line."""
+    import argparse
+    from .config import load_config, get_targets
+    
+    config = load_config()
+    archive_config = config.get("archive", {})
+    
+    parser = argparse.ArgumentParser(description="Query the local network event archive")
+    parser.add_argument("--host", default=get_targets(config)[0]["host"])
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--comm")
+    parser.add_argument("--daddr")
+    parser.add_argument("--dport", type=int)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--summary", action="store_true", help="Print top processes, destinations and ports")
+    args = parser.parse_args()
+    
+    archive = EventArchive(archive_config.get("path", "./data/archive"))
+    start = time.time() - args.minutes * 60
+    
+    if args.summary:
+        print(archive.summarize(args.host, start))
+        return
+    
+    for event in archive.query(args.host, start, pid=args.pid, comm=args.comm, daddr=args.daddr,
+                               dport=args.dport, limit=args.limit):
+        print(
+            f"{datetime.fromtimestamp(event.timestamp).isoformat(sep=' ', timespec='seconds')} "
+            f"{event.protocol} {event.event_type} pid={event.pid} comm={event.comm} "
+            f"saddr={event.saddr} sport={event.sport} daddr={event.daddr} dport={event.dport}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Clock used by the agent, replaceable by virtual time during replay."""
+
+import time
+from datetime import datetime
+from typing import Optional
+
+
+class Clock:
+    """Wall clock that can be switched to virtual time."""
+    
+    def __init__(self):
+        self._virtual: Optional[float] = None
+    
+    def time(self) -> float:
+        """Current time as epoch seconds."""
+        return time.time() if self._virtual is None else self._virtual
+    
+    def now(self) -> datetime:
+        """Current local time as a datetime."""
+        return datetime.fromtimestamp(self.time())
+    
+    def set(self, timestamp: float):
+        """Switch to virtual time at the given epoch seconds."""
+        self._virtual = timestamp
+    
+    def advance(self, seconds: float):
+        """Move virtual time forward."""
+        if self._virtual is None:
+            raise RuntimeError("Clock is not virtual")
+        self._virtual += seconds
+    
+    def reset(self):
+        """Return to the wall clock."""
+        self._virtual = None
+    
+    @property
+    def is_virtual(self) -> bool:
+        return self._virtual is not None
+
+
+# Global clock
+clock = Clock()
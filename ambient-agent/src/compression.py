@@ -0,0 +1,402 @@
+"""Compressed storage of alerts and other repetitive text payloads.
+
+Payloads are compressed with the fastest codec available: zstd
+(``zstandard``), then lz4 (``lz4``), falling back to zlib from the
+standard library. Event dumps, anomaly text and LLM reports repeat the
+same field names, headings and addresses, so small payloads compress far
+better with a preset dictionary (zstd and zlib; lz4 frames don't take
+one).
+
+``CompressedLog`` is an append-only file of independently compressed
+records, used for ``alerts.log`` when ``alerts.compress`` is set:
+
+    <header: magic, codec, dictionary> <length><record> <length><record> ...
+
+The dictionary is stored in the file header, so files are readable
+without any other file. Records are decompressed one at a time while
+reading, and a truncated last record (crash while writing) is skipped.
+When the file exceeds ``max_bytes`` it is rotated like ``logging``'s
+``RotatingFileHandler``, and the next file gets a dictionary trained on
+the records of the previous one.
+
+    python -m src.compression cat logs/alerts.log.z
+    python -m src.compression train -o data/events.dict dumps/*.txt
+"""
+
+import logging
+import os
+import re
+import struct
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Type
+
+from .metrics import metrics
+
+try:
+    import zstandard
+except ImportError:  # Optional
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Optional
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NCLG"
+VERSION = 1
+# magic, version, codec id, dictionary length
+HEADER = struct.Struct("<4sBB2xI")
+LENGTH = struct.Struct("<I")
+SUFFIX = ".z"
+
+# zlib only uses the last 32 KiB of a preset dictionary
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+# Text the agent writes over and over, used until a dictionary is trained
+SEED_DICTIONARY = "\n".join([
+    "Network Event Statistics (last 10 minutes)", "Total events: ",
+    "Top Processes:", "Top Destinations:", "Top Ports:",
+    "Detected anomalies:", "Possible port scan: pid ", " contacted ", " distinct ports on ",
+    "High connection rate: ", "Unusual port: pid ", "connections in the last ",
+    " TCP CONNECT pid=", " comm=", " saddr=", " sport=", " daddr=", " dport=",
+    " UDP SEND pid=", " TCP ACCEPT pid=", " TCP CLOSE pid=",
+    "[LOW] ", "[MEDIUM] ", "[HIGH] ", "[CRITICAL] ", "Anomaly 1:\n", "Anomaly 2:\n",
+    "- Overall Severity: ", "- Threat Assessment: ", "- Likely Cause: ",
+    "- Recommended Actions:\n1. ", "\n2. ", "\n3. ", "- Alert Required: YES",
+    "PRELIMINARY HIGH alert at ", "PRELIMINARY CRITICAL alert at ", "Alert at 20",
+    "=" * 80,
+]).encode()
+
+
+class Codec:
+    """A compression codec with an optional preset dictionary."""
+    
+    name = ""
+    id = 0
+    supports_dictionary = False
+    
+    def __init__(self, dictionary: bytes = b"", level: Optional[int] = None):
+        self.dictionary = dictionary if self.supports_dictionary else b""
+        self.level = level
+    
+    @staticmethod
+    def available() -> bool:
+        return True
+    
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+    
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    id = 1
+    supports_dictionary = True
+    
+    def __init__(self, dictionary: bytes = b"", level: Optional[int] = None):
+        super().__init__(dictionary, level)
+        # Compression contexts are reused; the agent compresses from one thread
+        dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+        self._compressor = zstandard.ZstdCompressor(level=level or 3, dict_data=dict_data)
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+    
+    @staticmethod
+    def available() -> bool:
+        return zstandard is not None
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    id = 2
+    
+    @staticmethod
+    def available() -> bool:
+        return lz4_frame is not None
+    
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data, compression_level=self.level or 0)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+class ZlibCodec(Codec):
+    name = "zlib"
+    id = 3
+    supports_dictionary = True
+    
+    def __init__(self, dictionary: bytes = b"", level: Optional[int] = None):
+        super().__init__(dictionary[-MAX_DICTIONARY_BYTES:], level)
+    
+    def compress(self, data: bytes) -> bytes:
+        level = 6 if self.level is None else self.level
+        if self.dictionary:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(level)
+        return compressor.compress(data) + compressor.flush()
+    
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+# In order of preference for "auto"
+CODECS: Dict[str, Type[Codec]] = {codec.name: codec for codec in (ZstdCodec, Lz4Codec, ZlibCodec)}
+_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str = "auto", dictionary: bytes = b"", level: Optional[int] = None) -> Codec:
+    """
+    Create a codec, falling back to zlib if the requested one isn't installed.
+    
+    Args:
+        name: "auto" (fastest available), "zstd", "lz4" or "zlib"
+        dictionary: Preset dictionary (ignored by lz4)
+        level: Compression level (codec default if None)
+    
+    Returns:
+        Codec instance
+    """
+    if name == "auto":
+        name = next(codec.name for codec in CODECS.values() if codec.available())
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec {name!r}, expected one of auto, {', '.join(CODECS)}")
+    if not codec.available():
+        logger.warning(f"⚠️  {name} is not installed, compressing with zlib")
+        codec = ZlibCodec
+    return codec(dictionary, level)
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = 16 * 1024, codec: str = "auto") -> bytes:
+    """
+    Build a preset dictionary from sample payloads.
+    
+    zstd's trainer is used when zstd is available and there are enough
+    samples. Otherwise the dictionary is the most frequent tokens and token
+    pairs of the samples, most valuable last (zlib prefers near matches).
+    
+    Args:
+        samples: Payloads like the ones that will be compressed
+        size: Dictionary size in bytes (at most 32 KiB is used by zlib)
+        codec: Codec the dictionary is for
+    
+    Returns:
+        Dictionary bytes
+    """
+    samples = [sample for sample in samples if sample]
+    if codec == "auto":
+        codec = get_codec().name
+    if codec == "zstd" and zstandard is not None and len(samples) >= 8:
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            logger.debug(f"zstd dictionary training failed ({e}), using frequent tokens")
+    
+    pieces: Counter = Counter()
+    for sample in samples:
+        for line in sample.splitlines():
+            tokens = re.findall(rb"\s*\S+", line)
+            pieces.update(tokens)
+            pieces.update(a + b for a, b in zip(tokens, tokens[1:]))
+    dictionary: List[bytes] = []
+    total = 0
+    for piece, count in sorted(pieces.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2 or total + len(piece) > size:
+            continue
+        dictionary.append(piece)
+        total += len(piece)
+    return b"".join(reversed(dictionary))
+
+
+class CompressedLog:
+    """Append-only, rotated log of compressed text records."""
+    
+    def __init__(self, path: str, codec: str = "auto", dictionary: Optional[bytes] = None,
+                 level: Optional[int] = None, max_bytes: int = 64 * 2**20, backups: int = 3):
+        """
+        Args:
+            path: Log file
+            codec: Codec of new files ("auto", "zstd", "lz4" or "zlib")
+            dictionary: Preset dictionary of new files (default: seed dictionary)
+            level: Compression level
+            max_bytes: Rotate when the file is larger (0: never)
+            backups: Rotated files kept (path.1, path.2, ...)
+        """
+        self.path = Path(path)
+        self.codec_name = codec
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._codec: Optional[Codec] = None
+        self._dictionary = SEED_DICTIONARY if dictionary is None else dictionary
+    
+    @classmethod
+    def from_config(cls, path: str, settings: Dict) -> "CompressedLog":
+        dictionary = None
+        if settings.get("dictionary"):
+            dictionary = Path(settings["dictionary"]).read_bytes()
+        return cls(
+            path,
+            codec=settings.get("codec", "auto"),
+            dictionary=dictionary,
+            level=settings.get("level"),
+            max_bytes=int(settings.get("max_mb", 64) * 2**20),
+            backups=settings.get("backups", 3)
+        )
+    
+    def _open_codec(self) -> Codec:
+        """Codec of the current file, creating the file if needed."""
+        if self._codec is not None and self.path.exists():
+            return self._codec
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with open(self.path, "r+b") as f:
+                self._codec = _read_header(f)
+                _truncate_partial_record(f)
+            return self._codec
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._codec = get_codec(self.codec_name, self._dictionary, self.level)
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self._codec.id, len(self._codec.dictionary)))
+            f.write(self._codec.dictionary)
+        return self._codec
+    
+    def append(self, text: str) -> int:
+        """
+        Append one record.
+        
+        Returns:
+            Compressed size in bytes
+        """
+        codec = self._open_codec()
+        data = text.encode()
+        with metrics.timer("compress_seconds"):
+            payload = codec.compress(data)
+        with open(self.path, "ab") as f:
+            f.write(LENGTH.pack(len(payload)) + payload)
+        metrics.incr("compress_bytes_in", len(data))
+        metrics.incr("compress_bytes_out", len(payload))
+        
+        if self.max_bytes and self.path.stat().st_size > self.max_bytes:
+            self.rotate()
+        return len(payload)
+    
+    def rotate(self):
+        """Move the file to path.1 and start a new one with a freshly trained dictionary."""
+        samples = [text.encode() for text in read_log(self.path)]
+        for i in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._codec = None
+        if len(samples) >= 8:
+            self._dictionary = train_dictionary(samples, codec=get_codec(self.codec_name).name)
+        logger.info(f"🗜️  Rotated {self.path} ({len(samples)} records)")
+    
+    def read(self) -> Iterator[str]:
+        """Records of the current file (empty right after a rotation)."""
+        if self.path.exists():
+            yield from read_log(self.path)
+
+
+def _read_header(f) -> Codec:
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{f.name} is not a compressed log")
+    magic, version, codec_id, dictionary_length = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or codec_id not in _BY_ID:
+        raise ValueError(f"{f.name} is not a compressed log")
+    codec = _BY_ID[codec_id]
+    if not codec.available():
+        raise ValueError(f"{f.name} is compressed with {codec.name}, which is not installed")
+    return codec(f.read(dictionary_length))
+
+
+def _truncate_partial_record(f):
+    """Cut off a record left incomplete by a crash, so appends stay readable (f is after the header)."""
+    position = f.tell()
+    end = f.seek(0, os.SEEK_END)
+    while position + LENGTH.size <= end:
+        f.seek(position)
+        length = LENGTH.unpack(f.read(LENGTH.size))[0]
+        if position + LENGTH.size + length > end:
+            break
+        position += LENGTH.size + length
+    if position < end:
+        logger.warning(f"⚠️  Dropping a truncated record at the end of {f.name}")
+        f.truncate(position)
+
+
+def read_log(path) -> Iterator[str]:
+    """Records of a compressed log, decompressed one at a time."""
+    with open(path, "rb") as f:
+        codec = _read_header(f)
+        while True:
+            prefix = f.read(LENGTH.size)
+            if not prefix:
+                return
+            length = LENGTH.unpack(prefix)[0] if len(prefix) == LENGTH.size else -1
+            payload = f.read(length) if length >= 0 else b""
+            if len(payload) != length:
+                logger.warning(f"⚠️  {path} ends with a truncated record, skipping it")
+                return
+            yield codec.decompress(payload).decode(errors="replace")
+
+
+def main():
+    """Read compressed logs or train a dictionary from the command line."""
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Read compressed logs and train dictionaries")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cat = commands.add_parser("cat", help="Print the records of compressed logs")
+    cat.add_argument("paths", nargs="+")
+    train = commands.add_parser("train", help="Train a dictionary from sample files")
+    train.add_argument("samples", nargs="+", help="Text files, or compressed logs")
+    train.add_argument("-o", "--output", required=True)
+    train.add_argument("--size", type=int, default=16 * 1024)
+    train.add_argument("--codec", default="auto")
+    train.add_argument("--chunk-lines", type=int, default=50, help="Lines per sample of text files")
+    args = parser.parse_args()
+    
+    if args.command == "cat":
+        for path in args.paths:
+            for record in read_log(path):
+                sys.stdout.write(record)
+        return
+    
+    samples = []
+    for path in args.samples:
+        with open(path, "rb") as f:
+            is_log = f.read(len(MAGIC)) == MAGIC
+        if is_log:
+            samples.extend(record.encode() for record in read_log(path))
+            continue
+        lines = Path(path).read_bytes().splitlines(keepends=True)
+        samples.extend(b"".join(lines[i:i + args.chunk_lines]) for i in range(0, len(lines), args.chunk_lines))
+    dictionary = train_dictionary(samples, args.size, args.codec)
+    Path(args.output).write_bytes(dictionary)
+    print(f"Wrote a {len(dictionary)}-byte dictionary from {len(samples)} samples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
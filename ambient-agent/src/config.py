@@ -3,7 +3,7 @@
 import os
 import yaml
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 
 def load_config(config_path: str = None) -> Dict[str, Any]:
@@ -62,6 +62,10 @@ def _apply_env_overrides(config: Dict[str, Any]) -> Dict[str, Any]:
     if os.getenv("TARGET_USERNAME"):
         config["target"]["username"] = os.getenv("TARGET_USERNAME")
     
+    # Webhook overrides
+    if os.getenv("WEBHOOK_TOKEN"):
+        config.setdefault("webhook", {})["token"] = os.getenv("WEBHOOK_TOKEN")
+    
     # Alert overrides
     if os.getenv("SLACK_WEBHOOK_URL"):
         config.setdefault("alerts", {})["slack_webhook"] = os.getenv("SLACK_WEBHOOK_URL")
@@ -71,6 +75,26 @@ def _apply_env_overrides(config: Dict[str, Any]) -> Dict[str, Any]:
     return config
 
 
+def get_targets(config: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Get the list of monitored targets.
+    
+    Args:
+        config: Configuration dictionary
+    
+    Returns:
+        List of target dicts with 'host' and 'username'. Uses the `targets`
+        list if configured, otherwise the single `target` entry.
+    """
+    targets = config.get("targets") or [config["target"]]
+    default_username = config.get("target", {}).get("username")
+    
+    return [
+        {"host": t["host"], "username": t.get("username", default_username)}
+        for t in targets
+    ]
+
+
 def get_prompt(config: Dict[str, Any], prompt_name: str, **kwargs) -> tuple[str, str]:
     """
     Get a prompt from config and format it with variables.
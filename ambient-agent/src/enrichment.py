@@ -0,0 +1,332 @@
+"""Local IP enrichment of anomaly text.
+
+Remote addresses in the text sent to the LLM are annotated with tags, so
+the model can tell an internal subnet from a hosting provider or a known
+bad range without follow-up questions:
+
+    pid 1002 (nc) contacted 20 distinct ports on 198.51.100.7 [asn:AS64500 Example Hosting, known-bad:botnet-c2]
+
+Tags come from zones in the config (``enrichment.zones``) and from prefix
+databases built from local CSV files (``network,tag`` per line, e.g. an
+ASN dump or a block list):
+
+    python -m src.enrichment build asn.csv ./data/enrichment/asn.ipdb
+
+A database holds disjoint address ranges (the most specific network wins
+where networks overlap) sorted by start address, as fixed-size records.
+Lookups memory-map the file and binary-search it, with every 64th start
+address held in memory to narrow the search, so large databases are
+neither parsed nor loaded. An LRU cache sits in front for
+addresses that recur across cycles.
+"""
+
+import bisect
+import ipaddress
+import logging
+import mmap
+import re
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .allowlist import PrefixTrie, _pack_address
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IPDB"
+VERSION = 1
+# magic, version, record count, tag count
+HEADER = struct.Struct("<4sH2xII")
+# first address, last address (IPv6 or IPv4-mapped, big-endian), tag index
+RANGE = struct.Struct("<16s16sI")
+
+_V4_MAPPED = bytes(10) + b"\xff\xff"
+# Every INDEX_STRIDE-th start address is kept in memory to narrow the search
+INDEX_STRIDE = 64
+
+# IPv4 (optionally followed by :port), and IPv6 with at least two colons
+ADDRESS_RE = re.compile(
+    r"(?<![\w.:])(?:\d{1,3}(?:\.\d{1,3}){3}(?!\w|\.\d)"
+    r"|(?:[0-9a-fA-F]{0,4}:){2,7}(?:[0-9a-fA-F]{1,4}|\d{1,3}(?:\.\d{1,3}){3})?(?![\w:.]))"
+)
+
+
+def _pack16(address: str) -> Optional[bytes]:
+    """Address as 16 bytes, with IPv4 mapped into IPv6."""
+    packed = _pack_address(address)
+    if packed is None:
+        return None
+    return _V4_MAPPED + packed if len(packed) == 4 else packed
+
+
+def _network_range(network: str) -> Tuple[int, int, int]:
+    """First and last address (as 128-bit integers) and prefix length in IPv6 terms."""
+    net = ipaddress.ip_network(network.strip(), strict=False)
+    if net.version == 4:
+        first = int.from_bytes(_V4_MAPPED + net.network_address.packed, "big")
+        return first, first + net.num_addresses - 1, net.prefixlen + 96
+    return int(net.network_address), int(net.broadcast_address), net.prefixlen
+
+
+def flatten(networks: Iterable[Tuple[str, str]]) -> List[Tuple[int, int, str]]:
+    """
+    Turn (network, tag) pairs into disjoint, sorted address ranges.
+    
+    Where networks overlap, the most specific one wins. Tags of the same
+    network are joined.
+    
+    Args:
+        networks: Pairs of CIDR (or address) and tag
+    
+    Returns:
+        (first, last, tag) ranges sorted by first address
+    """
+    tags: Dict[Tuple[int, int, int], List[str]] = {}
+    for network, tag in networks:
+        key = _network_range(network)
+        if tag not in tags.setdefault(key, []):
+            tags[key].append(tag)
+    
+    # Networks either nest or are disjoint; sweep with a stack of open ones
+    ranges: List[Tuple[int, int, str]] = []
+    
+    def emit(first: int, last: int, tag: str):
+        if first > last:
+            return
+        if ranges and ranges[-1][1] + 1 == first and ranges[-1][2] == tag:
+            ranges[-1] = (ranges[-1][0], last, tag)
+        else:
+            ranges.append((first, last, tag))
+    
+    stack: List[Tuple[int, str]] = []
+    position = 0
+    for (first, last, _), names in sorted(tags.items(), key=lambda item: (item[0][0], item[0][2])):
+        while stack and stack[-1][0] < first:
+            end, tag = stack.pop()
+            emit(position, end, tag)
+            position = max(position, end + 1)
+        if stack:
+            emit(position, first - 1, stack[-1][1])
+        position = first
+        stack.append((last, ", ".join(names)))
+    while stack:
+        end, tag = stack.pop()
+        emit(position, end, tag)
+        position = max(position, end + 1)
+    return ranges
+
+
+def read_source(path: str) -> Iterable[Tuple[str, str]]:
+    """(network, tag) pairs from a ``network,tag`` CSV file; ``#`` starts a comment."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            network, _, tag = line.partition(",")
+            tag = tag.strip().strip('"')
+            try:
+                ipaddress.ip_network(network.strip(), strict=False)
+            except ValueError:
+                logger.warning(f"⚠️  {path}:{number}: skipping invalid network {network.strip()!r}")
+                continue
+            yield network, tag
+
+
+def build_database(networks: Iterable[Tuple[str, str]], path: str) -> int:
+    """
+    Write a prefix database file.
+    
+    Args:
+        networks: Pairs of CIDR (or address) and tag
+        path: Output file
+    
+    Returns:
+        Number of ranges written
+    """
+    ranges = flatten(networks)
+    tag_index: Dict[str, int] = {}
+    for _, _, tag in ranges:
+        tag_index.setdefault(tag, len(tag_index))
+    
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(ranges), len(tag_index)))
+        f.write(b"".join(
+            RANGE.pack(first.to_bytes(16, "big"), last.to_bytes(16, "big"), tag_index[tag])
+            for first, last, tag in ranges
+        ))
+        f.write("\n".join(tag_index).encode())
+    tmp.replace(out)
+    return len(ranges)
+
+
+class PrefixDatabase:
+    """Memory-mapped, read-only prefix database."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.size, tag_count = HEADER.unpack_from(self._data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a prefix database (python -m src.enrichment build)")
+            tags_start = HEADER.size + self.size * RANGE.size
+            self._tags = self._data[tags_start:].decode().split("\n") if tag_count else []
+            self._index = [
+                self._data[HEADER.size + i * RANGE.size:HEADER.size + i * RANGE.size + 16]
+                for i in range(0, self.size, INDEX_STRIDE)
+            ]
+        except Exception:
+            self.close()
+            raise
+    
+    def lookup(self, address: str) -> Optional[str]:
+        """Tag of the range containing the address, or None."""
+        key = _pack16(address)
+        if key is None:
+            return None
+        # Narrow down to one stride with the in-memory index, then search the map
+        block = bisect.bisect_right(self._index, key)
+        if block == 0:
+            return None
+        data = self._data
+        lo, hi = (block - 1) * INDEX_STRIDE, min(block * INDEX_STRIDE, self.size)
+        # Last range starting at or before the address
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RANGE.size
+            if data[offset:offset + 16] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        _, last, tag = RANGE.unpack_from(data, HEADER.size + (lo - 1) * RANGE.size)
+        return self._tags[tag] if key <= last else None
+    
+    def close(self):
+        if getattr(self, "_data", None) is not None:
+            self._data.close()
+            self._data = None
+        self._file.close()
+
+
+class IPEnricher:
+    """Tags of remote addresses from config zones and prefix databases."""
+    
+    def __init__(self, zones: Optional[Dict[str, List[str]]] = None,
+                 databases: Optional[Dict[str, PrefixDatabase]] = None, cache_size: int = 4096):
+        """
+        Args:
+            zones: Zone name -> networks, e.g. {"internal": ["10.0.0.0/8"]}
+            databases: Tag prefix -> database, e.g. {"asn": PrefixDatabase(...)}
+            cache_size: Addresses kept in the LRU cache
+        """
+        self._zones = PrefixTrie()
+        for zone, networks in (zones or {}).items():
+            for network in ([networks] if isinstance(networks, str) else networks):
+                self._zones.insert(network, zone)
+        self.databases = databases or {}
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "IPEnricher":
+        settings = config.get("enrichment", {})
+        databases = {}
+        for entry in settings.get("databases", []):
+            try:
+                databases[entry["name"]] = PrefixDatabase(entry["path"])
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️  Enrichment database {entry['name']} not loaded: {e}")
+        return cls(
+            zones=settings.get("zones", {}),
+            databases=databases,
+            cache_size=settings.get("cache_size", 4096)
+        )
+    
+    def tags(self, address: str) -> Tuple[str, ...]:
+        """Tags of an address, e.g. ("zone:internal",) or ("asn:AS64500 Example",)."""
+        cache = self._cache
+        tags = cache.get(address)
+        if tags is not None:
+            cache.move_to_end(address)
+            metrics.incr("enrichment_cache_hits")
+            return tags
+        
+        metrics.incr("enrichment_cache_misses")
+        tags = self._lookup(address)
+        cache[address] = tags
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return tags
+    
+    def _lookup(self, address: str) -> Tuple[str, ...]:
+        zone = self._zones.lookup(address)
+        tags = [f"zone:{zone}"] if zone else []
+        for name, database in self.databases.items():
+            tag = database.lookup(address)
+            if tag:
+                tags.append(f"{name}:{tag}")
+        if not tags:
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                return ()
+            if ip.is_loopback:
+                tags.append("loopback")
+            elif ip.is_private or ip.is_link_local:
+                tags.append("private")
+        return tuple(tags)
+    
+    def annotate(self, text: str) -> str:
+        """Append the tags to the first mention of each address in the text."""
+        seen = set()
+        
+        def replace(match: re.Match) -> str:
+            address = match.group(0)
+            if address in seen:
+                return address
+            seen.add(address)
+            tags = self.tags(address)
+            return f"{address} [{', '.join(tags)}]" if tags else address
+        
+        with metrics.timer("enrichment_seconds"):
+            return ADDRESS_RE.sub(replace, text)
+    
+    def close(self):
+        for database in self.databases.values():
+            database.close()
+
+
+def main():
+    """Build a prefix database from a CSV file."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build and query IP enrichment databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build a database from network,tag lines")
+    build.add_argument("source")
+    build.add_argument("output")
+    lookup = commands.add_parser("lookup", help="Look up addresses in a database")
+    lookup.add_argument("database")
+    lookup.add_argument("addresses", nargs="+")
+    args = parser.parse_args()
+    
+    if args.command == "build":
+        count = build_database(read_source(args.source), args.output)
+        print(f"Wrote {count} ranges to {args.output}")
+        return
+    
+    database = PrefixDatabase(args.database)
+    for address in args.addresses:
+        print(f"{address}\t{database.lookup(address) or '-'}")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
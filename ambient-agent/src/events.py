@@ -0,0 +1,116 @@
+"""Parsing of network event history into structured events.
+
+``get_network_events_history`` returns one event per line. Lines can be
+JSON objects or free text with ``key=value`` pairs, optionally preceded
+by a timestamp::
+
+    2025-10-22 10:01:02 TCP CONNECT pid=1001 comm=curl saddr=10.0.0.5 sport=40001 daddr=203.0.113.1 dport=443
+
+Lines without a process or destination are skipped.
+"""
+
+import json
+import re
+from datetime import datetime
+from typing import Iterator, List, NamedTuple
+
+_PAIR = re.compile(r"(\w+)=(\"[^\"]*\"|\S+)")
+_TIMESTAMP = re.compile(r"^\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?)")
+_PROTOCOLS = ("TCP", "UDP", "ICMP")
+
+# Alternative field names used by different event sources
+_ALIASES = {
+    "process": "comm", "command": "comm", "cmd": "comm",
+    "src": "saddr", "src_ip": "saddr", "source": "saddr",
+    "dst": "daddr", "dst_ip": "daddr", "dest": "daddr", "destination": "daddr",
+    "src_port": "sport", "dst_port": "dport", "port": "dport",
+    "proto": "protocol", "type": "event_type", "event": "event_type",
+    "time": "timestamp", "ts": "timestamp",
+}
+
+
+class NetworkEvent(NamedTuple):
+    """A single network event."""
+    
+    timestamp: float
+    pid: int
+    comm: str
+    protocol: str
+    saddr: str
+    sport: int
+    daddr: str
+    dport: int
+    event_type: str
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace(" ", "T")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _parse_line(line: str) -> dict:
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return {}
+    
+    fields = {key: value.strip('"') for key, value in _PAIR.findall(line)}
+    timestamp = _TIMESTAMP.match(line)
+    if timestamp and "timestamp" not in fields:
+        fields["timestamp"] = timestamp.group(1)
+    
+    words = line.upper().split()
+    if "protocol" not in fields:
+        fields["protocol"] = next((p for p in _PROTOCOLS if p in words), "")
+    if "event_type" not in fields:
+        fields["event_type"] = next((w for w in ("CONNECT", "ACCEPT", "CLOSE", "SEND", "RECV") if w in words), "")
+    return fields
+
+
+def iter_events(text: str) -> Iterator[NetworkEvent]:
+    """
+    Parse network event history lazily.
+    
+    Args:
+        text: Output of get_network_events_history
+    
+    Yields:
+        NetworkEvent for each line with a process or destination
+    """
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or "=" not in line and not line.startswith("{"):
+            continue
+        
+        fields = {_ALIASES.get(key, key): value for key, value in _parse_line(line).items()}
+        if not fields.get("daddr") and not fields.get("comm"):
+            continue
+        
+        yield NetworkEvent(
+            timestamp=_to_timestamp(fields.get("timestamp", 0)),
+            pid=_to_int(fields.get("pid")),
+            comm=str(fields.get("comm", "")),
+            protocol=str(fields.get("protocol", "")).upper(),
+            saddr=str(fields.get("saddr", "")),
+            sport=_to_int(fields.get("sport")),
+            daddr=str(fields.get("daddr", "")),
+            dport=_to_int(fields.get("dport")),
+            event_type=str(fields.get("event_type", "")).upper(),
+        )
+
+
+def parse_events(text: str) -> List[NetworkEvent]:
+    """Parse network event history into a list of events."""
+    return list(iter_events(text))
@@ -1,19 +1,25 @@
 """LLM client configuration for LlamaStack."""
 
 import os
+import time
 import logging
+from langchain_core.messages import AIMessage, BaseMessage, message_chunk_to_message
 from langchain_openai import ChatOpenAI
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 
-def get_llm(config: Dict[str, Any]) -> ChatOpenAI:
+def get_llm(config: Dict[str, Any], apply_env: bool = True) -> ChatOpenAI:
     """
     Initialize LLM client for LlamaStack.
     
     Args:
         config: LLM configuration from config.yaml
+        apply_env: Whether LLAMASTACK_* environment variables override the
+            config (disabled for router tiers that name their own model)
     
     Returns:
         Configured ChatOpenAI instance pointing to LlamaStack
@@ -23,11 +29,13 @@ def get_llm(config: Dict[str, Any]) -> ChatOpenAI:
     api_key = config.get("api_key", "not-needed")
     temperature = config.get("temperature", 0.1)
     max_tokens = config.get("max_tokens", 2000)
+    timeout = config.get("timeout", 60.0)
     
     # Allow override from environment
-    base_url = os.getenv("LLAMASTACK_BASE_URL", base_url)
-    api_key = os.getenv("LLAMASTACK_API_KEY", api_key)
-    model = os.getenv("LLAMASTACK_MODEL", model)
+    if apply_env:
+        base_url = os.getenv("LLAMASTACK_BASE_URL", base_url)
+        api_key = os.getenv("LLAMASTACK_API_KEY", api_key)
+        model = os.getenv("LLAMASTACK_MODEL", model)
     
     logger.info(f"Initializing LLM client: {model} at {base_url}")
     
@@ -37,8 +45,60 @@ def get_llm(config: Dict[str, Any]) -> ChatOpenAI:
         api_key=api_key,
         temperature=temperature,
         max_tokens=max_tokens,
-        timeout=60.0,  # 60 second timeout
+        timeout=timeout,
+        streaming=config.get("streaming", True),
+        stream_usage=True,
     )
     
     return llm
 
+
+async def astream_llm(
+    llm: ChatOpenAI,
+    messages: List[BaseMessage],
+    on_line: Optional[Callable[[str], Awaitable[None]]] = None,
+    task: str = "default",
+) -> AIMessage:
+    """
+    Stream a completion and assemble the final message.
+    
+    Time-to-first-token and total latency are recorded as
+    ``llm_ttft_seconds`` and ``llm_latency_seconds`` metrics.
+    
+    Args:
+        llm: Chat model to call
+        messages: Prompt messages
+        on_line: Optional coroutine called with each complete line of output
+            as soon as it arrives (e.g. to react to a severity line early)
+        task: Task label for the metrics (e.g. 'anomaly_analysis')
+    
+    Returns:
+        The complete AIMessage, equivalent to what ``ainvoke`` would return
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    aggregate = None
+    pending = ""
+    
+    async for chunk in llm.astream(messages):
+        if first_token_at is None and chunk.content:
+            first_token_at = time.perf_counter()
+            metrics.observe("llm_ttft_seconds", first_token_at - start, task=task)
+        
+        aggregate = chunk if aggregate is None else aggregate + chunk
+        
+        if on_line and isinstance(chunk.content, str):
+            pending += chunk.content
+            while "\n" in pending:
+                line, pending = pending.split("\n", 1)
+                await on_line(line)
+    
+    if on_line and pending:
+        await on_line(pending)
+    
+    metrics.observe("llm_latency_seconds", time.perf_counter() - start, task=task)
+    
+    if aggregate is None:
+        return AIMessage(content="")
+    return message_chunk_to_message(aggregate)
+
@@ -0,0 +1,381 @@
+"""Priority-ordered LLM dispatch shared by all monitored targets.
+
+Every LLM call from the graph nodes goes through one LLMDispatcher, which
+sits in front of the ModelRouter:
+
+- Requests wait in a priority queue ordered by severity, so a CRITICAL on
+  one host is never stuck behind baseline chatter from another.
+- A global concurrency limit and tokens-per-minute budget protect the
+  shared LlamaStack endpoint.
+- Low-severity requests for the same task from several hosts are batched
+  into one prompt, and the response is split back per host.
+
+Queue wait time is recorded as the ``llm_queue_wait_seconds`` metric.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from .config import get_prompt, get_targets
+from .llm_router import ModelRouter
+from .metrics import metrics
+from .severity import severity_rank
+
+logger = logging.getLogger(__name__)
+
+# Characters per token, used to estimate prompt size before the call
+CHARS_PER_TOKEN = 4
+
+_HOST_SECTION = re.compile(r"^#+\s*HOST:\s*(\S+)\s*$", re.MULTILINE)
+
+
+@dataclass
+class LLMRequest:
+    """A queued LLM call, or a batch of calls from several hosts."""
+    
+    task: str
+    messages: List[BaseMessage]
+    severity: Optional[str] = None
+    host: str = ""
+    on_line: Optional[Callable[[str], Awaitable[None]]] = None
+    template_vars: Optional[Dict[str, Any]] = None
+    future: Optional[asyncio.Future] = None
+    enqueued_at: float = 0.0
+    batch: List["LLMRequest"] = field(default_factory=list)
+    
+    @property
+    def priority(self) -> int:
+        # PriorityQueue pops the smallest item first
+        return -severity_rank(self.severity)
+
+
+class TokenRateLimiter:
+    """
+    Token bucket enforcing a tokens-per-minute budget.
+    
+    Waiters are served by priority, then in arrival order; no lock is held
+    while waiting, so a low-priority request waiting for budget doesn't
+    hold back a higher-priority one that arrives later.
+    """
+    
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._changed = asyncio.Condition()
+        self._waiters: List[tuple] = []
+        self._order = itertools.count()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, tokens: int, priority: int = 0):
+        """
+        Wait until the budget allows spending ``tokens``.
+        
+        Args:
+            tokens: Tokens to spend
+            priority: Smaller goes first (``LLMRequest.priority``)
+        """
+        tokens = min(float(tokens), self.capacity)
+        entry = (priority, next(self._order))
+        async with self._changed:
+            heapq.heappush(self._waiters, entry)
+            # A new first waiter re-evaluates instead of the one it overtook
+            self._changed.notify_all()
+            try:
+                while True:
+                    self._refill()
+                    timeout = None
+                    if self._waiters[0] == entry:
+                        if self.tokens >= tokens:
+                            self.tokens -= tokens
+                            return
+                        timeout = (tokens - self.tokens) / self.rate
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._changed.notify_all()
+    
+    def refund(self, tokens: int):
+        """Return over-estimated tokens to the budget."""
+        if tokens > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+class LLMDispatcher:
+    """Priority queue, rate limiting and batching in front of the router."""
+    
+    def __init__(self, router: ModelRouter, config: Dict[str, Any]):
+        """
+        Args:
+            router: Model router that performs the actual calls
+            config: Full configuration dictionary (reads ``llm_dispatch``)
+        """
+        dispatch_config = config.get("llm_dispatch") or {}
+        batch_config = dispatch_config.get("batching") or {}
+        
+        self.router = router
+        self.config = config
+        self.max_concurrency = dispatch_config.get("max_concurrency", 4)
+        self.tokens_per_minute = dispatch_config.get("tokens_per_minute", 0)
+        
+        # Batching only pays off when several hosts share the endpoint
+        self.batching_enabled = batch_config.get("enabled", False) and len(get_targets(config)) > 1
+        self.batch_window = batch_config.get("window_seconds", 2.0)
+        self.batch_max = batch_config.get("max_batch", 8)
+        self.batch_severities = [s.upper() for s in batch_config.get("severities", ["LOW", "MEDIUM"])]
+        self.batch_tasks = batch_config.get("tasks", ["anomaly_analysis"])
+        
+        self._loop = None
+        self._seq = itertools.count()
+    
+    def _ensure_started(self):
+        """Create the queue and workers on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        
+        self._loop = loop
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._limiter = TokenRateLimiter(self.tokens_per_minute) if self.tokens_per_minute else None
+        self._pending_batches: Dict[str, List[LLMRequest]] = {}
+        self._batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._workers = [
+            loop.create_task(self._worker(), name=f"llm-dispatch-{i}")
+            for i in range(self.max_concurrency)
+        ]
+    
+    async def close(self):
+        """Stop the workers of the current event loop."""
+        if self._loop is None:
+            return
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._loop = None
+    
+    async def submit(
+        self,
+        task: str,
+        messages: List[BaseMessage],
+        severity: Optional[str] = None,
+        host: str = "",
+        on_line: Optional[Callable[[str], Awaitable[None]]] = None,
+        template_vars: Optional[Dict[str, Any]] = None,
+    ) -> AIMessage:
+        """
+        Queue an LLM call and wait for its response.
+        
+        Args:
+            task: Task name (e.g. 'anomaly_analysis')
+            messages: Prompt messages
+            severity: Severity, used for routing and queue priority
+            host: Target host the request is about (used for batching)
+            on_line: Optional coroutine called with each line of output
+            template_vars: Variables for template tiers
+        
+        Returns:
+            The response message for this request
+        """
+        # Templates cost nothing, so they bypass the queue
+        if self.router.route(task, severity).kind == "template":
+            return await self.router.ainvoke(task, messages, severity, on_line, template_vars)
+        
+        self._ensure_started()
+        request = LLMRequest(
+            task=task,
+            messages=messages,
+            severity=(severity or "LOW").upper(),
+            host=host,
+            on_line=on_line,
+            template_vars=template_vars,
+            future=self._loop.create_future(),
+            enqueued_at=time.perf_counter(),
+        )
+        
+        if self._is_batchable(request):
+            self._add_to_batch(request)
+        else:
+            self._enqueue(request)
+        
+        return await request.future
+    
+    def _is_batchable(self, request: LLMRequest) -> bool:
+        return (
+            self.batching_enabled
+            and bool(request.host)
+            and request.task in self.batch_tasks
+            and request.severity in self.batch_severities
+            and f"{request.task}_batch" in self.config.get("prompts", {})
+            # Template tiers make no LLM call to share
+            and self.router.route(request.task, request.severity).kind != "template"
+        )
+    
+    def _enqueue(self, request: LLMRequest):
+        self._queue.put_nowait((request.priority, next(self._seq), request))
+    
+    def _add_to_batch(self, request: LLMRequest):
+        pending = self._pending_batches.setdefault(request.task, [])
+        # One entry per host per batch; a second request from the same host
+        # goes into the next batch
+        if any(r.host == request.host for r in pending):
+            self._flush_batch(request.task)
+            pending = self._pending_batches.setdefault(request.task, [])
+        
+        pending.append(request)
+        if len(pending) >= self.batch_max:
+            self._flush_batch(request.task)
+        elif request.task not in self._batch_timers:
+            self._batch_timers[request.task] = self._loop.call_later(
+                self.batch_window, self._flush_batch, request.task
+            )
+    
+    def _flush_batch(self, task: str):
+        timer = self._batch_timers.pop(task, None)
+        if timer:
+            timer.cancel()
+        pending = self._pending_batches.pop(task, [])
+        if not pending:
+            return
+        
+        if len(pending) == 1:
+            self._enqueue(pending[0])
+            return
+        
+        severity = max((r.severity for r in pending), key=severity_rank)
+        self._enqueue(LLMRequest(
+            task=task,
+            messages=[],
+            severity=severity,
+            enqueued_at=min(r.enqueued_at for r in pending),
+            batch=pending,
+        ))
+    
+    async def _worker(self):
+        while True:
+            _, _, request = await self._queue.get()
+            try:
+                if request.batch:
+                    await self._run_batch(request)
+                else:
+                    await self._run_single(request)
+            except Exception as e:
+                logger.error(f"❌ LLM dispatch worker error: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+    
+    def _record_wait(self, request: LLMRequest):
+        waits = request.batch or [request]
+        now = time.perf_counter()
+        for r in waits:
+            metrics.observe("llm_queue_wait_seconds", now - r.enqueued_at, severity=r.severity)
+    
+    async def _acquire_tokens(self, request: LLMRequest, messages: List[BaseMessage]) -> int:
+        if not self._limiter:
+            return 0
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        estimate = prompt_chars // CHARS_PER_TOKEN + self.router.route(request.task, request.severity).max_tokens
+        await self._limiter.acquire(estimate, request.priority)
+        return estimate
+    
+    def _settle_tokens(self, estimate: int, response: Optional[AIMessage]):
+        if not self._limiter or response is None:
+            return
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self._limiter.refund(estimate - usage["total_tokens"])
+    
+    async def _run_single(self, request: LLMRequest):
+        estimate = await self._acquire_tokens(request, request.messages)
+        self._record_wait(request)
+        response = None
+        try:
+            response = await self.router.ainvoke(
+                request.task, request.messages, request.severity, request.on_line, request.template_vars
+            )
+            if not request.future.done():
+                request.future.set_result(response)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        finally:
+            self._settle_tokens(estimate, response)
+    
+    async def _run_batch(self, batch: LLMRequest):
+        requests = batch.batch
+        batch_text = "\n\n".join(
+            f"### HOST: {r.host}\n{r.messages[-1].content}" for r in requests
+        )
+        system_prompt_text, user_prompt_text = get_prompt(
+            self.config, f"{batch.task}_batch", batch_text=batch_text
+        )
+        messages = [SystemMessage(content=system_prompt_text), HumanMessage(content=user_prompt_text)]
+        
+        estimate = await self._acquire_tokens(batch, messages)
+        self._record_wait(batch)
+        metrics.incr("llm_batches", task=batch.task)
+        metrics.incr("llm_batched_requests", len(requests), task=batch.task)
+        logger.info(f"📦 Batched {len(requests)} {batch.task} requests: {[r.host for r in requests]}")
+        
+        response = None
+        try:
+            # Per-host variables, in case the batch falls back to a template tier
+            template_vars = [(r.host, r.template_vars or {}) for r in requests]
+            response = await self.router.ainvoke(batch.task, messages, batch.severity, template_vars=template_vars)
+        except Exception as e:
+            for r in requests:
+                if not r.future.done():
+                    r.future.set_exception(e)
+            return
+        finally:
+            self._settle_tokens(estimate, response)
+        
+        sections = split_host_sections(response.content)
+        for r in requests:
+            section = sections.get(r.host)
+            if section is None:
+                # The model skipped this host; ask again on its own
+                logger.warning(f"⚠️  Batched response had no section for {r.host}, re-dispatching")
+                metrics.incr("llm_batch_misses", task=batch.task)
+                self._enqueue(r)
+                continue
+            if r.on_line:
+                for line in section.split("\n"):
+                    await r.on_line(line)
+            if not r.future.done():
+                r.future.set_result(AIMessage(content=section))
+
+
+def split_host_sections(text: str) -> Dict[str, str]:
+    """
+    Split a batched response into per-host sections.
+    
+    Args:
+        text: LLM response with ``### HOST: <host>`` headers
+    
+    Returns:
+        Mapping of host to the text of its section
+    """
+    sections = {}
+    matches = list(_HOST_SECTION.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[match.group(1)] = text[match.end():end].strip()
+    return sections
@@ -0,0 +1,254 @@
+"""Severity-tiered model routing for LLM calls.
+
+Each LLM call is made for a task (``anomaly_analysis``, ``report_generation``,
+``baseline_learning``, ...) at a severity. The ``llm_router`` section of
+config.yaml maps task and severity to a tier; a tier is either an LLM
+endpoint/model with its own ``max_tokens`` and timeout budget, or a
+deterministic template that replaces the LLM entirely.
+
+Without an ``llm_router`` section every call goes to a single tier built
+from the ``llm`` section, which is the original behaviour.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from .llm_client import get_llm, astream_llm
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIER = "default"
+
+
+@dataclass
+class Tier:
+    """A routing target: an LLM client with budgets, or a template."""
+    
+    name: str
+    kind: str = "llm"  # "llm" or "template"
+    llm: Any = None
+    model: str = ""
+    max_tokens: int = 0
+    timeout: float = 60.0
+    fallback: Optional[str] = None
+    templates: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Route:
+    """Maps a task and set of severities to a tier (empty means any)."""
+    
+    tier: str
+    tasks: List[str] = field(default_factory=list)
+    severities: List[str] = field(default_factory=list)
+    
+    def matches(self, task: str, severity: str) -> bool:
+        if self.tasks and task not in self.tasks:
+            return False
+        if self.severities and severity not in self.severities:
+            return False
+        return True
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class ModelRouter:
+    """Routes LLM calls to tiers by task and severity."""
+    
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Build the tiers and routes from config.
+        
+        Args:
+            config: Full configuration dictionary
+        """
+        base_llm_config = config["llm"]
+        router_config = config.get("llm_router") or {}
+        
+        self.tiers: Dict[str, Tier] = {}
+        self.routes: List[Route] = []
+        self.recorder = None  # TraceRecorder for record/replay
+        
+        if not router_config.get("enabled", bool(router_config)):
+            self.tiers[DEFAULT_TIER] = self._build_llm_tier(DEFAULT_TIER, base_llm_config, {})
+            self.default_tier = DEFAULT_TIER
+            return
+        
+        templates = router_config.get("templates", {})
+        for name, tier_config in router_config.get("tiers", {}).items():
+            tier_config = tier_config or {}
+            if tier_config.get("type") == "template":
+                self.tiers[name] = Tier(name=name, kind="template", timeout=0, templates=templates)
+            else:
+                self.tiers[name] = self._build_llm_tier(name, base_llm_config, tier_config)
+        
+        for route_config in router_config.get("routes", []):
+            tier = route_config["tier"]
+            if tier not in self.tiers:
+                raise ValueError(f"Route refers to unknown tier '{tier}'")
+            self.routes.append(Route(
+                tier=tier,
+                tasks=_as_list(route_config.get("task")),
+                severities=[s.upper() for s in _as_list(route_config.get("severity"))],
+            ))
+        
+        self.default_tier = router_config.get("default_tier") or next(iter(self.tiers))
+        if self.default_tier not in self.tiers:
+            raise ValueError(f"Unknown default tier '{self.default_tier}'")
+        
+        for tier in self.tiers.values():
+            if tier.fallback and tier.fallback not in self.tiers:
+                raise ValueError(f"Tier '{tier.name}' falls back to unknown tier '{tier.fallback}'")
+        
+        logger.info(f"LLM router: tiers={list(self.tiers)} routes={len(self.routes)} default={self.default_tier}")
+    
+    @staticmethod
+    def _build_llm_tier(name: str, base_config: Dict[str, Any], tier_config: Dict[str, Any]) -> Tier:
+        llm_config = {**base_config, **tier_config}
+        # A tier that names its own endpoint or model must not be overridden
+        # by the global LLAMASTACK_* environment variables
+        apply_env = not ({"base_url", "model"} & tier_config.keys())
+        return Tier(
+            name=name,
+            llm=get_llm(llm_config, apply_env=apply_env),
+            model=llm_config.get("model", ""),
+            max_tokens=llm_config.get("max_tokens", 2000),
+            timeout=llm_config.get("timeout", 60.0),
+            fallback=tier_config.get("fallback"),
+        )
+    
+    def route(self, task: str, severity: Optional[str] = None) -> Tier:
+        """
+        Pick the tier for a task and severity (first matching route wins).
+        
+        Args:
+            task: Task name, matching a prompt name in config
+            severity: Severity of the input; None is treated as LOW
+        
+        Returns:
+            The selected tier
+        """
+        severity = (severity or "LOW").upper()
+        for route in self.routes:
+            if route.matches(task, severity):
+                return self.tiers[route.tier]
+        return self.tiers[self.default_tier]
+    
+    async def ainvoke(
+        self,
+        task: str,
+        messages: List[BaseMessage],
+        severity: Optional[str] = None,
+        on_line: Optional[Callable[[str], Awaitable[None]]] = None,
+        template_vars: Optional[Union[Dict[str, Any], List[Tuple[str, Dict[str, Any]]]]] = None,
+    ) -> AIMessage:
+        """
+        Run an LLM call (or template) for a task on the routed tier.
+        
+        Args:
+            task: Task name (e.g. 'anomaly_analysis')
+            messages: Prompt messages
+            severity: Severity used for routing
+            on_line: Optional coroutine called with each line of output
+            template_vars: Variables for template tiers (the prompt variables), or
+                (host, variables) pairs of a cross-host batch, rendered as one
+                ``### HOST: <host>`` section each
+        
+        Returns:
+            The response message
+        """
+        tier = self.route(task, severity)
+        try:
+            return await self._invoke_tier(tier, task, messages, on_line, template_vars)
+        except Exception as e:
+            if not tier.fallback:
+                raise
+            logger.warning(f"⚠️  Tier '{tier.name}' failed for {task} ({e}), falling back to '{tier.fallback}'")
+            metrics.incr("llm_tier_fallbacks", tier=tier.name)
+            return await self._invoke_tier(self.tiers[tier.fallback], task, messages, on_line, template_vars)
+    
+    async def _invoke_tier(self, tier, task, messages, on_line, template_vars) -> AIMessage:
+        start = time.perf_counter()
+        metrics.incr("llm_calls", tier=tier.name, task=task)
+        
+        if tier.kind == "template":
+            response = self._render_template(tier, task, template_vars or {})
+            if on_line:
+                for line in response.content.split("\n"):
+                    await on_line(line)
+        else:
+            try:
+                response = await asyncio.wait_for(
+                    astream_llm(tier.llm, messages, on_line=on_line, task=task),
+                    timeout=tier.timeout,
+                )
+            except asyncio.TimeoutError:
+                metrics.incr("llm_budget_exceeded", tier=tier.name, budget="timeout")
+                raise TimeoutError(f"Tier '{tier.name}' exceeded its {tier.timeout}s latency budget")
+            
+            if self.recorder:
+                self.recorder.record_llm(task, messages, response, time.perf_counter() - start)
+            
+            usage = getattr(response, "usage_metadata", None) or {}
+            metrics.incr("llm_input_tokens", usage.get("input_tokens", 0), tier=tier.name)
+            metrics.incr("llm_output_tokens", usage.get("output_tokens", 0), tier=tier.name)
+            if usage.get("output_tokens", 0) >= tier.max_tokens:
+                metrics.incr("llm_budget_exceeded", tier=tier.name, budget="max_tokens")
+        
+        metrics.observe("llm_tier_latency_seconds", time.perf_counter() - start, tier=tier.name)
+        return response
+    
+    @staticmethod
+    def _render_template(tier: Tier, task: str, template_vars) -> AIMessage:
+        template = tier.templates.get(task)
+        if template is None:
+            raise ValueError(f"No template configured for task '{task}' in tier '{tier.name}'")
+        if isinstance(template_vars, list):
+            # A batch of requests from several hosts: one section per host, as the batch prompt asks
+            return AIMessage(content="\n\n".join(
+                f"### HOST: {host}\n{template.strip().format(**variables)}" for host, variables in template_vars
+            ))
+        return AIMessage(content=template.strip().format(**template_vars))
+    
+    def usage_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize per-tier usage and latency.
+        
+        Returns:
+            Mapping of tier name to calls, tokens and latency statistics
+        """
+        snapshot = metrics.snapshot()
+        report = {}
+        for name in self.tiers:
+            latency = snapshot["timings"].get(f"llm_tier_latency_seconds{{tier={name}}}", {})
+            report[name] = {
+                "calls": metrics.total("llm_calls", tier=name),
+                "input_tokens": metrics.counter("llm_input_tokens", tier=name),
+                "output_tokens": metrics.counter("llm_output_tokens", tier=name),
+                "latency_mean": latency.get("mean", 0.0),
+                "latency_p95": latency.get("p95", 0.0),
+            }
+        return report
+    
+    def log_usage(self):
+        """Write the per-tier usage report to the log."""
+        for name, usage in self.usage_report().items():
+            if not usage["calls"]:
+                continue
+            logger.info(
+                f"  tier {name}: calls={usage['calls']:g} "
+                f"tokens={usage['input_tokens']:g} in/{usage['output_tokens']:g} out "
+                f"latency mean={usage['latency_mean']:.2f}s p95={usage['latency_p95']:.2f}s"
+            )
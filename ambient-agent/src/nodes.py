@@ -1,23 +1,86 @@
 """LangGraph nodes for the ambient agent."""
 
 import logging
-from datetime import datetime
+import os
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from .state import NetworkSecurityState
-from .llm_client import get_llm
+from .llm_router import ModelRouter
+from .llm_dispatch import LLMDispatcher
 from .config import load_config, get_prompt
 from .mcp_tools import load_mcp_tools, get_mcp_tool_by_name
+from .severity import highest_severity, is_at_least, parse_severity_line
+from .webhook import record_event_to_alert
+from .offload import CPUExecutor, prepare_events
+from .archive import RECORD, EventArchive
+from .compression import SUFFIX as COMPRESSED_SUFFIX, CompressedLog
+from .rollups import RollupEngine
+from .allowlist import AllowlistRegistry, parse_whitelist
+from .enrichment import IPEnricher
+from .sketches import TrafficSketches
+from .stats_diff import StatsDelta, parse_stats, diff_stats, merge_into_profile, summarize_profile
+from .metrics import metrics
+from .clock import clock
+from .replay import TraceRecorder
+from .profiling import CycleProfiler
 
 logger = logging.getLogger(__name__)
 
 # Load config and initialize clients
 config = load_config()
-llm = get_llm(config["llm"])
+router = ModelRouter(config)
+dispatcher = LLMDispatcher(router, config)
 
 # Global tools cache (loaded once)
 _tools_cache = None
 
+# Per-target baseline and last parsed stats, kept across cycles
+_baselines: dict[str, dict] = {}
+_previous_stats: dict[str, dict] = {}
+
+# Record MCP and LLM traffic for offline replay (python -m src.replay)
+recorder: TraceRecorder | None = None
+if config.get("recording", {}).get("enabled", False):
+    recorder = TraceRecorder(config["recording"].get("path", "./data/traces/trace.jsonl.gz"))
+    router.recorder = recorder
+
+# Per-node profiling of sampled cycles (python -m src --once --profile)
+profiler = CycleProfiler.from_config(config)
+
+# Known-good traffic dropped before detection and the LLM (None if disabled)
+allowlists: AllowlistRegistry | None = None
+if config.get("allowlist", {}).get("enabled", True):
+    allowlists = AllowlistRegistry.from_config(config)
+
+# Zone, ASN and known-bad tags of addresses in the anomaly text (None if disabled)
+enricher: IPEnricher | None = None
+if config.get("enrichment", {}).get("enabled", True):
+    enricher = IPEnricher.from_config(config)
+
+# Compressed alert logs by path (alerts.compress)
+_alert_logs: dict[str, CompressedLog] = {}
+
+# Per-target traffic sketches, kept across cycles
+_sketches: dict[str, TrafficSketches] = {}
+
+# Thread or process pool for parsing and aggregating large events texts
+executor = CPUExecutor.from_config(config)
+
+# 1/10/60-minute rollups of fetched events per target (None if disabled)
+rollups: RollupEngine | None = None
+if config.get("rollups", {}).get("enabled", True):
+    rollups = RollupEngine.from_config(config)
+
+# Local event archive (None if disabled)
+archive: EventArchive | None = None
+if config.get("archive", {}).get("enabled", False):
+    archive = EventArchive(
+        config["archive"].get("path", "./data/archive"),
+        retention_hours=config["archive"].get("retention_hours", 48),
+        compact_after_hours=config["archive"].get("compact_after_hours", 2)
+    )
+
+
 async def get_tools():
     """Get or load MCP tools."""
     global _tools_cache
@@ -27,9 +90,30 @@ async def get_tools():
             target_host=config["target"]["host"],
             target_username=config["target"]["username"]
         )
+        if recorder:
+            _tools_cache = recorder.wrap_tools(_tools_cache)
     return _tools_cache
 
 
+def get_sketches(host: str) -> TrafficSketches:
+    """Get the traffic sketches of a target, kept across cycles."""
+    if host not in _sketches:
+        sketch_config = config.get("sketches", {})
+        _sketches[host] = TrafficSketches(
+            port_scan_threshold=config["thresholds"]["port_scan_threshold"],
+            high_connection_rate=config["thresholds"]["high_connection_rate"],
+            max_sources=sketch_config.get("max_sources", 1024),
+            source_precision=sketch_config.get("source_precision", 8),
+            half_life=sketch_config.get("half_life_seconds", 3600)
+        )
+    return _sketches[host]
+
+
+def get_target(state: NetworkSecurityState) -> dict:
+    """Get the target of this cycle, defaulting to the configured target."""
+    return state.get("target") or config["target"]
+
+
 async def monitor_events(state: NetworkSecurityState) -> NetworkSecurityState:
     """
     Fetch latest network events and stats from MCP using proper tool calling.
@@ -45,38 +129,83 @@ async def monitor_events(state: NetworkSecurityState) -> NetworkSecurityState:
         stats_tool = await get_mcp_tool_by_name(tools, "get_network_event_stats")
         
         # Call tools with proper parameters
+        target = get_target(state)
+        window = config["agent"]["analysis_window"]
         events_result = await events_tool.ainvoke({
-            "minutes": config["agent"]["analysis_window"],
-            "host": config["target"]["host"],
-            "username": config["target"]["username"]
-        })
-        
-        stats_result = await stats_tool.ainvoke({
-            "minutes": config["agent"]["analysis_window"],
-            "host": config["target"]["host"],
-            "username": config["target"]["username"]
+            "minutes": window,
+            "host": target["host"],
+            "username": target["username"]
         })
         
         # Results are already strings from MCP tools
         events_text = str(events_result)
-        stats_text = str(stats_result)
+        
+        # Parse, encode and aggregate off the event loop
+        with metrics.timer("event_prepare_seconds"):
+            prepared = await executor.run_on_text(prepare_events, events_text)
+        
+        # Stats of the window come from the rollups once they cover it, and only
+        # if every event line of this fetch was parsed
+        stats_text = None
+        if rollups and not events_text.lstrip().startswith("Error"):
+            parsed = len(prepared.records) // RECORD.size
+            complete = parsed > 0 and parsed == prepared.lines
+            rollups.add_records(target["host"], prepared.records, clock.time() - window * 60, now=clock.time(),
+                                complete=complete)
+            if complete:
+                stats_text = rollups.summarize(target["host"], window, now=clock.time())
+        if stats_text is None:
+            stats_text = str(await stats_tool.ainvoke({
+                "minutes": window,
+                "host": target["host"],
+                "username": target["username"]
+            }))
+        else:
+            metrics.incr("rollup_stats_served")
         
         logger.info(f" Fetched network data: {len(events_text)} chars (events), {len(stats_text)} chars (stats)")
         
+        # Drop known-good traffic before detection
+        flows = prepared.flows
+        if allowlists:
+            flows = allowlists.get(target["host"]).filter_flows(flows)
+            dropped = sum(prepared.flows.values()) - sum(flows.values())
+            if dropped:
+                logger.info(f"✅ Allowlist dropped {dropped} of {prepared.count} events")
+        
+        # Local port-scan and connection-rate detection on bounded-memory sketches
+        local_findings = []
+        if config.get("sketches", {}).get("enabled", True):
+            with metrics.timer("sketch_update_seconds"):
+                local_findings = get_sketches(target["host"]).observe_flows(flows, now=clock.time())
+            metrics.incr("sketch_events", prepared.count)
+            if local_findings:
+                logger.info(f"📐 Sketches flagged {len(local_findings)} findings in {prepared.count} events")
+        
+        # Keep the events for local history queries
+        if archive:
+            try:
+                written = archive.append_records(target["host"], prepared.records)
+                archive.maintain(target["host"], now=clock.time())
+                logger.info(f"🗄️  Archived {written} new events")
+            except OSError as e:
+                logger.error(f"❌ Failed to archive events: {e}")
+        
         return {
             **state,
             "current_events": events_text,
             "current_stats": stats_text,
-            "last_run": datetime.now().isoformat()
+            "local_findings": local_findings,
+            "last_run": clock.now().isoformat()
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Failed to fetch events: {e}")
         return {
             **state,
             "current_events": f"Error: {str(e)}",
             "current_stats": "",
-            "last_run": datetime.now().isoformat()
+            "last_run": clock.now().isoformat()
         }
 
 
@@ -92,13 +221,16 @@ async def analyze_anomalies(state: NetworkSecurityState) -> NetworkSecurityState
         anomaly_tool = await get_mcp_tool_by_name(tools, "detect_network_anomalies")
         
         # Call tool
+        target = get_target(state)
         result = await anomaly_tool.ainvoke({
             "minutes": config["agent"]["analysis_window"],
-            "host": config["target"]["host"],
-            "username": config["target"]["username"]
+            "host": target["host"],
+            "username": target["username"]
         })
         
         anomalies_text = str(result)
+        if allowlists:
+            anomalies_text = allowlists.get(target["host"]).filter_findings(anomalies_text)
         
         # Count anomalies by checking for severity markers
         has_anomalies = ("HIGH" in anomalies_text or 
@@ -106,6 +238,7 @@ async def analyze_anomalies(state: NetworkSecurityState) -> NetworkSecurityState
                         "MEDIUM" in anomalies_text)
         
         anomaly_list = [anomalies_text] if has_anomalies else []
+        anomaly_list += state.get("local_findings", [])
         
         logger.info(f" Analysis complete: {len(anomaly_list)} anomalies detected")
         
@@ -113,12 +246,12 @@ async def analyze_anomalies(state: NetworkSecurityState) -> NetworkSecurityState
             **state,
             "detected_anomalies": anomaly_list
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Failed to analyze anomalies: {e}")
         return {
             **state,
-            "detected_anomalies": []
+            "detected_anomalies": list(state.get("local_findings", []))
         }
 
 
@@ -156,6 +289,10 @@ async def llm_analysis(state: NetworkSecurityState) -> NetworkSecurityState:
         for i, anomaly in enumerate(state["detected_anomalies"])
     ])
     
+    # Tag remote addresses so the LLM can tell internal from hosting ranges
+    if enricher:
+        anomalies_text = enricher.annotate(anomalies_text)
+    
     # Get prompts from config
     system_prompt_text, user_prompt_text = get_prompt(
         config,
@@ -167,8 +304,41 @@ async def llm_analysis(state: NetworkSecurityState) -> NetworkSecurityState:
     system_prompt = SystemMessage(content=system_prompt_text)
     user_prompt = HumanMessage(content=user_prompt_text)
     
+    alerts_config = config.get("alerts", {})
+    threshold = config["agent"].get("critical_threshold", "HIGH")
+    detected_severity = highest_severity(anomalies_text)
+    assessed_severity = None
+    partial_sent = False
+    
+    async def on_line(line: str):
+        # Write a preliminary alert as soon as the severity line arrives,
+        # instead of waiting for the full analysis and report
+        nonlocal partial_sent, assessed_severity
+        severity = parse_severity_line(line)
+        if severity and assessed_severity is None:
+            assessed_severity = severity
+        if partial_sent or not alerts_config.get("enabled", True):
+            return
+        if not alerts_config.get("partial_alerts", True):
+            return
+        if severity and is_at_least(severity, threshold):
+            partial_sent = True
+            logger.warning(f"🚨 LLM assessed severity {severity}, writing preliminary alert")
+            write_alert_log(
+                f"PRELIMINARY {severity} alert at {clock.now().isoformat()}",
+                [anomalies_text]
+            )
+            record_event_to_alert(state.get("triggered_at", 0.0), "preliminary")
+    
     try:
-        response = await llm.ainvoke([system_prompt, user_prompt])
+        response = await dispatcher.submit(
+            "anomaly_analysis",
+            [system_prompt, user_prompt],
+            severity=detected_severity,
+            host=get_target(state)["host"],
+            on_line=on_line,
+            template_vars={"anomalies_text": anomalies_text, "severity": detected_severity or "LOW"}
+        )
         analysis = response.content
         
         logger.info(f" LLM analysis complete: {len(analysis)} chars")
@@ -178,14 +348,16 @@ async def llm_analysis(state: NetworkSecurityState) -> NetworkSecurityState:
         
         return {
             **state,
+            "severity": assessed_severity or detected_severity or "",
             "recommendations": recommendations,
             "messages": state.get("messages", []) + [system_prompt, user_prompt, response],
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ LLM analysis failed: {e}")
         return {
             **state,
+            "severity": detected_severity or "",
             "recommendations": [f"LLM analysis failed: {str(e)}"]
         }
 
@@ -205,19 +377,25 @@ async def generate_report(state: NetworkSecurityState) -> NetworkSecurityState:
                 break
     
     # Get report generation prompt from config
-    system_prompt_text, user_prompt_text = get_prompt(
-        config,
-        "report_generation",
-        anomalies="\n\n".join(state.get("detected_anomalies", [])) or "None",
-        investigation_results=str(state.get("investigated_pids", [])) or "None",
-        llm_analysis=llm_analysis_text or "None"
-    )
+    severity = state.get("severity") or highest_severity("\n".join(state.get("detected_anomalies", [])))
+    report_vars = {
+        "anomalies": "\n\n".join(state.get("detected_anomalies", [])) or "None",
+        "investigation_results": str(state.get("investigated_pids", [])) or "None",
+        "llm_analysis": llm_analysis_text or "None",
+    }
+    system_prompt_text, user_prompt_text = get_prompt(config, "report_generation", **report_vars)
     
     system_prompt = SystemMessage(content=system_prompt_text)
     user_prompt = HumanMessage(content=user_prompt_text)
     
     try:
-        response = await llm.ainvoke([system_prompt, user_prompt])
+        response = await dispatcher.submit(
+            "report_generation",
+            [system_prompt, user_prompt],
+            severity=severity,
+            host=get_target(state)["host"],
+            template_vars={**report_vars, "severity": severity or "LOW"}
+        )
         report = response.content
         
         logger.info(" Report generated successfully")
@@ -226,12 +404,12 @@ async def generate_report(state: NetworkSecurityState) -> NetworkSecurityState:
             **state,
             "alerts": state.get("alerts", []) + [report]
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Report generation failed: {e}")
         # Create a simple text report as fallback
         simple_report = f"""
-Security Report - {datetime.now().isoformat()}
+Security Report - {clock.now().isoformat()}
 
 Anomalies Detected: {len(state.get('detected_anomalies', []))}
 {chr(10).join(state.get('detected_anomalies', []))}
@@ -257,23 +435,13 @@ async def send_alert(state: NetworkSecurityState) -> NetworkSecurityState:
         logger.info("Alerts disabled in config")
         return state
     
-    # Write to log file
-    log_file = alerts_config.get("log_file", "./logs/alerts.log")
-    
-    try:
-        import os
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        
-        with open(log_file, 'a') as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(f"Alert at {datetime.now().isoformat()}\n")
-            f.write(f"{'='*80}\n")
-            for alert in state.get("alerts", []):
-                f.write(f"{alert}\n")
-        
+    log_file = write_alert_log(
+        f"Alert at {clock.now().isoformat()}",
+        state.get("alerts", [])
+    )
+    if log_file:
         logger.info(f" Alert written to {log_file}")
-    except Exception as e:
-        logger.error(f"❌ Failed to write alert: {e}")
+        record_event_to_alert(state.get("triggered_at", 0.0), "final")
     
     return state
 
@@ -281,53 +449,146 @@ async def send_alert(state: NetworkSecurityState) -> NetworkSecurityState:
 async def update_baseline(state: NetworkSecurityState) -> NetworkSecurityState:
     """
     Update baseline with learned patterns using MCP tools.
+    
+    Only the delta of the stats against the previous cycle and the baseline
+    profile is sent to the LLM; when nothing changed the call is skipped.
     """
     logger.info("📚 Updating baseline")
     
     try:
-        # Get fresh stats if not in state
-        if not state.get("current_stats"):
+        # Get fresh stats if not in state, from the rollups if they cover the last hour
+        host = get_target(state)["host"]
+        if not state.get("current_stats") and rollups and rollups.covers(host, clock.time() - 3600):
+            current_stats = rollups.summarize(host, 60, now=clock.time())
+        elif not state.get("current_stats"):
             tools = await get_tools()
             stats_tool = await get_mcp_tool_by_name(tools, "get_network_event_stats")
             
+            target = get_target(state)
             stats_result = await stats_tool.ainvoke({
                 "minutes": 60,  # Last hour for baseline
-                "host": config["target"]["host"],
-                "username": config["target"]["username"]
+                "host": target["host"],
+                "username": target["username"]
             })
             current_stats = str(stats_result)
         else:
             current_stats = state.get("current_stats", "No data")
         
+        baseline = state.get("historical_baseline") or _baselines.get(host, {})
+        baseline_config = config.get("baseline", {})
+        change_threshold = baseline_config.get("change_threshold", 0.5)
+        min_count = baseline_config.get("min_count", 5)
+        
+        # Only the delta against the previous cycle and the baseline goes to the LLM
+        current = await executor.run_on_text(parse_stats, current_stats)
+        profile = baseline.get("profile")
+        # Recorded only once this cycle's delta was handled, so a failed LLM call
+        # leaves the changes for the next cycle to report
+        previous = _previous_stats.get(host)
+        
+        since_previous = diff_stats(current, previous, change_threshold, min_count) if previous is not None else StatsDelta()
+        against_baseline = diff_stats(current, profile, change_threshold, min_count, include_disappeared=False)
+        
+        updated_baseline = {
+            **baseline,
+            "last_update": clock.now().isoformat(),
+            "profile": merge_into_profile(profile, current, baseline_config.get("smoothing", 0.3)),
+        }
+        
+        if current and since_previous.is_empty() and against_baseline.is_empty():
+            logger.info(" No changes against previous cycle or baseline, skipping LLM")
+            metrics.incr("baseline_llm_skipped")
+            _previous_stats[host] = current
+            _baselines[host] = updated_baseline
+            return {
+                **state,
+                "historical_baseline": updated_baseline
+            }
+        
+        if current:
+            delta_text = (
+                f"Changes against baseline:\n{against_baseline.format() or 'none'}\n\n"
+                f"Changes since previous cycle:\n{since_previous.format() or 'none'}"
+            )
+        else:
+            # Unrecognized stats format, fall back to the raw text
+            delta_text = current_stats
+        
         # Use LLM to suggest baseline updates
-        system_prompt_text, user_prompt_text = get_prompt(
-            config,
-            "baseline_learning",
-            current_stats=current_stats,
-            baseline=str(state.get("historical_baseline", {}))
-        )
+        baseline_vars = {
+            "current_stats": delta_text,
+            "baseline": summarize_profile(profile),
+        }
+        system_prompt_text, user_prompt_text = get_prompt(config, "baseline_learning", **baseline_vars)
+        metrics.observe("baseline_prompt_chars", len(user_prompt_text))
         
         system_prompt = SystemMessage(content=system_prompt_text)
         user_prompt = HumanMessage(content=user_prompt_text)
         
-        response = await llm.ainvoke([system_prompt, user_prompt])
+        response = await dispatcher.submit(
+            "baseline_learning",
+            [system_prompt, user_prompt],
+            severity=state.get("severity") or None,
+            host=host,
+            template_vars=baseline_vars
+        )
         
         logger.info(" Baseline updated with LLM suggestions")
         
+        # Processes the LLM considers normal are allowlisted once suggested often enough
+        if allowlists:
+            allowlists.learn(host, parse_whitelist(response.content))
+        
         # Update baseline with timestamp
+        updated_baseline["llm_suggestions"] = response.content[:500]  # Store snippet
+        _previous_stats[host] = current
+        _baselines[host] = updated_baseline
         return {
             **state,
-            "historical_baseline": {
-                "last_update": datetime.now().isoformat(),
-                "llm_suggestions": response.content[:500]  # Store snippet
-            }
+            "historical_baseline": updated_baseline
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Baseline update failed: {e}")
         return state
 
 
+def write_alert_log(header: str, entries: list[str]) -> str | None:
+    """
+    Append an alert block to the configured alert log, compressed if
+    ``alerts.compress`` is set.
+    
+    Args:
+        header: Header line for the alert block
+        entries: Alert texts to write
+    
+    Returns:
+        Path of the log file, or None if writing failed
+    """
+    alerts_config = config.get("alerts", {})
+    log_file = alerts_config.get("log_file", "./logs/alerts.log")
+    block = f"\n{'='*80}\n{header}\n{'='*80}\n" + "".join(f"{entry}\n" for entry in entries)
+    
+    try:
+        if alerts_config.get("compress", False):
+            # One compressed record per alert (python -m src.compression cat)
+            log_file += COMPRESSED_SUFFIX
+            if log_file not in _alert_logs:
+                _alert_logs[log_file] = CompressedLog.from_config(log_file, alerts_config.get("compression", {}))
+            _alert_logs[log_file].append(block)
+            return log_file
+        
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        
+        with open(log_file, 'a') as f:
+            f.write(block)
+        
+        return log_file
+    except Exception as e:
+        logger.error(f"❌ Failed to write alert: {e}")
+        return None
+
+
 def extract_recommendations(analysis: str) -> list[str]:
     """Extract action items from LLM response."""
     recommendations = []
@@ -0,0 +1,177 @@
+"""CPU-heavy work off the event loop.
+
+Parsing the events text of a large target, encoding it for the archive
+and aggregating it for the sketches can take long enough to stall the
+event loop, delaying MCP calls and LLM streams of other targets. The
+``CPUExecutor`` runs such work in a thread pool or a process pool:
+
+- ``thread``: no copies, but the work still holds the GIL
+- ``process``: true parallelism; large texts are handed to the workers in
+  shared memory instead of being pickled, and results come back compact
+  (encoded archive records and aggregated flow counts)
+- ``inline``: run on the event loop (the previous behavior)
+
+``LoopLagMonitor`` measures how late the event loop wakes up, so the
+effect of the executor can be compared before and after.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional
+
+from .archive import encode_events
+from .events import parse_events
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+
+@dataclass
+class PreparedEvents:
+    """Result of parsing one window of events, ready for the archive and sketches."""
+    count: int
+    records: bytes
+    flows: Counter
+    # Non-empty lines of the text; more than the records means events were not parsed
+    lines: int = 0
+
+
+def prepare_events(text: str) -> PreparedEvents:
+    """
+    Parse an events text into archive records and flow counts.
+    
+    Args:
+        text: Output of get_network_events_history
+    
+    Returns:
+        Encoded records and flows keyed by (comm, pid, daddr, dport)
+    """
+    events = parse_events(text)
+    return PreparedEvents(
+        count=len(events),
+        records=encode_events(events),
+        flows=Counter((e.comm, e.pid, e.daddr, e.dport) for e in events),
+        lines=sum(1 for line in text.splitlines() if line.strip())
+    )
+
+
+def _run_on_shared_text(fn: Callable, name: str, size: int, args: tuple) -> Any:
+    """Worker side of run_on_text(): read the text from shared memory."""
+    # Workers share the parent's resource tracker, which unlinks the block
+    # only if the parent dies before it does
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        text = bytes(shm.buf[:size]).decode("utf-8")
+    finally:
+        shm.close()
+    return fn(text, *args)
+
+
+class CPUExecutor:
+    """Runs CPU-heavy functions in a thread or process pool."""
+    
+    def __init__(self, kind: str = "thread", max_workers: int = 2, shared_memory_min_bytes: int = 64 * 1024):
+        """
+        Args:
+            kind: "inline", "thread" or "process"
+            max_workers: Pool size
+            shared_memory_min_bytes: Texts at least this large go to process
+                workers through shared memory instead of pickling
+        """
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.shared_memory_min_bytes = shared_memory_min_bytes
+        self._pool: Optional[Executor] = None
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "CPUExecutor":
+        settings = config.get("executor", {})
+        return cls(
+            kind=settings.get("kind", "thread"),
+            max_workers=settings.get("max_workers", 2),
+            shared_memory_min_bytes=settings.get("shared_memory_min_kb", 64) * 1024
+        )
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # forkserver avoids forking a process with running threads and sockets
+                context = multiprocessing.get_context("forkserver")
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=context)
+            else:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="cpu")
+            logger.info(f"🧵 Started {self.kind} executor with {self.max_workers} workers")
+        return self._pool
+    
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` in the pool (arguments are pickled for processes)."""
+        if self.kind == "inline":
+            return fn(*args)
+        with metrics.timer("executor_task_seconds", kind=self.kind):
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), partial(fn, *args))
+    
+    async def run_on_text(self, fn: Callable, text: str, *args) -> Any:
+        """
+        Run ``fn(text, *args)`` in the pool.
+        
+        Process workers read large texts from a shared memory block, so the
+        text is copied once instead of being pickled and unpickled.
+        """
+        if self.kind != "process":
+            return await self.run(fn, text, *args)
+        
+        data = text.encode("utf-8")
+        if len(data) < self.shared_memory_min_bytes:
+            return await self.run(fn, text, *args)
+        
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            metrics.incr("executor_shared_bytes", len(data))
+            return await self.run(_run_on_shared_text, fn, shm.name, len(data), args)
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a periodic callback."""
+    
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            metrics.observe("event_loop_lag_seconds", max(0.0, time.perf_counter() - expected))
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
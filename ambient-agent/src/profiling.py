@@ -0,0 +1,288 @@
+"""Per-node profiling of monitoring cycles.
+
+Profiled cycles run every graph node under its own cProfile profiler and
+tracemalloc snapshots. The profiler is enabled only while the node's
+coroutine is actually running, not while it awaits MCP or the LLM, so
+for each node the wall time splits into local work (CPU) and waiting
+(the MCP/SSH hop or the LLM). Each profiled cycle writes a directory:
+
+    <dir>/<YYYYMMDD-HHMMSS>-cycle<N>/
+        <node>.collapsed   # Collapsed stacks (flamegraph.pl, speedscope)
+        <node>.prof        # pstats dump (snakeviz, python -m pstats)
+        allocations.txt    # Top allocating lines per node
+        timing.json        # Wall / CPU / wait seconds and memory peak per target and node
+
+Run ``python -m src --once --profile`` to profile a single cycle, or set
+``profiling.enabled`` to profile every ``every_n_cycles``-th cycle of the
+continuous loop. Cycles that aren't sampled only pay for a context
+variable lookup per node.
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from .clock import clock
+
+logger = logging.getLogger(__name__)
+
+# Branches of the call graph below this many seconds are dropped from the stacks
+MIN_STACK_SECONDS = 1e-6
+MAX_STACK_DEPTH = 64
+
+# Frames of the profiler itself, left out of the stacks
+_PROFILER_FRAMES = {"<method 'disable' of '_lsprof.Profiler' objects>"}
+_STEP_FRAMES = {"<method 'send' of 'coroutine' objects>", "<method 'throw' of 'coroutine' objects>"}
+
+_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+def _frame_label(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(profile: cProfile.Profile) -> Dict[str, int]:
+    """
+    Convert a profile into collapsed stacks with microsecond weights.
+    
+    cProfile only records caller/callee pairs, so the time of a function
+    is split between its callers in proportion to the time spent on each
+    edge (as flameprof and similar tools do).
+    
+    Args:
+        profile: Finished profiler
+    
+    Returns:
+        Mapping of "root;caller;callee" to self time in microseconds
+    """
+    raw = pstats.Stats(profile).stats
+    children: Dict[tuple, List[tuple]] = defaultdict(list)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    roots = [func for func, entry in raw.items() if not any(caller in raw for caller in entry[4])]
+    
+    stacks: Counter = Counter()
+    
+    def walk(func: tuple, inclusive: float, path: tuple, seen: frozenset):
+        _, _, self_time, total_time, _ = raw[func]
+        scale = inclusive / total_time if total_time else 0.0
+        path = path + (_frame_label(func),)
+        stacks[";".join(path)] += self_time * scale
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_time in children.get(func, ()):
+            if child not in seen and edge_time * scale >= MIN_STACK_SECONDS:
+                walk(child, edge_time * scale, path, seen | {child})
+    
+    for root in roots:
+        label = _frame_label(root)
+        if label in _PROFILER_FRAMES:
+            continue
+        if label in _STEP_FRAMES:
+            # Resumed coroutine steps: start the stacks at the node itself
+            for child, edge_time in children.get(root, ()):
+                walk(child, edge_time, (), frozenset([root, child]))
+            continue
+        walk(root, raw[root][3], (), frozenset([root]))
+    
+    return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if seconds * 1e6 >= 1}
+
+
+class _Stepped:
+    """Awaitable that profiles each step of a coroutine, but not its waits."""
+    
+    def __init__(self, coro, profile: cProfile.Profile, timing: Dict[str, float]):
+        self.coro = coro
+        self.profile = profile
+        self.timing = timing
+    
+    def __await__(self):
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            self.profile.enable()
+            try:
+                if error is not None:
+                    yielded = self.coro.throw(error)
+                else:
+                    yielded = self.coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.disable()
+                self.timing["cpu"] += time.perf_counter() - start
+            
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class ProfileSession:
+    """Profiles, snapshots and timings of one profiled cycle."""
+    
+    def __init__(self, iteration: int, top_allocators: int = 15):
+        self.iteration = iteration
+        self.top_allocators = top_allocators
+        self.started = time.perf_counter()
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.allocations: Dict[str, List[tracemalloc.StatisticDiff]] = defaultdict(list)
+        self.timings: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+    
+    async def run(self, name: str, host: str, coro: Awaitable) -> Any:
+        """Run one node under the profiler."""
+        profile = self.profiles.setdefault(name, cProfile.Profile())
+        timing = self.timings[host].setdefault(name, {"wall": 0.0, "cpu": 0.0, "wait": 0.0, "calls": 0})
+        timing.setdefault("peak_bytes", 0)
+        before, base = None, 0
+        if tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return await _Stepped(coro, profile, timing)
+        finally:
+            timing["wall"] += time.perf_counter() - start
+            timing["wait"] = max(0.0, timing["wall"] - timing["cpu"])
+            timing["calls"] += 1
+            if before is not None:
+                timing["peak_bytes"] = max(timing["peak_bytes"], tracemalloc.get_traced_memory()[1] - base)
+                after = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ])
+                self.allocations[name].extend(after.compare_to(before, "lineno")[:self.top_allocators])
+    
+    def write(self, directory: Path) -> Path:
+        """Write stacks, pstats dumps, allocators and timings for the cycle."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, profile in self.profiles.items():
+            stacks = collapsed_stacks(profile)
+            (directory / f"{name}.collapsed").write_text(
+                "".join(f"{stack} {weight}\n" for stack, weight in sorted(stacks.items()))
+            )
+            profile.dump_stats(str(directory / f"{name}.prof"))
+        
+        with open(directory / "allocations.txt", "w") as f:
+            for name, diffs in self.allocations.items():
+                f.write(f"== {name} ==\n")
+                top = sorted((d for d in diffs if d.size_diff > 0), key=lambda d: d.size_diff, reverse=True)
+                for diff in top[:self.top_allocators]:
+                    f.write(f"{diff}\n")
+                f.write("\n")
+        
+        (directory / "timing.json").write_text(json.dumps({
+            "iteration": self.iteration,
+            "wall_seconds": time.perf_counter() - self.started,
+            "targets": self.timings,
+        }, indent=2))
+        return directory
+    
+    def log_breakdown(self):
+        """Log where the time of the cycle went."""
+        logger.info(f"⏱️  Cycle #{self.iteration} profile ({time.perf_counter() - self.started:.2f}s):")
+        for host, nodes in self.timings.items():
+            for name, timing in nodes.items():
+                logger.info(
+                    f"  {host} {name:<13} wall={timing['wall']:.3f}s "
+                    f"local={timing['cpu']:.3f}s waiting={timing['wait']:.3f}s "
+                    f"peak={timing.get('peak_bytes', 0) / 1024:.0f} KiB"
+                )
+
+
+class CycleProfiler:
+    """Decides which cycles are profiled and wraps graph nodes."""
+    
+    def __init__(self, enabled: bool = False, every_n_cycles: int = 10, directory: str = "./data/profiles",
+                 top_allocators: int = 15, tracemalloc_frames: int = 1):
+        """
+        Args:
+            enabled: Profile sampled cycles
+            every_n_cycles: Profile cycles whose iteration is a multiple of this
+            directory: Where profile directories are written
+            top_allocators: Allocating lines reported per node
+            tracemalloc_frames: Frames stored per allocation (more is slower)
+        """
+        self.enabled = enabled
+        self.every_n_cycles = max(1, every_n_cycles)
+        self.directory = Path(directory)
+        self.top_allocators = top_allocators
+        self.tracemalloc_frames = tracemalloc_frames
+        self._active = 0
+        self._owns_tracing = False
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "CycleProfiler":
+        settings = config.get("profiling", {})
+        return cls(
+            enabled=settings.get("enabled", False),
+            every_n_cycles=settings.get("every_n_cycles", 10),
+            directory=settings.get("dir", "./data/profiles"),
+            top_allocators=settings.get("top_allocators", 15),
+            tracemalloc_frames=settings.get("tracemalloc_frames", 1)
+        )
+    
+    def sampled(self, iteration: int) -> bool:
+        return self.enabled and iteration % self.every_n_cycles == 0
+    
+    @contextmanager
+    def cycle(self, iteration: int) -> Iterator[Optional[ProfileSession]]:
+        """
+        Profile the graph runs inside the block if this cycle is sampled.
+        
+        Yields:
+            The session, or None if the cycle isn't profiled
+        """
+        if not self.sampled(iteration):
+            yield None
+            return
+        
+        session = ProfileSession(iteration, self.top_allocators)
+        token = _session.set(session)
+        if self._active == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._owns_tracing = True
+        self._active += 1
+        try:
+            yield session
+        finally:
+            self._active -= 1
+            _session.reset(token)
+            if self._active == 0 and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+            
+            name = f"{clock.now():%Y%m%d-%H%M%S}-cycle{iteration}"
+            try:
+                path = session.write(self.directory / name)
+                session.log_breakdown()
+                logger.info(f"🔬 Wrote cycle profile to {path}")
+            except OSError as e:
+                logger.error(f"❌ Failed to write cycle profile: {e}")
+    
+    @staticmethod
+    def wrap(name: str, node: Callable) -> Callable:
+        """Wrap a graph node so it is profiled in sampled cycles."""
+        @functools.wraps(node)
+        async def profiled(state):
+            session = _session.get()
+            if session is None:
+                return await node(state)
+            host = (state.get("target") or {}).get("host", "default")
+            return await session.run(name, host, node(state))
+        return profiled
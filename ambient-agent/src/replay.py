@@ -0,0 +1,316 @@
+"""Record and replay of MCP tool calls and LLM exchanges.
+
+With ``recording.enabled`` every MCP tool call and LLM response of a cycle
+is appended to a compact trace (gzip-compressed JSON lines). The replay
+driver runs ``build_agent()`` against the recorded responses on a virtual
+clock, without MCP or LLM access and faster than real time:
+
+    python -m src.replay data/traces/trace.jsonl.gz [--speed 0]
+
+``--speed`` scales the recorded latencies (0 skips them, 1 is real time).
+Use it for regression tests of detectors and caches, or to profile a week
+of cycles in seconds.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+from .clock import clock
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_key(messages: List[BaseMessage]) -> str:
+    """Short digest identifying a prompt."""
+    payload = json.dumps([(message.type, message.content) for message in messages], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def system_key(messages: List[BaseMessage]) -> str:
+    """Digest of the system prompt, which identifies the task of a call."""
+    return prompt_key([message for message in messages if message.type == "system"])
+
+
+def tool_key(name: str, args: Dict[str, Any]) -> str:
+    return f"{name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+class TraceRecorder:
+    """Appends cycles, tool calls and LLM exchanges to a trace file."""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        logger.info(f"⏺️  Recording MCP and LLM traffic to {self.path}")
+    
+    def _write(self, record: Dict[str, Any]):
+        record["time"] = clock.time()
+        self._file.write(json.dumps(record, default=str) + "\n")
+    
+    def record_cycle(self, iteration: int, targets: List[dict]):
+        """Mark the start of a cycle."""
+        self._write({"type": "cycle", "iteration": iteration, "targets": targets})
+    
+    def record_tool(self, name: str, args: Dict[str, Any], output: str, duration: float):
+        self._write({"type": "tool", "name": name, "args": args, "output": output, "duration": duration})
+    
+    def record_llm(self, task: str, messages: List[BaseMessage], response: AIMessage, duration: float):
+        self._write({
+            "type": "llm",
+            "task": task,
+            "system": system_key(messages),
+            "prompt": prompt_key(messages),
+            "content": response.content,
+            "usage": getattr(response, "usage_metadata", None) or {},
+            "duration": duration,
+        })
+    
+    def wrap_tools(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """Wrap MCP tools so their calls are recorded."""
+        return [RecordingTool(name=t.name, description=t.description, args_schema=t.args_schema,
+                              inner=t, recorder=self) for t in tools]
+    
+    def flush(self):
+        """
+        Write the records so far to disk as a gzip sync point, so a trace
+        cut off by a crash or kill still loads up to the last flush.
+        """
+        if not self._file.closed:
+            self._file.flush()
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"⏹️  Closed trace {self.path}")
+
+
+class RecordingTool(BaseTool):
+    """MCP tool wrapper that records each call."""
+    
+    inner: Any
+    recorder: Any
+    
+    async def _arun(self, **kwargs) -> str:
+        start = time.perf_counter()
+        output = str(await self.inner.ainvoke(kwargs))
+        self.recorder.record_tool(self.name, kwargs, output, time.perf_counter() - start)
+        return output
+    
+    def _run(self, **kwargs):
+        raise NotImplementedError("MCP tools are async only")
+
+
+class TracePlayer:
+    """Serves recorded responses in the order they were recorded."""
+    
+    def __init__(self, records: List[Dict[str, Any]], speed: float = 0.0):
+        """
+        Args:
+            records: Trace records
+            speed: Latency scale (0 = no delays, 1 = recorded latency)
+        """
+        self.speed = speed
+        self.cycles = [r for r in records if r["type"] == "cycle"]
+        self.tool_names = sorted({r["name"] for r in records if r["type"] == "tool"})
+        self._tools: Dict[str, deque] = defaultdict(deque)
+        self._llm: Dict[str, deque] = defaultdict(deque)
+        for record in records:
+            if record["type"] == "tool":
+                self._tools[tool_key(record["name"], record["args"])].append(record)
+            elif record["type"] == "llm":
+                self._llm[record["system"]].append(record)
+        self.misses = 0
+    
+    @classmethod
+    def load(cls, path: str, speed: float = 0.0) -> "TracePlayer":
+        """
+        Load a trace. A trace whose recorder wasn't closed (the process was
+        killed) ends in a truncated gzip member; the records up to the last
+        flush are kept.
+        """
+        lines = []
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    lines.append(line)
+        except (EOFError, OSError, zlib.error) as e:
+            # A partial last line was cut off mid-write
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()
+            logger.warning(f"⚠️  Trace {path} is truncated ({e}); replaying the {len(lines)} records before it")
+        return cls([json.loads(line) for line in lines if line.strip()], speed)
+    
+    async def _delay(self, record: Dict[str, Any]):
+        if self.speed > 0:
+            await asyncio.sleep(record.get("duration", 0.0) * self.speed)
+    
+    async def tool_output(self, name: str, args: Dict[str, Any]) -> str:
+        queue = self._tools.get(tool_key(name, args))
+        if not queue:
+            self.misses += 1
+            metrics.incr("replay_misses", kind="tool")
+            return f"Error: no recorded response for {name}"
+        record = queue.popleft()
+        await self._delay(record)
+        return record["output"]
+    
+    def llm_record(self, messages: List[BaseMessage]) -> Optional[Dict[str, Any]]:
+        """Next recorded LLM response for the same task, preferring an identical prompt."""
+        queue = self._llm.get(system_key(messages))
+        if not queue:
+            self.misses += 1
+            metrics.incr("replay_misses", kind="llm")
+            return None
+        
+        key = prompt_key(messages)
+        for i, record in enumerate(queue):
+            if record["prompt"] == key:
+                del queue[i]
+                return record
+        
+        # The prompt changed (e.g. a detector changed); use the next response
+        record = queue.popleft()
+        metrics.incr("replay_prompt_mismatches", task=record["task"])
+        return record
+    
+    def tools(self) -> List[BaseTool]:
+        """Tools that answer from the trace instead of MCP."""
+        return [ReplayTool(name=name, description=f"Replayed {name}", player=self) for name in self.tool_names]
+
+
+class ReplayTool(BaseTool):
+    """Tool that answers from a trace."""
+    
+    player: Any
+    
+    async def _arun(self, **kwargs) -> str:
+        return await self.player.tool_output(self.name, kwargs)
+    
+    def _run(self, **kwargs):
+        raise NotImplementedError("Replay tools are async only")
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that answers from a trace, streaming it line by line."""
+    
+    player: Any
+    
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+    
+    def _response(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        return self.player.llm_record(messages) or {"content": "", "usage": {}}
+    
+    def _generate(self, messages: List[BaseMessage], stop=None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        record = self._response(messages)
+        message = AIMessage(content=record["content"], usage_metadata=record["usage"] or None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    @staticmethod
+    def _chunks(record: Dict[str, Any]):
+        for line in record["content"].splitlines(keepends=True):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=line))
+        if record["usage"]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=record["usage"]))
+    
+    def _stream(self, messages: List[BaseMessage], stop=None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs):
+        yield from self._chunks(self._response(messages))
+    
+    async def _astream(self, messages: List[BaseMessage], stop=None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs):
+        record = self._response(messages)
+        await self.player._delay(record)
+        for chunk in self._chunks(record):
+            yield chunk
+
+
+async def replay(path: str, speed: float = 0.0, alert_log: str = "./logs/replay-alerts.log") -> Dict[str, float]:
+    """
+    Replay a recorded trace through the agent on a virtual clock.
+    
+    Replayed events aren't archived and alerts go to a separate log.
+    
+    Args:
+        path: Trace file written with recording enabled
+        speed: Latency scale (0 = no delays, 1 = recorded latency)
+        alert_log: Alert log file for the replay
+    
+    Returns:
+        Cycles replayed, wall time, virtual time span, speedup and misses
+    """
+    from . import nodes
+    from .__main__ import run_cycle
+    from .agent import build_agent
+    
+    player = TracePlayer.load(path, speed)
+    if not player.cycles:
+        raise ValueError(f"No cycles recorded in {path}")
+    
+    nodes.router.recorder = None
+    nodes.archive = None
+    nodes.config.setdefault("alerts", {})["log_file"] = alert_log
+    nodes._tools_cache = player.tools()
+    for tier in nodes.router.tiers.values():
+        if tier.kind == "llm":
+            tier.llm = ReplayChatModel(player=player)
+    
+    agent = build_agent()
+    started = time.perf_counter()
+    try:
+        for cycle in player.cycles:
+            clock.set(cycle["time"])
+            await run_cycle(agent, cycle["iteration"], cycle["targets"])
+    finally:
+        await nodes.dispatcher.close()
+        clock.reset()
+    
+    elapsed = time.perf_counter() - started
+    span = player.cycles[-1]["time"] - player.cycles[0]["time"]
+    return {
+        "cycles": len(player.cycles),
+        "elapsed_seconds": elapsed,
+        "virtual_seconds": span,
+        "speedup": span / elapsed if elapsed else 0.0,
+        "misses": player.misses,
+    }
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Replay a recorded ambient agent trace")
+    parser.add_argument("trace", help="Trace file (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=0.0, help="Latency scale: 0 = none, 1 = recorded")
+    parser.add_argument("--alert-log", default="./logs/replay-alerts.log")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s')
+    result = asyncio.run(replay(args.trace, args.speed, args.alert_log))
+    logger.info(
+        f"⏩ Replayed {result['cycles']} cycles ({result['virtual_seconds']:.0f}s of agent time) "
+        f"in {result['elapsed_seconds']:.2f}s: {result['speedup']:.0f}x real time, "
+        f"{result['misses']} missing responses"
+    )
+
+
+if __name__ == "__main__":
+    main()
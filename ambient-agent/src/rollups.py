@@ -0,0 +1,300 @@
+"""Multi-resolution rollups of network events.
+
+Events fetched each cycle are counted once into tumbling 1-minute buckets
+per target. When a minute can no longer receive events, it is merged into
+its 10-minute bucket, and a completed 10-minute bucket into its 60-minute
+bucket. Coarse aggregates are built incrementally instead of being
+refetched or rescanned. A window query covers the requested range with
+the coarsest complete buckets and fills the edges with finer ones, so a
+60-minute window merges at most a few dozen buckets.
+
+Each level keeps its own retention, e.g. 1-minute buckets for 3 hours,
+10-minute buckets for a day and 60-minute buckets for a week. Older parts
+of a window are served at the finest resolution still retained.
+"""
+
+import logging
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from .archive import RECORD, _unpack_addr, encode_events, new_records, newest_records
+from .events import NetworkEvent
+from .metrics import metrics
+from .stats_diff import SUMMARY_SECTION, Stats
+
+logger = logging.getLogger(__name__)
+
+MINUTE, TEN_MINUTES, HOUR = 60, 600, 3600
+LEVELS = (HOUR, TEN_MINUTES, MINUTE)
+
+
+@dataclass
+class Bucket:
+    """Event counts of one time bucket."""
+    count: int = 0
+    processes: Counter = field(default_factory=Counter)
+    destinations: Counter = field(default_factory=Counter)
+    ports: Counter = field(default_factory=Counter)
+    
+    def add(self, comm: str, daddr: str, dport: int, count: int = 1):
+        self.count += count
+        self.processes[comm] += count
+        if daddr:
+            self.destinations[daddr] += count
+        if dport:
+            self.ports[dport] += count
+    
+    def merge(self, other: "Bucket"):
+        self.count += other.count
+        self.processes.update(other.processes)
+        self.destinations.update(other.destinations)
+        self.ports.update(other.ports)
+    
+    def prune(self, max_entries: int):
+        """Keep only the largest entries of each section."""
+        for name in ("processes", "destinations", "ports"):
+            counts = getattr(self, name)
+            if len(counts) > max_entries:
+                setattr(self, name, Counter(dict(counts.most_common(max_entries))))
+    
+    def to_stats(self) -> Stats:
+        """Sections as ``parse_stats`` returns them for get_network_event_stats."""
+        return {
+            SUMMARY_SECTION: {"Total events": float(self.count)},
+            "top_processes": {k: float(v) for k, v in self.processes.items()},
+            "top_destinations": {k: float(v) for k, v in self.destinations.items()},
+            "top_ports": {str(k): float(v) for k, v in self.ports.items()},
+        }
+    
+    def format(self, minutes: float, top: int = 10) -> str:
+        """Text in the layout of get_network_event_stats."""
+        sections = {
+            "Top Processes": self.processes,
+            "Top Destinations": self.destinations,
+            "Top Ports": self.ports,
+        }
+        lines = [f"Network Event Statistics (last {minutes:g} minutes, local rollup)", f"Total events: {self.count}"]
+        for title, counts in sections.items():
+            lines.append(f"{title}:")
+            lines.extend(f"  {key}: {count}" for key, count in counts.most_common(top))
+        return "\n".join(lines)
+
+
+class TargetRollup:
+    """Buckets of one target at 1, 10 and 60 minutes."""
+    
+    def __init__(self):
+        self.levels: Dict[int, Dict[int, Bucket]] = {level: {} for level in LEVELS}
+        self.high_water = 0.0
+        # Records counted at the high water mark
+        self.high_water_records: Counter = Counter()
+        # Every minute before this has been merged into its 10-minute bucket
+        self.sealed_until = 0
+        self.covered_since: Optional[float] = None
+        self.covered_until = 0.0
+        # Event times don't match the fetch window (clock skew or time zone)
+        self.skewed = False
+
+
+class RollupEngine:
+    """Per-target tumbling buckets with incremental 10- and 60-minute merges."""
+    
+    def __init__(self, minute_retention: float = 3 * HOUR, ten_minute_retention: float = 24 * HOUR,
+                 hour_retention: float = 7 * 24 * HOUR, max_entries: int = 500):
+        """
+        Args:
+            minute_retention: Seconds 1-minute buckets are kept
+            ten_minute_retention: Seconds 10-minute buckets are kept
+            hour_retention: Seconds 60-minute buckets are kept
+            max_entries: Entries kept per section of 10- and 60-minute buckets
+        """
+        self.retention = {MINUTE: minute_retention, TEN_MINUTES: ten_minute_retention, HOUR: hour_retention}
+        self.max_entries = max_entries
+        self._targets: Dict[str, TargetRollup] = {}
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "RollupEngine":
+        settings = config.get("rollups", {})
+        return cls(
+            minute_retention=settings.get("keep_1m_minutes", 180) * 60,
+            ten_minute_retention=settings.get("keep_10m_minutes", 1440) * 60,
+            hour_retention=settings.get("keep_60m_minutes", 10080) * 60,
+            max_entries=settings.get("max_entries", 500)
+        )
+    
+    def _target(self, host: str) -> TargetRollup:
+        if host not in self._targets:
+            self._targets[host] = TargetRollup()
+        return self._targets[host]
+    
+    # ---- Ingest ----
+    
+    def add(self, host: str, events: Iterable[NetworkEvent], window_start: float, now: Optional[float] = None,
+            complete: bool = True) -> int:
+        """Add parsed events fetched for the window [window_start, now]."""
+        return self.add_records(host, encode_events(events), window_start, now, complete)
+    
+    def add_records(self, host: str, records: bytes, window_start: float, now: Optional[float] = None,
+                    complete: bool = True) -> int:
+        """
+        Count encoded, time-sorted records into 1-minute buckets.
+        
+        Records before the newest counted timestamp, or counted at it
+        already, are skipped, so overlapping fetch windows are counted once.
+        
+        Args:
+            host: Target host
+            records: Records from ``encode_events``
+            window_start: Start of the fetched window (epoch seconds)
+            now: End of the fetched window (default: wall clock)
+            complete: Whether the records are every event of the window; a
+                window with none, or with events that weren't parsed, ends
+                the coverage until the next complete fetch
+        
+        Returns:
+            Number of events counted
+        """
+        now = time.time() if now is None else now
+        rollup = self._target(host)
+        if not complete or not records:
+            rollup.covered_since = None
+            rollup.covered_until = 0.0
+            metrics.incr("rollup_incomplete_fetches")
+        elif rollup.covered_since is None or window_start > rollup.covered_until:
+            # First fetch, or a gap since the previous one
+            rollup.covered_since = window_start
+        if rollup.covered_since is not None:
+            rollup.covered_until = max(rollup.covered_until, now)
+        
+        # Aggregate the raw fields first so each distinct flow is decoded once
+        flows: Counter = Counter()
+        outside = 0
+        for timestamp, *_ in RECORD.iter_unpack(records):
+            if not window_start - MINUTE <= timestamp <= now + MINUTE:
+                outside += 1
+        records = new_records(records, rollup.high_water, rollup.high_water_records)
+        for timestamp, _, _, dport, _, _, comm, _, daddr in RECORD.iter_unpack(records):
+            flows[(int(timestamp // MINUTE) * MINUTE, comm, daddr, dport)] += 1
+        
+        for (minute, comm, daddr, dport), count in flows.items():
+            entry = (comm.rstrip(b"\0").decode(errors="replace"), _unpack_addr(daddr), dport, count)
+            rollup.levels[MINUTE].setdefault(minute, Bucket()).add(*entry)
+            # Late events of minutes already merged go to the coarser buckets too
+            if minute < rollup.sealed_until:
+                ten = minute // TEN_MINUTES * TEN_MINUTES
+                rollup.levels[TEN_MINUTES].setdefault(ten, Bucket()).add(*entry)
+                if ten + TEN_MINUTES <= rollup.sealed_until:
+                    rollup.levels[HOUR].setdefault(minute // HOUR * HOUR, Bucket()).add(*entry)
+        
+        rollup.high_water, rollup.high_water_records = newest_records(
+            records, rollup.high_water, rollup.high_water_records
+        )
+        if outside and not rollup.skewed:
+            logger.warning(
+                f"⚠️  {outside} events of {host} are outside the fetched window; "
+                f"check the clocks and time zones, using remote stats until they match"
+            )
+        rollup.skewed = outside > 0
+        metrics.incr("rollup_events_outside_window", outside)
+        # Minutes before the current one are complete
+        self._seal(rollup, int(now // MINUTE) * MINUTE)
+        self._expire(rollup, now)
+        
+        counted = sum(flows.values())
+        metrics.incr("rollup_events", counted)
+        return counted
+    
+    def _seal(self, rollup: TargetRollup, sealed_until: int):
+        """Merge minutes that can't change anymore into 10- and 60-minute buckets."""
+        previous = rollup.sealed_until
+        if sealed_until <= previous:
+            return
+        
+        tens, hours = rollup.levels[TEN_MINUTES], rollup.levels[HOUR]
+        for minute in sorted(m for m in rollup.levels[MINUTE] if previous <= m < sealed_until):
+            ten = minute // TEN_MINUTES * TEN_MINUTES
+            tens.setdefault(ten, Bucket()).merge(rollup.levels[MINUTE][minute])
+        
+        for ten in sorted(t for t in tens if previous < t + TEN_MINUTES <= sealed_until):
+            tens[ten].prune(self.max_entries)
+            hour = ten // HOUR * HOUR
+            hours.setdefault(hour, Bucket()).merge(tens[ten])
+            if hour + HOUR <= sealed_until:
+                hours[hour].prune(self.max_entries)
+        
+        rollup.sealed_until = sealed_until
+    
+    def _expire(self, rollup: TargetRollup, now: float):
+        for level, buckets in rollup.levels.items():
+            horizon = now - self.retention[level]
+            for start in [start for start in buckets if start + level <= horizon]:
+                del buckets[start]
+    
+    # ---- Queries ----
+    
+    def covers(self, host: str, start: float) -> bool:
+        """Whether fetched events cover the time since ``start`` without gaps."""
+        rollup = self._targets.get(host)
+        if rollup is None or rollup.covered_since is None or rollup.skewed:
+            return False
+        # Fetch windows are given in whole minutes
+        return rollup.covered_since <= start + MINUTE
+    
+    def window(self, host: str, start: float, end: Optional[float] = None) -> Optional[Bucket]:
+        """
+        Aggregate a time range from the coarsest complete buckets.
+        
+        Args:
+            host: Target host
+            start: Start of the range (epoch seconds)
+            end: End of the range (default: wall clock)
+        
+        Returns:
+            Merged bucket, or None if fetched events don't cover the range
+        """
+        if not self.covers(host, start):
+            return None
+        end = time.time() if end is None else end
+        rollup = self._targets[host]
+        horizon = {level: rollup.covered_until - self.retention[level] for level in LEVELS}
+        
+        # Start at the finest resolution still retained for the start of the range
+        for level in (MINUTE, TEN_MINUTES, HOUR):
+            t = int(start // level) * level
+            if t + level > horizon[level]:
+                break
+        end_t = math.ceil(end / MINUTE) * MINUTE
+        
+        result = Bucket()
+        merged = 0
+        while t < end_t:
+            for level in LEVELS:
+                complete = level == MINUTE or t + level <= rollup.sealed_until
+                if t % level == 0 and t + level <= end_t and complete and t + level > horizon[level]:
+                    break
+            else:
+                # Finer buckets expired: use the retained bucket containing t
+                level = next((level for level in (TEN_MINUTES, HOUR) if t % level == 0 and t + level > horizon[level]),
+                             MINUTE)
+            bucket = rollup.levels[level].get(t)
+            if bucket is not None:
+                result.merge(bucket)
+                merged += 1
+            t += level
+        
+        metrics.observe("rollup_buckets_merged", merged)
+        return result
+    
+    def summarize(self, host: str, minutes: float, now: Optional[float] = None, top: int = 10) -> Optional[str]:
+        """
+        Stats text for the last ``minutes``, like get_network_event_stats.
+        
+        Returns:
+            Text, or None if fetched events don't cover the window
+        """
+        now = time.time() if now is None else now
+        bucket = self.window(host, now - minutes * 60, now)
+        return bucket.format(minutes, top) if bucket is not None else None
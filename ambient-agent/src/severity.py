@@ -0,0 +1,63 @@
+"""Severity levels shared by the detectors, LLM prompts and alerting."""
+
+import re
+from typing import Optional
+
+# Ordered from least to most severe
+SEVERITY_LEVELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+_SEVERITY_WORD = re.compile(r"\b(LOW|MEDIUM|HIGH|CRITICAL)\b")
+_SEVERITY_LINE = re.compile(r"(?:overall\s+)?severity\s*[:=]\s*\**\s*\[?(LOW|MEDIUM|HIGH|CRITICAL)\b", re.IGNORECASE)
+
+
+def severity_rank(severity: Optional[str]) -> int:
+    """
+    Get the rank of a severity level.
+    
+    Args:
+        severity: Severity name (case-insensitive), or None
+    
+    Returns:
+        Index into SEVERITY_LEVELS, or -1 if unknown
+    """
+    if not severity:
+        return -1
+    try:
+        return SEVERITY_LEVELS.index(severity.upper())
+    except ValueError:
+        return -1
+
+
+def is_at_least(severity: Optional[str], threshold: str) -> bool:
+    """Check whether a severity is at or above a threshold level."""
+    return severity_rank(severity) >= severity_rank(threshold) >= 0
+
+
+def highest_severity(text: str) -> Optional[str]:
+    """
+    Find the highest severity marker mentioned in a block of text.
+    
+    Args:
+        text: Anomaly report or other text containing severity markers
+    
+    Returns:
+        Highest severity found, or None
+    """
+    found = {match.group(1) for match in _SEVERITY_WORD.finditer(text or "")}
+    if not found:
+        return None
+    return max(found, key=severity_rank)
+
+
+def parse_severity_line(line: str) -> Optional[str]:
+    """
+    Parse a ``Severity: X`` line from an LLM response.
+    
+    Args:
+        line: A single line of LLM output
+    
+    Returns:
+        Severity level, or None if the line doesn't declare one
+    """
+    match = _SEVERITY_LINE.search(line)
+    return match.group(1).upper() if match else None
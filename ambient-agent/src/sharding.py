@@ -0,0 +1,221 @@
+"""Sharding of targets across ambient agent replicas.
+
+Targets are assigned to replicas by consistent hashing over the live
+replicas, and a replica monitors a target only while it holds the
+target's lease on a shared directory (a ReadWriteMany volume):
+
+    <shared_dir>/members/<replica>.json   # heartbeat of each replica
+    <shared_dir>/leases/<target>.lease    # current owner and expiry
+
+When replicas join or leave, the ring changes and targets move: the old
+owner stops the target and releases its lease, then the new owner
+acquires it. A lease can only be taken when it is free or expired, so a
+target is never monitored by two replicas; a replica that dies stops
+renewing, and its targets are picked up once its lease expires.
+"""
+
+import bisect
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def get_replica_id(config: Dict) -> str:
+    """
+    Get the identity of this replica.
+    
+    Uses ``sharding.replica_id``, then the REPLICA_ID environment variable,
+    then the host name (the pod name, e.g. ``ambient-agent-2`` in a
+    StatefulSet).
+    """
+    return (
+        config.get("sharding", {}).get("replica_id")
+        or os.getenv("REPLICA_ID")
+        or socket.gethostname()
+    )
+
+
+def _position(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+    
+    def __init__(self, members: Iterable[str], vnodes: int = 64):
+        self._ring = sorted((_position(f"{member}#{i}"), member) for member in members for i in range(vnodes))
+        self._positions = [position for position, _ in self._ring]
+    
+    def owner(self, key: str) -> Optional[str]:
+        """Member that owns a key, or None if the ring is empty."""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._positions, _position(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class ShardCoordinator:
+    """Membership, target assignment and leases of one replica."""
+    
+    def __init__(self, shared_dir: str, replica_id: str, lease_seconds: float = 90,
+                 vnodes: int = 64, time_fn: Callable[[], float] = time.time):
+        """
+        Args:
+            shared_dir: Directory shared by all replicas
+            replica_id: Unique identity of this replica
+            lease_seconds: Lifetime of heartbeats and leases without renewal
+            vnodes: Virtual nodes per replica on the hash ring
+            time_fn: Time source (for tests)
+        """
+        self.replica_id = replica_id
+        self.lease_seconds = lease_seconds
+        self.vnodes = vnodes
+        self.time_fn = time_fn
+        self.members_dir = Path(shared_dir) / "members"
+        self.leases_dir = Path(shared_dir) / "leases"
+        self.members_dir.mkdir(parents=True, exist_ok=True)
+        self.leases_dir.mkdir(parents=True, exist_ok=True)
+        self.held: Set[str] = set()
+    
+    @property
+    def renew_interval(self) -> float:
+        """How often rebalance() should run to keep leases alive."""
+        return self.lease_seconds / 3
+    
+    # ---- Membership ----
+    
+    def heartbeat(self):
+        """Announce this replica as alive."""
+        self._write_json(self.members_dir / f"{self._safe(self.replica_id)}.json", {
+            "replica": self.replica_id,
+            "expires_at": self.time_fn() + self.lease_seconds,
+        })
+    
+    def members(self) -> List[str]:
+        """Live replicas (including this one)."""
+        now = self.time_fn()
+        members = {self.replica_id}
+        for path in self.members_dir.glob("*.json"):
+            member = self._read_json(path)
+            if member and member["expires_at"] > now:
+                members.add(member["replica"])
+        return sorted(members)
+    
+    def owner(self, host: str, members: Optional[List[str]] = None) -> Optional[str]:
+        """Replica that should monitor a target."""
+        return HashRing(members or self.members(), self.vnodes).owner(host)
+    
+    # ---- Leases ----
+    
+    @contextmanager
+    def _locked(self, host: str):
+        fd = os.open(self.leases_dir / f"{self._safe(host)}.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield self.leases_dir / f"{self._safe(host)}.lease"
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    
+    def lease_owner(self, host: str) -> Optional[str]:
+        """Current holder of a target's lease, or None if free or expired."""
+        lease = self._read_json(self.leases_dir / f"{self._safe(host)}.lease")
+        if lease and lease["expires_at"] > self.time_fn():
+            return lease["owner"]
+        return None
+    
+    def try_acquire(self, host: str) -> bool:
+        """
+        Acquire or renew the lease of a target.
+        
+        Returns:
+            True if this replica now holds the lease
+        """
+        with self._locked(host) as lease_file:
+            lease = self._read_json(lease_file)
+            now = self.time_fn()
+            if lease and lease["owner"] != self.replica_id and lease["expires_at"] > now:
+                self.held.discard(host)
+                return False
+            self._write_json(lease_file, {"owner": self.replica_id, "expires_at": now + self.lease_seconds})
+        
+        if host not in self.held:
+            logger.info(f"🔑 Replica {self.replica_id} acquired {host}")
+            self.held.add(host)
+        return True
+    
+    def release(self, host: str):
+        """Release a target's lease if this replica holds it."""
+        with self._locked(host) as lease_file:
+            lease = self._read_json(lease_file)
+            if lease and lease["owner"] == self.replica_id:
+                lease_file.unlink(missing_ok=True)
+        if host in self.held:
+            logger.info(f"🔓 Replica {self.replica_id} released {host}")
+            self.held.discard(host)
+    
+    # ---- Rebalancing ----
+    
+    def rebalance(self, hosts: Iterable[str]) -> Set[str]:
+        """
+        Heartbeat, renew held leases and acquire newly assigned targets.
+        
+        Targets that moved to another replica stay leased here until the
+        caller has stopped monitoring them and calls ``release()``.
+        
+        Args:
+            hosts: All configured targets
+        
+        Returns:
+            Targets this replica should monitor now
+        """
+        self.heartbeat()
+        ring = HashRing(self.members(), self.vnodes)
+        
+        assigned = set()
+        for host in hosts:
+            if ring.owner(host) == self.replica_id:
+                assigned.add(host)
+            elif host in self.held:
+                # Keep the lease alive until the caller hands the target off
+                self.try_acquire(host)
+        
+        for host in assigned:
+            self.try_acquire(host)
+        
+        return assigned & self.held
+    
+    def shutdown(self):
+        """Release all leases and leave the ring."""
+        for host in list(self.held):
+            self.release(host)
+        (self.members_dir / f"{self._safe(self.replica_id)}.json").unlink(missing_ok=True)
+    
+    # ---- Helpers ----
+    
+    @staticmethod
+    def _safe(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    
+    @staticmethod
+    def _read_json(path: Path) -> Optional[Dict]:
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    @staticmethod
+    def _write_json(path: Path, data: Dict):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
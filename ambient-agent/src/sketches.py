@@ -0,0 +1,387 @@
+"""Bounded-memory streaming sketches for high event rates.
+
+Exact sets of destinations and ports per process grow with traffic; these
+sketches answer the same questions in fixed memory and can be merged
+across windows (and across processes, since hashing is deterministic):
+
+- HyperLogLog: distinct counts. Relative standard error is
+  ``1.04 / sqrt(2**p)`` (p=12: 1.6%, p=8: 6.5%); small cardinalities use
+  linear counting and are close to exact.
+- CountMinSketch: frequency estimates that never undercount. With width
+  ``w = ceil(e / epsilon)`` and depth ``d = ceil(ln(1 / delta))`` the
+  overestimate is at most ``epsilon * N`` (N = total count) with
+  probability ``1 - delta``.
+- TopK: heavy hitters tracked with a CountMinSketch and a k-entry heap.
+- DecayedCountMinSketch / WindowedHyperLogLog: time-decayed variants
+  (exponential half-life, and a ring of per-window HLLs).
+
+TrafficSketches combines them into per-target port-scan and connection
+rate detection, bounded to a configurable number of tracked sources.
+"""
+
+import heapq
+import math
+import time
+from array import array
+from collections import Counter
+from hashlib import blake2b
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+def hash64(item) -> int:
+    """
+    Fast 64-bit hash that, unlike hash() of a str, is the same in every process.
+    
+    An 8-byte BLAKE2b digest of the item's bytes, so all 64 bits vary and
+    HyperLogLog and CountMinSketch estimates stay unbiased at any
+    cardinality. Sketches can be merged across processes and Python versions.
+    """
+    if not isinstance(item, bytes):
+        item = str(item).encode()
+    return int.from_bytes(blake2b(item, digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with ``2**p`` one-byte registers."""
+    
+    def __init__(self, p: int = 12):
+        if not 4 <= p <= 18:
+            raise ValueError("p must be between 4 and 18")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._rank_bits = 64 - p
+        self._rank_mask = (1 << self._rank_bits) - 1
+        if self.m >= 128:
+            self._alpha = 0.7213 / (1 + 1.079 / self.m)
+        else:
+            self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.m]
+    
+    def add_hash(self, h: int):
+        """Add an item by its 64-bit hash."""
+        index = h >> self._rank_bits
+        rank = self._rank_bits - (h & self._rank_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def add(self, item):
+        self.add_hash(hash64(item))
+    
+    def update(self, items: Iterable):
+        add_hash = self.add_hash
+        for item in items:
+            add_hash(hash64(item))
+    
+    def count(self) -> float:
+        """Estimate the number of distinct items added."""
+        registers = self.registers
+        estimate = self._alpha * self.m * self.m / sum(2.0 ** -r for r in registers)
+        if estimate <= 2.5 * self.m:
+            zeros = registers.count(0)
+            if zeros:
+                # Linear counting is more accurate for small cardinalities
+                return self.m * math.log(self.m / zeros)
+        return estimate
+    
+    def merge(self, other: "HyperLogLog"):
+        """Merge another HLL with the same precision into this one."""
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLogs with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.p)
+        clone.registers = bytearray(self.registers)
+        return clone
+    
+    def __len__(self):
+        return round(self.count())
+
+
+class CountMinSketch:
+    """Count-Min Sketch frequency estimator."""
+    
+    def __init__(self, epsilon: float = 0.001, delta: float = 0.01, width: int = 0, depth: int = 0):
+        """
+        Args:
+            epsilon: Overestimate bound as a fraction of the total count
+            delta: Probability of exceeding the bound
+            width, depth: Explicit dimensions (override epsilon/delta)
+        """
+        self.width = width or math.ceil(math.e / epsilon)
+        self.depth = depth or math.ceil(math.log(1 / delta))
+        self.rows = [self._new_row() for _ in range(self.depth)]
+        self.total = 0
+    
+    def _new_row(self):
+        return array("q", bytes(8 * self.width))
+    
+    def add_hash(self, h: int, count=1):
+        self.total += count
+        # Kirsch-Mitzenmacher: derive all row indexes from one 64-bit hash
+        index, step, width = h & 0xFFFFFFFF, (h >> 32) | 1, self.width
+        for row in self.rows:
+            row[index % width] += count
+            index += step
+    
+    def add(self, item, count=1):
+        self.add_hash(hash64(item), count)
+    
+    def estimate_hash(self, h: int):
+        index, step, width = h & 0xFFFFFFFF, (h >> 32) | 1, self.width
+        estimate = None
+        for row in self.rows:
+            value = row[index % width]
+            if estimate is None or value < estimate:
+                estimate = value
+            index += step
+        return estimate
+    
+    def estimate(self, item):
+        """Estimated count of an item (never below the true count)."""
+        return self.estimate_hash(hash64(item))
+    
+    def merge(self, other: "CountMinSketch"):
+        """Add another sketch with the same dimensions into this one."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge CountMinSketches with different dimensions")
+        for row, other_row in zip(self.rows, other.rows):
+            for i, value in enumerate(other_row):
+                if value:
+                    row[i] += value
+        self.total += other.total
+
+
+class DecayedCountMinSketch(CountMinSketch):
+    """
+    Count-Min Sketch whose counts decay exponentially with a half-life.
+    
+    Uses forward decay: an update at time t is weighted by
+    ``2 ** ((t - t0) / half_life)`` and estimates are scaled back to the
+    current time, so updates stay O(depth). Counters are rescaled before
+    the weights grow too large.
+    """
+    
+    RESCALE_AFTER = 64  # half-lives
+    
+    def __init__(self, half_life: float, epsilon: float = 0.001, delta: float = 0.01,
+                 width: int = 0, depth: int = 0, now: Optional[float] = None):
+        self.half_life = half_life
+        self.landmark = now  # Set by the first update if not given
+        super().__init__(epsilon, delta, width, depth)
+    
+    def _new_row(self):
+        return array("d", bytes(8 * self.width))
+    
+    def _weight(self, now: float) -> float:
+        if self.landmark is None:
+            self.landmark = now
+        exponent = (now - self.landmark) / self.half_life
+        if exponent > self.RESCALE_AFTER:
+            self._rescale(now)
+            exponent = 0.0
+        return 2.0 ** exponent
+    
+    def _rescale(self, now: float):
+        factor = 2.0 ** (-(now - self.landmark) / self.half_life)
+        for row in self.rows:
+            for i, value in enumerate(row):
+                if value:
+                    row[i] = value * factor
+        self.total *= factor
+        self.landmark = now
+    
+    def add_hash(self, h: int, count=1, now: Optional[float] = None):
+        super().add_hash(h, count * self._weight(time.time() if now is None else now))
+    
+    def add(self, item, count=1, now: Optional[float] = None):
+        self.add_hash(hash64(item), count, now)
+    
+    def estimate_hash(self, h: int, now: Optional[float] = None) -> float:
+        return super().estimate_hash(h) / self._weight(time.time() if now is None else now)
+    
+    def estimate(self, item, now: Optional[float] = None) -> float:
+        """Decayed count of an item at ``now``."""
+        return self.estimate_hash(hash64(item), now)
+    
+    def merge(self, other: "DecayedCountMinSketch"):
+        if other.half_life != self.half_life:
+            raise ValueError("Cannot merge sketches with different half-lives")
+        # Bring both sketches to the later landmark first
+        later = max((s.landmark for s in (self, other) if s.landmark is not None), default=None)
+        for sketch in (self, other):
+            if sketch.landmark is None:
+                sketch.landmark = later
+            elif sketch.landmark != later:
+                sketch._rescale(later)
+        super().merge(other)
+
+
+class TopK:
+    """Heavy hitters: a CountMinSketch plus a min-heap of the k largest."""
+    
+    def __init__(self, k: int = 20, sketch: Optional[CountMinSketch] = None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch(epsilon=0.0005, delta=0.01)
+        self._counts: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, Hashable]] = []
+    
+    def add(self, item, count=1):
+        h = hash64(item)
+        self.sketch.add_hash(h, count)
+        estimate = self.sketch.estimate_hash(h)
+        
+        if item in self._counts:
+            self._counts[item] = estimate
+            heapq.heappush(self._heap, (estimate, item))
+        elif len(self._counts) < self.k:
+            self._counts[item] = estimate
+            heapq.heappush(self._heap, (estimate, item))
+        elif estimate > self._min():
+            _, evicted = heapq.heappop(self._heap)
+            del self._counts[evicted]
+            self._counts[item] = estimate
+            heapq.heappush(self._heap, (estimate, item))
+        
+        # Keep the lazy heap from accumulating too many stale entries
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, i) for i, c in self._counts.items()]
+            heapq.heapify(self._heap)
+    
+    def _min(self) -> float:
+        # Drop stale entries whose count has since been updated
+        while self._heap and self._counts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0]
+    
+    def top(self, n: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """The heaviest items with their estimated counts, largest first."""
+        ranked = sorted(self._counts.items(), key=lambda kv: -kv[1])
+        return ranked[:n] if n else ranked
+
+
+class WindowedHyperLogLog:
+    """Distinct counts over a sliding window, as a ring of per-window HLLs."""
+    
+    def __init__(self, window_seconds: float = 60, windows: int = 60, p: int = 12):
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.p = p
+        self._buckets: Dict[int, HyperLogLog] = {}
+    
+    def _bucket(self, now: float) -> HyperLogLog:
+        key = int(now // self.window_seconds)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = HyperLogLog(self.p)
+            oldest = key - self.windows
+            for stale in [k for k in self._buckets if k <= oldest]:
+                del self._buckets[stale]
+        return bucket
+    
+    def add(self, item, now: Optional[float] = None):
+        self._bucket(time.time() if now is None else now).add(item)
+    
+    def count(self, last_seconds: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Distinct items seen in the last ``last_seconds`` (default: whole ring)."""
+        now = time.time() if now is None else now
+        current = int(now // self.window_seconds)
+        span = self.windows if last_seconds is None else max(1, math.ceil(last_seconds / self.window_seconds))
+        merged = HyperLogLog(self.p)
+        for key, bucket in self._buckets.items():
+            if current - span < key <= current:
+                merged.merge(bucket)
+        return merged.count()
+
+
+class TrafficSketches:
+    """
+    Per-target sketches for port-scan and connection-rate detection.
+    
+    Each call to ``observe`` sketches one analysis window of events and
+    returns findings for it; the window is then merged into long-lived,
+    time-decayed sketches kept across cycles. Memory is bounded by
+    ``max_sources`` small per-source HLLs plus fixed-size sketches.
+    """
+    
+    def __init__(self, port_scan_threshold: int = 10, high_connection_rate: int = 50,
+                 max_sources: int = 1024, source_precision: int = 8, half_life: float = 3600):
+        self.port_scan_threshold = port_scan_threshold
+        self.high_connection_rate = high_connection_rate
+        self.max_sources = max_sources
+        self.source_precision = source_precision
+        self.connections = DecayedCountMinSketch(half_life=half_life, epsilon=0.001, delta=0.01)
+        self.destinations = WindowedHyperLogLog(window_seconds=60, windows=60, p=12)
+    
+    def observe(self, events: Iterable, now: Optional[float] = None) -> List[str]:
+        """
+        Sketch one window of events and detect port scans and heavy hitters.
+        
+        Args:
+            events: NetworkEvent-like objects with pid, comm, daddr, dport
+            now: Current time (default: wall clock)
+        
+        Returns:
+            Findings as severity-tagged lines
+        """
+        # Pre-aggregate repeated flows so each distinct key is hashed once
+        return self.observe_flows(Counter((e.comm, e.pid, e.daddr, e.dport) for e in events), now)
+    
+    def observe_flows(self, flows: Counter, now: Optional[float] = None) -> List[str]:
+        """
+        Sketch one window of pre-aggregated flows (see ``observe``).
+        
+        Args:
+            flows: Counts keyed by (comm, pid, daddr, dport)
+            now: Current time (default: wall clock)
+        
+        Returns:
+            Findings as severity-tagged lines
+        """
+        now = time.time() if now is None else now
+        
+        per_source: Counter = Counter()
+        ports: Dict[Tuple[str, int], HyperLogLog] = {}
+        for (comm, pid, daddr, dport), count in flows.items():
+            source = (comm, pid)
+            per_source[source] += count
+            
+            sketch = ports.get(source)
+            if sketch is None:
+                if len(ports) >= self.max_sources:
+                    continue
+                sketch = ports[source] = HyperLogLog(self.source_precision)
+            # Distinct ports, not addr:port pairs: a client of many servers on one port isn't scanning
+            sketch.add_hash(hash64(str(dport)))
+        
+        window = TopK(k=20)
+        for (comm, pid), count in per_source.items():
+            window.add((comm, pid), count)
+            self.connections.add(f"{comm}/{pid}", count, now=now)
+        for daddr in {daddr for _, _, daddr, _ in flows}:
+            self.destinations.add(daddr, now=now)
+        
+        findings = []
+        for (comm, pid), sketch in ports.items():
+            distinct = round(sketch.count())
+            if distinct >= self.port_scan_threshold:
+                findings.append(
+                    f"[HIGH] Possible port scan: {comm} (pid {pid}) contacted ~{distinct} distinct "
+                    f"destination ports (threshold {self.port_scan_threshold})"
+                )
+        for (comm, pid), count in window.top():
+            if count >= self.high_connection_rate:
+                findings.append(
+                    f"[MEDIUM] High connection rate: {comm} (pid {pid}) made ~{count:g} connections "
+                    f"in the window (threshold {self.high_connection_rate}, "
+                    f"decayed total ~{self.connection_count(comm, pid, now):.0f})"
+                )
+        return findings
+    
+    def connection_count(self, comm: str, pid: int, now: Optional[float] = None) -> float:
+        """Time-decayed connection count of a process across all windows."""
+        return self.connections.estimate(f"{comm}/{pid}", now=now)
+    
+    def distinct_destinations(self, last_seconds: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Distinct destination addresses seen recently (default: last hour)."""
+        return self.destinations.count(last_seconds, now=now)
@@ -8,13 +8,18 @@ from langgraph.graph.message import add_messages
 class NetworkSecurityState(TypedDict):
     """State for the ambient network security agent."""
     
+    # Target being monitored in this cycle: {"host": ..., "username": ...}
+    target: dict
+    
     # Current monitoring data
     current_events: str  # Raw text from get_network_events_history
     current_stats: str   # Raw text from get_network_event_stats
     
     # Analysis results
+    local_findings: list[str]      # Findings of the local sketch-based detectors
     detected_anomalies: list[str]  # List of anomaly descriptions
     investigated_pids: list[int]   # PIDs that were investigated
+    severity: str                  # Highest severity this cycle (LLM-assessed if available)
     
     # LLM analysis
     messages: Annotated[list, add_messages]  # LangGraph messages
@@ -28,5 +33,6 @@ class NetworkSecurityState(TypedDict):
     
     # Metadata
     iteration: int  # Monitoring cycle number
+    triggered_at: float  # Epoch time of the webhook event that triggered this cycle (0 if scheduled)
     last_run: str   # ISO timestamp of last run
 
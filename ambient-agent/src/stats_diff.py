@@ -0,0 +1,210 @@
+"""Differential network statistics.
+
+Parses the text of ``get_network_event_stats`` into sections of counters
+(processes, destinations, ports, ...) and computes the compact delta
+between two snapshots: new entries, disappeared entries and rate changes
+above a relative threshold. Only this delta is sent to the LLM, and an
+empty delta means there is nothing new to learn.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+Stats = Dict[str, Dict[str, float]]
+
+SUMMARY_SECTION = "summary"
+
+_ENTRY = re.compile(
+    r"^[\s\-*•]*(?P<key>.+?)\s*(?::|=|\s{2,}|\t)\s*(?P<value>-?\d+(?:\.\d+)?)(?:[\s(%,].*)?$"
+)
+
+
+def _section_name(header: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", header.lower()).strip("_")
+
+
+def _flatten_json(data, prefix="") -> Stats:
+    stats: Stats = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            if all(isinstance(v, (int, float)) for v in value.values()):
+                stats[_section_name(f"{prefix}{key}")] = {str(k): float(v) for k, v in value.items()}
+            else:
+                for section, entries in _flatten_json(value, f"{prefix}{key}_").items():
+                    stats[section] = entries
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            stats.setdefault(SUMMARY_SECTION, {})[f"{prefix}{key}"] = float(value)
+    return stats
+
+
+def parse_stats(text: str) -> Stats:
+    """
+    Parse network event statistics into sections of counters.
+    
+    Understands JSON output as well as the usual text layout::
+    
+        Total events: 1234
+        Top Processes:
+          curl: 20
+          - sshd (pid 812): 15
+    
+    Args:
+        text: Output of get_network_event_stats
+    
+    Returns:
+        Mapping of section name to {entry: value}. Top-level values go
+        into the 'summary' section.
+    """
+    text = (text or "").strip()
+    if text.startswith("{"):
+        try:
+            return _flatten_json(json.loads(text))
+        except ValueError:
+            pass
+    
+    stats: Stats = {}
+    section = SUMMARY_SECTION
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            # A blank line ends the current section
+            section = SUMMARY_SECTION
+            continue
+        
+        entry = _ENTRY.match(line)
+        if entry:
+            stats.setdefault(section, {})[entry.group("key").strip()] = float(entry.group("value"))
+        elif line.endswith(":"):
+            section = _section_name(line[:-1].strip("#=-* ")) or SUMMARY_SECTION
+    
+    return stats
+
+
+@dataclass
+class StatsDelta:
+    """Differences between two statistics snapshots."""
+    
+    new: Stats = field(default_factory=dict)
+    disappeared: Stats = field(default_factory=dict)
+    changed: Dict[str, Dict[str, Tuple[float, float]]] = field(default_factory=dict)
+    
+    def is_empty(self) -> bool:
+        return not (self.new or self.disappeared or self.changed)
+    
+    def format(self, max_entries: int = 20) -> str:
+        """
+        Render the delta as compact text for prompts.
+        
+        Args:
+            max_entries: Maximum entries listed per section and kind
+        
+        Returns:
+            Text listing new, disappeared and changed entries, or "" if empty
+        """
+        lines = []
+        for label, entries_by_section in (("New", self.new), ("Disappeared", self.disappeared)):
+            for section, entries in sorted(entries_by_section.items()):
+                items = sorted(entries.items(), key=lambda kv: -kv[1])
+                shown = ", ".join(f"{k} ({v:g})" for k, v in items[:max_entries])
+                more = f" (+{len(items) - max_entries} more)" if len(items) > max_entries else ""
+                lines.append(f"{label} {section}: {shown}{more}")
+        
+        for section, entries in sorted(self.changed.items()):
+            items = sorted(entries.items(), key=lambda kv: -abs(kv[1][1] - kv[1][0]))
+            shown = ", ".join(f"{k} {old:g}→{new:g}" for k, (old, new) in items[:max_entries])
+            more = f" (+{len(items) - max_entries} more)" if len(items) > max_entries else ""
+            lines.append(f"Changed {section}: {shown}{more}")
+        
+        return "\n".join(lines)
+
+
+def diff_stats(current: Stats, reference: Optional[Stats], change_threshold: float = 0.5,
+               min_count: float = 5, include_disappeared: bool = True) -> StatsDelta:
+    """
+    Compute the delta of a statistics snapshot against a reference.
+    
+    Args:
+        current: Parsed statistics of this cycle
+        reference: Previous cycle or baseline profile (None: everything is new)
+        change_threshold: Minimum relative change (0.5 = ±50%) to report
+        min_count: Entries where both values are below this are ignored
+        include_disappeared: Report entries missing from the current snapshot
+            (not useful against a baseline profile, which keeps old entries)
+    
+    Returns:
+        StatsDelta with new, disappeared and changed entries
+    """
+    reference = reference or {}
+    delta = StatsDelta()
+    
+    for section in current.keys() | reference.keys():
+        now = current.get(section, {})
+        before = reference.get(section, {})
+        
+        new = {k: v for k, v in now.items() if k not in before and v >= min_count}
+        gone = {}
+        if include_disappeared:
+            gone = {k: v for k, v in before.items() if k not in now and v >= min_count}
+        changed = {}
+        for key in now.keys() & before.keys():
+            old, cur = before[key], now[key]
+            if max(old, cur) < min_count:
+                continue
+            if abs(cur - old) / max(abs(old), 1e-9) >= change_threshold:
+                changed[key] = (old, cur)
+        
+        if new:
+            delta.new[section] = new
+        if gone:
+            delta.disappeared[section] = gone
+        if changed:
+            delta.changed[section] = changed
+    
+    return delta
+
+
+def merge_into_profile(profile: Optional[Stats], current: Stats, smoothing: float = 0.3) -> Stats:
+    """
+    Fold a snapshot into a baseline profile with exponential smoothing.
+    
+    Entries seen for the first time are adopted as-is; known entries move
+    towards the new value by ``smoothing``. Entries missing from the
+    snapshot are kept, so a quiet cycle doesn't erase the baseline.
+    
+    Args:
+        profile: Existing baseline profile
+        current: Parsed statistics of this cycle
+        smoothing: Weight of the newest snapshot (0-1)
+    
+    Returns:
+        Updated profile (a new dict)
+    """
+    merged: Stats = {section: dict(entries) for section, entries in (profile or {}).items()}
+    for section, entries in current.items():
+        target = merged.setdefault(section, {})
+        for key, value in entries.items():
+            if key in target:
+                target[key] = round(target[key] + smoothing * (value - target[key]), 3)
+            else:
+                target[key] = value
+    return merged
+
+
+def summarize_profile(profile: Optional[Stats]) -> str:
+    """
+    Summarize a baseline profile in one line per section.
+    
+    Args:
+        profile: Baseline profile
+    
+    Returns:
+        Compact text with the number of known entries per section
+    """
+    if not profile:
+        return "No baseline yet"
+    return "\n".join(
+        f"Known {section}: {len(entries)} entries"
+        for section, entries in sorted(profile.items())
+    )
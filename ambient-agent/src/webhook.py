@@ -0,0 +1,247 @@
+"""Webhook receiver for push-triggered monitoring cycles.
+
+The eBPF side, the MCP server or any other source can POST a JSON
+notification to trigger an immediate out-of-band cycle for a target
+instead of waiting for the next ``monitoring_interval``:
+
+    curl -X POST http://localhost:8080/events \\
+         -H 'Content-Type: application/json' \\
+         -d '{"host": "bastion.example.com", "reason": "burst of connections"}'
+
+Triggers are debounced per target and rate limited globally. With
+sharding, a replica accepts events only for the targets leased to it and
+answers 409 for the others, so the sender can retry another replica. The
+time from the event to the alert is recorded as ``event_to_alert_seconds``.
+
+Without a ``token`` the listener only starts on a loopback address.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for the tiny HTTP server
+MAX_BODY_BYTES = 64 * 1024
+READ_TIMEOUT = 5.0
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+class CycleTrigger:
+    """Per-target wake-ups for out-of-band cycles."""
+    
+    def __init__(self, hosts: Iterable[str], debounce_seconds: float = 30.0, max_triggers_per_minute: int = 30,
+                 owned: Optional[Set[str]] = None):
+        """
+        Args:
+            hosts: Hosts that can be triggered
+            debounce_seconds: Minimum time between two cycles of one target
+            max_triggers_per_minute: Global limit of accepted triggers
+            owned: Hosts monitored by this replica when sharding (None: all)
+        """
+        self.debounce_seconds = debounce_seconds
+        self.max_triggers_per_minute = max_triggers_per_minute
+        self.owned = owned
+        self._events: Dict[str, asyncio.Event] = {host: asyncio.Event() for host in hosts}
+        self._pending: Dict[str, float] = {}
+        self._last_cycle: Dict[str, float] = {}
+        self._accepted: deque = deque()
+    
+    @property
+    def hosts(self) -> list[str]:
+        return list(self._events)
+    
+    def set_owned(self, hosts: Set[str]):
+        """Record the hosts leased to this replica; pending triggers of others are dropped."""
+        self.owned = set(hosts)
+        for host in list(self._pending):
+            if host not in self.owned:
+                del self._pending[host]
+                self._events[host].clear()
+    
+    def fire(self, host: str, event_time: Optional[float] = None, reason: str = "") -> str:
+        """
+        Request an immediate cycle for a target.
+        
+        Args:
+            host: Target host
+            event_time: When the event happened (epoch seconds), default now
+            reason: Free-text reason for the log
+        
+        Returns:
+            'triggered', 'coalesced' (a trigger is already pending),
+            'rate_limited', 'unknown_host' or 'not_owned' (another
+            replica monitors the host)
+        """
+        if host not in self._events:
+            return "unknown_host"
+        if self.owned is not None and host not in self.owned:
+            metrics.incr("webhook_events", result="not_owned")
+            return "not_owned"
+        
+        event_time = event_time or time.time()
+        if host in self._pending:
+            # Keep the earliest event so event-to-alert latency stays honest
+            self._pending[host] = min(self._pending[host], event_time)
+            metrics.incr("webhook_events", result="coalesced")
+            return "coalesced"
+        
+        now = time.monotonic()
+        while self._accepted and now - self._accepted[0] > 60:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.max_triggers_per_minute:
+            metrics.incr("webhook_events", result="rate_limited")
+            return "rate_limited"
+        
+        self._accepted.append(now)
+        self._pending[host] = event_time
+        self._events[host].set()
+        metrics.incr("webhook_events", result="triggered")
+        logger.info(f"⚡ Out-of-band cycle requested for {host}: {reason or 'no reason given'}")
+        return "triggered"
+    
+    async def wait(self, host: str, timeout: float) -> Optional[float]:
+        """
+        Wait for the next trigger of a target or the regular interval.
+        
+        A trigger that arrives within ``debounce_seconds`` of the previous
+        cycle is held back until the debounce window has passed.
+        
+        Args:
+            host: Target host
+            timeout: Regular monitoring interval in seconds
+        
+        Returns:
+            Event time of the trigger, or None if the interval elapsed
+        """
+        event = self._events[host]
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        
+        since_last = time.monotonic() - self._last_cycle.get(host, float("-inf"))
+        if since_last < self.debounce_seconds:
+            await asyncio.sleep(self.debounce_seconds - since_last)
+        
+        event.clear()
+        return self._pending.pop(host, None)
+    
+    def cycle_started(self, host: str):
+        """Record that a cycle for the target has started."""
+        self._last_cycle[host] = time.monotonic()
+
+
+class WebhookServer:
+    """Minimal async HTTP listener that feeds a CycleTrigger."""
+    
+    def __init__(self, trigger: CycleTrigger, host: str = "0.0.0.0", port: int = 8080,
+                 path: str = "/events", token: str = ""):
+        self.trigger = trigger
+        self.host = host
+        self.port = port
+        self.path = path
+        self.token = token
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self):
+        """
+        Start listening; the bound port is available as ``self.port``.
+        
+        Raises:
+            ValueError: No token is set and the host is not a loopback address
+        """
+        if not self.token and self.host not in LOOPBACK_HOSTS:
+            raise ValueError(f"Refusing to start the webhook on {self.host} without a token; "
+                             f"set webhook.token (or WEBHOOK_TOKEN), or bind 127.0.0.1")
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🔔 Webhook listening on {self.host}:{self.port}{self.path}")
+    
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            status, body = await asyncio.wait_for(self._process(reader), timeout=READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            status, body = 408, {"error": "request timeout"}
+        except Exception as e:
+            logger.error(f"❌ Webhook request failed: {e}")
+            status, body = 400, {"error": "bad request"}
+        
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+    
+    async def _process(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        method, _, rest = request_line.partition(" ")
+        path = rest.split(" ", 1)[0]
+        
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        if method == "GET" and path == "/healthz":
+            return 200, {"status": "ok"}
+        if path != self.path:
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "method not allowed"}
+        if self.token and not hmac.compare_digest(headers.get("x-webhook-token", "").encode(), self.token.encode()):
+            return 401, {"error": "unauthorized"}
+        
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "payload too large"}
+        event = json.loads(await reader.readexactly(length) or b"{}")
+        
+        host = event.get("host")
+        if not host:
+            return 400, {"error": "missing 'host'"}
+        
+        event_time = event.get("timestamp")
+        if isinstance(event_time, str):
+            event_time = datetime.fromisoformat(event_time).timestamp()
+        
+        result = self.trigger.fire(host, event_time=event_time, reason=event.get("reason", ""))
+        status = {"triggered": 202, "coalesced": 202, "rate_limited": 429, "unknown_host": 404,
+                  "not_owned": 409}[result]
+        return status, {"result": result, "host": host}
+
+
+_REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests",
+}
+
+
+def record_event_to_alert(triggered_at: float, kind: str):
+    """Record the latency from a triggering event to an alert of the given kind."""
+    if triggered_at:
+        metrics.observe("event_to_alert_seconds", time.time() - triggered_at, kind=kind)
@@ -0,0 +1,131 @@
+"""Test the known-good traffic allowlist."""
+
+import fnmatch
+import ipaddress
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.allowlist import Allowlist, AllowlistRegistry, Rule, parse_whitelist
+
+RULES = [
+    {"name": "ntp", "comm": "chronyd", "dport": 123},
+    {"name": "ssh", "comm": "sshd"},
+    {"name": "mirrors", "comm": ["dnf", "yum"], "daddr": ["203.0.113.0/24", "2001:db8::/32"], "dport": [80, 443]},
+    {"name": "monitoring", "daddr": "10.20.0.0/16"},
+    {"name": "collector", "daddr": "192.0.2.10"},
+    {"name": "ephemeral", "dport": "50000-50100"},
+    {"name": "kworkers", "comm": "kworker*"},
+    {"name": "java-app", "comm": "java*", "dport": "8000-8100"},
+]
+
+
+def reference(comm, daddr, dport):
+    """Naive matcher: every rule, every field."""
+    for entry in RULES:
+        rule = Rule.from_config(entry)
+        if rule.comms and not (comm and any(fnmatch.fnmatchcase(comm, c) for c in rule.comms)):
+            continue
+        if rule.addresses:
+            if not daddr:
+                continue
+            ip = ipaddress.ip_address(daddr)
+            if not any(ip in ipaddress.ip_network(a, strict=False) for a in rule.addresses):
+                continue
+        if rule.ports and not (dport and any(low <= dport <= high for low, high in rule.ports)):
+            continue
+        return True
+    return False
+
+
+def test_match():
+    """Compiled lookups agree with a naive matcher."""
+    allowlist = Allowlist(Rule.from_config(entry, i) for i, entry in enumerate(RULES))
+    assert allowlist.match("chronyd", "198.51.100.1", 123) == "ntp"
+    assert allowlist.match("chronyd", "198.51.100.1", 4444) is None
+    assert allowlist.match("dnf", "203.0.113.77", 443) == "mirrors"
+    assert allowlist.match("dnf", "2001:db8::5", 80) == "mirrors"
+    assert allowlist.match("dnf", "198.51.100.1", 443) is None
+    assert allowlist.match("curl", "10.20.3.4", 9999) == "monitoring"
+    assert allowlist.match("curl", "::ffff:10.20.3.4", 9999) == "monitoring"
+    assert allowlist.match("curl", "192.0.2.10", 1) == "collector"
+    assert allowlist.match("curl", "192.0.2.11", 50050) == "ephemeral"
+    assert allowlist.match("kworker/u8:2", "198.51.100.1", 1) == "kworkers"
+    assert allowlist.match("java", None, 8080) == "java-app"
+    # Missing fields only match rules that don't constrain them
+    assert allowlist.match("java", None, None) is None
+    assert allowlist.match("sshd") == "ssh"
+    
+    rng = random.Random(3)
+    comms = ["chronyd", "sshd", "dnf", "yum", "curl", "nc", "kworker/0:1", "javac", "java"]
+    addresses = ["203.0.113.9", "198.51.100.1", "10.20.255.1", "10.21.0.1", "192.0.2.10", "2001:db8::1", "2001:db9::1", ""]
+    for _ in range(5000):
+        comm, daddr = rng.choice(comms), rng.choice(addresses)
+        dport = rng.choice([0, 22, 80, 123, 443, 8050, 50000, 50101, rng.randrange(1, 65536)])
+        expected = reference(comm, daddr or None, dport or None)
+        assert (allowlist.match(comm, daddr or None, dport or None) is not None) == expected, (comm, daddr, dport)
+    print(" Compiled allowlist agrees with the naive matcher")
+
+
+def test_filter_flows_and_findings():
+    """Allowed flows and findings are dropped and counted per rule."""
+    allowlist = Allowlist(Rule.from_config(entry, i) for i, entry in enumerate(RULES))
+    flows = Counter({
+        ("chronyd", 812, "198.51.100.1", 123): 40,
+        ("sshd", 900, "10.0.0.9", 22): 25,
+        ("nc", 1002, "198.51.100.1", 4444): 5,
+    })
+    assert allowlist.filter_flows(flows) == Counter({("nc", 1002, "198.51.100.1", 4444): 5})
+    assert allowlist.dropped == Counter({"ntp": 40, "ssh": 25})
+    
+    text = (
+        "Detected anomalies:\n"
+        "[HIGH] Possible port scan: pid 1002 (nc) contacted 20 distinct ports on 198.51.100.1\n"
+        "[MEDIUM] High connection rate: sshd (pid 900) made ~300 connections\n"
+        "[MEDIUM] Unusual port: pid 812 (chronyd) to 198.51.100.1 port 123\n"
+        "[HIGH] Possible port scan: pid 1300 (sshd) contacted 40 distinct ports on 198.51.100.1\n"
+        "[HIGH] Unusual port: pid 812 (chronyd) to 198.51.100.1 port 123"
+    )
+    # Findings are only filtered when enabled
+    assert allowlist.filter_findings(text) == text
+    allowlist = Allowlist((Rule.from_config(entry, i) for i, entry in enumerate(RULES)), filter_findings=True)
+    filtered = allowlist.filter_findings(text)
+    assert "nc" in filtered and "made ~300" not in filtered and "chronyd" not in filtered
+    # A comm-only rule doesn't drop HIGH findings: anything can be named sshd
+    assert "pid 1300 (sshd)" in filtered
+    assert filtered.startswith("Detected anomalies:")
+    print(" Allowed flows and findings dropped")
+
+
+def test_learning():
+    """Suggested processes are allowed after enough votes, never for risky names."""
+    assert parse_whitelist("- Whitelist Processes: [sshd, chronyd]\n- Expected Behaviors: []") == ["sshd", "chronyd"]
+    assert parse_whitelist("- Whitelist Processes: []") == []
+    assert parse_whitelist("Whitelist processes: rsyslogd, 'crond'") == ["rsyslogd", "crond"]
+    
+    registry = AllowlistRegistry(learn=True, min_votes=2, never=["nc", "python*"], filter_findings=True)
+    answer = "- Whitelist Processes: [rsyslogd, nc, python3, kworker*]"
+    assert registry.learn("a", parse_whitelist(answer)) == []
+    assert registry.get("a").match("rsyslogd", "10.0.0.1", 514) is None
+    assert registry.learn("a", parse_whitelist(answer)) == ["rsyslogd"]
+    assert registry.get("a").match("rsyslogd", "10.0.0.1", 514) == "learned:rsyslogd"
+    assert registry.get("a").match("nc") is None
+    # Learned rules drop lower findings, never HIGH or CRITICAL ones
+    findings = ("[MEDIUM] High connection rate: rsyslogd (pid 700) made ~90 connections\n"
+                "[CRITICAL] Reverse shell: rsyslogd (pid 701) to 198.51.100.1 port 4444")
+    assert registry.get("a").filter_findings(findings) == findings.splitlines()[1]
+    # Learning is opt-in
+    assert AllowlistRegistry().learn("a", ["rsyslogd"] * 3) == []
+    # Learned entries are per target
+    assert registry.get("b").match("rsyslogd") is None
+    print(" Learned allowlist entries")
+
+
+if __name__ == "__main__":
+    test_match()
+    test_filter_flows_and_findings()
+    test_learning()
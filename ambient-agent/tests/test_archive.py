@@ -0,0 +1,122 @@
+"""Test the local network event archive."""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.archive import HEADER, RECORD, EventArchive
+from src.events import NetworkEvent
+
+HOST = "bastion.example.com"
+START = 1_760_000_400.0  # An hour boundary
+
+
+def make_event(offset: float, pid: int = 1001, comm: str = "curl", dport: int = 443) -> NetworkEvent:
+    return NetworkEvent(START + offset, pid, comm, "TCP", "10.0.0.5", 40000, "203.0.113.7", dport, "CONNECT")
+
+
+def test_append_and_query():
+    """Events are partitioned by hour and queried by time range and filters."""
+    with tempfile.TemporaryDirectory() as path:
+        archive = EventArchive(path)
+        events = [make_event(i * 60, pid=1000 + i % 3, dport=22 if i % 2 else 443) for i in range(150)]
+        
+        assert archive.append(HOST, events) == 150
+        assert len(archive.segments(HOST)) == 3  # 150 minutes span three hours
+        assert archive.query(HOST, START, START + 3 * 3600)[0] == events[0]
+        
+        # Time range across a segment boundary
+        window = archive.query(HOST, START + 50 * 60, START + 70 * 60)
+        assert [e.timestamp for e in window] == [START + i * 60 for i in range(50, 71)]
+        
+        # Segments outside the range aren't opened
+        assert len(archive.segments(HOST, START + 125 * 60, START + 130 * 60)) == 1
+        
+        assert all(e.pid == 1001 for e in archive.query(HOST, START, START + 3 * 3600, pid=1001))
+        assert len(archive.query(HOST, START, START + 3 * 3600, dport=22, limit=5)) == 5
+        assert "Top Ports:\n  443: 75\n  22: 75" in archive.summarize(HOST, START, START + 3 * 3600)
+    print(" Events archived and queried")
+
+
+def test_overlapping_windows():
+    """Events already archived by the previous cycle aren't written again."""
+    with tempfile.TemporaryDirectory() as path:
+        archive = EventArchive(path)
+        assert archive.append(HOST, [make_event(i) for i in range(10)]) == 10
+        assert archive.append(HOST, [make_event(i) for i in range(5, 15)]) == 5
+        
+        # A new process reads the index from disk
+        reopened = EventArchive(path)
+        assert len(reopened.query(HOST, START, START + 60)) == 15
+    print(" Overlapping analysis windows deduplicated")
+
+
+def test_events_at_high_water_and_untimed():
+    """Events sharing the newest timestamp are kept once; events without a time aren't archived."""
+    with tempfile.TemporaryDirectory() as path:
+        archive = EventArchive(path)
+        untimed = make_event(0)._replace(timestamp=0.0)
+        assert archive.append(HOST, [make_event(0), make_event(10, pid=1), untimed]) == 2
+        
+        # The next window ends at the same second: the new event at it is written, the old one isn't
+        window = [make_event(0), make_event(10, pid=1), make_event(10, pid=2), untimed]
+        assert archive.append(HOST, window) == 1
+        assert archive.append(HOST, window) == 0
+        assert EventArchive(path).append(HOST, window + [make_event(10, pid=3)]) == 1
+        
+        assert sorted(e.pid for e in archive.query(HOST, START, START + 60)) == [1, 2, 3, 1001]
+    print(" Events at the high water mark kept once, untimed events skipped")
+
+
+def test_retention_and_compaction():
+    """Closed segments are compacted and expired ones deleted."""
+    with tempfile.TemporaryDirectory() as path:
+        archive = EventArchive(path, retention_hours=24, compact_after_hours=1)
+        # Two identical events in the same second (a retry loop) are both real
+        archive.append(HOST, [make_event(i) for i in range(10)] + [make_event(9)])
+        archive.append(HOST, [make_event(3600 * 30)])
+        
+        # Records out of time order (e.g. appended by another writer) are sorted
+        segment = archive.segments(HOST)[0]
+        data = segment.read_bytes()
+        split = HEADER.size + RECORD.size * 4
+        segment.write_bytes(data[:HEADER.size] + data[split:] + data[HEADER.size:split])
+        
+        now = START + 3600 * 30
+        assert archive.maintain(HOST, now=START + 3600 * 3) is True
+        assert archive.maintain(HOST, now=START + 3600 * 3 + 10) is False
+        assert archive._index(HOST)["segments"][segment.stem]["count"] == 11
+        events = archive.query(HOST, START, START + 60)
+        assert len(events) == 11 and [e.timestamp for e in events] == sorted(e.timestamp for e in events)
+        
+        assert archive.enforce_retention(HOST, now=now) == 1
+        assert not segment.exists()
+        assert len(archive.query(HOST, START, now)) == 1
+    print(" Retention and compaction applied")
+
+
+def test_query_speed():
+    """A day of events is queried from the memory-mapped segments quickly."""
+    with tempfile.TemporaryDirectory() as path:
+        archive = EventArchive(path)
+        archive.append(HOST, [make_event(i * 2.0, pid=i % 50) for i in range(43200)])
+        
+        started = time.perf_counter()
+        events = archive.query(HOST, START, START + 86400, pid=7)
+        elapsed = time.perf_counter() - started
+        
+        assert len(events) == 864
+        assert elapsed < 1.0
+    print(f" 24h lookback over 43200 events in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    test_append_and_query()
+    test_overlapping_windows()
+    test_events_at_high_water_and_untimed()
+    test_retention_and_compaction()
+    test_query_speed()
@@ -0,0 +1,95 @@
+"""Test local IP enrichment."""
+
+import ipaddress
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.enrichment import IPEnricher, PrefixDatabase, build_database, read_source
+from src.metrics import metrics
+
+
+def test_database_lookup():
+    """Lookups in the memory-mapped database return the most specific network."""
+    rng = random.Random(5)
+    networks = [("0.0.0.0/0", "default"), ("2001:db8::/32", "doc-v6"), ("2001:db8:1::/48", "doc-v6-1")]
+    for i in range(300):
+        length = rng.choice([8, 12, 16, 20, 24, 28, 32])
+        address = ipaddress.ip_address(rng.getrandbits(32))
+        networks.append((f"{address}/{length}", f"tag{i % 40}"))
+    # The same network twice joins the tags
+    networks += [("198.51.100.0/24", "hosting"), ("198.51.100.0/24", "known-bad")]
+    
+    def reference(address: str):
+        ip = ipaddress.ip_address(address)
+        best = None
+        for network, _ in networks:
+            net = ipaddress.ip_network(network, strict=False)
+            if ip.version == net.version and ip in net and (best is None or net.prefixlen > best.prefixlen):
+                best = net
+        if best is None:
+            return None
+        return ", ".join(tag for network, tag in networks if ipaddress.ip_network(network, strict=False) == best)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/test.ipdb"
+        build_database(networks, path)
+        database = PrefixDatabase(path)
+        assert database.lookup("198.51.100.7") == "hosting, known-bad"
+        assert database.lookup("::ffff:198.51.100.7") == "hosting, known-bad"
+        assert database.lookup("2001:db8:1::5") == "doc-v6-1"
+        assert database.lookup("2001:db8:2::5") == "doc-v6"
+        assert database.lookup("2001:db9::1") is None
+        assert database.lookup("not an address") is None
+        
+        for _, (network, _) in zip(range(150), rng.sample(networks, len(networks))):
+            first = int(ipaddress.ip_network(network, strict=False).network_address)
+            for candidate in (first, first - 1, first + rng.randrange(256), rng.getrandbits(32)):
+                address = str(ipaddress.ip_address(candidate % 2**32))
+                assert database.lookup(address) == reference(address), address
+        database.close()
+    print(" Database lookups match the most specific network")
+
+
+def test_annotate_and_cache():
+    """Addresses in anomaly text are tagged once, from the LRU cache when hot."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "asn.csv"
+        source.write_text("# network,tag\n198.51.100.0/24,AS64500 Example Hosting\nbogus,skipped\n")
+        build_database(read_source(str(source)), f"{tmp}/asn.ipdb")
+        enricher = IPEnricher(
+            zones={"internal": ["10.0.0.0/8"], "dmz": "10.9.0.0/16"},
+            databases={"asn": PrefixDatabase(f"{tmp}/asn.ipdb")},
+            cache_size=2
+        )
+        text = (
+            "[HIGH] Possible port scan: pid 1002 (nc) contacted 20 distinct ports on 198.51.100.7\n"
+            "[MEDIUM] pid 900 (sshd) to 10.9.1.1:22 at 12:30:45, again 198.51.100.7, 93.184.216.34 and fe80::1"
+        )
+        annotated = enricher.annotate(text)
+        assert "198.51.100.7 [asn:AS64500 Example Hosting]\n" in annotated
+        assert annotated.count("[asn:") == 1
+        assert "10.9.1.1 [zone:dmz]:22" in annotated
+        assert "93.184.216.34 and" in annotated
+        assert "fe80::1 [private]" in annotated
+        assert "12:30:45," in annotated
+        
+        metrics.reset()
+        enricher.tags("198.51.100.7")
+        enricher.tags("198.51.100.7")
+        assert metrics.total("enrichment_cache_hits") == 1
+        enricher.tags("10.0.0.1")
+        enricher.tags("10.0.0.2")
+        # Least recently used entry evicted
+        assert "198.51.100.7" not in enricher._cache and len(enricher._cache) == 2
+        enricher.close()
+    print(" Anomaly text annotated")
+
+
+if __name__ == "__main__":
+    test_database_lookup()
+    test_annotate_and_cache()
@@ -0,0 +1,160 @@
+"""Test the priority-ordered LLM dispatcher."""
+
+import asyncio
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.config import load_config
+from src.llm_dispatch import LLMDispatcher, TokenRateLimiter, split_host_sections
+from src.llm_router import ModelRouter
+from src.metrics import metrics
+
+
+class FakeRouter:
+    """Router stand-in that records calls and answers from a function."""
+    
+    def __init__(self, answer, delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = []
+    
+    def route(self, task, severity=None):
+        return SimpleNamespace(kind="llm", max_tokens=100)
+    
+    async def ainvoke(self, task, messages, severity=None, on_line=None, template_vars=None):
+        self.calls.append((task, severity, messages))
+        await asyncio.sleep(self.delay)
+        return AIMessage(content=self.answer(messages))
+
+
+def _config(**dispatch):
+    return {
+        "target": {"host": "a", "username": "u"},
+        "targets": [{"host": "a"}, {"host": "b"}],
+        "llm_dispatch": dispatch,
+        "prompts": {
+            "anomaly_analysis_batch": {"system": "sys", "user_template": "{batch_text}"},
+        },
+    }
+
+
+def test_priority_order():
+    """Higher severity requests are served first."""
+    router = FakeRouter(lambda messages: "ok", delay=0.01)
+    dispatcher = LLMDispatcher(router, _config(max_concurrency=1))
+    
+    async def run():
+        first = asyncio.create_task(dispatcher.submit("report_generation", [HumanMessage(content="busy")], "MEDIUM"))
+        await asyncio.sleep(0)
+        rest = [
+            asyncio.create_task(dispatcher.submit("report_generation", [HumanMessage(content=s)], s))
+            for s in ["MEDIUM", "HIGH", "CRITICAL"]
+        ]
+        await asyncio.gather(first, *rest)
+        await dispatcher.close()
+    
+    asyncio.run(run())
+    
+    order = [severity for _, severity, _ in router.calls]
+    assert order == ["MEDIUM", "CRITICAL", "HIGH", "MEDIUM"]
+    print(" Requests served by severity")
+
+
+def test_rate_limit_waiters_by_priority():
+    """A low-priority request waiting for budget doesn't hold back a critical one."""
+    async def run():
+        limiter = TokenRateLimiter(6000)  # 100 tokens per second
+        await limiter.acquire(6000)
+        order = []
+        
+        async def spend(name, tokens, priority):
+            await limiter.acquire(tokens, priority)
+            order.append(name)
+        
+        low = asyncio.create_task(spend("low", 50, 0))
+        await asyncio.sleep(0.1)
+        critical = asyncio.create_task(spend("critical", 20, -4))
+        await asyncio.wait_for(asyncio.gather(low, critical), timeout=3)
+        return order
+    
+    assert asyncio.run(run()) == ["critical", "low"]
+    print(" Rate-limited requests served by priority")
+
+
+def test_batching_splits_per_host():
+    """Low-severity requests from several hosts share one LLM call."""
+    metrics.reset()
+    
+    def answer(messages):
+        return "### HOST: a\n- Overall Severity: LOW\n### HOST: b\n- Overall Severity: MEDIUM"
+    
+    router = FakeRouter(answer)
+    dispatcher = LLMDispatcher(router, _config(batching={"enabled": True, "window_seconds": 0.05}))
+    
+    async def run():
+        results = await asyncio.gather(
+            dispatcher.submit("anomaly_analysis", [HumanMessage(content="anomalies a")], "MEDIUM", host="a"),
+            dispatcher.submit("anomaly_analysis", [HumanMessage(content="anomalies b")], "MEDIUM", host="b"),
+        )
+        await dispatcher.close()
+        return results
+    
+    result_a, result_b = asyncio.run(run())
+    
+    assert len(router.calls) == 1
+    assert "### HOST: a\nanomalies a" in router.calls[0][2][-1].content
+    assert result_a.content == "- Overall Severity: LOW"
+    assert result_b.content == "- Overall Severity: MEDIUM"
+    assert len(metrics.samples("llm_queue_wait_seconds", severity="MEDIUM")) == 2
+    print(" Batched response split per host")
+
+
+def test_batch_falls_back_to_template():
+    """A batch whose LLM tier fails gets one templated section per host."""
+    metrics.reset()
+    config = copy.deepcopy(load_config())
+    config.update(_config(batching={"enabled": True, "window_seconds": 0.05}))
+    router = ModelRouter(config)
+    router.tiers["small"].llm = GenericFakeChatModel(messages=iter([]))  # raises when called
+    dispatcher = LLMDispatcher(router, config)
+    
+    async def run():
+        results = await asyncio.gather(*(
+            dispatcher.submit("anomaly_analysis", [HumanMessage(content=f"anomalies {host}")], "MEDIUM", host=host,
+                              template_vars={"anomalies_text": f"anomalies {host}", "severity": severity})
+            for host, severity in (("a", "MEDIUM"), ("b", "LOW"))
+        ))
+        await dispatcher.close()
+        return results
+    
+    result_a, result_b = asyncio.run(run())
+    assert metrics.counter("llm_batches", task="anomaly_analysis") == 1
+    assert metrics.counter("llm_tier_fallbacks", tier="small") == 1
+    assert result_a.content.startswith("- Overall Severity: MEDIUM")
+    assert result_b.content.startswith("- Overall Severity: LOW")
+    # Requests routed to the template tier aren't batched at all
+    assert not dispatcher._is_batchable(SimpleNamespace(host="a", task="anomaly_analysis", severity="LOW"))
+    print(" Batch fell back to per-host templates")
+
+
+def test_split_host_sections():
+    """Host sections are split on their headers."""
+    sections = split_host_sections("preamble\n### HOST: web-01\nA\nB\n## HOST: db-01\nC")
+    assert sections == {"web-01": "A\nB", "db-01": "C"}
+    print(" Host sections parsed")
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_rate_limit_waiters_by_priority()
+    test_batching_splits_per_host()
+    test_batch_falls_back_to_template()
+    test_split_host_sections()
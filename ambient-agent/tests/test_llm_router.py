@@ -0,0 +1,76 @@
+"""Test severity-tiered model routing."""
+
+import asyncio
+import copy
+import sys
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.config import load_config
+from src.llm_router import ModelRouter
+from src.metrics import metrics
+
+
+def _router():
+    config = copy.deepcopy(load_config())
+    return ModelRouter(config)
+
+
+def test_routes_by_task_and_severity():
+    """Routes from config.yaml pick the expected tiers."""
+    router = _router()
+    
+    assert router.route("anomaly_analysis", "LOW").name == "template"
+    assert router.route("anomaly_analysis", "MEDIUM").name == "small"
+    assert router.route("report_generation", "CRITICAL").name == "large"
+    assert router.route("baseline_learning", None).name == "small"
+    print(" Routing table matches config")
+
+
+def test_template_tier_and_usage():
+    """Template tiers answer without an LLM and usage is reported per tier."""
+    metrics.reset()
+    router = _router()
+    router.tiers["small"].llm = GenericFakeChatModel(messages=iter([AIMessage(content="- Overall Severity: MEDIUM")]))
+    
+    templated = asyncio.run(router.ainvoke(
+        "anomaly_analysis", [HumanMessage(content="x")], severity="LOW",
+        template_vars={"anomalies_text": "a", "severity": "LOW"}
+    ))
+    routed = asyncio.run(router.ainvoke("anomaly_analysis", [HumanMessage(content="x")], severity="MEDIUM"))
+    
+    assert "Overall Severity: LOW" in templated.content
+    assert routed.content == "- Overall Severity: MEDIUM"
+    
+    usage = router.usage_report()
+    assert usage["template"]["calls"] == 1
+    assert usage["small"]["calls"] == 1
+    assert usage["large"]["calls"] == 0
+    print(" Template and LLM tiers used and reported")
+
+
+def test_fallback_on_failure():
+    """A failing tier falls back to its configured fallback tier."""
+    metrics.reset()
+    router = _router()
+    router.tiers["large"].llm = GenericFakeChatModel(messages=iter([]))  # raises when called
+    
+    response = asyncio.run(router.ainvoke(
+        "report_generation", [HumanMessage(content="x")], severity="CRITICAL",
+        template_vars={"anomalies": "a", "investigation_results": "[]", "llm_analysis": "None", "severity": "CRITICAL"}
+    ))
+    
+    assert response.content.startswith("Security Report (automated, severity CRITICAL)")
+    assert metrics.counter("llm_tier_fallbacks", tier="large") == 1
+    print(" Fallback to template tier")
+
+
+if __name__ == "__main__":
+    test_routes_by_task_and_severity()
+    test_template_tier_and_usage()
+    test_fallback_on_failure()
@@ -0,0 +1,89 @@
+"""Test parsing and aggregation off the event loop."""
+
+import asyncio
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.archive import EventArchive, encode_events
+from src.events import parse_events
+from src.metrics import metrics
+from src.offload import CPUExecutor, LoopLagMonitor, prepare_events
+from src.sketches import TrafficSketches
+
+HOST = "bastion.example.com"
+NOW = 1_760_000_400.0
+
+
+def events_text(count: int) -> str:
+    return "\n".join(
+        f"2025-10-09 09:{i // 60 % 60:02d}:{i % 60:02d} TCP CONNECT pid={4000 + i % 7} comm=proc-{i % 7} "
+        f"saddr=10.0.0.5 sport={40000 + i % 1000} daddr=10.0.{i % 5}.9 dport={1 + i % 40}"
+        for i in range(count)
+    )
+
+
+def test_prepare_events():
+    """Prepared records and flows match parsing on the event loop."""
+    text = events_text(500)
+    events = parse_events(text)
+    prepared = prepare_events(text)
+    
+    assert prepared.count == 500
+    assert prepared.records == encode_events(events)
+    assert prepared.flows == Counter((e.comm, e.pid, e.daddr, e.dport) for e in events)
+    assert (TrafficSketches(port_scan_threshold=10).observe_flows(prepared.flows, NOW)
+            == TrafficSketches(port_scan_threshold=10).observe(events, NOW))
+    
+    with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+        direct, offloaded = EventArchive(a), EventArchive(b)
+        assert direct.append(HOST, events) == offloaded.append_records(HOST, prepared.records) == 500
+        assert direct.query(HOST, 0, NOW) == offloaded.query(HOST, 0, NOW)
+        # Overlapping windows aren't archived twice
+        assert offloaded.append_records(HOST, prepared.records) == 0
+    print(" Prepared events match inline parsing")
+
+
+def test_executors():
+    """Thread and process pools give the same result; large texts go through shared memory."""
+    text = events_text(3000)
+    expected = prepare_events(text)
+    
+    for kind in ("inline", "thread", "process"):
+        executor = CPUExecutor(kind, max_workers=1, shared_memory_min_bytes=1024)
+        try:
+            shared_before = metrics.counter("executor_shared_bytes")
+            result = asyncio.run(executor.run_on_text(prepare_events, text))
+            assert result == expected, kind
+            if kind == "process":
+                assert metrics.counter("executor_shared_bytes") - shared_before == len(text.encode())
+        finally:
+            executor.shutdown()
+    print(" Inline, thread and process executors agree")
+
+
+def test_loop_lag_monitor():
+    """Blocking the event loop shows up as lag."""
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.03)
+        prepare_events(events_text(20000))  # Blocks the loop
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+    
+    metrics.reset()
+    asyncio.run(run())
+    lags = metrics.samples("event_loop_lag_seconds")
+    assert lags and max(lags) > 0.05
+    print(f" Max event-loop lag while parsing inline: {max(lags) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    test_prepare_events()
+    test_executors()
+    test_loop_lag_monitor()
@@ -0,0 +1,90 @@
+"""Test per-node cycle profiling."""
+
+import asyncio
+import cProfile
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.profiling import CycleProfiler, collapsed_stacks
+
+HOST = "bastion.example.com"
+
+
+def busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def outer() -> int:
+    return busy(50000) + busy(10000)
+
+
+async def slow_node(state: dict) -> dict:
+    """Local work, a wait on the 'network', then more local work."""
+    data = [str(i) * 10 for i in range(20000)]
+    outer()
+    await asyncio.sleep(0.1)
+    outer()
+    return {**state, "size": len(data)}
+
+
+def test_collapsed_stacks():
+    """Stacks follow the call graph and weights add up to the profiled time."""
+    profile = cProfile.Profile()
+    profile.enable()
+    outer()
+    profile.disable()
+    
+    stacks = collapsed_stacks(profile)
+    nested = [stack for stack in stacks if "outer (test_profiling.py" in stack and "busy (test_profiling.py" in stack]
+    assert nested, stacks
+    assert all(stack.index("outer") < stack.index("busy") for stack in nested)
+    assert all(weight > 0 for weight in stacks.values())
+    print(f" {len(stacks)} collapsed stacks")
+
+
+def test_profiled_cycle():
+    """Sampled cycles split node time into local work and waiting and write the artifacts."""
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = CycleProfiler(enabled=True, every_n_cycles=2, directory=tmp)
+        node = profiler.wrap("monitor", slow_node)
+        state = {"target": {"host": HOST}}
+        
+        async def cycle(iteration: int):
+            with profiler.cycle(iteration) as session:
+                result = await asyncio.gather(node(state), node({"target": {"host": "other"}}))
+            return session, result
+        
+        session, result = asyncio.run(cycle(1))
+        assert session is None and result[0]["size"] == 20000
+        assert not list(Path(tmp).iterdir())
+        
+        session, _ = asyncio.run(cycle(2))
+        assert not tracemalloc.is_tracing()
+        timing = session.timings[HOST]["monitor"]
+        assert timing["wait"] >= 0.09
+        assert 0 < timing["cpu"] < timing["wall"]
+        assert timing["peak_bytes"] > 20000 * 50
+        
+        [directory] = Path(tmp).iterdir()
+        assert directory.name.endswith("-cycle2")
+        stacks = (directory / "monitor.collapsed").read_text()
+        assert "slow_node (test_profiling.py" in stacks and "busy (test_profiling.py" in stacks
+        # The event loop isn't profiled while the node waits
+        assert "select" not in stacks
+        assert all(line.startswith("slow_node") for line in stacks.splitlines())
+        assert (directory / "monitor.prof").exists()
+        assert "test_profiling.py" in (directory / "allocations.txt").read_text()
+        saved = json.loads((directory / "timing.json").read_text())
+        assert set(saved["targets"]) == {HOST, "other"}
+    print(f" monitor: local={timing['cpu']:.3f}s waiting={timing['wait']:.3f}s")
+
+
+if __name__ == "__main__":
+    test_collapsed_stacks()
+    test_profiled_cycle()
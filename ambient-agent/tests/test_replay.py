@@ -0,0 +1,157 @@
+"""Test record/replay of MCP and LLM traffic."""
+
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import StructuredTool
+
+import src.__main__ as main_module
+import src.nodes as nodes
+from src.agent import build_agent
+from src.clock import clock
+from src.config import get_targets
+from src.replay import ReplayChatModel, TracePlayer, TraceRecorder, prompt_key, replay, system_key
+
+START = 1_760_000_400.0
+ANALYSIS = "- Overall Severity: HIGH\n- Recommended Actions:\n1. Kill pid 4242"
+
+
+def fake_tool(name: str, text: str):
+    async def call(minutes: int = 10, host: str = "", username: str = "") -> str:
+        return text
+    return StructuredTool.from_function(coroutine=call, name=name, description=name)
+
+
+def fake_tools():
+    events = "\n".join(
+        f"2025-10-09 09:00:{i:02d} TCP CONNECT pid=4242 comm=nc saddr=10.0.0.5 sport={40000 + i} "
+        f"daddr=10.0.0.9 dport={i + 1}"
+        for i in range(30)
+    )
+    return [
+        fake_tool("get_network_events_history", events),
+        fake_tool("get_network_event_stats", "Total events: 30\nTop Processes:\n  nc: 30\n"),
+        fake_tool("detect_network_anomalies", "[HIGH] Possible port scan: pid 4242 (nc)"),
+    ]
+
+
+class Answers:
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return AIMessage(content=ANALYSIS)
+
+
+async def record_cycles(path: str, cycles: int):
+    recorder = TraceRecorder(path)
+    nodes._tools_cache = recorder.wrap_tools(fake_tools())
+    nodes.router.recorder = recorder
+    main_module.recorder = recorder
+    for tier in nodes.router.tiers.values():
+        if tier.kind == "llm":
+            tier.llm = GenericFakeChatModel(messages=Answers())
+    
+    agent = build_agent()
+    try:
+        for iteration in range(1, cycles + 1):
+            clock.set(START + (iteration - 1) * 300)
+            await main_module.run_cycle(agent, iteration, get_targets(nodes.config))
+    finally:
+        recorder.close()
+        clock.reset()
+        main_module.recorder = None
+        nodes.router.recorder = None
+
+
+def test_record_and_replay():
+    """A recorded week-like run of cycles replays faster than real time."""
+    alerts = nodes.config["alerts"]
+    archive, log_file = nodes.archive, alerts["log_file"]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            nodes.archive = None
+            alerts["log_file"] = str(Path(tmp) / "alerts.log")
+            path = str(Path(tmp) / "trace.jsonl.gz")
+            asyncio.run(record_cycles(path, cycles=3))
+            
+            player = TracePlayer.load(path)
+            assert [cycle["iteration"] for cycle in player.cycles] == [1, 2, 3]
+            assert [cycle["time"] for cycle in player.cycles] == [START, START + 300, START + 600]
+            assert "get_network_events_history" in player.tool_names
+            
+            result = asyncio.run(replay(path, alert_log=str(Path(tmp) / "replay-alerts.log")))
+            assert result["cycles"] == 3
+            assert result["misses"] == 0
+            assert result["virtual_seconds"] == 600
+            assert result["speedup"] > 1
+    finally:
+        nodes.archive, alerts["log_file"] = archive, log_file
+    print(f" Replayed 3 cycles at {result['speedup']:.0f}x real time")
+
+
+def test_load_truncated_trace():
+    """A trace of a killed process loads up to its last flush."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl.gz"
+        recorder = TraceRecorder(str(path))
+        recorder.record_cycle(1, [{"host": "a"}])
+        recorder.record_tool("get_network_event_stats", {"minutes": 10}, "Total events: 3", 0.1)
+        recorder.flush()
+        recorder.record_cycle(2, [{"host": "a"}])
+        
+        # The process dies before the recorder is closed: no gzip trailer
+        killed = Path(tmp) / "killed.jsonl.gz"
+        killed.write_bytes(path.read_bytes())
+        player = TracePlayer.load(str(killed))
+        assert [cycle["iteration"] for cycle in player.cycles] == [1]
+        assert player.tool_names == ["get_network_event_stats"]
+        
+        # Cut inside the flushed data: the partial record is dropped
+        killed.write_bytes(path.read_bytes()[:-8])
+        assert [cycle["iteration"] for cycle in TracePlayer.load(str(killed)).cycles] == [1]
+        
+        recorder.close()
+        recorder.close()
+        assert [cycle["iteration"] for cycle in TracePlayer.load(str(path)).cycles] == [1, 2]
+    print(" Truncated trace keeps the flushed records")
+
+
+def test_replay_chat_model():
+    """Recorded answers are matched by task and preferably by prompt."""
+    system = SystemMessage(content="You are a security analyst")
+    records = [
+        {"type": "llm", "task": "anomaly_analysis", "system": None, "prompt": None, "content": text,
+         "usage": {}, "duration": 0.1, "time": START}
+        for text in ("first\nanswer", "second")
+    ]
+    for record, question in zip(records, ("cycle 1", "cycle 2")):
+        record["system"] = system_key([system])
+        record["prompt"] = prompt_key([system, HumanMessage(content=question)])
+    
+    player = TracePlayer(records)
+    llm = ReplayChatModel(player=player)
+    
+    # Identical prompt wins over recording order
+    assert llm.invoke([system, HumanMessage(content="cycle 2")]).content == "second"
+    chunks = [chunk.content for chunk in llm.stream([system, HumanMessage(content="changed")]) if chunk.content]
+    assert "".join(chunks) == "first\nanswer"
+    assert len(chunks) == 2
+    
+    # Exhausted traces count as misses
+    assert llm.invoke([system, HumanMessage(content="cycle 3")]).content == ""
+    assert player.misses == 1
+    print(" Replay model matches recorded answers")
+
+
+if __name__ == "__main__":
+    test_record_and_replay()
+    test_load_truncated_trace()
+    test_replay_chat_model()
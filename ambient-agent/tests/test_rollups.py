@@ -0,0 +1,161 @@
+"""Test multi-resolution rollups of network events."""
+
+import asyncio
+import random
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from langchain_core.tools import StructuredTool
+
+from src.events import NetworkEvent
+from src.metrics import metrics
+from src.rollups import RollupEngine
+from src.stats_diff import parse_stats
+
+HOST = "bastion.example.com"
+START = 1_760_000_400.0  # An hour boundary
+
+
+def make_stream(hours: int, per_minute: int = 20) -> list:
+    rng = random.Random(7)
+    return sorted(
+        (NetworkEvent(START + minute * 60 + rng.random() * 60, 1000 + rng.randrange(3),
+                      rng.choice(["curl", "sshd", "nc"]), "TCP", "10.0.0.5", 40000,
+                      f"203.0.113.{rng.randrange(8)}", rng.choice([22, 443, 8080]), "CONNECT")
+         for minute in range(hours * 60) for _ in range(per_minute)),
+        key=lambda event: event.timestamp
+    )
+
+
+def run_cycles(engine: RollupEngine, stream: list, hours: int, window_minutes: int = 10):
+    """Fetch an overlapping window every 5 minutes, like the agent loop."""
+    for cycle in range(1, hours * 12 + 1):
+        now = START + cycle * 300
+        window = [e for e in stream if now - window_minutes * 60 <= e.timestamp < now]
+        engine.add(HOST, window, window_start=now - window_minutes * 60, now=now)
+    return now
+
+
+def exact(stream: list, start: float, end: float) -> Counter:
+    return Counter(e.comm for e in stream if start <= e.timestamp < end)
+
+
+def test_windows_match_exact_counts():
+    """Overlapping fetches are counted once and every window size is exact."""
+    stream = make_stream(hours=4)
+    engine = RollupEngine()
+    now = run_cycles(engine, stream, hours=4)
+    
+    for minutes in (1, 10, 15, 60, 90, 175):
+        bucket = engine.window(HOST, now - minutes * 60, now)
+        expected = exact(stream, now - minutes * 60, now)
+        assert bucket.count == sum(expected.values()), minutes
+        assert bucket.processes == expected, minutes
+    
+    # 60-minute windows merge 60- and 10-minute buckets instead of 60 minutes
+    metrics.reset()
+    engine.window(HOST, now - 3600, now)
+    bucket = engine.window(HOST, now - 3600 - 300, now - 300)
+    assert bucket.count == sum(exact(stream, now - 3600 - 300, now - 300).values())
+    assert metrics.samples("rollup_buckets_merged") == [1, 15]
+    
+    # The text parses like get_network_event_stats
+    stats = parse_stats(engine.summarize(HOST, 60, now=now))
+    assert stats["summary"]["Total events"] == sum(exact(stream, now - 3600, now).values())
+    assert set(stats["top_processes"]) == {"curl", "sshd", "nc"}
+    print(" 1- to 175-minute windows match exact counts")
+
+
+def test_coverage_and_retention():
+    """Windows before the first fetch or a gap are not served; old ones use coarse buckets."""
+    stream = make_stream(hours=6)
+    engine = RollupEngine(minute_retention=3600, ten_minute_retention=3 * 3600)
+    assert engine.window(HOST, START, START + 600) is None
+    
+    now = run_cycles(engine, stream, hours=6)
+    assert engine.window(HOST, START - 3600, now) is None
+    
+    # Older than the 1-minute retention: served from 10- and 60-minute buckets
+    bucket = engine.window(HOST, START + 3600 + 60, START + 2 * 3600)
+    assert bucket.count == sum(exact(stream, START + 3600, START + 2 * 3600).values())
+    
+    # A gap between fetches restarts coverage
+    late = stream[-1]._replace(timestamp=now + 4000)
+    engine.add(HOST, [late], window_start=now + 3600, now=now + 4200)
+    assert engine.window(HOST, now, now + 4200) is None
+    assert engine.window(HOST, now + 3600, now + 4200).count == 1
+    
+    # A fetch without events, or with events that weren't parsed, ends the coverage
+    engine.add(HOST, [], window_start=now + 3900, now=now + 4500)
+    assert engine.window(HOST, now + 3900, now + 4500) is None
+    engine.add(HOST, [late._replace(timestamp=now + 4600)], window_start=now + 4200, now=now + 4800)
+    assert engine.covers(HOST, now + 4200)
+    engine.add(HOST, [], window_start=now + 4500, now=now + 5100, complete=False)
+    assert not engine.covers(HOST, now + 4500)
+    
+    # Event times that don't match the fetch window (clock skew) aren't served
+    engine.add(HOST, [late._replace(timestamp=now + 5200)], window_start=now + 4800, now=now + 5400)
+    skewed = [e._replace(timestamp=e.timestamp - 7200) for e in stream[-50:]]
+    engine.add(HOST, skewed, window_start=now + 5100, now=now + 5700)
+    assert engine.covers(HOST, now + 5700) is False and engine.window(HOST, now + 5100, now + 5700) is None
+    print(" Coverage gaps, retention and clock skew handled")
+
+
+def test_events_at_high_water_and_untimed():
+    """Overlapping fetches ending on the same second count each event once; untimed events never."""
+    engine = RollupEngine()
+    event = NetworkEvent(START + 30, 1000, "curl", "TCP", "10.0.0.5", 40000, "203.0.113.1", 443, "CONNECT")
+    untimed = event._replace(timestamp=0.0)
+    
+    assert engine.add(HOST, [event, untimed], window_start=START, now=START + 60) == 1
+    assert engine.add(HOST, [event, event._replace(comm="nc"), untimed], window_start=START, now=START + 60) == 1
+    assert engine.add(HOST, [event, event._replace(comm="nc"), untimed], window_start=START, now=START + 120) == 0
+    assert engine.window(HOST, START, START + 120).processes == Counter({"curl": 1, "nc": 1})
+    print(" Events at the high water mark counted once")
+
+
+def test_unparsed_events_use_mcp_stats():
+    """Event text the parser doesn't understand doesn't replace the MCP stats with empty rollups."""
+    import src.nodes as nodes
+    
+    mcp_stats = "Total events: 42\nTop Processes:\n  curl: 42\n"
+    
+    def fake_tool(name: str, text: str):
+        async def call(minutes: int = 10, host: str = "", username: str = "") -> str:
+            return text
+        return StructuredTool.from_function(coroutine=call, name=name, description=name)
+    
+    def monitor(events_text: str) -> str:
+        nodes._tools_cache = [fake_tool("get_network_events_history", events_text),
+                              fake_tool("get_network_event_stats", mcp_stats)]
+        state = asyncio.run(nodes.monitor_events({"target": {"host": HOST, "username": "student"}}))
+        return state["current_stats"]
+    
+    tools, engine, archive = nodes._tools_cache, nodes.rollups, nodes.archive
+    nodes.rollups, nodes.archive = RollupEngine(), None
+    try:
+        # Unknown format, then a fetch with one line the parser skipped
+        assert monitor("10:01:02 curl connected to 203.0.113.1 on 443\n" * 3) == mcp_stats
+        assert not nodes.rollups.covers(HOST, 0)
+        line = (f"{datetime.now():%Y-%m-%d %H:%M:%S} TCP CONNECT pid=1001 comm=curl saddr=10.0.0.5 sport=40001 "
+                f"daddr=203.0.113.1 dport=443")
+        assert monitor(f"{line}\n(output truncated)") == mcp_stats
+        
+        # Every line parsed: the rollups serve the stats
+        assert monitor(line) != mcp_stats
+        assert metrics.counter("rollup_stats_served") >= 1
+    finally:
+        nodes._tools_cache, nodes.rollups, nodes.archive = tools, engine, archive
+    print(" Unparsed event text falls back to the MCP stats")
+
+
+if __name__ == "__main__":
+    test_windows_match_exact_counts()
+    test_coverage_and_retention()
+    test_events_at_high_water_and_untimed()
+    test_unparsed_events_use_mcp_stats()
@@ -0,0 +1,123 @@
+"""Test sharding of targets across replicas."""
+
+import multiprocessing
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.sharding import HashRing, ShardCoordinator
+
+HOSTS = [f"rhel-{i:03d}.example.com" for i in range(60)]
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+def settle(replicas):
+    """Rebalance like the agent loop: stop and release moved targets."""
+    running = {}
+    for _ in range(2):
+        for replica in replicas:
+            owned = replica.rebalance(HOSTS)
+            for host in replica.held - owned:
+                replica.release(host)
+            running[replica.replica_id] = owned
+    return running
+
+
+def assert_partition(running):
+    counts = Counter(host for owned in running.values() for host in owned)
+    assert set(counts) == set(HOSTS), "a target is not monitored"
+    assert max(counts.values()) == 1, "a target is monitored twice"
+
+
+def test_hash_ring():
+    """Targets spread over replicas and few move when one is added."""
+    ring = HashRing(["agent-0", "agent-1", "agent-2"])
+    before = {host: ring.owner(host) for host in HOSTS}
+    assert min(Counter(before.values()).values()) >= 8
+    
+    ring = HashRing(["agent-0", "agent-1", "agent-2", "agent-3"])
+    after = {host: ring.owner(host) for host in HOSTS}
+    moved = [host for host in HOSTS if before[host] != after[host]]
+    assert all(after[host] == "agent-3" for host in moved)
+    assert len(moved) < len(HOSTS) / 2
+    print(f" {len(moved)} of {len(HOSTS)} targets moved to the new replica")
+
+
+def test_scale_up_and_down():
+    """Targets are handed off without gaps or overlap when replicas change."""
+    clock = FakeTime()
+    with tempfile.TemporaryDirectory() as shared:
+        a = ShardCoordinator(shared, "agent-0", lease_seconds=30, time_fn=clock)
+        b = ShardCoordinator(shared, "agent-1", lease_seconds=30, time_fn=clock)
+        assert_partition(settle([a, b]))
+        
+        # A new replica can't take targets before the old owner releases them
+        c = ShardCoordinator(shared, "agent-2", lease_seconds=30, time_fn=clock)
+        assert c.rebalance(HOSTS) == set()
+        running = settle([a, b, c])
+        assert_partition(running)
+        assert running["agent-2"]
+        
+        # Graceful shutdown hands targets over immediately
+        c.shutdown()
+        assert_partition(settle([a, b]))
+        
+        # A crashed replica's targets move once its lease expires
+        clock.now += 10
+        running = settle([a])
+        assert len(running["agent-0"]) < len(HOSTS)
+        clock.now += 31
+        assert_partition(settle([a]))
+    print(" Scale up, scale down and crash handled")
+
+
+def replica_process(shared, replica_id, rounds, results):
+    coordinator = ShardCoordinator(shared, replica_id, lease_seconds=5)
+    owned = set()
+    for _ in range(rounds):
+        owned = coordinator.rebalance(HOSTS)
+        for host in coordinator.held - owned:
+            coordinator.release(host)
+        time.sleep(0.05)
+    results.put((replica_id, sorted(owned)))
+
+
+def test_processes_share_directory():
+    """Several processes sharing a directory split the targets."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as shared:
+        processes = [
+            context.Process(target=replica_process, args=(shared, f"agent-{i}", 40, results))
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        running = {}
+        for _ in processes:
+            replica_id, owned = results.get(timeout=30)
+            running[replica_id] = set(owned)
+        for process in processes:
+            process.join()
+    
+    assert_partition(running)
+    assert all(running.values())
+    print(" Four processes split the targets")
+
+
+if __name__ == "__main__":
+    test_hash_ring()
+    test_scale_up_and_down()
+    test_processes_share_directory()
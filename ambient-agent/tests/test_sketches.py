@@ -0,0 +1,150 @@
+"""Test bounded-memory sketches and their error bounds."""
+
+import math
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.events import NetworkEvent, parse_events
+from src.sketches import (
+    CountMinSketch, DecayedCountMinSketch, HyperLogLog, TopK, TrafficSketches, WindowedHyperLogLog
+)
+
+
+def test_hyperloglog_error_bound():
+    """Distinct counts stay within 3 standard errors (1.04 / sqrt(2**p))."""
+    for p in (8, 12):
+        bound = 3 * 1.04 / math.sqrt(1 << p)
+        for n in (50, 1000, 50000):
+            hll = HyperLogLog(p)
+            hll.update(f"10.0.{i // 256}.{i % 256}:{i}" for i in range(n))
+            assert abs(hll.count() / n - 1) <= bound, (p, n, hll.count())
+    
+    # Duplicates don't change the estimate
+    hll = HyperLogLog(12)
+    hll.update(["a", "b", "c"] * 1000)
+    assert round(hll.count()) == 3
+    print(" HyperLogLog within its error bound")
+
+
+def test_hyperloglog_merge():
+    """Merging two windows equals sketching their union."""
+    left, right, union = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+    left.update(range(0, 3000))
+    right.update(range(2000, 5000))
+    union.update(range(0, 5000))
+    
+    left.merge(right)
+    assert left.registers == union.registers
+    print(" HyperLogLog merge is exact")
+
+
+def test_count_min_error_bound():
+    """Estimates never undercount and overcount by at most epsilon * N."""
+    rng = random.Random(7)
+    items = [int(rng.paretovariate(1.2)) for _ in range(50000)]
+    truth = Counter(items)
+    
+    cms = CountMinSketch(epsilon=0.001, delta=0.01)
+    for item in items:
+        cms.add(item)
+    
+    bound = 0.001 * len(items)
+    errors = [cms.estimate(item) - count for item, count in truth.items()]
+    assert min(errors) >= 0
+    # With delta=0.01 at most ~1% of items may exceed the bound
+    assert sum(e > bound for e in errors) <= 0.01 * len(truth) + 1
+    print(" Count-Min Sketch within its error bound")
+
+
+def test_top_k():
+    """Heavy hitters are found among background noise."""
+    rng = random.Random(1)
+    stream = [f"noise-{rng.randrange(5000)}" for _ in range(20000)]
+    stream += ["curl"] * 900 + ["nc"] * 700 + ["sshd"] * 500
+    rng.shuffle(stream)
+    
+    top = TopK(k=10)
+    for item in stream:
+        top.add(item)
+    
+    assert [item for item, _ in top.top(3)] == ["curl", "nc", "sshd"]
+    print(" Top-k finds the heavy hitters")
+
+
+def test_decay():
+    """Decayed counts halve every half-life and survive rescaling."""
+    cms = DecayedCountMinSketch(half_life=60, width=1000, depth=4, now=0)
+    cms.add("curl", 100, now=0)
+    
+    assert abs(cms.estimate("curl", now=60) - 50) < 1e-6
+    assert abs(cms.estimate("curl", now=120) - 25) < 1e-6
+    
+    # Far in the future the sketch rescales instead of overflowing
+    cms.add("curl", 10, now=60 * 100)
+    assert abs(cms.estimate("curl", now=60 * 100) - 10) < 1e-6
+    print(" Decayed counts follow the half-life")
+
+
+def test_windowed_hyperloglog():
+    """Old windows drop out of the sliding distinct count."""
+    windowed = WindowedHyperLogLog(window_seconds=60, windows=5, p=10)
+    for i in range(100):
+        windowed.add(f"old-{i}", now=0)
+    for i in range(50):
+        windowed.add(f"new-{i}", now=240)
+    
+    assert round(windowed.count(now=240)) in range(145, 156)
+    assert round(windowed.count(last_seconds=60, now=240)) in range(47, 54)
+    assert round(windowed.count(now=600)) == 0
+    print(" Windowed distinct counts expire")
+
+
+def test_traffic_sketches():
+    """A port scan and a chatty process are flagged from parsed events."""
+    lines = [
+        f"2025-10-22 10:00:00 TCP CONNECT pid=4242 comm=nmap saddr=10.0.0.5 sport={40000 + i} "
+        f"daddr=10.0.0.9 dport={i}"
+        for i in range(1, 200)
+    ]
+    lines += [
+        f'{{"pid": 812, "comm": "curl", "daddr": "203.0.113.1", "dport": 443, "protocol": "tcp"}}'
+        for _ in range(80)
+    ]
+    events = parse_events("\n".join(lines) + "\nNo further events\n")
+    assert len(events) == 279
+    assert events[0] == NetworkEvent(events[0].timestamp, 4242, "nmap", "TCP", "10.0.0.5", 40001,
+                                     "10.0.0.9", 1, "CONNECT")
+    
+    sketches = TrafficSketches(port_scan_threshold=10, high_connection_rate=50)
+    findings = sketches.observe(events, now=0)
+    
+    assert any(f.startswith("[HIGH] Possible port scan: nmap (pid 4242)") for f in findings)
+    assert any(f.startswith("[MEDIUM] High connection rate: curl (pid 812)") for f in findings)
+    assert not any("port scan: curl" in f for f in findings)
+    assert sketches.connection_count("curl", 812, now=0) >= 80
+    print(" Port scan and connection rate detected")
+
+
+def test_many_servers_one_port_is_not_a_scan():
+    """A client of 50 hosts on port 443 gets no port scan finding."""
+    lines = [f'{{"pid": 900, "comm": "chrome", "daddr": "198.51.100.{i}", "dport": 443, "protocol": "tcp"}}'
+             for i in range(1, 51)]
+    findings = TrafficSketches(port_scan_threshold=10).observe(parse_events("\n".join(lines)), now=0)
+    assert not any("port scan" in f for f in findings)
+    print(" 50 hosts on one port: no finding")
+
+
+if __name__ == "__main__":
+    test_hyperloglog_error_bound()
+    test_hyperloglog_merge()
+    test_count_min_error_bound()
+    test_top_k()
+    test_decay()
+    test_windowed_hyperloglog()
+    test_traffic_sketches()
+    test_many_servers_one_port_is_not_a_scan()
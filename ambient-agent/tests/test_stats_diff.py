@@ -0,0 +1,109 @@
+"""Test differential network statistics."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.stats_diff import parse_stats, diff_stats, merge_into_profile
+
+
+STATS = """Network Event Statistics (last 10 minutes)
+Total events: 120
+Top Processes:
+  curl: 20
+  - sshd (pid 812): 40 (33%)
+  chronyd   10
+Top Destinations:
+  203.0.113.1: 9
+  10.0.0.1:443: 50
+"""
+
+
+def test_parse_stats():
+    """Sections and entries are parsed from the text layout."""
+    stats = parse_stats(STATS)
+    
+    assert stats["summary"] == {"Total events": 120}
+    assert stats["top_processes"] == {"curl": 20, "sshd (pid 812)": 40, "chronyd": 10}
+    assert stats["top_destinations"]["10.0.0.1:443"] == 50
+    assert parse_stats('{"total": 3, "ports": {"22": 7}}') == {"summary": {"total": 3}, "ports": {"22": 7}}
+    print(" Stats parsed")
+
+
+def test_delta():
+    """New, disappeared and changed entries are reported; small noise is not."""
+    before = parse_stats(STATS)
+    after = parse_stats(
+        STATS.replace("curl: 20", "curl: 45")
+             .replace("chronyd   10", "nc   30")
+             .replace("203.0.113.1: 9", "203.0.113.1: 11")
+    )
+    
+    delta = diff_stats(after, before, change_threshold=0.5, min_count=5)
+    
+    assert delta.new == {"top_processes": {"nc": 30}}
+    assert delta.disappeared == {"top_processes": {"chronyd": 10}}
+    assert delta.changed == {"top_processes": {"curl": (20, 45)}}
+    assert "New top_processes: nc (30)" in delta.format()
+    assert diff_stats(before, before).is_empty()
+    print(" Delta computed")
+
+
+def test_steady_host_converges():
+    """A steady host yields an empty delta against its learned profile."""
+    stats = parse_stats(STATS)
+    profile = merge_into_profile(None, stats)
+    
+    assert diff_stats(stats, None, include_disappeared=False).new
+    assert diff_stats(stats, profile, include_disappeared=False).is_empty()
+    
+    # Entries absent from a quiet cycle stay in the profile
+    quiet = {"top_processes": {"sshd (pid 812)": 40}}
+    assert "curl" in merge_into_profile(profile, quiet)["top_processes"]
+    print(" Steady host produces no delta")
+
+
+def test_failed_llm_call_keeps_previous_stats():
+    """Changes of a cycle whose baseline LLM call failed are reported again next cycle."""
+    import src.nodes as nodes
+    
+    calls = []
+    
+    class Response:
+        content = "Baseline looks normal."
+    
+    async def submit(task, messages, **kwargs):
+        calls.append(messages[-1].content)
+        if len(calls) == 1:
+            raise RuntimeError("LLM unavailable")
+        return Response()
+    
+    host = "stats-diff.example.com"
+    state = {"target": {"host": host, "username": "student"}, "historical_baseline": {}}
+    changed = STATS.replace("curl: 20", "curl: 90")
+    original, allowlists = nodes.dispatcher.submit, nodes.allowlists
+    nodes.dispatcher.submit, nodes.allowlists = submit, None
+    try:
+        nodes._previous_stats[host] = parse_stats(STATS)
+        asyncio.run(nodes.update_baseline({**state, "current_stats": changed}))
+        assert nodes._previous_stats[host] == parse_stats(STATS)
+        
+        # The retry still sees the change since the last handled cycle
+        asyncio.run(nodes.update_baseline({**state, "current_stats": changed}))
+        assert "curl" in calls[1].split("Changes since previous cycle:")[1]
+        assert nodes._previous_stats[host] == parse_stats(changed)
+    finally:
+        nodes.dispatcher.submit, nodes.allowlists = original, allowlists
+        nodes._previous_stats.pop(host, None)
+        nodes._baselines.pop(host, None)
+    print(" Failed baseline call keeps the previous stats")
+
+
+if __name__ == "__main__":
+    test_parse_stats()
+    test_delta()
+    test_steady_host_converges()
+    test_failed_llm_call_keeps_previous_stats()
@@ -0,0 +1,53 @@
+"""Test streaming LLM output and time-to-first-token metrics."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.llm_client import astream_llm
+from src.metrics import metrics
+from src.severity import parse_severity_line
+
+
+ANALYSIS = """- Overall Severity: CRITICAL
+- Threat Assessment: Port scan from 10.0.0.5
+- Recommended Actions:
+1. Block 10.0.0.5"""
+
+
+def test_stream_lines_and_ttft():
+    """Lines are delivered as they arrive and TTFT is recorded."""
+    metrics.reset()
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=ANALYSIS)]))
+    seen = []
+    
+    async def on_line(line):
+        seen.append(line)
+    
+    response = asyncio.run(astream_llm(llm, [HumanMessage(content="analyze")], on_line=on_line, task="test"))
+    
+    assert response.content == ANALYSIS
+    assert seen == ANALYSIS.split("\n")
+    assert len(metrics.samples("llm_ttft_seconds", task="test")) == 1
+    assert len(metrics.samples("llm_latency_seconds", task="test")) == 1
+    print(" Streamed response assembled and TTFT recorded")
+
+
+def test_severity_line_parsing():
+    """The severity line is recognized in the usual LLM formats."""
+    assert parse_severity_line("- Overall Severity: CRITICAL") == "CRITICAL"
+    assert parse_severity_line("**Overall Severity:** [HIGH]") == "HIGH"
+    assert parse_severity_line("Severity = high") == "HIGH"
+    assert parse_severity_line("- Threat Assessment: HIGH risk") is None
+    print(" Severity lines parsed")
+
+
+if __name__ == "__main__":
+    test_stream_lines_and_ttft()
+    test_severity_line_parsing()
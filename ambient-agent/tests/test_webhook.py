@@ -0,0 +1,123 @@
+"""Test the webhook receiver with a local client posting synthetic events."""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add parent to path so we can import src as a package
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.webhook import CycleTrigger, WebhookServer
+
+
+async def post(port, body, path="/events", token=None):
+    """Send one HTTP POST and return (status, json body)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode()
+    headers = f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n"
+    if token:
+        headers += f"X-Webhook-Token: {token}\r\n"
+    writer.write(headers.encode() + b"\r\n" + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_event_triggers_cycle():
+    """A posted event wakes the target loop long before the interval."""
+    async def run():
+        trigger = CycleTrigger(["web-01"], debounce_seconds=0, max_triggers_per_minute=10)
+        server = WebhookServer(trigger, host="127.0.0.1", port=0, token="secret")
+        await server.start()
+        
+        waiter = asyncio.create_task(trigger.wait("web-01", timeout=300))
+        sent_at = time.time()
+        status, body = await post(server.port, {"host": "web-01", "reason": "burst", "timestamp": sent_at}, token="secret")
+        triggered_at = await asyncio.wait_for(waiter, timeout=2)
+        
+        assert status == 202 and body["result"] == "triggered"
+        assert triggered_at == sent_at
+        
+        assert (await post(server.port, {"host": "web-01"}, token="wrong"))[0] == 401
+        assert (await post(server.port, {"host": "other"}, token="secret"))[0] == 404
+        assert (await post(server.port, {"reason": "no host"}, token="secret"))[0] == 400
+        await server.stop()
+    
+    asyncio.run(run())
+    print(" Event triggered an immediate cycle")
+
+
+def test_coalescing_and_rate_limit():
+    """Pending triggers coalesce and the global rate limit applies."""
+    trigger = CycleTrigger(["a", "b", "c"], max_triggers_per_minute=2)
+    
+    assert trigger.fire("a", event_time=100.0) == "triggered"
+    assert trigger.fire("a", event_time=90.0) == "coalesced"
+    assert trigger.fire("b") == "triggered"
+    assert trigger.fire("c") == "rate_limited"
+    
+    # The earliest event time is kept for the event-to-alert metric
+    assert asyncio.run(trigger.wait("a", timeout=1)) == 90.0
+    print(" Triggers coalesced and rate limited")
+
+
+def test_debounce_delays_trigger():
+    """A trigger right after a cycle waits for the debounce window."""
+    async def run():
+        trigger = CycleTrigger(["a"], debounce_seconds=0.2)
+        trigger.cycle_started("a")
+        trigger.fire("a")
+        start = time.monotonic()
+        await trigger.wait("a", timeout=5)
+        return time.monotonic() - start
+    
+    elapsed = asyncio.run(run())
+    assert 0.15 <= elapsed < 1.0
+    print(f" Trigger debounced for {elapsed:.2f}s")
+
+
+def test_sharded_replica_rejects_hosts_it_does_not_own():
+    """With sharding, events for hosts leased to another replica get 409."""
+    async def run():
+        trigger = CycleTrigger(["a", "b"], debounce_seconds=0, owned=set())
+        server = WebhookServer(trigger, host="127.0.0.1", port=0)
+        await server.start()
+        
+        # Before the first rebalance no host is owned
+        assert (await post(server.port, {"host": "a"})) == (409, {"result": "not_owned", "host": "a"})
+        trigger.set_owned({"a"})
+        assert (await post(server.port, {"host": "a"}))[0] == 202
+        assert (await post(server.port, {"host": "b"}))[0] == 409
+        
+        # A pending trigger of a host that moved away is dropped
+        trigger.set_owned({"b"})
+        assert "a" not in trigger._pending and not trigger._events["a"].is_set()
+        assert (await post(server.port, {"host": "b"}))[0] == 202
+        await server.stop()
+    
+    asyncio.run(run())
+    print(" Events for hosts of other replicas rejected")
+
+
+def test_refuses_public_listener_without_token():
+    """The listener doesn't start on 0.0.0.0 without a token."""
+    server = WebhookServer(CycleTrigger(["a"]), host="0.0.0.0", port=0)
+    try:
+        asyncio.run(server.start())
+        assert False, "started without a token"
+    except ValueError as e:
+        assert "without a token" in str(e)
+    assert server._server is None
+    print(" Public listener without token refused")
+
+
+if __name__ == "__main__":
+    test_event_triggers_cycle()
+    test_coalescing_and_rate_limit()
+    test_debounce_delays_trigger()
+    test_sharded_replica_rejects_hosts_it_does_not_own()
+    test_refuses_public_listener_without_token()
@@ -0,0 +1,140 @@
+"""Benchmark the semantic answer cache on a stream of analyst questions.
+
+Analysts ask paraphrases of a few common questions at random times; some
+questions look alike but ask something else (curl vs wget, 10 vs 60
+minutes). Each miss runs a ReAct loop with simulated LLM and MCP latency
+(an LLM call asking for a tool, the tool call, an LLM call answering).
+The clock of the cache is simulated, so the TTL and the anomaly
+invalidations follow the question times, not the benchmark's run time.
+Reports:
+
+- hit ratio, and false hits (answers served for a different question)
+- answer latency of hits and misses
+
+Run from the conversational-agent directory:
+
+    python benchmarks/bench_answer_cache.py [questions] [mean seconds between questions]
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.answer_cache import AnswerCache
+from src.metrics import metrics
+
+warnings.filterwarnings("ignore")
+logging.basicConfig(level=logging.WARNING)
+
+LLM_SECONDS = 0.05
+TOOL_SECONDS = 0.1
+INVALIDATE_EVERY = 300   # New anomalies every 5 minutes
+
+INTENTS = {
+    "scan": ["is the bastion host being port scanned?", "Is the bastion host being port-scanned?",
+             "is the bastion host being port scanned right now", "any port scanning against the bastion host?"],
+    "talkers-10": ["top talkers in the last 10 minutes", "what are the top talkers in the last 10 minutes?",
+                   "show me the top talkers over the last 10 minutes"],
+    "talkers-60": ["top talkers in the last 60 minutes", "what are the top talkers in the last 60 minutes?"],
+    "suspicious": ["anything suspicious right now?", "is anything suspicious happening?",
+                   "anything suspicious going on?"],
+    "curl": ["why is curl connecting to 198.51.100.7?", "why does curl connect to 198.51.100.7"],
+    "wget": ["why is wget connecting to 198.51.100.7?", "why does wget connect to 198.51.100.7"],
+    "ssh": ["any failed ssh logins?", "are there failed ssh logins right now?", "failed ssh logins?"],
+    "dns": ["is DNS resolution working?", "is dns resolution working right now", "Is DNS resolution working"],
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+    
+    async def _agenerate(self, messages, *args, **kwargs):
+        await asyncio.sleep(LLM_SECONDS)
+        return await super()._agenerate(messages, *args, **kwargs)
+
+
+async def run(count: int, interval: float):
+    rng = random.Random(5)
+    clock = Clock()
+    cache = AnswerCache(clock=clock)
+    intent_of = {}
+    
+    async def detect_network_anomalies(minutes: int = 10) -> str:
+        await asyncio.sleep(TOOL_SECONDS)
+        return "no anomalies"
+    
+    answers = []
+    
+    def script():
+        while True:
+            yield AIMessage(content="", tool_calls=[{"name": "detect_network_anomalies", "args": {"minutes": 10},
+                                                     "id": f"call_{len(answers)}"}])
+            yield AIMessage(content=answers[-1])
+    
+    tool = StructuredTool.from_function(coroutine=detect_network_anomalies, name="detect_network_anomalies",
+                                        description="anomalies")
+    model = SlowModel(messages=script())
+    agent = create_react_agent(cache.model(lambda state, runtime: model, "bastion"), [tool])
+    
+    hits, misses, false_hits = [], [], 0
+    next_invalidation = INVALIDATE_EVERY
+    for i in range(count):
+        clock.now += rng.expovariate(1 / interval)
+        if clock.now >= next_invalidation:
+            cache.invalidate("snapshot")
+            next_invalidation += INVALIDATE_EVERY
+        intent = rng.choice(list(INTENTS))
+        question = rng.choice(INTENTS[intent])
+        answers.append(f"answer {i} about {intent}")
+        intent_of[answers[-1]] = intent
+        
+        start = time.perf_counter()
+        result = await agent.ainvoke({"messages": [HumanMessage(content=question)]})
+        elapsed = time.perf_counter() - start
+        answer = result["messages"][-1]
+        if "answer_cache" in answer.response_metadata:
+            hits.append(elapsed)
+            false_hits += intent_of[answer.content.split("\n\n")[0]] != intent
+        else:
+            misses.append(elapsed)
+    
+    report = AnswerCache.report()
+    print(f"{count} questions, one every {interval:g}s on average, TTL {cache.ttl_seconds:g}s, "
+          f"new anomalies every {INVALIDATE_EVERY}s")
+    print(f"hit ratio      {report['hit_ratio']:.0%} ({len(hits)} hits, {false_hits} false)")
+    print(f"answer hit     p50 {statistics.median(hits) * 1000:7.1f} ms   p95 "
+          f"{sorted(hits)[int(len(hits) * 0.95)] * 1000:7.1f} ms")
+    print(f"answer miss    p50 {statistics.median(misses) * 1000:7.1f} ms   (LLM {LLM_SECONDS * 1000:.0f} ms x 2, "
+          f"tool {TOOL_SECONDS * 1000:.0f} ms)")
+    print(f"lookup         p50 {statistics.median(metrics.samples('answer_cache_seconds')) * 1000:7.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    asyncio.run(run(count, interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark LLM input size and turn latency over a long session.
+
+Runs a 50-question investigation through the ReAct graph with a fake LLM.
+Every question calls get_network_events_history, which returns a ~16 KB
+event dump. Records the estimated input tokens of every LLM call with and
+without compaction. Turn latency is the measured graph time plus a
+simulated prefill time (input tokens / prefill rate), since the fake LLM
+has no prefill cost. Run from the conversational-agent directory:
+
+    python benchmarks/bench_compaction.py [questions] [prefill tokens/s]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.compaction import ContextCompactor, estimate_tokens, make_recall_tool
+from src.config import load_config
+
+warnings.filterwarnings("ignore")
+
+
+class RecordingModel(GenericFakeChatModel):
+    """Fake LLM recording the estimated tokens of each input."""
+    inputs: list = []
+    
+    def bind_tools(self, tools, **kwargs):
+        return self
+    
+    async def _agenerate(self, messages, *args, **kwargs):
+        self.inputs.append(sum(estimate_tokens(m) for m in messages))
+        return await super()._agenerate(messages, *args, **kwargs)
+
+
+def event_dump(seed: int) -> str:
+    return "\n".join(
+        f"2026-10-19T10:{i % 60:02d}:00 pid {1000 + (i * 7 + seed) % 300} (curl) connect "
+        f"198.51.100.{(i + seed) % 250}:{443 if i % 3 else 8080} tcp"
+        for i in range(300)
+    )
+
+
+def script(questions: int):
+    for turn in range(questions):
+        yield AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "id": f"call_{turn}",
+                                                 "args": {"minutes": 10, "host": "bastion.example.com"}}])
+        yield AIMessage(content=f"In the last 10 minutes curl made 300 connections, mostly to port 443. (#{turn})")
+
+
+async def session(questions: int, compactor) -> tuple:
+    async def history(minutes: int = 10, host: str = "") -> str:
+        return event_dump(len(model.inputs))
+    
+    tool = StructuredTool.from_function(coroutine=history, name="get_network_events_history", description="history")
+    model = RecordingModel(messages=script(questions))
+    model.inputs = []
+    agent = create_react_agent(compactor.model(lambda state, runtime: model) if compactor else model,
+                               [tool, make_recall_tool()])
+    
+    messages, graph_seconds = [], []
+    for turn in range(questions):
+        start = time.perf_counter()
+        result = await agent.ainvoke({"messages": messages + [HumanMessage(content=f"What happened now? ({turn})")]})
+        graph_seconds.append(time.perf_counter() - start)
+        messages = result["messages"]
+    # Two LLM calls per question
+    tokens = [model.inputs[2 * turn] + model.inputs[2 * turn + 1] for turn in range(questions)]
+    return tokens, graph_seconds
+
+
+async def main():
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    prefill_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 5000.0
+    config = load_config(str(ROOT / "config.yaml"))
+    
+    for label, compactor in (("no compaction", None), ("compaction", ContextCompactor.from_config(config))):
+        tokens, graph_seconds = await session(questions, compactor)
+        print(f"--- {label}")
+        for turn in sorted({1, 10, 25, questions}):
+            if turn <= questions:
+                latency = graph_seconds[turn - 1] + tokens[turn - 1] / prefill_rate
+                print(f"question {turn:3d}: {tokens[turn - 1]:7d} input tokens  graph {graph_seconds[turn - 1] * 1000:6.1f} ms  "
+                      f"with prefill {latency:6.2f} s")
+        print(f"total input tokens {sum(tokens)}, mean graph time {statistics.mean(graph_seconds) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
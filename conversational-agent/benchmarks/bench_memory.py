@@ -0,0 +1,127 @@
+"""Benchmark semantic memory recall latency and quality against its size.
+
+Fills the memory with synthetic findings about recurring processes,
+destinations and ports (answers and incident reports), then asks
+paraphrased questions about random findings. Reports, per memory size:
+
+- load: reading the database and training the index (first start) or
+  restoring the saved cells (restart)
+- recall latency (embedding, index search and reading the rows)
+- hit rate: the finding a question was written from is in the top k
+- recall vs exact: share of the exact top k (all cells searched) found
+
+Run from the conversational-agent directory:
+
+    python benchmarks/bench_memory.py [sizes...]
+"""
+
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.memory import IVFIndex, SemanticMemory, _pack
+from src.persistence import connect
+
+logging.basicConfig(level=logging.WARNING)
+
+QUESTIONS = 300
+K = 3
+
+rng = random.Random(7)
+PROCESSES = ["curl", "wget", "sshd", "python3", "java", "chronyd", "systemd-resolved", "dnf", "rsyslogd", "nginx",
+             "postgres", "node", "containerd", "kubelet", "podman", "crond", "NetworkManager", "sssd", "httpd",
+             "redis-server"] + [f"{rng.choice(['svc', 'agent', 'job', 'worker', 'collector'])}-{i}" for i in range(480)]
+DESTINATIONS = [f"{rng.choice([10, 172, 192, 198, 203])}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+                for _ in range(8000)]
+PORTS = [22, 53, 80, 123, 443, 514, 993, 3306, 5432, 6379, 8080, 8443, 9090, 9200]
+VERDICTS = ["expected: it is a package mirror", "matches the nightly backup job", "is a known monitoring endpoint",
+            "was not seen before and should be reviewed", "looks like beaconing every 60 seconds",
+            "is the configured NTP server", "is the internal DNS resolver", "stopped after the service restart"]
+TEMPLATES = [
+    "Q: Why is {proc} connecting to {dst}?\nA: {proc} (pid {pid}) opened {n} connections to {dst}:{port} in the "
+    "last {m} minutes. The destination {verdict}.",
+    "Q: What is {proc} talking to?\nA: Mostly {dst} on port {port}, {n} connections in {m} minutes; it {verdict}.",
+    "Q: Is the traffic to {dst} on port {port} suspicious?\nA: The connections come from {proc} (pid {pid}). "
+    "It {verdict}.",
+    "Alert at 2025-10-22T{hh}:{mm}\nSeverity MEDIUM: {proc} made {n} outbound connections to {dst}:{port}. "
+    "Recommendation: confirm the destination {verdict}.",
+]
+PARAPHRASES = [
+    "what does {proc} do with {dst}",
+    "{proc} connections to {dst} port {port}",
+    "is {dst}:{port} from {proc} normal?",
+    "seen {proc} talking to {dst} before?",
+]
+
+
+def finding(i: int) -> tuple:
+    fields = {"proc": rng.choice(PROCESSES), "dst": rng.choice(DESTINATIONS), "port": rng.choice(PORTS),
+              "pid": rng.randrange(300, 99999), "n": rng.randrange(2, 400), "m": rng.choice([5, 10, 30, 60]),
+              "verdict": rng.choice(VERDICTS), "hh": f"{rng.randrange(24):02}", "mm": f"{rng.randrange(60):02}"}
+    template = rng.randrange(len(TEMPLATES))
+    kind = "incident" if template == 3 else "answer"
+    return kind, TEMPLATES[template].format(**fields), fields
+
+
+def fill(memory: SemanticMemory, count: int) -> list:
+    """Insert findings directly (remember() also checks for duplicates, which a bulk load doesn't need)."""
+    findings = [finding(i) for i in range(count)]
+    now = time.time()
+    rows = [(kind, text, json.dumps({}), *_pack(memory.embedder.embed(text)), "", now, now)
+            for kind, text, _ in findings]
+    memory.conn.executemany("INSERT INTO memories (kind, text, metadata, features, weights, cells, created_at, "
+                            "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return findings
+
+
+def bench(count: int, directory: Path):
+    path = str(directory / f"memory-{count}.sqlite")
+    memory = SemanticMemory(connect(path))
+    findings = fill(memory, count)
+    
+    start = time.perf_counter()
+    memory.load()
+    first_load = time.perf_counter() - start
+    start = time.perf_counter()
+    memory = SemanticMemory(connect(path))
+    memory.load()
+    restart = time.perf_counter() - start
+    
+    exact = IVFIndex(nprobe=len(memory.index.cells))
+    exact.__dict__.update({k: v for k, v in memory.index.__dict__.items() if k != "nprobe"})
+    
+    latencies, hits, overlap = [], 0, []
+    for i in rng.sample(range(count), min(QUESTIONS, count)):
+        _, _, fields = findings[i]
+        question = rng.choice(PARAPHRASES).format(**fields)
+        start = time.perf_counter()
+        found = memory.recall(question, k=K, min_score=0.0)
+        latencies.append(time.perf_counter() - start)
+        hits += any(m.id == i + 1 for m in found)
+        best = {entry for _, entry in exact.search(memory.embedder.embed(question), K)}
+        overlap.append(len(best & {m.id for m in found}) / max(1, len(best)))
+    
+    latencies.sort()
+    print(f"{count:>7}  {len(memory.index.cells):>5}  {first_load:7.2f} s {restart:7.2f} s  "
+          f"{statistics.median(latencies) * 1000:7.2f} ms {latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms  "
+          f"{hits / len(latencies):8.0%}  {statistics.mean(overlap):8.0%}")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'entries':>7}  {'cells':>5}  {'load (train/restart)':>19}  {'recall p50/p95':>18}  "
+          f"{'hit@' + str(K):>8}  {'vs exact':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            bench(count, Path(directory))
+
+
+if __name__ == "__main__":
+    main()
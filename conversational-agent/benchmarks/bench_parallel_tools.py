@@ -0,0 +1,94 @@
+"""Benchmark multi-tool turns run one at a time and concurrently.
+
+Each question is one ReAct run whose first LLM turn asks for several MCP
+tools at once, with latencies like the SSH-backed tools on the target.
+Compares a concurrency cap of 1 (tools one after another) with the
+configured cap, and a deadline shorter than the slowest tool. Run from
+the conversational-agent directory:
+
+    python benchmarks/bench_parallel_tools.py [questions]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import ToolNode, create_react_agent
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.parallel_tools import ToolTurnLimiter
+
+warnings.filterwarnings("ignore")
+logging.getLogger("src.parallel_tools").setLevel(logging.ERROR)
+
+# Seconds per call, roughly what each tool costs over SSH
+LATENCIES = {
+    "get_network_event_stats": 0.35,
+    "detect_network_anomalies": 0.60,
+    "analyze_process_network_behavior": 0.45,
+    "get_network_events_history": 0.30,
+    "get_system_info": 0.15,
+}
+
+
+class FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def make_tool(name: str, delay: float):
+    async def run(minutes: int = 10, host: str = "", username: str = "") -> str:
+        await asyncio.sleep(delay)
+        return f"{name}: ok"
+    return StructuredTool.from_function(coroutine=run, name=name, description=name)
+
+
+async def ask(limiter: ToolTurnLimiter, names: list) -> tuple:
+    """One question; returns latency and the number of timed-out tool calls."""
+    calls = [{"name": name, "args": {"minutes": 10}, "id": f"call_{i}"} for i, name in enumerate(names)]
+    model = FakeModel(messages=iter([AIMessage(content="", tool_calls=calls), AIMessage(content="answer")]))
+    tools = [make_tool(name, delay) for name, delay in LATENCIES.items()]
+    agent = create_react_agent(model, ToolNode(tools, awrap_tool_call=limiter.wrap))
+    
+    start = time.perf_counter()
+    result = await agent.ainvoke({"messages": [{"role": "user", "content": "what's happening?"}]})
+    errors = sum(1 for m in result["messages"] if isinstance(m, ToolMessage) and m.status == "error")
+    return time.perf_counter() - start, errors
+
+
+async def run(label: str, limiter: ToolTurnLimiter, names: list, questions: int):
+    results = [await ask(limiter, names) for _ in range(questions)]
+    latencies = [latency for latency, _ in results]
+    timeouts = sum(errors for _, errors in results)
+    print(f"{label:<34} {len(names)} tools  p50 {statistics.median(latencies) * 1000:6.0f} ms  "
+          f"max {max(latencies) * 1000:6.0f} ms  timed out {timeouts}")
+
+
+async def main():
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    names = list(LATENCIES)
+    
+    for count in (2, 3, 5):
+        turn = names[:count]
+        slowest = max(LATENCIES[name] for name in turn)
+        total = sum(LATENCIES[name] for name in turn)
+        print(f"--- {count} tools: slowest call {slowest * 1000:.0f} ms, sum {total * 1000:.0f} ms")
+        await run("one at a time (cap 1)", ToolTurnLimiter(max_concurrency=1, deadline_seconds=0), turn, questions)
+        await run("concurrent (cap 4)", ToolTurnLimiter(max_concurrency=4, deadline_seconds=0), turn, questions)
+        await run("concurrent (no cap)", ToolTurnLimiter(max_concurrency=0, deadline_seconds=0), turn, questions)
+    
+    print("--- 5 tools with a 0.5 s deadline (detect_network_anomalies takes 0.6 s)")
+    await run("concurrent (cap 4, deadline 0.5s)", ToolTurnLimiter(max_concurrency=4, deadline_seconds=0.5),
+              names, questions)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+"""Benchmark SQLite checkpoints against the whole-file pickle store.
+
+``langgraph dev`` keeps every thread's checkpoints in memory and pickles
+the whole store to ``.langgraph_api/`` on save, and unpickles it all on
+start. This replays the checkpoint writes of a real multi-turn agent
+thread into many threads and compares, per total thread count:
+
+- start: load everything (pickle) vs open the database (SQLite)
+- save after a turn: pickle the whole store vs the turn's row writes
+- resume: read one thread's latest checkpoint
+- size on disk
+
+Run from the conversational-agent directory:
+
+    python benchmarks/bench_persistence.py [thread counts...]
+"""
+
+import asyncio
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.persistence import SqliteSaver, connect
+
+warnings.filterwarnings("ignore")
+
+TURNS = 5
+
+
+class FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class RecordingSaver(InMemorySaver):
+    """Records the checkpointer calls of a run so they can be replayed."""
+    
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+    
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.calls.append(("put", config, checkpoint, metadata, new_versions))
+        return super().put(config, checkpoint, metadata, new_versions)
+    
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.calls.append(("put_writes", config, writes, task_id, task_path))
+        return super().put_writes(config, writes, task_id, task_path)
+
+
+def record_thread() -> list:
+    """Checkpointer calls of a thread with TURNS questions, one tool call each."""
+    async def history(minutes: int = 10) -> str:
+        return "\n".join(f"event {i}: pid {1000 + i} (curl) -> 198.51.100.{i % 250}:443" for i in range(150))
+    
+    def script():
+        for turn in range(TURNS):
+            yield AIMessage(content="", tool_calls=[{"name": "get_network_events_history",
+                                                     "args": {"minutes": 10}, "id": f"call_{turn}"}])
+            yield AIMessage(content=f"Answer {turn}: nothing unusual in the last 10 minutes. " * 5)
+    
+    tool = StructuredTool.from_function(coroutine=history, name="get_network_events_history", description="history")
+    saver = RecordingSaver()
+    agent = create_react_agent(FakeModel(messages=script()), [tool], checkpointer=saver)
+    
+    async def run():
+        for turn in range(TURNS):
+            await agent.ainvoke({"messages": [HumanMessage(content=f"question {turn}")]},
+                                {"configurable": {"thread_id": "recorded"}})
+    
+    asyncio.run(run())
+    return saver.calls
+
+
+def replay(saver, calls: list, thread_id: str):
+    for name, config, *args in calls:
+        config = {"configurable": {**config["configurable"], "thread_id": thread_id}}
+        getattr(saver, name)(config, *args)
+
+
+def last_turn(calls: list) -> list:
+    """Calls of the thread's last question (from its input checkpoint)."""
+    starts = [i for i, call in enumerate(calls) if call[0] == "put" and call[3].get("source") == "input"]
+    return calls[starts[-1]:]
+
+
+def bench(threads: int, calls: list, directory: Path):
+    turn = last_turn(calls)
+    history = calls[:len(calls) - len(turn)]
+    
+    # Pickle: the whole in-memory store, as langgraph dev saves it
+    memory = InMemorySaver()
+    for i in range(threads):
+        replay(memory, calls, f"thread-{i}")
+    pickled = directory / f"checkpoints-{threads}.pckl"
+    storage = ({thread: dict(namespaces) for thread, namespaces in memory.storage.items()},
+               dict(memory.writes), memory.blobs)
+    start = time.perf_counter()
+    pickled.write_bytes(pickle.dumps(storage))
+    pickle_save = time.perf_counter() - start
+    start = time.perf_counter()
+    storage = pickle.loads(pickled.read_bytes())
+    pickle_load = time.perf_counter() - start
+    
+    # SQLite: rows per thread
+    path = str(directory / f"checkpoints-{threads}.sqlite")
+    sqlite = SqliteSaver(connect(path))
+    for i in range(threads):
+        replay(sqlite, calls if i else history, f"thread-{i}")
+    sqlite.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    start = time.perf_counter()
+    sqlite = SqliteSaver(connect(path))
+    sqlite_open = time.perf_counter() - start
+    # Saving one question: its checkpoints and pending writes
+    start = time.perf_counter()
+    replay(sqlite, turn, "thread-0")
+    sqlite_turn = time.perf_counter() - start
+    
+    reads = []
+    for i in range(0, threads, max(1, threads // 50)):
+        start = time.perf_counter()
+        assert sqlite.get_tuple({"configurable": {"thread_id": f"thread-{i}"}}) is not None
+        reads.append(time.perf_counter() - start)
+    sqlite.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    print(f"{threads:>7}  {pickle_load * 1000:9.1f} ms {sqlite_open * 1000:9.1f} ms  "
+          f"{pickle_save * 1000:9.1f} ms {sqlite_turn * 1000:9.1f} ms  "
+          f"{statistics.median(reads) * 1000:9.2f} ms  "
+          f"{pickled.stat().st_size / 1e6:8.1f} MB {Path(path).stat().st_size / 1e6:8.1f} MB")
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    calls = record_thread()
+    puts = sum(1 for call in calls if call[0] == "put")
+    print(f"Each thread: {TURNS} questions, {puts} checkpoints, {len(calls) - puts} write batches")
+    print(f"{'threads':>7}  {'start (load/open)':>25}  {'save after a turn':>25}  {'resume':>12}  "
+          f"{'size (pickle/sqlite)':>20}")
+    with tempfile.TemporaryDirectory() as directory:
+        for threads in counts:
+            bench(threads, calls, Path(directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Benchmark concurrent questions against local LlamaStack and MCP stand-ins.
+
+Each question is one ReAct run: an LLM call that asks for
+get_network_event_stats, the MCP tool call, and an LLM call for the answer.
+Compares building the LLM client and MCP tools per question (the old
+build_agent) with the shared agent, counting the TCP connections each
+server accepted. Run from the conversational-agent directory:
+
+    python benchmarks/bench_shared_agent.py [questions] [concurrency] [sse|json]
+
+The last argument selects how the MCP stand-in frames tool results. The
+mcp client closes SSE-framed responses as soon as the result arrives, so
+with ``sse`` each tool call still opens a connection; with ``json`` they
+reuse keep-alive connections.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import uvicorn
+import yaml
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_openai import ChatOpenAI
+from langgraph.prebuilt import create_react_agent
+from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import agent as agent_module
+from src.config import load_config
+
+TOOL_ARGS = {"minutes": 10, "host": "bastion.example.com", "username": "student"}
+
+
+class Connections:
+    """ASGI middleware counting distinct client connections."""
+    
+    def __init__(self, app):
+        self.app = app
+        self.peers = set()
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.peers.add(tuple(scope.get("client") or ()))
+        await self.app(scope, receive, send)
+
+
+def chunk(delta: dict, finish: str = None) -> str:
+    body = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    return f"data: {json.dumps(body)}\n\n"
+
+
+async def chat_completions(request):
+    """Streams a tool call first, then the answer once a tool result is in the conversation."""
+    body = await request.json()
+    await asyncio.sleep(0.02)
+    
+    async def events():
+        if any(message["role"] == "tool" for message in body["messages"]):
+            for word in ("No ", "anomalies ", "in ", "the ", "last ", "10 ", "minutes."):
+                yield chunk({"role": "assistant", "content": word})
+            yield chunk({}, "stop")
+        else:
+            yield chunk({"role": "assistant", "tool_calls": [{
+                "index": 0, "id": "call_1", "type": "function",
+                "function": {"name": "get_network_event_stats", "arguments": json.dumps(TOOL_ARGS)}}]})
+            yield chunk({}, "tool_calls")
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def make_mcp_app(json_response: bool):
+    server = FastMCP("bench", log_level="WARNING", json_response=json_response)
+    
+    @server.tool()
+    async def get_network_event_stats(minutes: int = 10, host: str = "", username: str = "") -> str:
+        """Network event statistics."""
+        await asyncio.sleep(0.02)
+        return f"Network Event Statistics (last {minutes} minutes)\nTotal events: 60"
+    
+    return server.streamable_http_app(), server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def build_per_request(config: dict):
+    """The previous build_agent(): new LLM client and MCP client for every call."""
+    llm = ChatOpenAI(base_url=config["llm"]["base_url"], model=config["llm"]["model"], api_key="x",
+                     streaming=True, stream_usage=True, timeout=60.0)
+    client = MultiServerMCPClient({"linux_diagnostics": {"transport": "streamable_http", "url": config["mcp"]["endpoint"]}})
+    tools = await client.get_tools()
+    return create_react_agent(llm, tools, prompt="You are a network security assistant.")
+
+
+async def run(label: str, build, questions: int, concurrency: int, llm_app: Connections, mcp_app: Connections):
+    llm_app.peers.clear()
+    mcp_app.peers.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async def ask(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            agent = await build()
+            result = await agent.ainvoke({"messages": [{"role": "user", "content": f"Any anomalies? ({i})"}]})
+            assert result["messages"][-1].content.startswith("No anomalies")
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(i) for i in range(questions)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{label:<22} {questions / elapsed:8.1f} q/s {latencies[len(latencies) // 2] * 1000:8.0f} ms p50 "
+          f"{latencies[int(len(latencies) * 0.95)] * 1000:8.0f} ms p95 "
+          f"{len(llm_app.peers):6d} LLM conns {len(mcp_app.peers):6d} MCP conns")
+
+
+async def main():
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    framing = sys.argv[3] if len(sys.argv) > 3 else "sse"
+    llm_port, mcp_port = free_port(), free_port()
+    
+    llm_app = Connections(Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])]))
+    mcp_starlette, mcp_server = make_mcp_app(json_response=framing == "json")
+    mcp_app = Connections(mcp_starlette)
+    servers = [uvicorn.Server(uvicorn.Config(app, port=port, log_level="error", lifespan=lifespan))
+               for app, port, lifespan in ((llm_app, llm_port, "off"), (mcp_app, mcp_port, "on"))]
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    while not all(server.started for server in servers):
+        await asyncio.sleep(0.05)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config = yaml.safe_load((ROOT / "config.yaml").read_text())
+        config["llm"]["base_url"] = f"http://127.0.0.1:{llm_port}/v1"
+        config["mcp"]["endpoint"] = f"http://127.0.0.1:{mcp_port}/mcp"
+        config["tool_cache"]["enabled"] = False
+        config["answer_cache"]["enabled"] = False
+        (Path(tmp) / "config.yaml").write_text(yaml.safe_dump(config))
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            print(f"{questions} questions, {concurrency} concurrent, MCP results as {framing}\n")
+            await run("per-request clients", lambda: build_per_request(load_config()), questions, concurrency,
+                      llm_app, mcp_app)
+            await run("shared agent", agent_module.build_agent, questions, concurrency, llm_app, mcp_app)
+            await agent_module.close_agent()
+        finally:
+            os.chdir(cwd)
+    
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Benchmark the size caps of large tool outputs.
+
+Event dumps of growing size (text lines like the MCP server's
+``get_network_events_history``, and the same events as a JSON array) go
+through ``ToolOutputLimiter.limit_message``. Reports per size:
+
+- bytes of the output and of the preview sent to the LLM
+- time to build the preview and spill the output
+- tracemalloc peak above the output itself while doing so (traced in a
+  second, untimed run), next to the peak of parsing the whole output at
+  once (a list of lines, or ``json.loads``)
+
+Run from the conversational-agent directory:
+
+    python benchmarks/bench_tool_output.py [sizes, comma-separated]
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from langchain_core.messages import ToolMessage
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tool_output import ToolOutputLimiter, byte_size
+
+PROCESSES = ["curl", "sshd", "nginx", "python3", "chrome", "nc"]
+
+
+def events(count: int) -> list:
+    return [{"time": f"2025-10-22T12:{i // 600 % 60:02d}:{i // 10 % 60:02d}", "pid": 1000 + i % 97,
+             "process": PROCESSES[i % len(PROCESSES)], "daddr": f"198.51.100.{i % 211}", "dport": 443 if i % 5 else 22}
+            for i in range(count)]
+
+
+def as_text(rows: list) -> str:
+    return "\n".join(f"{e['time']} pid {e['pid']} ({e['process']}) -> {e['daddr']}:{e['dport']}" for e in rows)
+
+
+def traced_peak(fn) -> int:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(limiter: ToolOutputLimiter, content: str, parse) -> tuple:
+    message = ToolMessage(content=content, name="get_network_events_history", tool_call_id="call_bench")
+    start = time.perf_counter()
+    capped = asyncio.run(limiter.limit_message(message))
+    elapsed = time.perf_counter() - start
+    peak = traced_peak(lambda: asyncio.run(limiter.limit_message(message)))
+    return byte_size(content), byte_size(capped.content), elapsed, peak, traced_peak(lambda: parse(content))
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    limiter = ToolOutputLimiter(spill_dir=tempfile.mkdtemp())
+    print(f"caps: {limiter.max_bytes} bytes, {limiter.max_rows} rows")
+    print(f"{'events':>8} {'format':>6} {'output':>10} {'sent':>9} {'time':>9} {'peak':>10} {'full parse':>11}")
+    for count in sizes:
+        rows = events(count)
+        for kind, content, parse in (("text", as_text(rows), str.splitlines), ("json", json.dumps(rows), json.loads)):
+            size, sent, elapsed, peak, parse_peak = measure(limiter, content, parse)
+            print(f"{count:>8} {kind:>6} {size / 1e6:>8.2f}MB {sent / 1e3:>7.1f}KB {elapsed * 1000:>7.1f}ms "
+                  f"{peak / 1e6:>8.2f}MB {parse_peak / 1e6:>9.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
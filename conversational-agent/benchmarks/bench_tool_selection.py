@@ -0,0 +1,161 @@
+"""Benchmark per-question tool subsetting on a fixed question set.
+
+Binds the tools ToolSelector picks for each question and compares the
+estimated tool-schema tokens sent per LLM turn with binding all tools.
+Quality is measured as recall: the share of questions whose subset
+contains every tool a correct answer needs. The catalog mirrors the MCP
+server's 24 tools. Run from the conversational-agent directory:
+
+    python benchmarks/bench_tool_selection.py [--live]
+
+``--live`` also asks the configured LLM each question once with all tools
+and once with the subset, and compares the tools it calls first.
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.config import load_config
+from src.tool_selection import ToolSelector
+
+HOST_ARGS = {
+    "host": {"type": "string", "description": "Remote host to connect to over SSH"},
+    "username": {"type": "string", "description": "SSH username"},
+}
+WINDOW_ARGS = {"minutes": {"type": "integer", "description": "Look back this many minutes", "default": 10}}
+
+# name -> (description, extra arguments)
+CATALOG = {
+    "get_system_info": ("Get basic system information: hostname, OS version, kernel, uptime and architecture.", {}),
+    "get_cpu_info": ("Get CPU information: model, cores, load average and utilization.", {}),
+    "get_memory_info": ("Get memory and swap usage.", {}),
+    "get_disk_usage": ("Get filesystem disk usage and free space for mounted filesystems.", {}),
+    "get_hardware_info": ("Get hardware details: PCI and USB devices, DMI information.", {}),
+    "list_block_devices": ("List block devices, partitions and their mount points.", {}),
+    "list_services": ("List systemd services and their states.", {}),
+    "get_service_status": ("Get the status of a systemd service.", {"service_name": {"type": "string"}}),
+    "get_service_logs": ("Get recent journal entries of a systemd service.",
+                         {"service_name": {"type": "string"}, "lines": {"type": "integer"}}),
+    "list_processes": ("List running processes with CPU and memory usage.", {}),
+    "get_process_info": ("Get details of a process by PID: command line, user, open files, status.",
+                         {"pid": {"type": "integer"}}),
+    "get_journal_logs": ("Query the systemd journal with filters for unit, priority and time range.",
+                         {"unit": {"type": "string"}, "priority": {"type": "string"}, "since": {"type": "string"}}),
+    "get_audit_logs": ("Get Linux audit log entries (auditd), e.g. logins and privilege use.", {"lines": {"type": "integer"}}),
+    "read_log_file": ("Read the last lines of a log file under /var/log.", {"path": {"type": "string"}, "lines": {"type": "integer"}}),
+    "get_network_interfaces": ("Get network interfaces, IP addresses, link state and traffic counters.", {}),
+    "get_network_connections": ("List active network connections (TCP/UDP sockets) with the owning process.", {}),
+    "get_listening_ports": ("List ports listening for incoming connections and the process bound to each.", {}),
+    "get_routing_table": ("Get the IP routing table and default gateway.", {}),
+    "get_firewall_rules": ("Get firewalld zones and nftables firewall rules.", {}),
+    "get_dns_config": ("Get DNS resolver configuration and name servers.", {}),
+    "get_network_events_history": ("Get recent network connection events captured by eBPF: process, "
+                                   "destination address and port, for the last N minutes.", WINDOW_ARGS),
+    "get_network_event_stats": ("Get statistics of network events: totals, top processes, top "
+                                "destinations and ports over the last N minutes.", WINDOW_ARGS),
+    "detect_network_anomalies": ("Detect anomalous network behaviour: port scans, unusual destinations, "
+                                 "connection bursts and suspicious processes over the last N minutes.", WINDOW_ARGS),
+    "analyze_process_network_behavior": ("Analyze the network behaviour of each process: connections, "
+                                         "destinations and ports per process over the last N minutes.", WINDOW_ARGS),
+}
+
+# question -> tools a correct answer needs
+QUESTIONS = {
+    "Are there any network anomalies in the last 10 minutes?": ["detect_network_anomalies"],
+    "Is anyone port scanning the server?": ["detect_network_anomalies"],
+    "Which processes are making the most network connections?": ["analyze_process_network_behavior"],
+    "Show me the network event statistics for the last hour": ["get_network_event_stats"],
+    "What are the top destinations contacted recently?": ["get_network_event_stats"],
+    "List the recent network events": ["get_network_events_history"],
+    "What is process 4242 doing on the network?": ["analyze_process_network_behavior", "get_process_info"],
+    "Is sshd running?": ["get_service_status"],
+    "Why did the httpd service fail?": ["get_service_status", "get_service_logs"],
+    "Which ports are listening?": ["get_listening_ports"],
+    "What is the kernel version and uptime?": ["get_system_info"],
+    "How much memory and swap is in use?": ["get_memory_info"],
+    "Is the disk full?": ["get_disk_usage"],
+    "Show the firewall rules": ["get_firewall_rules"],
+    "Any failed logins in the audit log?": ["get_audit_logs"],
+    "Show errors from the journal in the last hour": ["get_journal_logs"],
+    "Which process is listening on port 8080?": ["get_listening_ports"],
+    "What is the CPU load right now?": ["get_cpu_info"],
+    "Give me a security overview of the host": ["detect_network_anomalies"],
+    "What's going on?": [],
+}
+
+
+def make_tools():
+    async def run(**kwargs) -> str:
+        return "ok"
+    
+    tools = []
+    for name, (description, extra) in CATALOG.items():
+        schema = {"type": "object", "properties": {**extra, **HOST_ARGS}, "required": ["host", "username"]}
+        tools.append(StructuredTool(name=name, description=description, args_schema=schema, coroutine=run))
+    return tools
+
+
+def schema_tokens(tools) -> int:
+    return len(json.dumps([convert_to_openai_tool(tool) for tool in tools])) // 4
+
+
+async def first_tool_calls(llm, tools, question: str) -> set:
+    response = await llm.bind_tools(tools).ainvoke(question)
+    return {call["name"] for call in response.tool_calls}
+
+
+async def main():
+    live = "--live" in sys.argv
+    config = load_config(str(ROOT / "config.yaml"))
+    tools = make_tools()
+    by_name = {tool.name: tool for tool in tools}
+    selector = ToolSelector.from_config(tools, config)
+    all_tokens = schema_tokens(tools)
+    
+    rows, hits, expanded, latencies = [], 0, 0, []
+    for question, needed in QUESTIONS.items():
+        start = time.perf_counter()
+        names = selector.select(question)
+        latencies.append(time.perf_counter() - start)
+        tokens = schema_tokens([by_name[name] for name in names])
+        covered = set(needed) <= set(names)
+        hits += covered
+        expanded += len(names) == len(tools)
+        rows.append((question, names, tokens, covered))
+        print(f"{'ok ' if covered else 'MISS'} {len(names):2d} tools {tokens:5d} tokens  {question}")
+        if not covered:
+            print(f"      needed {needed}, got {names}")
+    
+    subset_tokens = [tokens for _, _, tokens, _ in rows]
+    print(f"\nAll {len(tools)} tools:      {all_tokens} schema tokens per turn")
+    print(f"Selected subset:   {statistics.mean(subset_tokens):.0f} schema tokens per turn on average "
+          f"({1 - statistics.mean(subset_tokens) / all_tokens:.0%} fewer), "
+          f"{statistics.mean(len(names) for _, names, _, _ in rows):.1f} tools")
+    print(f"Recall:            {hits}/{len(QUESTIONS)} questions have every needed tool "
+          f"({expanded} expanded to all tools)")
+    print(f"Selection latency: {statistics.mean(latencies) * 1e6:.0f} µs per question")
+    
+    if live:
+        from src.llm_client import create_http_client, get_llm
+        llm = get_llm(config, create_http_client(config.get("http", {})))
+        agree = 0
+        for question, names, _, _ in rows:
+            full = await first_tool_calls(llm, tools, question)
+            subset = await first_tool_calls(llm, [by_name[name] for name in names], question)
+            agree += full == subset
+            print(f"{'same' if full == subset else 'DIFF'}  all: {sorted(full)}  subset: {sorted(subset)}  {question}")
+        print(f"First tool choice unchanged for {agree}/{len(rows)} questions")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,93 @@
-"""Conversational ReAct agent for network security queries."""
+"""Conversational ReAct agent for network security queries.
+
+``build_agent()`` is the graph factory in ``langgraph.json``, so the
+LangGraph server may call it for every run. The compiled agent, its LLM
+client's HTTP connection pool and the MCP session are built once per
+config version (config file path, size and modification time) and shared
+by all threads; later calls only stat the config file.
+"""
 
 import asyncio
 import logging
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
+import os
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+from langgraph.prebuilt import ToolNode, create_react_agent
 
-from src.config import load_config
-from src.mcp_tools import load_mcp_tools
+from src.answer_cache import AnswerCache
+from src.compaction import ContextCompactor, make_recall_tool
+from src.config import find_config_path, load_config
+from src.llm_client import create_http_client, get_llm
+from src.mcp_tools import MCPSession
+from src.memory import SemanticMemory
+from src.metrics import metrics
+from src.parallel_tools import ToolTurnLimiter
+from src.snapshot import SituationSnapshot
+from src.tool_selection import ToolSelector
+from src.tool_cache import ToolCache
+from src.tool_output import ToolOutputLimiter
 
 logger = logging.getLogger(__name__)
 
+# MCP tool results shared across conversations (None until the first build or if disabled)
+tool_cache: ToolCache | None = None
+
+# Findings of past investigations, kept across rebuilds (None until the first build or if disabled)
+memory: SemanticMemory | None = None
+
+# Recent answers to repeated questions (None until the first build or if disabled)
+answer_cache: AnswerCache | None = None
+
+
+@dataclass
+class _SharedAgent:
+    """A compiled agent and the long-lived clients it uses."""
+    version: tuple
+    agent: Any
+    http_client: httpx.AsyncClient
+    mcp: MCPSession
+    loop: asyncio.AbstractEventLoop
+    retire_after: float = 600.0
+    snapshot: Optional[SituationSnapshot] = None
+    metrics_task: Optional[asyncio.Task] = None
+    
+    def usable(self, version: tuple) -> bool:
+        return (self.version == version and self.loop is asyncio.get_running_loop()
+                and self.mcp.healthy and not self.http_client.is_closed)
+    
+    def stop_metrics(self):
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+    
+    async def close(self):
+        self.stop_metrics()
+        if self.snapshot is not None:
+            await self.snapshot.stop()
+        await self.mcp.close()
+        await self.http_client.aclose()
+
+
+# Current shared agent, and the build lock of each event loop
+_shared: Optional[_SharedAgent] = None
+_locks: dict = {}
+
+
+def _config_version() -> tuple:
+    """Cheap identity of the config file (no parsing)."""
+    path = find_config_path()
+    stat = os.stat(path)
+    return (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+def _build_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    if loop not in _locks:
+        _locks.clear()
+        _locks[loop] = asyncio.Lock()
+    return _locks[loop]
+
 
 async def build_agent():
     """
@@ -20,35 +98,96 @@ async def build_agent():
     - Reasoning about the data
     - Providing helpful answers
     
+    The agent is built once per config version and returned to every
+    later caller, together with one HTTP connection pool to LlamaStack and
+    one MCP session. A new version (or a closed MCP session) builds a new
+    agent; the previous one is closed after ``shared_agent.retire_after_seconds``
+    so runs still using it can finish.
+    
     Returns:
         Compiled ReAct agent
     """
+    global _shared
+    version = _config_version()
+    if _shared is not None and _shared.usable(version):
+        metrics.incr("agent_reuses")
+        return _shared.agent
+    
+    async with _build_lock():
+        # Another caller may have built it while we waited
+        if _shared is not None and _shared.usable(version):
+            metrics.incr("agent_reuses")
+            return _shared.agent
+        
+        with metrics.timer("agent_build_seconds"):
+            shared = await _build_shared_agent(version)
+        previous, _shared = _shared, shared
+        metrics.incr("agent_builds")
+    
+    if previous is not None:
+        _retire(previous)
+    return shared.agent
+
+
+def _retire(previous: _SharedAgent):
+    """Close a replaced agent's clients once in-flight runs had time to finish."""
+    try:
+        if previous.loop is asyncio.get_running_loop():
+            # The new agent logs the same process-wide metrics
+            previous.stop_metrics()
+            # Its snapshot would only refresh what the new agent's refreshes too
+            if previous.snapshot is not None:
+                asyncio.ensure_future(previous.snapshot.stop())
+            previous.loop.call_later(previous.retire_after, lambda: asyncio.ensure_future(previous.close()))
+    except RuntimeError:
+        pass
+
+
+async def _build_shared_agent(version: tuple) -> _SharedAgent:
     logger.info("Building conversational ReAct agent...")
     
     # Load configuration (run in thread to avoid blocking)
     config = await asyncio.to_thread(load_config)
+    http_settings = config.get("http", {})
     
-    # Initialize LLM
-    llm = ChatOpenAI(
-        base_url=config["llm"]["base_url"],
-        model=config["llm"]["model"],
-        api_key=config["llm"]["api_key"],
-        temperature=config["llm"]["temperature"],
-        max_tokens=config["llm"]["max_tokens"],
-        timeout=60.0,
-    )
+    # Initialize LLM on a keep-alive connection pool shared by all threads
+    http_client = create_http_client(http_settings)
+    llm = get_llm(config, http_client)
     
     logger.info(f"LLM initialized: {config['llm']['model']}")
     
-    # Load MCP tools
-    tools = await load_mcp_tools(
-        endpoint=config["mcp"]["endpoint"],
-        target_host=config["target"]["host"],
-        target_username=config["target"]["username"]
-    )
+    # Load MCP tools bound to one long-lived session
+    mcp = MCPSession(config["mcp"]["endpoint"], http_settings)
+    try:
+        tools = await mcp.start()
+    except BaseException:
+        await http_client.aclose()
+        raise
     
     logger.info(f"Loaded {len(tools)} MCP tools")
     
+    # Serve repeated tool calls from a process-wide cache
+    global tool_cache
+    if config.get("tool_cache", {}).get("enabled", True):
+        if tool_cache is None:
+            tool_cache = ToolCache.from_config(config)
+        tools = tool_cache.wrap_tools(tools)
+    
+    mcp_tools = tools
+    
+    # Old tool outputs are sent as digests; this tool returns them in full
+    compaction = config.get("compaction", {})
+    if compaction.get("enabled", True):
+        spill_dir = config.get("tool_output", {}).get("spill_dir", ".langgraph_api/tool_outputs")
+        tools = tools + [make_recall_tool(compaction.get("recall_max_chars", 8000), spill_dir)]
+    
+    # Current situation refreshed in the background, offered before live calls
+    snapshot = None
+    if config.get("snapshot", {}).get("enabled", True):
+        snapshot = SituationSnapshot.from_config(config)
+        if snapshot.mode == "tool":
+            tools = tools + [snapshot.make_tool()]
+    
     # Create ReAct agent with tools
     # This agent will:
     # 1. Receive a question
@@ -64,13 +203,83 @@ async def build_agent():
         target_username=config["target"]["username"]
     )
     
+    # Tool calls of one LLM turn run concurrently, capped and with a deadline
+    limiter = ToolTurnLimiter.from_config(config)
+    wrap_tool_call = limiter.wrap
+    
+    # Large outputs: a capped preview for the LLM, the full output spilled to disk
+    if config.get("tool_output", {}).get("enabled", True):
+        output = ToolOutputLimiter.from_config(config)
+        
+        async def wrap_tool_call(request, execute):
+            return await limiter.wrap(request, lambda request: output.wrap(request, execute))
+    
+    tool_node = ToolNode(tools, awrap_tool_call=wrap_tool_call)
+    
+    # Bind only the tools matching each question (all of them stay callable)
+    if config.get("tool_selection", {}).get("enabled", True):
+        model = ToolSelector.from_config(tools, config).model(llm)
+    else:
+        bound = llm.bind_tools(tools)
+        model = lambda state, runtime: bound
+    
+    # Add findings of earlier investigations to each question and remember answers
+    global memory
+    if config.get("memory", {}).get("enabled", True):
+        if memory is None:
+            memory = SemanticMemory.from_config(config)
+        model = memory.model(model)
+    
+    # Count questions answered without live calls (prompt mode: add the snapshot)
+    if snapshot is not None:
+        model = snapshot.model(model)
+    
+    # Keep the history sent to the LLM within a token budget
+    if compaction.get("enabled", True):
+        model = ContextCompactor.from_config(config).model(model)
+    
+    # Answer repeated first questions from recent answers
+    global answer_cache
+    if config.get("answer_cache", {}).get("enabled", True):
+        if answer_cache is None:
+            answer_cache = AnswerCache.from_config(config)
+        if snapshot is not None:
+            snapshot.listeners.append(answer_cache.on_snapshot)
+        model = answer_cache.model(model, config["target"]["host"])
+    
     agent = create_react_agent(
-        llm,
-        tools,
+        model,
+        tool_node,
         prompt=system_prompt
     )
     
     logger.info(" ReAct agent built successfully")
     
-    return agent
+    # Refreshes go through the cached tools, so they also warm the tool cache
+    if snapshot is not None:
+        snapshot.start(mcp_tools)
+    
+    # TTFT, cache and tool metrics of served runs go to the log periodically
+    metrics_task = None
+    log_interval = config.get("metrics", {}).get("log_interval_seconds", 300)
+    if log_interval > 0:
+        metrics_task = asyncio.create_task(metrics.log_every(log_interval))
+    
+    return _SharedAgent(
+        version=version,
+        agent=agent,
+        http_client=http_client,
+        mcp=mcp,
+        loop=asyncio.get_running_loop(),
+        retire_after=config.get("shared_agent", {}).get("retire_after_seconds", 600),
+        snapshot=snapshot,
+        metrics_task=metrics_task
+    )
+
 
+async def close_agent():
+    """Close the shared agent's HTTP pool and MCP session (scripts and tests)."""
+    global _shared
+    if _shared is not None:
+        shared, _shared = _shared, None
+        await shared.close()
@@ -0,0 +1,170 @@
+"""Reading the ambient agent's alert logs.
+
+The ambient agent appends alert blocks to ``alerts.log``, or with
+``alerts.compress`` to ``alerts.log.z``: a header (magic, codec, preset
+dictionary) followed by one length-prefixed compressed record per alert
+(``ambient-agent/src/compression.py``). Memory, the situation snapshot and
+the answer cache are configured with the plain path and read both files,
+so switching compression on or off doesn't cut them off from new alerts.
+"""
+
+import logging
+import os
+import struct
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Optional
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".z"
+MAGIC = b"NCLG"
+VERSION = 1
+# magic, version, codec id, dictionary length (as written by the ambient agent)
+HEADER = struct.Struct("<4sBB2xI")
+LENGTH = struct.Struct("<I")
+
+# Configured logs already reported missing
+_missing: set = set()
+
+
+def log_files(path: str) -> List[str]:
+    """
+    Existing files of a configured alert log: the plain log and its
+    compressed ``.z`` counterpart. A log with neither is reported once.
+    """
+    files = [name for name in (path, path + SUFFIX) if os.path.exists(name)]
+    if not files and path not in _missing:
+        _missing.add(path)
+        logger.warning(f"⚠️  Alert log {path} (or {path}{SUFFIX}) not found; no incidents are read from it yet")
+    elif files:
+        _missing.discard(path)
+    return files
+
+
+def log_size(path: str) -> Optional[int]:
+    """Total size of a configured alert log's files, or None if it has none."""
+    sizes = []
+    for name in log_files(path):
+        try:
+            sizes.append(os.path.getsize(name))
+        except OSError:
+            pass
+    return sum(sizes) if sizes else None
+
+
+def is_compressed(name: str) -> bool:
+    return name.endswith(SUFFIX)
+
+
+def _decompressor(name: str, codec_id: int, dictionary: bytes) -> Callable[[bytes], bytes]:
+    if codec_id == 1 and zstandard is not None:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress
+    if codec_id == 2 and lz4_frame is not None:
+        return lz4_frame.decompress
+    if codec_id == 3:
+        def decompress(data: bytes) -> bytes:
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            return decompressor.decompress(data) + decompressor.flush()
+        return decompress
+    codec = {1: "zstandard", 2: "lz4"}.get(codec_id)
+    raise ValueError(f"{name} is compressed with {codec}, which is not installed" if codec
+                     else f"{name} is not a compressed alert log")
+
+
+def _records(f) -> Tuple[Callable[[bytes], bytes], List[Tuple[int, int]]]:
+    """Decompressor and (position, length) of the complete records of an open compressed log."""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{f.name} is not a compressed alert log")
+    magic, version, codec_id, dictionary_length = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{f.name} is not a compressed alert log")
+    decompress = _decompressor(f.name, codec_id, f.read(dictionary_length))
+    # Record lengths are read and payloads skipped; only the wanted records are decompressed
+    records = []
+    position = f.tell()
+    end = f.seek(0, os.SEEK_END)
+    while position + LENGTH.size <= end:
+        f.seek(position)
+        length = LENGTH.unpack(f.read(LENGTH.size))[0]
+        if position + LENGTH.size + length > end:
+            # A record being written, read on the next call
+            break
+        records.append((position, length))
+        position += LENGTH.size + length
+    return decompress, records
+
+
+def _decode(f, decompress: Callable[[bytes], bytes], position: int, length: int) -> str:
+    f.seek(position + LENGTH.size)
+    try:
+        data = decompress(f.read(length))
+    except Exception as e:
+        raise ValueError(f"{f.name} has an unreadable record at {position}: {e}") from e
+    return data.decode("utf-8", errors="replace")
+
+
+def read_from(name: str, offset: int) -> Tuple[str, int]:
+    """
+    Alert text appended to one file of an alert log after ``offset``.
+    
+    Args:
+        name: Plain or compressed (``.z``) log file
+        offset: End of the text read by the previous call (0 at first)
+    
+    Returns:
+        (text, offset to pass next time); the text is empty while an alert
+        is still being written
+    """
+    if is_compressed(name):
+        with open(name, "rb") as f:
+            decompress, records = _records(f)
+            text = "".join(_decode(f, decompress, position, length)
+                           for position, length in records if position >= offset)
+        return text, (records[-1][0] + LENGTH.size + records[-1][1]) if records else offset
+    
+    with open(name, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # Each alert is written at once; a partial last line means a write is in progress
+    if not data.endswith(b"\n"):
+        return "", offset
+    return data.decode("utf-8", errors="replace"), offset + len(data)
+
+
+def tail(name: str, max_chars: int) -> str:
+    """
+    The latest alerts of one file of an alert log, about ``max_chars`` of text.
+    
+    Args:
+        name: Plain or compressed (``.z``) log file
+        max_chars: Text to read from the end
+    
+    Returns:
+        Text of the latest alerts (the first one may be cut)
+    """
+    if is_compressed(name):
+        with open(name, "rb") as f:
+            decompress, records = _records(f)
+            texts, size = [], 0
+            for position, length in reversed(records):
+                if size >= max_chars:
+                    break
+                texts.append(_decode(f, decompress, position, length))
+                size += len(texts[-1])
+        return "".join(reversed(texts))
+    
+    with open(name, "rb") as f:
+        f.seek(max(0, os.path.getsize(name) - max_chars))
+        return f.read().decode("utf-8", errors="replace")
@@ -0,0 +1,341 @@
+"""Semantic cache of answers to repeated analyst questions.
+
+Several analysts often ask near-identical questions within minutes ("is
+the bastion host being port scanned?"), and each one pays for the whole
+ReAct loop. ``AnswerCache.model`` wraps the agent's model so a question
+similar enough to one answered recently gets that answer in milliseconds:
+
+- Questions are normalized (case, spacing, punctuation) and embedded with
+  the memory's ``HashingEmbedder``. Entries are kept per target host and
+  per data epoch, for ``ttl_seconds``.
+- A hit needs a cosine similarity of at least ``threshold`` and the same
+  specifics (numbers, IPs, ``host:port``, paths and dotted host names),
+  and the questions may differ in at most ``max_term_differences`` words
+  besides filler words. "curl" vs "wget" or "last 10" vs "last 60 minutes"
+  are different questions however similar the rest is.
+- The epoch moves on (and the cache is emptied) when new anomalies arrive:
+  a situation snapshot whose ``invalidate_on`` sections changed, or a new
+  report in the ambient agent's alert logs (plain or compressed). An
+  answer whose investigation started in an earlier epoch is not cached.
+- Questions starting with a ``bypass_prefixes`` prefix (``/fresh ...``), or
+  runs with ``configurable.answer_cache`` set to False, are investigated
+  again; their answers refresh the cache.
+- Only the first question of a conversation is cached: follow-ups depend
+  on the conversation before them.
+
+Lookups, hits, bypasses and invalidations are counted in the metrics
+(``answer_cache_lookups``, ``answer_cache_hits``, ``answer_cache_seconds``).
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src import alert_log
+from src.memory import HashingEmbedder, Vector
+from src.metrics import metrics
+from src.tool_selection import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change what a question asks about
+FILLERS = frozenset(
+    "again anything being current currently happening just now ok okay right see seeing still so some "
+    "something there".split()
+)
+
+_DIGIT_RE = re.compile(r"[a-z0-9]*\d[a-z0-9]*")
+_NAME_RE = re.compile(r"[a-z0-9_-]+(?:[.:/][a-z0-9_-]+)+")
+
+
+def normalize(question: str) -> str:
+    """Lowercase, single-spaced, without surrounding punctuation."""
+    return " ".join(question.lower().split()).strip(" ?!.,;:")
+
+
+def specifics(question: str) -> FrozenSet[str]:
+    """Numbers, IPs, ``host:port``, paths and dotted names in a question."""
+    text = normalize(question)
+    return frozenset(_NAME_RE.findall(text)) | frozenset(_DIGIT_RE.findall(text))
+
+
+@dataclass
+class _Answer:
+    question: str
+    normalized: str
+    vector: Vector
+    terms: FrozenSet[str]
+    specifics: FrozenSet[str]
+    answer: str
+    created: float
+
+
+class CachedAnswerModel(BaseChatModel):
+    """Chat model that replies with a cached answer (streamed as one chunk)."""
+    
+    answer: str
+    metadata: Dict[str, Any] = {}
+    
+    @property
+    def _llm_type(self) -> str:
+        return "answer-cache"
+    
+    def bind_tools(self, tools, **kwargs):
+        return self
+    
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = AIMessage(content=self.answer, response_metadata={"answer_cache": self.metadata})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunk = ChatGenerationChunk(message=AIMessageChunk(content=self.answer,
+                                                           response_metadata={"answer_cache": self.metadata}))
+        if run_manager:
+            run_manager.on_llm_new_token(self.answer, chunk=chunk)
+        yield chunk
+
+
+class AnswerCache:
+    """Recent answers per target, matched by question similarity."""
+    
+    def __init__(self, threshold: float = 0.6, ttl_seconds: float = 120.0, max_entries: int = 256,
+                 max_term_differences: int = 1, bypass_prefixes: Iterable[str] = ("/fresh",),
+                 invalidate_on: Iterable[str] = ("detect_network_anomalies", "open incidents"),
+                 incident_logs: Iterable[str] = (), embedder: Optional[HashingEmbedder] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            threshold: Lowest cosine similarity of a hit
+            ttl_seconds: Age after which an answer is not served
+            max_entries: Answers kept per target; the oldest are evicted
+            max_term_differences: Words (besides fillers) two questions may differ in
+            bypass_prefixes: A question starting with one of these is investigated again
+            invalidate_on: Snapshot sections whose change empties the cache
+            incident_logs: Alert logs whose growth empties the cache
+            embedder: Question embedder (default: HashingEmbedder)
+            clock: Time source (epoch seconds)
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_term_differences = max_term_differences
+        self.bypass_prefixes = tuple(prefix.lower() for prefix in bypass_prefixes)
+        self.invalidate_on = set(invalidate_on)
+        self.incident_logs = list(incident_logs)
+        self.embedder = embedder or HashingEmbedder()
+        self.clock = clock
+        self.epoch = 0
+        self._entries: Dict[str, OrderedDict] = {}
+        self._log_sizes: Dict[str, int] = {}
+        # Epoch each running investigation started in, by question message id
+        self._started: OrderedDict = OrderedDict()
+        self._check_logs()
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "AnswerCache":
+        settings = config.get("answer_cache", {})
+        return cls(
+            threshold=settings.get("threshold", 0.6),
+            ttl_seconds=settings.get("ttl_seconds", 120),
+            max_entries=settings.get("max_entries", 256),
+            max_term_differences=settings.get("max_term_differences", 1),
+            bypass_prefixes=settings.get("bypass_prefixes", ["/fresh"]),
+            invalidate_on=settings.get("invalidate_on", ["detect_network_anomalies", "open incidents"]),
+            incident_logs=settings.get("incident_logs", [])
+        )
+    
+    def bypassed(self, question: str) -> bool:
+        """Whether a question asks to be investigated again."""
+        return question.strip().lower().startswith(self.bypass_prefixes) if self.bypass_prefixes else False
+    
+    def _strip_bypass(self, question: str) -> str:
+        stripped = question.strip()
+        for prefix in self.bypass_prefixes:
+            if stripped.lower().startswith(prefix):
+                return stripped[len(prefix):].strip()
+        return stripped
+    
+    def lookup(self, target: str, question: str) -> Optional[Tuple[_Answer, float]]:
+        """
+        A recent answer to a similar question about the same target.
+        
+        Args:
+            target: Target host
+            question: The question
+        
+        Returns:
+            (answer, similarity), or None
+        """
+        with metrics.timer("answer_cache_seconds"):
+            self._check_logs()
+            metrics.incr("answer_cache_lookups")
+            entries = self._entries.get(target)
+            if not entries:
+                return None
+            now = self.clock()
+            # Entries are in insertion order, so expired ones are at the front
+            while entries and now - next(iter(entries.values())).created > self.ttl_seconds:
+                entries.popitem(last=False)
+            normalized = normalize(question)
+            if normalized in entries:
+                found = entries[normalized], 1.0
+            else:
+                found = self._similar(entries.values(), question)
+        if found is not None:
+            metrics.incr("answer_cache_hits")
+        return found
+    
+    def _similar(self, entries: Iterable[_Answer], question: str) -> Optional[Tuple[_Answer, float]]:
+        vector = self.embedder.embed(question)
+        weights = dict(zip(*vector))
+        terms, wanted = frozenset(tokenize(question)) - FILLERS, specifics(question)
+        best = None
+        for entry in entries:
+            if entry.specifics != wanted or len(entry.terms ^ terms) > self.max_term_differences:
+                continue
+            score = sum(weights.get(key, 0.0) * weight for key, weight in zip(*entry.vector))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = entry, score
+        return best
+    
+    def store(self, target: str, question: str, answer: str, epoch: Optional[int] = None):
+        """
+        Remember the answer to a question about a target.
+        
+        Args:
+            target: Target host
+            question: The question
+            answer: The answer
+            epoch: Data epoch when the question was asked; an answer from an
+                earlier epoch is built on old data and is not stored
+        """
+        self._check_logs()
+        if epoch is not None and epoch != self.epoch:
+            metrics.incr("answer_cache_stale_answers")
+            logger.info(f"🗑️  Not caching an answer started in epoch {epoch} (now {self.epoch}): {question[:80]!r}")
+            return
+        normalized = normalize(question)
+        entries = self._entries.setdefault(target, OrderedDict())
+        entries.pop(normalized, None)
+        entries[normalized] = _Answer(question, normalized, self.embedder.embed(question),
+                                      frozenset(tokenize(question)) - FILLERS, specifics(question), answer,
+                                      self.clock())
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        metrics.incr("answer_cache_stores")
+    
+    def invalidate(self, reason: str):
+        """Start a new data epoch: cached answers describe the old data."""
+        self.epoch += 1
+        dropped = sum(len(entries) for entries in self._entries.values())
+        self._entries.clear()
+        metrics.incr("answer_cache_invalidations", reason=reason)
+        if dropped:
+            logger.info(f"🗑️  Answer cache emptied ({reason}): {dropped} answers, epoch {self.epoch}")
+    
+    def on_snapshot(self, changed: Set[str]):
+        """Listener for SituationSnapshot: new anomalies or incidents empty the cache."""
+        if changed & self.invalidate_on:
+            self.invalidate("snapshot")
+    
+    def _check_logs(self):
+        for path in self.incident_logs:
+            # The plain log and the compressed .z log the ambient agent writes with alerts.compress
+            size = alert_log.log_size(path)
+            if size is None:
+                continue
+            previous = self._log_sizes.get(path)
+            self._log_sizes[path] = size
+            # Grown, or rotated (a compressed log starts over)
+            if previous is not None and size != previous:
+                self.invalidate("incident")
+    
+    @staticmethod
+    def report() -> Dict[str, float]:
+        """Lookups, hits and the hit ratio."""
+        lookups = metrics.counter("answer_cache_lookups")
+        hits = metrics.counter("answer_cache_hits")
+        return {"lookups": lookups, "hits": hits, "bypassed": metrics.counter("answer_cache_bypassed"),
+                "hit_ratio": hits / lookups if lookups else 0.0}
+    
+    def model(self, select_model: Callable[[Any, Any], Any], target: str) -> Callable[[Any, Any], Any]:
+        """
+        Dynamic model for ``create_react_agent`` that answers a conversation's
+        first question from the cache when it can, and caches its answer.
+        
+        Args:
+            select_model: Dynamic model (state, runtime) -> model with tools bound
+            target: Target host the agent's tools run on
+        
+        Returns:
+            Dynamic model with the answer cache
+        """
+        def cached_model(state, runtime):
+            messages = state["messages"] if isinstance(state, dict) else state.messages
+            questions = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+            # Follow-ups depend on the conversation; only first questions are cached
+            if len(questions) != 1:
+                return select_model(state, runtime)
+            question = _text(messages[questions[0]])
+            key = messages[questions[0]].id or question
+            if questions[0] == len(messages) - 1:
+                hit = self._first_call(target, question)
+                if hit is not None:
+                    return hit
+                # The epoch the investigation starts in, checked when its answer arrives
+                self._started[key] = self.epoch
+                while len(self._started) > self.max_entries:
+                    self._started.popitem(last=False)
+            epoch = self._started.get(key, -1)
+            keep = RunnableLambda(lambda answer: self._store_answer(target, question, answer, epoch, key),
+                                  name="cache_answer")
+            return select_model(state, runtime) | keep
+        
+        return cached_model
+    
+    def _first_call(self, target: str, question: str) -> Optional[CachedAnswerModel]:
+        """The cached answer model for a new question, if there is a hit."""
+        if self.bypassed(question) or not _cache_enabled():
+            metrics.incr("answer_cache_bypassed")
+            return None
+        found = self.lookup(target, question)
+        if found is None:
+            return None
+        entry, similarity = found
+        age = self.clock() - entry.created
+        logger.info(f"🗄️  Cached answer ({similarity:.2f} similar, {age:.0f}s old): {entry.question[:80]!r}")
+        note = (f"\n\n(Answer to a similar question asked {age:.0f}s ago: \"{entry.question}\". "
+                f"Start a question with {self.bypass_prefixes[0]} for a new investigation.)"
+                if self.bypass_prefixes else "")
+        return CachedAnswerModel(answer=entry.answer + note,
+                                 metadata={"question": entry.question, "similarity": round(similarity, 3),
+                                           "age_seconds": round(age, 1), "epoch": self.epoch})
+    
+    def _store_answer(self, target: str, question: str, answer: Any, epoch: int, key: str) -> Any:
+        if isinstance(answer, AIMessage) and not answer.tool_calls and _text(answer).strip():
+            self._started.pop(key, None)
+            self.store(target, self._strip_bypass(question), _text(answer), epoch)
+        return answer
+
+
+def _cache_enabled() -> bool:
+    """Whether the run allows cached answers (``configurable.answer_cache``)."""
+    try:
+        from langgraph.config import get_config
+        return get_config().get("configurable", {}).get("answer_cache", True) is not False
+    except RuntimeError:
+        return True
+
+
+def _text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content)
@@ -0,0 +1,271 @@
+"""Context compaction for long conversations.
+
+An investigation can run for dozens of questions, and every tool output
+(often a large event dump) stays in the conversation. Without compaction
+each LLM turn re-sends all of it, so latency and token cost grow with the
+session until the context overflows. ``ContextCompactor.model`` wraps the
+agent's model so the messages it sees are compacted on each turn; the
+conversation state keeps every message unchanged:
+
+- The system prompt and the last ``keep_turns`` questions with their tool
+  calls and answers are sent verbatim.
+- Older tool outputs longer than ``digest_chars`` are replaced by a
+  digest: the tool name, the size, the first lines, and a reference
+  for ``recall_tool_output``, which returns the full output, or the lines
+  matching a filter, from the conversation state.
+- If the history is still above ``max_tokens`` (estimated), the oldest
+  turns are left out and replaced by a note saying so.
+
+Digests are cached per tool call, so an old turn looks the same on every
+later turn. Estimated input tokens, digests and omitted turns are counted
+in the metrics (``context_tokens``, ``context_digests``,
+``context_omitted_turns``).
+
+This wraps the model rather than using a ``pre_model_hook``, which would
+also store the compacted copy in the graph state on every LLM call.
+"""
+
+import json
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Annotated, Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool, tool
+from langgraph.prebuilt import InjectedState
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RECALL_TOOL = "recall_tool_output"
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Rough token count of a message (~4 characters per token)."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    size = len(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        size += len(json.dumps([call["args"] for call in message.tool_calls]))
+    return size // 4 + 4
+
+
+def _text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content)
+
+
+class ContextCompactor:
+    """Keeps the messages sent to the LLM within a rolling token budget."""
+    
+    def __init__(self, max_tokens: int = 12000, keep_turns: int = 2, digest_chars: int = 800,
+                 digest_lines: int = 8, cache_size: int = 1024):
+        """
+        Args:
+            max_tokens: Estimated token budget of the history sent to the LLM
+            keep_turns: Latest questions whose messages are sent verbatim
+            digest_chars: Older tool outputs longer than this are digested
+            digest_lines: Lines of the output kept in a digest
+            cache_size: Digests kept
+        """
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.digest_chars = digest_chars
+        self.digest_lines = digest_lines
+        self.cache_size = cache_size
+        self._digests: OrderedDict = OrderedDict()
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "ContextCompactor":
+        settings = config.get("compaction", {})
+        return cls(
+            max_tokens=settings.get("max_tokens", 12000),
+            keep_turns=settings.get("keep_turns", 2),
+            digest_chars=settings.get("digest_chars", 800),
+            digest_lines=settings.get("digest_lines", 8)
+        )
+    
+    def model(self, select_model: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+        """
+        Dynamic model for ``create_react_agent`` that compacts the prompt.
+        
+        Args:
+            select_model: Dynamic model (state, runtime) -> model with tools bound
+        
+        Returns:
+            Dynamic model sending compacted messages to the selected model
+        """
+        compact = RunnableLambda(self._compact_prompt, name="compact_context")
+        
+        def compacting_model(state, runtime):
+            return compact | select_model(state, runtime)
+        
+        return compacting_model
+    
+    def _compact_prompt(self, prompt: Any) -> List[BaseMessage]:
+        messages = prompt.to_messages() if hasattr(prompt, "to_messages") else list(prompt)
+        # Leading system messages (the system prompt) are pinned
+        system = 0
+        while system < len(messages) and isinstance(messages[system], SystemMessage):
+            system += 1
+        with metrics.timer("context_compaction_seconds"):
+            return messages[:system] + self.compact(messages[system:])
+    
+    def compact(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Messages to send to the LLM.
+        
+        Args:
+            messages: Full conversation
+        
+        Returns:
+            Messages with old tool outputs digested and, above the token
+            budget, the oldest turns left out
+        """
+        # Turns start at each question; the last keep_turns are pinned
+        starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if self.keep_turns <= 0:
+            pinned = len(messages)
+        elif len(starts) >= self.keep_turns:
+            pinned = starts[-self.keep_turns]
+        else:
+            pinned = 0
+        
+        turns = []
+        bounds = [0] + [i for i in starts if 0 < i < pinned] + [pinned]
+        for begin, end in zip(bounds, bounds[1:]):
+            if begin < end:
+                turns.append([self._digest(m) if isinstance(m, ToolMessage) else m for m in messages[begin:end]])
+        recent = list(messages[pinned:])
+        
+        sizes = [sum(estimate_tokens(m) for m in turn) for turn in turns]
+        total = sum(sizes) + sum(estimate_tokens(m) for m in recent)
+        
+        # Leave out the oldest turns until the history fits
+        omitted = 0
+        while omitted < len(turns) and total > self.max_tokens:
+            total -= sizes[omitted]
+            omitted += 1
+        
+        compacted = [m for turn in turns[omitted:] for m in turn] + recent
+        if omitted:
+            metrics.incr("context_omitted_turns", omitted)
+            compacted.insert(0, HumanMessage(
+                content=f"[{omitted} earlier question(s) of this conversation were left out to save context.]"
+            ))
+        metrics.observe("context_tokens", total)
+        return compacted
+    
+    def _digest(self, message: ToolMessage) -> ToolMessage:
+        """Short stand-in for a long tool output (cached per tool call)."""
+        text = _text(message)
+        if len(text) <= self.digest_chars:
+            return message
+        
+        key = message.tool_call_id
+        digest = self._digests.get(key)
+        if digest is not None:
+            self._digests.move_to_end(key)
+            return digest
+        
+        lines = text.splitlines()
+        head = []
+        budget = self.digest_chars
+        for line in lines[:self.digest_lines]:
+            line = line if len(line) <= 200 else line[:200] + "…"
+            if len(line) > budget:
+                break
+            head.append(line)
+            budget -= len(line)
+        more = len(lines) - len(head)
+        digest = ToolMessage(
+            content=(
+                f"[Digest of {message.name or 'tool'} output: {len(lines)} lines, {len(text)} characters]\n"
+                + "\n".join(head)
+                + (f"\n… {more} more lines." if more > 0 else "")
+                + f'\nFull output: {RECALL_TOOL}(ref="{key}"), optionally with grep="<text>".'
+            ),
+            name=message.name,
+            tool_call_id=message.tool_call_id,
+            id=message.id,
+            status=message.status
+        )
+        self._digests[key] = digest
+        metrics.incr("context_digests")
+        while len(self._digests) > self.cache_size:
+            self._digests.popitem(last=False)
+        return digest
+
+
+def _spilled_lines(message: ToolMessage, spill_dir: str) -> Optional[Iterator[str]]:
+    """
+    Lines of a tool output spilled to disk by ``ToolOutputLimiter``, or None.
+    
+    Only files inside ``spill_dir`` are read: the artifact is part of the
+    conversation state, so its path is not trusted.
+    """
+    artifact = message.artifact if isinstance(message.artifact, dict) else {}
+    if not artifact.get("spill"):
+        return None
+    path = Path(artifact["spill"]).resolve()
+    if not path.is_relative_to(Path(spill_dir).resolve()):
+        logger.warning(f"⚠️  Ignoring spilled output {path} outside {spill_dir}")
+        metrics.incr("recall_rejected_spills")
+        return None
+    if not path.is_file():
+        return None
+    
+    def lines():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+    
+    return lines()
+
+
+def make_recall_tool(max_chars: int = 8000, spill_dir: str = ".langgraph_api/tool_outputs") -> BaseTool:
+    """
+    Tool returning an earlier tool output from the conversation state.
+    
+    Args:
+        max_chars: Characters returned per call; ``offset`` pages through the rest
+        spill_dir: Directory of outputs spilled by ``ToolOutputLimiter``;
+            spill paths elsewhere fall back to the message text
+    
+    Returns:
+        The ``recall_tool_output`` tool
+    """
+    @tool(RECALL_TOOL)
+    def recall_tool_output(ref: str, grep: str = "", offset: int = 0,
+                           state: Annotated[dict, InjectedState] = None) -> str:
+        """Return an earlier tool output that was shown as a digest or a capped
+        preview. ref is the reference in the digest or preview; grep keeps only lines containing the text
+        (case-insensitive); offset skips that many lines."""
+        for message in reversed(state["messages"]):
+            if isinstance(message, ToolMessage) and message.tool_call_id == ref:
+                break
+        else:
+            return f"Error: no tool output with ref {ref!r} in this conversation"
+        
+        # A capped output's full text was spilled to disk: read it line by line
+        spilled = _spilled_lines(message, spill_dir)
+        lines = spilled if spilled is not None else iter(_text(message).splitlines())
+        if grep:
+            lines = (line for line in lines if grep.lower() in line.lower())
+        out, size, remaining = [], 0, 0
+        for index, line in enumerate(lines):
+            if index < offset:
+                continue
+            if remaining or (size + len(line) + 1 > max_chars and out):
+                remaining += 1
+                continue
+            out.append(line)
+            size += len(line) + 1
+        if remaining > 0:
+            out.append(f"… {remaining} more lines (offset={offset + len(out)})")
+        return "\n".join(out) if out else "No matching lines"
+    
+    return recall_tool_output
@@ -6,6 +6,33 @@ from pathlib import Path
 from typing import Dict, Any
 
 
+def find_config_path(config_path: str = None) -> Path:
+    """
+    Locate the config file.
+    
+    Args:
+        config_path: Path to config file. If None, looks in default locations.
+    
+    Returns:
+        Path of the config file
+    """
+    if config_path is not None:
+        return Path(config_path)
+    
+    # Try default locations
+    possible_paths = [
+        Path("config.yaml"),
+        Path("../config.yaml"),
+        Path("/etc/ambient-agent/config.yaml"),
+    ]
+    
+    for path in possible_paths:
+        if path.exists():
+            return path
+    
+    raise FileNotFoundError("Config file not found. Expected config.yaml in current directory.")
+
+
 def load_config(config_path: str = None) -> Dict[str, Any]:
     """
     Load configuration from YAML file.
@@ -16,21 +43,7 @@ def load_config(config_path: str = None) -> Dict[str, Any]:
     Returns:
         Configuration dictionary
     """
-    if config_path is None:
-        # Try default locations
-        possible_paths = [
-            Path("config.yaml"),
-            Path("../config.yaml"),
-            Path("/etc/ambient-agent/config.yaml"),
-        ]
-        
-        for path in possible_paths:
-            if path.exists():
-                config_path = path
-                break
-        
-        if config_path is None:
-            raise FileNotFoundError("Config file not found. Expected config.yaml in current directory.")
+    config_path = find_config_path(config_path)
     
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
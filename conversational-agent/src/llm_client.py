@@ -0,0 +1,68 @@
+"""LLM client for LlamaStack with a shared HTTP connection pool."""
+
+import importlib.util
+import logging
+from typing import Any, Dict
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from src.streaming import TTFTCallback
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client(settings: Dict[str, Any]) -> httpx.AsyncClient:
+    """
+    Create a keep-alive connection pool for LlamaStack requests.
+    
+    HTTP/2 multiplexes concurrent requests over one connection when the
+    ``h2`` package is installed (``pip install httpx[http2]``); otherwise
+    requests reuse HTTP/1.1 keep-alive connections.
+    
+    Args:
+        settings: ``http`` section of config.yaml
+    
+    Returns:
+        Async HTTP client to share across agents
+    """
+    http2 = settings.get("http2", True)
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("⚠️  h2 is not installed, using HTTP/1.1 keep-alive (pip install httpx[http2])")
+        http2 = False
+    
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.get("max_connections", 100),
+            max_keepalive_connections=settings.get("max_keepalive_connections", 20),
+            keepalive_expiry=settings.get("keepalive_expiry_seconds", 60)
+        ),
+        timeout=httpx.Timeout(settings.get("timeout_seconds", 60.0), connect=settings.get("connect_timeout_seconds", 10.0))
+    )
+
+
+def get_llm(config: Dict[str, Any], http_client: httpx.AsyncClient) -> ChatOpenAI:
+    """
+    Initialize the LLM on a shared connection pool.
+    
+    Args:
+        config: Full configuration
+        http_client: Pool from ``create_http_client``
+    
+    Returns:
+        Configured ChatOpenAI instance; its calls record ``llm_ttft_seconds``
+    """
+    return ChatOpenAI(
+        base_url=config["llm"]["base_url"],
+        model=config["llm"]["model"],
+        api_key=config["llm"]["api_key"],
+        temperature=config["llm"]["temperature"],
+        max_tokens=config["llm"]["max_tokens"],
+        timeout=60.0,
+        # Stream tokens so LangGraph API clients get astream/astream_events output
+        streaming=config["llm"].get("streaming", True),
+        stream_usage=True,
+        http_async_client=http_client,
+        callbacks=[TTFTCallback()],
+    )
@@ -1,11 +1,15 @@
 """MCP tools loader using langchain-mcp-adapters."""
 
+import asyncio
 import logging
-from typing import List
+from typing import Any, Dict, List, Optional
 from langchain_core.tools import BaseTool
 
 try:
+    import httpx
     from langchain_mcp_adapters.client import MultiServerMCPClient
+    from langchain_mcp_adapters.sessions import create_session
+    from langchain_mcp_adapters.tools import load_mcp_tools as load_session_tools
     MCP_AVAILABLE = True
 except ImportError:
     MCP_AVAILABLE = False
@@ -54,12 +58,102 @@ async def load_mcp_tools(endpoint: str, target_host: str, target_username: str)
             logger.debug(f"  - {tool.name}: {tool.description[:80]}...")
         
         return tools
-        
+    
     except Exception as e:
         logger.error(f"❌ Failed to load MCP tools: {e}")
         raise
 
 
+class MCPSession:
+    """
+    One MCP session kept open and shared by every agent and thread.
+    
+    ``MultiServerMCPClient.get_tools()`` tools open a new session (and
+    connection) for each call. Here the session lives in a background task,
+    so anyio's task-bound context stays valid, and concurrent tool calls are
+    multiplexed over its keep-alive HTTP connections.
+    """
+    
+    def __init__(self, endpoint: str, http_settings: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            endpoint: MCP server endpoint URL
+            http_settings: ``http`` section of config.yaml (connection limits)
+        """
+        self.endpoint = endpoint
+        self.http_settings = http_settings or {}
+        self.tools: List[BaseTool] = []
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+    
+    def _client_factory(self, headers=None, timeout=None, auth=None) -> "httpx.AsyncClient":
+        return httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout or httpx.Timeout(30.0, read=300.0),
+            auth=auth,
+            limits=httpx.Limits(
+                max_connections=self.http_settings.get("max_connections", 100),
+                max_keepalive_connections=self.http_settings.get("max_keepalive_connections", 20),
+                keepalive_expiry=self.http_settings.get("keepalive_expiry_seconds", 60)
+            )
+        )
+    
+    async def start(self) -> List[BaseTool]:
+        """
+        Open the session and load its tools.
+        
+        Returns:
+            Tools bound to the shared session
+        """
+        if not MCP_AVAILABLE:
+            raise ImportError("langchain-mcp-adapters is required. Install with: pip install langchain-mcp-adapters")
+        
+        logger.info(f"Opening shared MCP session to {self.endpoint}")
+        self._task = asyncio.create_task(self._run())
+        ready = asyncio.create_task(self._ready.wait())
+        await asyncio.wait({self._task, ready}, return_when=asyncio.FIRST_COMPLETED)
+        if not self._ready.is_set():
+            ready.cancel()
+            # Raises the connection error
+            await self._task
+        
+        logger.info(f" Loaded {len(self.tools)} MCP tools on a shared session")
+        return self.tools
+    
+    async def _run(self):
+        connection = {
+            "transport": "streamable_http",
+            "url": self.endpoint,
+            "headers": {},
+            "httpx_client_factory": self._client_factory,
+        }
+        try:
+            async with create_session(connection) as session:
+                await session.initialize()
+                self.tools = await load_session_tools(session)
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            if self._ready.is_set():
+                logger.error(f"❌ Shared MCP session closed: {e}")
+            raise
+    
+    @property
+    def healthy(self) -> bool:
+        """Whether the session is open."""
+        return self._task is not None and not self._task.done() and self._ready.is_set()
+    
+    async def close(self):
+        """Close the session; tools bound to it stop working."""
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.debug(f"MCP session closed with {e}")
+
+
 async def get_mcp_tool_by_name(tools: List[BaseTool], name: str) -> BaseTool:
     """
     Get a specific tool by name.
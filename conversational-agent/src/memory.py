@@ -0,0 +1,852 @@
+"""Semantic memory of past investigations.
+
+Analysts keep asking about the same recurring processes and destinations,
+and every conversation starts over with fresh tool calls. ``SemanticMemory``
+keeps what earlier investigations found and puts the most relevant
+findings in front of the model with each new question:
+
+- Finished answers (question, answer, tools used) are remembered when a
+  question needed tool calls. Incident reports written by the ambient
+  agent (its alert log) are read as they are appended.
+- Texts are embedded by ``HashingEmbedder``: stemmed words, word pairs and
+  compound tokens (IPs, ``host:port``, ``systemd-resolved``) hashed into a
+  sparse vector. It is deterministic and needs no model or download.
+- Vectors are indexed by ``IVFIndex``, an inverted-file ANN index: entries
+  are clustered into cells around sparse centroids (each entry is stored
+  in its ``replicas`` nearest cells), and a search scores only the entries
+  in the ``nprobe`` cells nearest to the question. The index is retrained
+  in the background when it has grown fourfold since its last training.
+- Entries, vectors, centroids and cell assignments are rows in the
+  persistence database (``persistence.path``), so a restart reloads the
+  index without retraining. Loading runs in the background; until it is
+  done questions get no findings.
+
+The ``top_k`` findings scoring at least ``min_score`` are added before the
+latest question. Recall latency and hits are counted in the metrics
+(``memory_recall_seconds``, ``memory_hits``, ``memory_entries``).
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src import alert_log
+from src.metrics import metrics
+from src.tool_selection import tokenize
+
+logger = logging.getLogger(__name__)
+
+# A sparse vector: feature ids and weights, feature ids ascending
+Vector = Tuple[array, array]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    features BLOB NOT NULL,
+    weights BLOB NOT NULL,
+    cells TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memories_updated ON memories (updated_at);
+CREATE TABLE IF NOT EXISTS memory_cells (
+    cell INTEGER PRIMARY KEY,
+    features BLOB NOT NULL,
+    weights BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory_sources (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+_COMPOUND_RE = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)+")
+# Alert log blocks (ambient-agent write_alert_log): rule, header line, rule, report lines
+_ALERT_RULE = "=" * 80
+_ALERT_HEADER = re.compile(rf"\n{_ALERT_RULE}\n([^\n]*)\n{_ALERT_RULE}\n")
+
+
+class HashingEmbedder:
+    """Deterministic sparse embedding by feature hashing."""
+    
+    def __init__(self, dim: int = 1 << 22, max_features: int = 64, bigrams: bool = True):
+        """
+        Args:
+            dim: Hash space size
+            max_features: Features kept per text (highest weights, then earliest)
+            bigrams: Also hash consecutive word pairs
+        """
+        self.dim = dim
+        self.max_features = max_features
+        self.bigrams = bigrams
+    
+    def features(self, text: str) -> Counter:
+        """Words, word pairs and compound tokens of a text, in order of appearance."""
+        terms = tokenize(text)
+        counts = Counter(terms)
+        if self.bigrams:
+            counts.update(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+        counts.update(_COMPOUND_RE.findall(text.lower()))
+        return counts
+    
+    def embed(self, text: str) -> Vector:
+        """L2-normalized vector of log term frequencies."""
+        weights: Dict[int, float] = {}
+        for feature, count in self.features(text).items():
+            key = zlib.crc32(feature.encode()) % self.dim
+            weights[key] = weights.get(key, 0.0) + 1.0 + math.log(count)
+        # sorted() is stable, so ties keep the earliest features (the question comes first)
+        kept = sorted(weights.items(), key=lambda item: -item[1])[:self.max_features]
+        return _vector(dict(kept))
+
+
+def _vector(weights: Dict[int, float]) -> Vector:
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    keys = sorted(weights)
+    return array("q", keys), array("f", [weights[k] / norm for k in keys])
+
+
+def _dot(query: Dict[int, float], vector: Vector) -> float:
+    return sum(query.get(key, 0.0) * weight for key, weight in zip(*vector))
+
+
+class _Cell:
+    """One IVF cell: its entries as a feature-sorted inverted list.
+    
+    New entries wait in ``pending`` and are merged into the inverted list
+    in batches, so adding an entry doesn't rebuild the cell.
+    """
+    
+    __slots__ = ("ids", "keys", "starts", "rows", "weights", "pending")
+    
+    def __init__(self):
+        self.ids = array("q")
+        self.keys = array("q")
+        self.starts = array("I", [0])
+        self.rows = array("I")
+        self.weights = array("f")
+        self.pending: List[Tuple[int, Vector]] = []
+    
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.pending)
+    
+    def score(self, query: Sequence[Tuple[int, float]], query_map: Dict[int, float],
+              removed: set, scores: Dict[int, float]):
+        """Add the cell's entries' dot products with the query to ``scores``."""
+        if self.ids:
+            found: Dict[int, float] = {}
+            keys, starts, rows, weights = self.keys, self.starts, self.rows, self.weights
+            size = len(keys)
+            for key, query_weight in query:
+                i = bisect_left(keys, key)
+                if i < size and keys[i] == key:
+                    for j in range(starts[i], starts[i + 1]):
+                        row = rows[j]
+                        found[row] = found.get(row, 0.0) + query_weight * weights[j]
+            for row, score in found.items():
+                entry = self.ids[row]
+                if entry not in removed:
+                    scores[entry] = score
+        for entry, vector in self.pending:
+            if entry not in removed:
+                score = _dot(query_map, vector)
+                if score > 0:
+                    scores[entry] = score
+    
+    def vectors(self, removed: set) -> List[Tuple[int, Vector]]:
+        """Entries of the cell with their vectors (rebuilt from the inverted list)."""
+        entries: Dict[int, Tuple[array, array]] = {}
+        for i, key in enumerate(self.keys):
+            for j in range(self.starts[i], self.starts[i + 1]):
+                entry = self.ids[self.rows[j]]
+                if entry not in removed:
+                    keys, weights = entries.setdefault(entry, (array("q"), array("f")))
+                    keys.append(key)
+                    weights.append(self.weights[j])
+        return list(entries.items()) + [(entry, vector) for entry, vector in self.pending if entry not in removed]
+    
+    def merge(self, removed: set):
+        """Fold pending entries into the inverted list and drop removed ones."""
+        entries = self.vectors(removed)
+        postings: Dict[int, Tuple[List[int], List[float]]] = {}
+        for row, (_, (keys, weights)) in enumerate(entries):
+            for key, weight in zip(keys, weights):
+                posting = postings.get(key)
+                if posting is None:
+                    posting = postings[key] = ([], [])
+                posting[0].append(row)
+                posting[1].append(weight)
+        self.ids = array("q", [entry for entry, _ in entries])
+        self.keys = array("q", sorted(postings))
+        self.starts, self.rows, self.weights = array("I", [0]), array("I"), array("f")
+        for key in self.keys:
+            rows, weights = postings[key]
+            self.rows.extend(rows)
+            self.weights.extend(weights)
+            self.starts.append(len(self.rows))
+        self.pending = []
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest neighbour index over sparse vectors.
+    
+    Entries are clustered into cells (spherical k-means on a sample) and each
+    entry is stored in its ``replicas`` nearest cells, so an entry near a cell
+    boundary is still found when the question lands in the neighbouring cell.
+    A search scores exactly the entries of the ``nprobe`` cells whose
+    centroids best match the question.
+    """
+    
+    def __init__(self, nprobe: int = 8, replicas: int = 2, min_train: int = 1024, centroid_features: int = 48,
+                 assign_features: int = 8, merge_every: int = 32, seed: int = 0):
+        """
+        Args:
+            nprobe: Cells searched per query (more: better recall, slower)
+            replicas: Cells each entry is stored in
+            min_train: Entries below which the index is one cell (exact search)
+            centroid_features: Features kept per centroid
+            assign_features: Most distinctive features of a vector matched
+                against the centroids to pick its cells
+            merge_every: Pending entries that trigger a cell merge
+            seed: Seed of the centroid sampling
+        """
+        self.nprobe = nprobe
+        self.replicas = replicas
+        self.min_train = min_train
+        self.centroid_features = centroid_features
+        self.assign_features = assign_features
+        self.merge_every = merge_every
+        self.seed = seed
+        self.cells: List[_Cell] = [_Cell()]
+        self.centroids: List[Vector] = []
+        self.df: Counter = Counter()
+        self.trained_size = 0
+        self._centroid_postings: Dict[int, List[Tuple[int, float]]] = {}
+        self._cells_of: Dict[int, Tuple[int, ...]] = {}
+        self._removed: set = set()
+    
+    def __len__(self) -> int:
+        return len(self._cells_of)
+    
+    def __contains__(self, entry: int) -> bool:
+        return entry in self._cells_of
+    
+    def fresh(self) -> "IVFIndex":
+        """An empty index with the same settings."""
+        return IVFIndex(self.nprobe, self.replicas, self.min_train, self.centroid_features,
+                        self.assign_features, self.merge_every, self.seed)
+    
+    @property
+    def needs_training(self) -> bool:
+        """True once the index has outgrown its cells (4x the entries it was trained on)."""
+        return len(self) >= self.min_train and len(self) > 4 * self.trained_size
+    
+    def _nearest_cells(self, query: Dict[int, float], count: int) -> List[int]:
+        scores: Dict[int, float] = {}
+        for key, weight in query.items():
+            for cell, centroid_weight in self._centroid_postings.get(key, ()):
+                scores[cell] = scores.get(cell, 0.0) + weight * centroid_weight
+        return sorted(scores, key=scores.get, reverse=True)[:count]
+    
+    def _distinctive(self, weights: Dict[int, float], idf: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """The ``assign_features`` centroid features with the highest weight x idf."""
+        postings = self._centroid_postings
+        if idf is None:
+            total = len(self) + 1
+            scored = {key: weight * math.log(1 + total / max(1, self.df.get(key, 0)))
+                      for key, weight in weights.items() if key in postings}
+        else:
+            scored = {key: weight * idf.get(key, 1.0) for key, weight in weights.items() if key in postings}
+        return dict(sorted(scored.items(), key=lambda item: -item[1])[:self.assign_features])
+    
+    def assign(self, vector: Vector, idf: Optional[Dict[int, float]] = None) -> Tuple[int, ...]:
+        """Cells an entry with this vector is stored in."""
+        if not self.centroids:
+            return (0,)
+        cells = self._nearest_cells(self._distinctive(dict(zip(*vector)), idf), self.replicas)
+        if not cells:
+            # Nothing in common with any centroid: spread such entries over the cells
+            return (int(vector[0][0]) % len(self.cells) if len(vector[0]) else 0,)
+        return tuple(cells)
+    
+    def add(self, entry: int, vector: Vector, cells: Optional[Sequence[int]] = None, merge: bool = True) -> Tuple[int, ...]:
+        """
+        Add an entry. Ids of removed entries must not be reused.
+        
+        Args:
+            entry: Entry id
+            vector: Its vector
+            cells: Cells to store it in (from ``assign`` or a saved index); nearest if None
+            merge: Merge cells when enough entries are pending (bulk loads
+                pass False and call ``compact`` once at the end)
+        
+        Returns:
+            The entry's cells
+        """
+        if not cells or max(cells) >= len(self.cells):
+            cells = self.assign(vector)
+        cells = tuple(cells)
+        self._cells_of[entry] = cells
+        self.df.update(vector[0])
+        for cell in cells:
+            target = self.cells[cell]
+            target.pending.append((entry, vector))
+            # Merging rebuilds the cell, so large cells merge less often
+            if merge and len(target.pending) >= max(self.merge_every, len(target.ids) // 4):
+                target.merge(self._removed)
+        return cells
+    
+    def remove(self, entry: int, vector: Vector):
+        """Remove an entry (``vector`` is the one it was added with)."""
+        if self._cells_of.pop(entry, None) is None:
+            return
+        self._removed.add(entry)
+        self.df.subtract(vector[0])
+        if len(self._removed) > max(1024, len(self) // 8):
+            self.compact()
+    
+    def weigh(self, vector: Vector) -> Dict[int, float]:
+        """Query vector weighted by inverse document frequency (unknown features dropped)."""
+        total = len(self) + 1
+        weights = {key: weight * math.log(1 + total / self.df[key])
+                   for key, weight in zip(*vector) if self.df.get(key, 0) > 0}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {key: weight / norm for key, weight in weights.items()}
+    
+    def search(self, vector: Vector, k: int = 5) -> List[Tuple[float, int]]:
+        """
+        Nearest entries of a query.
+        
+        Args:
+            vector: Query vector (from the same embedder)
+            k: Entries returned
+        
+        Returns:
+            (score, entry id) pairs, best first; scores are cosine-like, 0..1
+        """
+        query = self.weigh(vector)
+        if not query:
+            return []
+        items = sorted(query.items())
+        cells = self._nearest_cells(self._distinctive(query, {}), self.nprobe) if self.centroids else [0]
+        scores: Dict[int, float] = {}
+        for cell in cells:
+            self.cells[cell].score(items, query, self._removed, scores)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(score, entry) for entry, score in best]
+    
+    def train(self, entries: Sequence[Tuple[int, Vector]], iterations: int = 4,
+              sample: int = 20000) -> Dict[int, Tuple[int, ...]]:
+        """
+        Cluster the entries into cells (spherical k-means) and rebuild the index.
+        
+        Args:
+            entries: All entries with their vectors
+            iterations: k-means iterations
+            sample: Entries the centroids are trained on
+        
+        Returns:
+            Entry id -> cells
+        """
+        rng = random.Random(self.seed)
+        count = max(1, min(len(entries) // 32, int(4 * math.sqrt(len(entries)))))
+        training = rng.sample(list(entries), min(sample, len(entries)))
+        # Centroids keep distinctive features: common words would put every
+        # centroid in their postings and make assignment scan all cells
+        df = Counter(key for _, (keys, _) in training for key in keys)
+        idf = {key: math.log(1 + len(training) / n) for key, n in df.items()}
+        self.cells = [_Cell() for _ in range(count)]
+        self._set_centroids([self._mean([vector], idf) for _, vector in rng.sample(training, count)])
+        for _ in range(iterations):
+            members: List[List[Vector]] = [[] for _ in range(count)]
+            for _, vector in training:
+                members[self.assign(vector, idf)[0]].append(vector)
+            self._set_centroids([
+                self._mean(vectors or [training[rng.randrange(len(training))][1]], idf)
+                for vectors in members
+            ])
+        
+        self.cells = [_Cell() for _ in range(count)]
+        self._cells_of, self._removed, self.df = {}, set(), Counter()
+        for entry, vector in entries:
+            self.add(entry, vector, self.assign(vector, idf), merge=False)
+        self.compact()
+        self.trained_size = len(entries)
+        return dict(self._cells_of)
+    
+    def _mean(self, vectors: List[Vector], idf: Dict[int, float]) -> Vector:
+        total: Dict[int, float] = {}
+        for keys, weights in vectors:
+            for key, weight in zip(keys, weights):
+                total[key] = total.get(key, 0.0) + weight * idf.get(key, 1.0)
+        kept = sorted(total.items(), key=lambda item: -item[1])[:self.centroid_features]
+        return _vector(dict(kept))
+    
+    def _set_centroids(self, centroids: List[Vector]):
+        self.centroids = centroids
+        self._centroid_postings = {}
+        for cell, (keys, weights) in enumerate(centroids):
+            for key, weight in zip(keys, weights):
+                self._centroid_postings.setdefault(key, []).append((cell, weight))
+    
+    def restore(self, centroids: List[Vector], trained_size: int):
+        """Reinstate saved centroids before re-adding entries to their cells."""
+        self.cells = [_Cell() for _ in range(max(1, len(centroids)))]
+        self._set_centroids(centroids)
+        self.trained_size = trained_size
+    
+    def compact(self):
+        """Merge every cell's pending entries and drop removed ones (e.g. after bulk loading)."""
+        for cell in self.cells:
+            cell.merge(self._removed)
+        self._removed.clear()
+
+
+@dataclass
+class Memory:
+    """A remembered finding."""
+    id: int
+    kind: str
+    text: str
+    score: float
+    created_at: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _pack(vector: Vector) -> Tuple[bytes, bytes]:
+    return vector[0].tobytes(), vector[1].tobytes()
+
+
+def _unpack(keys: bytes, weights: bytes) -> Vector:
+    vector = array("q"), array("f")
+    vector[0].frombytes(keys)
+    vector[1].frombytes(weights)
+    return vector
+
+
+def _cells(cells: Sequence[int]) -> str:
+    return " ".join(map(str, cells))
+
+
+class SemanticMemory:
+    """Findings of past investigations, searchable by meaning."""
+    
+    def __init__(self, conn: sqlite3.Connection, lock: Optional[threading.Lock] = None,
+                 embedder: Optional[HashingEmbedder] = None, index: Optional[IVFIndex] = None,
+                 top_k: int = 3, min_score: float = 0.3, entry_chars: int = 600,
+                 max_entries: int = 200000, incident_logs: Iterable[str] = ()):
+        """
+        Args:
+            conn: Connection to the persistence database
+            lock: Lock shared with the other users of the connection
+            embedder: Text embedder (default: HashingEmbedder)
+            index: Vector index (default: IVFIndex)
+            top_k: Findings added to the context per question
+            min_score: Lowest similarity of a finding added to the context
+            entry_chars: Characters of each finding added to the context
+            max_entries: Oldest entries are forgotten above this
+            incident_logs: Ambient agent alert logs to read incidents from
+        """
+        self.conn = conn
+        self.lock = lock or threading.Lock()
+        self.embedder = embedder or HashingEmbedder()
+        self.index = index or IVFIndex()
+        self.top_k = top_k
+        self.min_score = min_score
+        self.entry_chars = entry_chars
+        self.max_entries = max_entries
+        self.incident_logs = list(incident_logs)
+        self._context: Dict[Any, List[Memory]] = {}
+        # Held while a new index is built (load or retraining)
+        self._rebuilding = threading.Lock()
+        self._log_sizes: Dict[str, int] = {}
+        self._ingesting = threading.Lock()
+        with self.lock:
+            conn.executescript(SCHEMA)
+    
+    @classmethod
+    def from_config(cls, config: Dict, background: bool = True) -> "SemanticMemory":
+        """
+        Memory on the persistence database, configured by ``memory``.
+        
+        Args:
+            config: Full configuration
+            background: Load the index in a background thread (recall finds
+                nothing until it is loaded)
+        """
+        from src.persistence import shared_connection
+        settings = config.get("memory", {})
+        conn, lock = shared_connection(config.get("persistence", {}))
+        memory = cls(
+            conn, lock,
+            index=IVFIndex(nprobe=settings.get("nprobe", 8)),
+            top_k=settings.get("top_k", 3),
+            min_score=settings.get("min_score", 0.3),
+            entry_chars=settings.get("entry_chars", 600),
+            max_entries=settings.get("max_entries", 200000),
+            incident_logs=settings.get("incident_logs", [])
+        )
+        # Loading takes seconds at 100k findings, so the agent doesn't wait for it
+        if background:
+            threading.Thread(target=memory._load_in_background, daemon=True).start()
+        else:
+            memory.load()
+            memory.ingest_incidents()
+        return memory
+    
+    def load(self):
+        """
+        Rebuild the index from the database: restore the saved cells, or train
+        new ones if there are none or the index outgrew them. The index is
+        built without the lock and swapped in when done; until then recall
+        finds nothing and new findings are caught up at the swap.
+        """
+        started = time.perf_counter()
+        with self._rebuilding:
+            with self.lock:
+                centroids = [_unpack(keys, weights) for keys, weights in
+                             self.conn.execute("SELECT features, weights FROM memory_cells ORDER BY cell")]
+                entries = [(entry, _unpack(keys, weights), tuple(map(int, cells.split())))
+                           for entry, keys, weights, cells
+                           in self.conn.execute("SELECT id, features, weights, cells FROM memories")]
+            index = self.index.fresh()
+            index.restore(centroids, trained_size=len(entries) if centroids else 0)
+            if centroids or len(entries) < index.min_train:
+                for entry, vector, cells in entries:
+                    index.add(entry, vector, cells, merge=False)
+                index.compact()
+            if index.needs_training or (not centroids and len(entries) >= index.min_train):
+                self._train([(entry, vector) for entry, vector, _ in entries], started)
+            else:
+                self._swap(index, [(entry, vector) for entry, vector, _ in entries], {})
+        metrics.observe("memory_load_seconds", time.perf_counter() - started)
+        metrics.observe("memory_entries", len(self.index))
+        logger.info(f"🧠 Memory loaded: {len(self.index)} findings in {len(self.index.cells)} cells "
+                    f"({time.perf_counter() - started:.1f}s)")
+    
+    def _train(self, entries: Optional[List[Tuple[int, Vector]]] = None, started: Optional[float] = None):
+        """Recluster all entries into a new index and swap it in."""
+        started = started or time.perf_counter()
+        if entries is None:
+            with self.lock:
+                entries = [(entry, _unpack(keys, weights)) for entry, keys, weights in
+                           self.conn.execute("SELECT id, features, weights FROM memories")]
+        index = self.index.fresh()
+        cells = index.train(entries)
+        self._swap(index, entries, cells, trained=True)
+        logger.info(f"🧠 Memory index trained: {len(entries)} findings in {len(self.index.cells)} cells "
+                    f"({time.perf_counter() - started:.1f}s)")
+    
+    def _swap(self, index: IVFIndex, snapshot: List[Tuple[int, Vector]], cells: Dict[int, Tuple[int, ...]],
+              trained: bool = False):
+        """
+        Replace the live index with one built from a snapshot of the database,
+        after catching up on findings remembered or forgotten meanwhile.
+        
+        Args:
+            index: The new index
+            snapshot: Entries it was built from
+            cells: Cells of entries whose saved cells are outdated
+            trained: Whether the index has new centroids to save
+        """
+        with self.lock:
+            # Ids only grow, so new findings are the ones above the snapshot's last id
+            last = max((entry for entry, _ in snapshot), default=0)
+            for entry, keys, weights in self.conn.execute("SELECT id, features, weights FROM memories WHERE id > ?",
+                                                          (last,)):
+                cells[entry] = index.add(entry, _unpack(keys, weights))
+            kept = {entry for (entry,) in self.conn.execute("SELECT id FROM memories")}
+            for entry, vector in snapshot:
+                if entry not in kept:
+                    index.remove(entry, vector)
+            self.conn.execute("BEGIN")
+            try:
+                if trained:
+                    self.conn.execute("DELETE FROM memory_cells")
+                    self.conn.executemany("INSERT INTO memory_cells VALUES (?, ?, ?)",
+                                          [(cell, *_pack(vector)) for cell, vector in enumerate(index.centroids)])
+                self.conn.executemany("UPDATE memories SET cells = ? WHERE id = ?",
+                                      [(_cells(cell), entry) for entry, cell in cells.items() if entry in index])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.index = index
+    
+    def _load_in_background(self):
+        try:
+            self.load()
+            self.ingest_incidents()
+        except Exception as e:
+            logger.warning(f"⚠️  Memory could not be loaded: {e}")
+    
+    def _train_in_background(self):
+        try:
+            self._train()
+        except Exception as e:
+            logger.warning(f"⚠️  Memory index training failed: {e}")
+        finally:
+            self._rebuilding.release()
+    
+    def remember(self, kind: str, text: str, metadata: Optional[Dict[str, Any]] = None,
+                 duplicate_score: float = 0.9) -> int:
+        """
+        Store a finding; a near-duplicate of the same kind is replaced instead.
+        
+        Args:
+            kind: "answer" or "incident"
+            text: The finding
+            metadata: Extra fields (e.g. tools used)
+            duplicate_score: Similarity above which an existing finding is replaced
+        
+        Returns:
+            The finding's id
+        """
+        vector = self.embedder.embed(text)
+        metadata = dict(metadata or {}, seen=1)
+        now = created = time.time()
+        with metrics.timer("memory_write_seconds"), self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                # A recurring finding replaces the earlier one and counts how often it was seen
+                # (compared by plain cosine: search scores weigh rare words up)
+                weights = dict(zip(*vector))
+                for _, duplicate in self.index.search(vector, 3):
+                    row = self.conn.execute("SELECT kind, metadata, created_at, features, weights FROM memories "
+                                            "WHERE id = ?", (duplicate,)).fetchone()
+                    if row is None or row[0] != kind:
+                        continue
+                    existing = _unpack(row[3], row[4])
+                    if _dot(weights, existing) >= duplicate_score:
+                        metadata["seen"] = json.loads(row[1]).get("seen", 1) + 1
+                        created = row[2]
+                        self.index.remove(duplicate, existing)
+                        self.conn.execute("DELETE FROM memories WHERE id = ?", (duplicate,))
+                        break
+                cells = self.index.assign(vector)
+                entry = self.conn.execute(
+                    "INSERT INTO memories (kind, text, metadata, features, weights, cells, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, text, json.dumps(metadata), *_pack(vector), _cells(cells), created, now)
+                ).lastrowid
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.index.add(entry, vector, cells)
+            self._forget_oldest()
+            if self.index.needs_training and self._rebuilding.acquire(blocking=False):
+                threading.Thread(target=self._train_in_background, daemon=True).start()
+        metrics.incr("memory_writes", kind=kind)
+        return entry
+    
+    def _forget_oldest(self):
+        excess = len(self.index) - self.max_entries
+        if excess <= 0:
+            return
+        # Forget a batch at a time rather than one entry per write
+        batch = excess + self.max_entries // 100
+        rows = self.conn.execute("SELECT id, features, weights FROM memories ORDER BY updated_at LIMIT ?",
+                                 (batch,)).fetchall()
+        for entry, keys, weights in rows:
+            self.index.remove(entry, _unpack(keys, weights))
+        self.conn.executemany("DELETE FROM memories WHERE id = ?", [(entry,) for entry, _, _ in rows])
+    
+    def recall(self, query: str, k: Optional[int] = None, min_score: Optional[float] = None) -> List[Memory]:
+        """
+        Findings most similar to a query.
+        
+        Args:
+            query: Question or text to match
+            k: Findings returned (default: top_k)
+            min_score: Lowest similarity returned (default: min_score)
+        
+        Returns:
+            Findings, most similar first
+        """
+        min_score = self.min_score if min_score is None else min_score
+        with metrics.timer("memory_recall_seconds"), self.lock:
+            hits = [(score, entry) for score, entry in self.index.search(self.embedder.embed(query), k or self.top_k)
+                    if score >= min_score]
+            memories = []
+            for score, entry in hits:
+                row = self.conn.execute("SELECT kind, text, metadata, created_at FROM memories WHERE id = ?",
+                                        (entry,)).fetchone()
+                if row is not None:
+                    memories.append(Memory(entry, row[0], row[1], score, row[3], json.loads(row[2])))
+        metrics.incr("memory_hits", len(memories))
+        return memories
+    
+    def ingest_incidents(self) -> int:
+        """
+        Remember incident reports appended to the ambient agent's alert logs
+        since the last call (plain ``alerts.log`` and compressed ``alerts.log.z``).
+        
+        Returns:
+            Incidents read
+        """
+        # Another question is already reading the logs
+        if not self._ingesting.acquire(blocking=False):
+            return 0
+        try:
+            count = self._ingest_incidents()
+        finally:
+            self._ingesting.release()
+        if count:
+            logger.info(f"🧠 Remembered {count} incident reports")
+        return count
+    
+    def _ingest_incidents(self) -> int:
+        count = 0
+        for name in (name for path in self.incident_logs for name in alert_log.log_files(path)):
+            try:
+                size = os.path.getsize(name)
+            except OSError:
+                continue
+            if self._log_sizes.get(name) == size:
+                continue
+            with self.lock:
+                row = self.conn.execute("SELECT offset FROM memory_sources WHERE path = ?", (name,)).fetchone()
+            offset = row[0] if row and row[0] <= size else 0
+            try:
+                text, end = alert_log.read_from(name, offset)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️  Could not read incidents from {name}: {e}")
+                self._log_sizes[name] = size
+                continue
+            for header, body in alert_blocks(text):
+                self.remember("incident", f"{header}\n{body}", {"source": name})
+                count += 1
+            if end != offset:
+                with self.lock:
+                    self.conn.execute("INSERT OR REPLACE INTO memory_sources VALUES (?, ?)", (name, end))
+            # A write in progress is read on a later call
+            if end == size:
+                self._log_sizes[name] = size
+        return count
+    
+    def context(self, memories: List[Memory]) -> str:
+        """Findings as a note for the model."""
+        lines = ["Findings from earlier investigations that may be relevant. They can be outdated: "
+                 "verify with tools before relying on them."]
+        for memory in memories:
+            when = datetime.fromtimestamp(memory.created_at).strftime("%Y-%m-%d %H:%M")
+            text = memory.text if len(memory.text) <= self.entry_chars else memory.text[:self.entry_chars] + "…"
+            lines.append(f"- [{memory.kind}, {when}, similarity {memory.score:.2f}] {text}")
+        return "\n".join(lines)
+    
+    def model(self, select_model: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+        """
+        Dynamic model for ``create_react_agent`` that adds recalled findings
+        before the latest question and remembers final answers.
+        
+        Args:
+            select_model: Dynamic model (state, runtime) -> model with tools bound
+        
+        Returns:
+            Dynamic model with memory
+        """
+        def memory_model(state, runtime):
+            messages = state["messages"] if isinstance(state, dict) else state.messages
+            add = RunnableLambda(self._add_context, name="recall_memory")
+            keep = RunnableLambda(lambda message: self._remember_answer(messages, message), name="remember_answer")
+            return add | select_model(state, runtime) | keep
+        
+        return memory_model
+    
+    def _add_context(self, prompt: Any) -> List[BaseMessage]:
+        messages = prompt.to_messages() if hasattr(prompt, "to_messages") else list(prompt)
+        question = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+        if question is None:
+            return messages
+        # Recalled once per question, so every LLM call of the turn sees the same findings
+        key = messages[question].id or messages[question].content
+        if key not in self._context:
+            self.ingest_incidents()
+            if len(self._context) > 256:
+                self._context.clear()
+            self._context[key] = self.recall(_content(messages[question]))
+        memories = self._context[key]
+        if not memories:
+            return messages
+        return messages[:question] + [HumanMessage(content=self.context(memories))] + messages[question:]
+    
+    def _remember_answer(self, messages: List[BaseMessage], answer: Any) -> Any:
+        """Remember a final answer to a question that needed tools."""
+        if not isinstance(answer, AIMessage) or answer.tool_calls or not _content(answer).strip():
+            return answer
+        question = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+        if question is None:
+            return answer
+        tools = sorted({call["name"] for m in messages[question:] if isinstance(m, AIMessage) for call in m.tool_calls})
+        if tools:
+            try:
+                self.remember("answer", f"Q: {_content(messages[question])}\nA: {_content(answer)}", {"tools": tools})
+            except Exception as e:
+                logger.warning(f"⚠️  Could not remember the answer: {e}")
+        return answer
+
+
+def alert_blocks(text: str) -> List[Tuple[str, str]]:
+    """
+    Reports in the ambient agent's alert log layout (rule, header line,
+    rule, report lines).
+    
+    Args:
+        text: Alert log text (a partial first block is skipped)
+    
+    Returns:
+        (header, report) pairs in log order; empty reports are skipped
+    """
+    matches = list(_ALERT_HEADER.finditer(text))
+    ends = [match.start() for match in matches[1:]] + [len(text)]
+    blocks = [(match.group(1).strip(), text[match.end():end].strip()) for match, end in zip(matches, ends)]
+    return [(header, body) for header, body in blocks if body]
+
+
+def _content(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content)
+
+
+def main():
+    """Search and inspect the memory from the command line."""
+    import argparse
+    from src.config import load_config
+    
+    parser = argparse.ArgumentParser(description="Search the agent's memory of past investigations")
+    parser.add_argument("query", nargs="?", help="Text to search for (omit for stats)")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    memory = SemanticMemory.from_config(load_config(), background=False)
+    if args.query:
+        for found in memory.recall(args.query, k=args.k, min_score=0.0):
+            print(f"{found.score:.3f}  [{found.kind} #{found.id}] {found.text[:300]}\n")
+    else:
+        print(f"{len(memory.index)} findings in {len(memory.index.cells)} cells")
+
+
+if __name__ == "__main__":
+    main()
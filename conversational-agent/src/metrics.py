@@ -0,0 +1,134 @@
+"""In-process metrics for the conversational agent.
+
+Counters and timing samples are kept in memory so that streaming, caching
+and tool-call behaviour can be summarized into the log. The shared agent
+logs a summary every ``metrics.log_interval_seconds``.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Keep a bounded number of samples per series so long-running agents
+# don't grow without limit
+MAX_SAMPLES = 1000
+
+
+def _series_key(name: str, labels: Dict[str, Any]) -> str:
+    """Build a Prometheus-style series key, e.g. ``llm_ttft_seconds{task=report}``."""
+    if not labels:
+        return name
+    label_text = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and timing observations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Increment a counter."""
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a single observation (latency, size, ...)."""
+        key = _series_key(name, labels)
+        with self._lock:
+            self._samples[key].append(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block and record the elapsed seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """Get the current value of a counter."""
+        with self._lock:
+            return self._counters.get(_series_key(name, labels), 0)
+
+    def total(self, name: str, **labels) -> float:
+        """Sum a counter over every series that has the given labels."""
+        wanted = {f"{k}={v}" for k, v in labels.items()}
+        total = 0
+        with self._lock:
+            for key, value in self._counters.items():
+                series_name, _, label_text = key.partition("{")
+                if series_name == name and wanted <= set(label_text.rstrip("}").split(",")):
+                    total += value
+        return total
+
+    def samples(self, name: str, **labels) -> list[float]:
+        """Get the recorded observations of a series."""
+        with self._lock:
+            return list(self._samples.get(_series_key(name, labels), ()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarize all series.
+
+        Returns:
+            Dictionary with ``counters`` and ``timings`` (count/mean/p50/p95/max)
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {key: sorted(values) for key, values in self._samples.items() if values}
+
+        timings = {}
+        for key, values in samples.items():
+            count = len(values)
+            timings[key] = {
+                "count": count,
+                "mean": sum(values) / count,
+                "p50": values[count // 2],
+                "p95": values[min(count - 1, int(count * 0.95))],
+                "max": values[-1],
+            }
+
+        return {"counters": counters, "timings": timings}
+
+    def log_summary(self):
+        """Write a summary of all series to the log."""
+        snapshot = self.snapshot()
+        if not snapshot["counters"] and not snapshot["timings"]:
+            return
+
+        logger.info("📈 Metrics:")
+        for key, value in sorted(snapshot["counters"].items()):
+            logger.info(f"  {key}: {value:g}")
+        for key, stats in sorted(snapshot["timings"].items()):
+            logger.info(
+                f"  {key}: n={stats['count']} mean={stats['mean']:.3f} "
+                f"p50={stats['p50']:.3f} p95={stats['p95']:.3f} max={stats['max']:.3f}"
+            )
+
+    async def log_every(self, seconds: float):
+        """Write a summary to the log every ``seconds``; runs until cancelled."""
+        while True:
+            await asyncio.sleep(seconds)
+            self.log_summary()
+
+    def reset(self):
+        """Clear all series."""
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+
+
+# Process-wide registry
+metrics = Metrics()
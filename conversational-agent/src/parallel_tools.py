@@ -0,0 +1,139 @@
+"""Concurrency cap and deadline for the tool calls of one LLM turn.
+
+When the model asks for several tools at once (stats, anomalies and
+process behaviour for the same question), the ReAct graph runs them
+concurrently: each call is sent to its own tool node. Every call is a slow
+MCP-over-SSH round trip to the target, so a turn takes as long as its
+slowest call instead of the sum of all calls.
+
+``ToolTurnLimiter.wrap`` is installed as the tool node's ``awrap_tool_call``
+and groups calls by the AI message that requested them:
+
+- At most ``max_concurrency`` calls of a turn run at once; the rest queue.
+- The turn has a deadline, counted from its first call. Calls still queued
+  or running at the deadline return an error message to the model, and the
+  results of the calls that finished are kept, so the model answers from
+  partial results instead of the whole turn failing.
+
+Turn latency, calls per turn and timeouts are counted in the metrics
+(``tool_turn_seconds``, ``tool_turn_calls``, ``tool_turn_timeouts``).
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Turn:
+    """Shared budget of the tool calls requested by one AI message."""
+    key: Any
+    semaphore: asyncio.Semaphore
+    started: float
+    deadline: Optional[float]
+    pending: int
+    finished: int = 0
+    timed_out: list = field(default_factory=list)
+
+
+class ToolTurnLimiter:
+    """Per-turn concurrency cap and deadline for ToolNode calls."""
+    
+    def __init__(self, max_concurrency: int = 4, deadline_seconds: float = 45.0):
+        """
+        Args:
+            max_concurrency: Tool calls of one turn running at once (0: no cap)
+            deadline_seconds: Time from a turn's first call after which
+                unfinished calls return a timeout error (0: no deadline)
+        """
+        self.max_concurrency = max_concurrency
+        self.deadline_seconds = deadline_seconds
+        self._turns: Dict[Any, _Turn] = {}
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "ToolTurnLimiter":
+        settings = config.get("parallel_tools", {})
+        return cls(
+            max_concurrency=settings.get("max_concurrency", 4),
+            deadline_seconds=settings.get("deadline_seconds", 45)
+        )
+    
+    def _turn(self, request) -> _Turn:
+        """Budget of the turn that requested this call (created by its first call)."""
+        message = _requesting_message(request)
+        key = (message.id or id(message)) if message is not None else request.tool_call["id"]
+        turn = self._turns.get(key)
+        if turn is None:
+            now = asyncio.get_running_loop().time()
+            self._forget_stale(now)
+            calls = len(message.tool_calls) if message is not None else 1
+            limit = self.max_concurrency if self.max_concurrency > 0 else calls
+            deadline = now + self.deadline_seconds if self.deadline_seconds > 0 else None
+            turn = self._turns[key] = _Turn(key, asyncio.Semaphore(max(1, limit)), now, deadline, calls)
+            metrics.observe("tool_turn_calls", calls)
+        return turn
+    
+    def _forget_stale(self, now: float):
+        # Turns whose calls never all arrived (e.g. an interrupted run)
+        for key in [key for key, turn in self._turns.items() if now - turn.started > self.deadline_seconds + 300]:
+            del self._turns[key]
+    
+    async def wrap(self, request, execute: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Run one tool call within its turn's concurrency cap and deadline.
+        
+        Args:
+            request: ToolCallRequest from the tool node
+            execute: Runs the tool call
+        
+        Returns:
+            The tool's message, or an error ToolMessage if the deadline passed
+        """
+        turn = self._turn(request)
+        loop = asyncio.get_running_loop()
+        name = request.tool_call["name"]
+        try:
+            async with asyncio.timeout_at(turn.deadline):
+                async with turn.semaphore:
+                    return await execute(request)
+        except TimeoutError:
+            turn.timed_out.append(name)
+            metrics.incr("tool_turn_timeouts", tool=name)
+            logger.warning(f"⏱️  {name} still running at the {self.deadline_seconds}s turn deadline")
+            return ToolMessage(
+                content=(f"Error: {name} did not finish within the {self.deadline_seconds:g}s deadline "
+                         f"for this step. Answer from the other tool results, or call it again "
+                         f"on its own if it is needed."),
+                name=name,
+                tool_call_id=request.tool_call["id"],
+                status="error"
+            )
+        finally:
+            turn.finished += 1
+            if turn.finished >= turn.pending:
+                self._end_turn(turn, loop.time())
+    
+    def _end_turn(self, turn: _Turn, now: float):
+        self._turns.pop(turn.key, None)
+        metrics.observe("tool_turn_seconds", now - turn.started)
+        if turn.timed_out:
+            logger.info(f"⏱️  Tool turn returned partial results: {len(turn.timed_out)} of "
+                        f"{turn.pending} calls timed out ({', '.join(turn.timed_out)})")
+
+
+def _requesting_message(request) -> Optional[AIMessage]:
+    """The AI message whose tool calls include this request's call."""
+    state = request.state
+    messages = state.get("messages", []) if isinstance(state, dict) else getattr(state, "messages", [])
+    call_id = request.tool_call["id"]
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and any(call["id"] == call_id for call in message.tool_calls):
+            return message
+    return None
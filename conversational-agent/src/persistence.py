@@ -0,0 +1,645 @@
+"""SQLite persistence for local and dev deployments.
+
+``langgraph dev`` keeps checkpoints and the store in whole-file pickles
+under ``.langgraph_api/``: loading and saving cost grows with the total
+history of every thread, and each save rewrites everything. This module
+provides a checkpointer and a store backed by one SQLite database in WAL
+mode, referenced from ``langgraph.json``:
+
+- Checkpoints, pending writes and channel values are rows keyed by
+  thread, so resuming a thread reads only that thread's latest rows.
+- Writes are incremental: a checkpoint stores only the channels that
+  changed in that step, each as its own row.
+- Values are msgpack (the LangGraph serializer), compressed with zstd
+  (zlib without ``zstandard``) above ``compress_min_bytes``.
+- Retention runs in the background: threads idle for ``thread_days`` are
+  deleted, older checkpoints beyond ``keep_checkpoints`` per thread are
+  pruned, expired store items are removed, and freed pages are returned
+  to the file system.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.store.base import BaseStore, GetOp, Item, ListNamespacesOp, Op, PutOp, Result, SearchItem, SearchOp
+from langgraph.store.memory import _compare_values, _does_match
+
+from src.config import load_config
+from src.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_CHECKPOINT_COLUMNS = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS threads_updated ON threads (updated_at);
+CREATE TABLE IF NOT EXISTS store (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL,
+    ttl_minutes REAL,
+    PRIMARY KEY (prefix, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS store_expires ON store (expires_at) WHERE expires_at IS NOT NULL;
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open (and create) the database in WAL mode with incremental vacuum."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    # auto_vacuum only takes effect before the first table is created
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class _Codec:
+    """Compresses serialized values above a size threshold."""
+    
+    def __init__(self, min_bytes: int = 1024, level: int = 3):
+        self.min_bytes = min_bytes
+        if zstandard is not None:
+            self.suffix = "+zstd"
+            self._compress = zstandard.ZstdCompressor(level=level).compress
+        else:
+            self.suffix = "+zlib"
+            self._compress = lambda data: zlib.compress(data, level)
+    
+    def encode(self, typed: Tuple[str, bytes]) -> Tuple[str, bytes]:
+        kind, data = typed
+        if data is not None and len(data) >= self.min_bytes:
+            metrics.incr("persistence_bytes_in", len(data))
+            data = self._compress(data)
+            metrics.incr("persistence_bytes_out", len(data))
+            return kind + self.suffix, data
+        return kind, data
+    
+    @staticmethod
+    def decode(kind: str, data: bytes) -> Tuple[str, bytes]:
+        if kind.endswith("+zstd"):
+            if zstandard is None:
+                raise RuntimeError("Checkpoint is zstd-compressed; pip install zstandard")
+            return kind[:-5], zstandard.ZstdDecompressor().decompress(data)
+        if kind.endswith("+zlib"):
+            return kind[:-5], zlib.decompress(data)
+        return kind, data
+
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """Checkpointer storing each thread's checkpoints as indexed SQLite rows."""
+    
+    def __init__(self, conn: sqlite3.Connection, compress_min_bytes: int = 1024,
+                 lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            conn: Connection from ``connect()``
+            compress_min_bytes: Serialized values this large are compressed
+            lock: Lock shared with a SqliteStore on the same connection
+        """
+        super().__init__()
+        self.conn = conn
+        self.codec = _Codec(compress_min_bytes)
+        self.lock = lock or threading.Lock()
+    
+    # Versions are the same strings as InMemorySaver's
+    get_next_version = InMemorySaver.get_next_version
+    
+    def _dumps(self, value: Any) -> Tuple[str, bytes]:
+        return self.codec.encode(self.serde.dumps_typed(value))
+    
+    def _loads(self, kind: str, data: bytes) -> Any:
+        return self.serde.loads_typed(self.codec.decode(kind, data))
+    
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with metrics.timer("checkpoint_read_seconds"), self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                return None
+            return self._tuple(thread_id, checkpoint_ns, row)
+    
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        """Checkpoint tuple of a checkpoints row (called with the lock held)."""
+        checkpoint_id, parent_id, kind, data, metadata_kind, metadata = row
+        checkpoint = self._loads(kind, data)
+        versions = checkpoint["channel_versions"]
+        values = {}
+        if versions:
+            placeholders = ",".join("(?, ?)" for _ in versions)
+            params = [item for channel_version in versions.items() for item in channel_version]
+            for channel, blob_kind, blob in self.conn.execute(
+                f"SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                f"AND (channel, version) IN (VALUES {placeholders})",
+                (thread_id, checkpoint_ns, *params)
+            ):
+                if blob_kind != "empty":
+                    values[channel] = self._loads(blob_kind, blob)
+        
+        writes = self.conn.execute(
+            "SELECT task_id, idx, channel, type, blob, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        writes.sort(key=lambda w: writes_sort_key(w[5], w[0], w[1]))
+        
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self._loads(metadata_kind, metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._loads(w_kind, blob))
+                            for task_id, _, channel, w_kind, blob, _ in writes]
+        )
+    
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = f"SELECT thread_id, checkpoint_ns, {_CHECKPOINT_COLUMNS} FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self.lock:
+                item = self._tuple(thread_id, checkpoint_ns, tuple(row))
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+    
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        # Only channels updated in this step get a new row
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version),
+             *(self._dumps(values[channel]) if channel in values else ("empty", None)))
+            for channel, version in new_versions.items()
+        ]
+        kind, data = self._dumps(stored)
+        meta_kind, meta = self._dumps(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with metrics.timer("checkpoint_write_seconds"), self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     kind, data, meta_kind, meta, now)
+                )
+                self.conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, now))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        metrics.incr("checkpoint_bytes_written", len(data) + sum(len(b[5] or b"") for b in blobs))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+    
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+             *self._dumps(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # Special channels (errors, interrupts) have negative indexes and are replaced
+        with metrics.timer("checkpoint_write_seconds"), self.lock:
+            self.conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [row for row in rows if row[4] >= 0])
+            self.conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [row for row in rows if row[4] < 0])
+    
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock:
+            self.conn.execute("BEGIN")
+            for table in ("checkpoints", "blobs", "writes", "threads"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("COMMIT")
+    
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest", keep: int = 1) -> None:
+        """
+        Delete a thread's older checkpoints with their writes and channel values.
+        
+        Args:
+            thread_ids: Threads to prune
+            strategy: ``"keep_latest"`` keeps the latest ``keep`` checkpoints
+                per namespace; ``"delete"`` deletes the threads
+            keep: Checkpoints kept per namespace
+        """
+        for thread_id in thread_ids:
+            if strategy == "delete":
+                self.delete_thread(thread_id)
+                continue
+            with self.lock:
+                self.conn.execute("BEGIN")
+                try:
+                    self._prune_thread(thread_id, keep)
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+    
+    def _prune_thread(self, thread_id: str, keep: int):
+        namespaces = [ns for (ns,) in self.conn.execute(
+            "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,))]
+        for checkpoint_ns in namespaces:
+            kept = self.conn.execute(
+                "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?", (thread_id, checkpoint_ns, keep)
+            ).fetchall()
+            if not kept:
+                continue
+            oldest = kept[-1][0]
+            self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                              (thread_id, checkpoint_ns, oldest))
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                              (thread_id, checkpoint_ns, oldest))
+            # Channel values no kept checkpoint refers to
+            live = {(channel, str(version)) for _, kind, data in kept
+                    for channel, version in self._loads(kind, data)["channel_versions"].items()}
+            stale = [
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version in self.conn.execute(
+                    "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                    (thread_id, checkpoint_ns))
+                if (channel, version) not in live
+            ]
+            self.conn.executemany(
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?", stale)
+    
+    # The database is local: async methods run the queries in a worker thread
+    
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+    
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+    
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+    
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+    
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+    
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest", keep: int = 1) -> None:
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy, keep=keep)
+
+
+class SqliteStore(BaseStore):
+    """Key-value store (``langgraph.store``) in the same SQLite database."""
+    
+    supports_ttl = True
+    
+    def __init__(self, conn: sqlite3.Connection, lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            conn: Connection from ``connect()``
+            lock: Lock shared with a SqliteSaver on the same connection
+        """
+        self.conn = conn
+        self.lock = lock or threading.Lock()
+    
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                results = [self._run(op, time.time()) for op in ops]
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return results
+    
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        return await asyncio.to_thread(self.batch, list(ops))
+    
+    def _run(self, op: Op, now: float) -> Result:
+        if isinstance(op, GetOp):
+            row = self.conn.execute(
+                "SELECT key, value, created_at, updated_at, ttl_minutes FROM store "
+                "WHERE prefix = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (_prefix(op.namespace), op.key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if op.refresh_ttl and row[4]:
+                self._refresh(_prefix(op.namespace), [row[0]], row[4], now)
+            return _item(Item, op.namespace, row)
+        if isinstance(op, PutOp):
+            prefix = _prefix(op.namespace)
+            if op.value is None:
+                self.conn.execute("DELETE FROM store WHERE prefix = ? AND key = ?", (prefix, op.key))
+                return None
+            expires = now + op.ttl * 60 if op.ttl else None
+            self.conn.execute(
+                "INSERT INTO store VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (prefix, key) DO UPDATE SET "
+                "value = excluded.value, updated_at = excluded.updated_at, expires_at = excluded.expires_at, "
+                "ttl_minutes = excluded.ttl_minutes",
+                (prefix, op.key, json.dumps(op.value, separators=(",", ":")), now, now, expires, op.ttl)
+            )
+            return None
+        if isinstance(op, SearchOp):
+            return self._search(op, now)
+        if isinstance(op, ListNamespacesOp):
+            return self._list_namespaces(op, now)
+        raise ValueError(f"Unknown store operation: {op}")
+    
+    def _search(self, op: SearchOp, now: float) -> List[SearchItem]:
+        # Namespace prefixes are a range scan on the primary key
+        prefix = _prefix(op.namespace_prefix)
+        if prefix:
+            where, params = "(prefix = ? OR (prefix >= ? AND prefix < ?))", [prefix, prefix + ".", prefix + "/"]
+        else:
+            where, params = "1", []
+        rows = self.conn.execute(
+            f"SELECT prefix, key, value, created_at, updated_at, ttl_minutes FROM store WHERE {where} "
+            f"AND (expires_at IS NULL OR expires_at > ?) ORDER BY updated_at DESC",
+            (*params, now)
+        )
+        items, skipped = [], 0
+        for prefix_, *row in rows:
+            value = json.loads(row[1])
+            if op.filter and not all(_compare_values(value.get(k), v) for k, v in op.filter.items()):
+                continue
+            if skipped < op.offset:
+                skipped += 1
+                continue
+            items.append((prefix_, row))
+            if len(items) >= op.limit:
+                break
+        for prefix_, row in items:
+            if op.refresh_ttl and row[4]:
+                self._refresh(prefix_, [row[0]], row[4], now)
+        return [_item(SearchItem, tuple(prefix_.split(".")), row) for prefix_, row in items]
+    
+    def _list_namespaces(self, op: ListNamespacesOp, now: float) -> List[Tuple[str, ...]]:
+        namespaces = [
+            tuple(prefix.split(".")) for (prefix,) in self.conn.execute(
+                "SELECT DISTINCT prefix FROM store WHERE expires_at IS NULL OR expires_at > ? ORDER BY prefix", (now,))
+        ]
+        if op.match_conditions:
+            namespaces = [ns for ns in namespaces if all(_does_match(c, ns) for c in op.match_conditions)]
+        if op.max_depth is not None:
+            namespaces = sorted({ns[:op.max_depth] for ns in namespaces})
+        return namespaces[op.offset:op.offset + op.limit]
+    
+    def _refresh(self, prefix: str, keys: List[str], ttl_minutes: float, now: float):
+        self.conn.executemany("UPDATE store SET expires_at = ? WHERE prefix = ? AND key = ?",
+                              [(now + ttl_minutes * 60, prefix, key) for key in keys])
+
+
+def _prefix(namespace: Tuple[str, ...]) -> str:
+    return ".".join(namespace)
+
+
+def _item(cls, namespace: Tuple[str, ...], row: tuple):
+    key, value, created, updated = row[:4]
+    return cls(
+        namespace=namespace,
+        key=key,
+        value=json.loads(value),
+        created_at=datetime.fromtimestamp(created, timezone.utc),
+        updated_at=datetime.fromtimestamp(updated, timezone.utc)
+    )
+
+
+def apply_retention(saver: SqliteSaver, thread_days: float = 30, keep_checkpoints: int = 20) -> Dict[str, int]:
+    """
+    Delete idle threads, prune old checkpoints and expired store items, and
+    return freed pages to the file system.
+    
+    Args:
+        saver: Checkpointer (its connection also holds the store)
+        thread_days: Threads not updated for this many days are deleted (0: keep)
+        keep_checkpoints: Latest checkpoints kept per thread (0: keep all)
+    
+    Returns:
+        Counts of deleted threads, pruned threads and expired store items
+    """
+    now = time.time()
+    conn = saver.conn
+    with metrics.timer("persistence_retention_seconds"):
+        deleted = []
+        if thread_days:
+            with saver.lock:
+                deleted = [t for (t,) in conn.execute("SELECT thread_id FROM threads WHERE updated_at < ?",
+                                                      (now - thread_days * 86400,))]
+            for thread_id in deleted:
+                saver.delete_thread(thread_id)
+        
+        pruned = []
+        if keep_checkpoints:
+            with saver.lock:
+                pruned = [t for (t,) in conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+                    (keep_checkpoints,))]
+            saver.prune(sorted(set(pruned)), keep=keep_checkpoints)
+        
+        with saver.lock:
+            expired = conn.execute("DELETE FROM store WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA incremental_vacuum")
+    
+    result = {"deleted_threads": len(deleted), "pruned_threads": len(set(pruned)), "expired_items": expired}
+    if any(result.values()):
+        logger.info(f"🧹 Persistence retention: {result}")
+    return result
+
+
+def vacuum(path: str):
+    """Rebuild the database file (offline; ``python -m src.persistence vacuum``)."""
+    conn = connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+
+
+# One connection per database file, shared by the checkpointer, the store and the memory
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+
+
+def shared_connection(settings: Dict) -> Tuple[sqlite3.Connection, threading.Lock]:
+    """The process's connection to the ``persistence`` database and its lock."""
+    path = str(Path(settings.get("path", ".langgraph_api/agent.sqlite")).resolve())
+    if path not in _connections:
+        _connections[path] = (connect(path), threading.Lock())
+    return _connections[path]
+
+
+async def _retention_loop(saver: SqliteSaver, settings: Dict):
+    retention = settings.get("retention", {})
+    interval = retention.get("interval_minutes", 60) * 60
+    while True:
+        try:
+            await asyncio.to_thread(apply_retention, saver, retention.get("thread_days", 30),
+                                    retention.get("keep_checkpoints", 20))
+        except Exception as e:
+            logger.warning(f"⚠️  Persistence retention failed: {e}")
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def make_checkpointer():
+    """Checkpointer for ``langgraph.json`` (``checkpointer.path``)."""
+    settings = load_config().get("persistence", {})
+    conn, lock = shared_connection(settings)
+    saver = SqliteSaver(conn, settings.get("compress_min_bytes", 1024), lock)
+    retention = asyncio.create_task(_retention_loop(saver, settings))
+    logger.info(f"💾 Checkpoints in {settings.get('path', '.langgraph_api/agent.sqlite')}")
+    try:
+        yield saver
+    finally:
+        retention.cancel()
+
+
+@asynccontextmanager
+async def make_store():
+    """Store for ``langgraph.json`` (``store.path``)."""
+    settings = load_config().get("persistence", {})
+    conn, lock = shared_connection(settings)
+    yield SqliteStore(conn, lock)
+
+
+def main():
+    """Inspect and maintain the persistence database."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Maintain the SQLite checkpoint and store database")
+    parser.add_argument("command", choices=["stats", "retention", "vacuum"])
+    parser.add_argument("--path", default=load_config().get("persistence", {}).get("path", ".langgraph_api/agent.sqlite"))
+    args = parser.parse_args()
+    
+    if args.command == "vacuum":
+        vacuum(args.path)
+    elif args.command == "retention":
+        settings = load_config().get("persistence", {}).get("retention", {})
+        print(apply_retention(SqliteSaver(connect(args.path)), settings.get("thread_days", 30),
+                              settings.get("keep_checkpoints", 20)))
+    conn = connect(args.path)
+    for table in ("threads", "checkpoints", "blobs", "writes", "store"):
+        print(f"{table:12} {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>10} rows")
+    pages, size = conn.execute("PRAGMA page_count").fetchone()[0], conn.execute("PRAGMA page_size").fetchone()[0]
+    print(f"{'file':12} {pages * size / 1e6:>10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Background snapshot of the target's current network situation.
+
+Most questions are variations of "anything suspicious right now?" or "top
+talkers in the last 10 minutes", and each one runs the ReAct loop with
+several MCP round trips over SSH. ``SituationSnapshot`` refreshes a compact
+summary of the current situation in the background instead:
+
+- Every ``refresh_seconds`` it calls the snapshot tools (event stats with
+  the top processes, anomalies) for the last ``minutes`` on the target, and
+  reads the open incidents (reports of the last ``incident_hours``) from
+  the ambient agent's alert logs. The calls go through the tool cache, so
+  live calls with the same arguments in the same window are cache hits too.
+- In ``tool`` mode the model gets a ``get_situation_snapshot`` tool to try
+  first; in ``prompt`` mode the snapshot is added before each question.
+  Either way it shows its age, and a snapshot older than
+  ``max_age_seconds`` is not used: the model is told to call the live tools.
+- Refreshing pauses when no question came for ``idle_seconds`` and resumes
+  with the next question.
+
+Questions and the ones answered without a live MCP call are counted in the
+metrics (``snapshot_questions``, ``snapshot_answered_without_live_calls``).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool, StructuredTool
+
+from src import alert_log
+from src.compaction import RECALL_TOOL
+from src.memory import alert_blocks
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TOOL = "get_situation_snapshot"
+
+
+def _result_text(result: Any) -> str:
+    """MCP tool result as text (plain string or content blocks)."""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, (list, tuple)):
+        return "\n".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in result)
+    return str(result)
+
+
+def _clip(text: str, max_chars: int) -> str:
+    """Whole lines of a text up to ``max_chars``."""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    kept = text[:cut if cut > 0 else max_chars]
+    return f"{kept}\n… {len(text) - len(kept)} more characters (call the tool for all of it)"
+
+
+class SituationSnapshot:
+    """Periodically refreshed summary of the target's current situation."""
+    
+    def __init__(self, host: str, username: str, tools: Iterable[str] = ("get_network_event_stats",
+                                                                         "detect_network_anomalies"),
+                 minutes: int = 10, refresh_seconds: float = 30.0, max_age_seconds: float = 120.0,
+                 idle_seconds: float = 600.0, section_chars: int = 1500, incident_logs: Iterable[str] = (),
+                 incident_hours: float = 24.0, max_incidents: int = 5, mode: str = "tool",
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            host: Target host passed to the tools
+            username: SSH username passed to the tools
+            tools: MCP tools called on each refresh (with minutes, host, username)
+            minutes: Window of the tool calls
+            refresh_seconds: Time between refreshes
+            max_age_seconds: Older snapshots are not used
+            idle_seconds: Refreshing pauses this long after the last question (0: never)
+            section_chars: Characters kept of each tool's output
+            incident_logs: Ambient agent alert logs (plain text)
+            incident_hours: Reports this recent are open incidents
+            max_incidents: Latest open incidents shown
+            mode: "tool" (get_situation_snapshot) or "prompt" (added before each question)
+            clock: Time source (epoch seconds)
+        """
+        self.host = host
+        self.username = username
+        self.tools = list(tools)
+        self.minutes = minutes
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.idle_seconds = idle_seconds
+        self.section_chars = section_chars
+        self.incident_logs = list(incident_logs)
+        self.incident_hours = incident_hours
+        self.max_incidents = max_incidents
+        self.mode = mode
+        self.clock = clock
+        self.sections: Dict[str, str] = {}
+        self.taken_at: Optional[float] = None
+        self._last_question = clock()
+        self._wake = asyncio.Event()
+        # Loop of the refresh task; questions may arrive on executor threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._seen: Dict[Any, bool] = {}
+        # Called after each refresh with the names of the sections that changed
+        self.listeners: List[Callable[[Set[str]], None]] = []
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "SituationSnapshot":
+        settings = config.get("snapshot", {})
+        return cls(
+            host=config["target"]["host"],
+            username=config["target"]["username"],
+            tools=settings.get("tools", ["get_network_event_stats", "detect_network_anomalies"]),
+            minutes=settings.get("minutes", 10),
+            refresh_seconds=settings.get("refresh_seconds", 30),
+            max_age_seconds=settings.get("max_age_seconds", 120),
+            idle_seconds=settings.get("idle_seconds", 600),
+            section_chars=settings.get("section_chars", 1500),
+            incident_logs=settings.get("incident_logs", []),
+            incident_hours=settings.get("incident_hours", 24),
+            max_incidents=settings.get("max_incidents", 5),
+            mode=settings.get("mode", "tool")
+        )
+    
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last refresh, or None before the first one."""
+        return None if self.taken_at is None else self.clock() - self.taken_at
+    
+    @property
+    def fresh(self) -> bool:
+        return self.age is not None and self.age <= self.max_age_seconds
+    
+    async def refresh(self, tools: List[BaseTool]):
+        """
+        Call the snapshot tools concurrently and read the open incidents.
+        
+        Args:
+            tools: The agent's tools (the snapshot tools are looked up by name)
+        """
+        by_name = {tool.name: tool for tool in tools}
+        args = {"minutes": self.minutes, "host": self.host, "username": self.username}
+        names = [name for name in self.tools if name in by_name]
+        started = self.clock()
+        with metrics.timer("snapshot_refresh_seconds"):
+            results = await asyncio.gather(*(by_name[name].ainvoke(args) for name in names), return_exceptions=True)
+        sections = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"⚠️  Snapshot tool {name} failed: {result}")
+                sections[name] = f"Error: {result}"
+            else:
+                sections[name] = _clip(_result_text(result), self.section_chars)
+        if self.incident_logs:
+            sections["open incidents"] = await asyncio.to_thread(self._open_incidents)
+        # A refresh with every tool failing keeps the previous snapshot (it goes stale)
+        if names and all(isinstance(result, BaseException) for result in results):
+            metrics.incr("snapshot_refresh_errors")
+            return
+        changed = {name for name, text in sections.items() if self.sections and self.sections.get(name) != text}
+        self.sections, self.taken_at = sections, started
+        metrics.incr("snapshot_refreshes")
+        for listener in self.listeners:
+            listener(changed)
+    
+    def _open_incidents(self, tail_chars: int = 256 * 1024) -> str:
+        """Latest alert log reports of the last ``incident_hours``."""
+        since = datetime.fromtimestamp(self.clock()) - timedelta(hours=self.incident_hours)
+        incidents = []
+        for name in (name for path in self.incident_logs for name in alert_log.log_files(path)):
+            try:
+                text = alert_log.tail(name, tail_chars)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️  Could not read incidents from {name}: {e}")
+                continue
+            for header, body in alert_blocks(text):
+                try:
+                    when = datetime.fromisoformat(header.removeprefix("Alert at ").strip())
+                except ValueError:
+                    when = None
+                if when is None or when.replace(tzinfo=None) >= since:
+                    incidents.append(f"- {header}: {body.splitlines()[0]}")
+        if not incidents:
+            return f"None in the last {self.incident_hours:g} hours"
+        return "\n".join(incidents[-self.max_incidents:])
+    
+    def start(self, tools: List[BaseTool]):
+        """Refresh in a background task of the running event loop until ``stop``."""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(tools))
+    
+    async def _run(self, tools: List[BaseTool]):
+        while True:
+            if not self.idle_seconds or self.clock() - self._last_question <= self.idle_seconds:
+                try:
+                    await self.refresh(tools)
+                except Exception as e:
+                    logger.warning(f"⚠️  Snapshot refresh failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def _touch(self):
+        """A question arrived: resume refreshing if it was paused."""
+        idle = self.idle_seconds and self.clock() - self._last_question > self.idle_seconds
+        self._last_question = self.clock()
+        if idle and self._loop is not None:
+            # asyncio.Event isn't thread-safe: set it on the refresh task's loop
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                # The loop was closed; there is no refresh to resume
+                pass
+    
+    def render(self) -> str:
+        """The snapshot as text for the model, or why it can't be used."""
+        if self.taken_at is None:
+            return f"No situation snapshot of {self.host} yet: call the live tools."
+        if not self.fresh:
+            metrics.incr("snapshot_stale")
+            return (f"The situation snapshot of {self.host} is {self.age:.0f}s old (limit "
+                    f"{self.max_age_seconds:.0f}s): call the live tools.")
+        taken = datetime.fromtimestamp(self.taken_at).strftime("%H:%M:%S")
+        lines = [f"Situation snapshot of {self.host} at {taken} ({self.age:.0f}s ago), last {self.minutes} minutes. "
+                 f"Call the live tools for other windows, details or anything not shown here."]
+        for name, text in self.sections.items():
+            lines += ["", f"## {name}", text]
+        return "\n".join(lines)
+    
+    def make_tool(self) -> BaseTool:
+        """The ``get_situation_snapshot`` tool."""
+        async def get_situation_snapshot() -> str:
+            self._touch()
+            metrics.incr("snapshot_reads", fresh=self.fresh)
+            return self.render()
+        
+        return StructuredTool.from_function(
+            coroutine=get_situation_snapshot,
+            name=SNAPSHOT_TOOL,
+            description=(f"Try this first for questions about the current situation on the target (anything "
+                         f"suspicious, anomalies, top talkers and processes, open incidents). Returns network event "
+                         f"stats and anomalies of the last {self.minutes} minutes and recent alerts, refreshed in "
+                         f"the background every {self.refresh_seconds:g}s, with their age. Use the other tools "
+                         f"for other time windows, details, or when the snapshot is stale.")
+        )
+    
+    def model(self, select_model: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+        """
+        Dynamic model for ``create_react_agent`` that counts questions
+        answered without live MCP calls (and in ``prompt`` mode adds the
+        snapshot before the latest question).
+        
+        Args:
+            select_model: Dynamic model (state, runtime) -> model with tools bound
+        
+        Returns:
+            Dynamic model with the snapshot
+        """
+        def snapshot_model(state, runtime):
+            messages = state["messages"] if isinstance(state, dict) else state.messages
+            add = RunnableLambda(self._add_snapshot, name="add_snapshot")
+            count = RunnableLambda(lambda message: self._count_answer(messages, message), name="count_answer")
+            return add | select_model(state, runtime) | count
+        
+        return snapshot_model
+    
+    def _add_snapshot(self, prompt: Any) -> List[BaseMessage]:
+        messages = prompt.to_messages() if hasattr(prompt, "to_messages") else list(prompt)
+        question = _last_question(messages)
+        if question is None:
+            return messages
+        key = messages[question].id or messages[question].content
+        if key not in self._seen:
+            if len(self._seen) > 256:
+                self._seen.clear()
+            self._seen[key] = True
+            self._touch()
+        if self.mode != "prompt":
+            return messages
+        return messages[:question] + [HumanMessage(content=self.render())] + messages[question:]
+    
+    def _count_answer(self, messages: List[BaseMessage], answer: Any) -> Any:
+        if not isinstance(answer, AIMessage) or answer.tool_calls:
+            return answer
+        question = _last_question(messages)
+        if question is None:
+            return answer
+        called = {call["name"] for m in messages[question:] if isinstance(m, AIMessage) for call in m.tool_calls}
+        metrics.incr("snapshot_questions")
+        if not called - {SNAPSHOT_TOOL, RECALL_TOOL}:
+            metrics.incr("snapshot_answered_without_live_calls")
+        return answer
+    
+    @staticmethod
+    def report() -> Dict[str, float]:
+        """Questions, and the share answered without a live MCP call."""
+        questions = metrics.counter("snapshot_questions")
+        without = metrics.counter("snapshot_answered_without_live_calls")
+        return {"questions": questions, "answered_without_live_calls": without,
+                "share": without / questions if questions else 0.0}
+
+
+def _last_question(messages: List[BaseMessage]) -> Optional[int]:
+    return next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
@@ -0,0 +1,90 @@
+"""Token streaming helpers for the conversational agent."""
+
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TTFTCallback(BaseCallbackHandler):
+    """
+    Records time-to-first-token of every streamed LLM call.
+    
+    Attached to the ChatOpenAI instance, so it times the calls of runs
+    served by the LangGraph server as well as ``stream_answer``. The time
+    from the request to the first text token is recorded as the
+    ``llm_ttft_seconds`` metric; calls answering with tool calls only
+    have no text and are not counted.
+    """
+    
+    # Only takes a timestamp; no need to run in an executor
+    run_inline = True
+    
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+    
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        if not token or run_id not in self._started:
+            return
+        ttft = time.perf_counter() - self._started.pop(run_id)
+        metrics.observe("llm_ttft_seconds", ttft)
+        logger.debug(f"First token after {ttft:.2f}s")
+    
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        self._started.pop(run_id, None)
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._started.pop(run_id, None)
+
+
+async def stream_answer(agent, question: str, config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Stream the agent's answer token by token.
+    
+    Uses ``astream_events`` so that tokens from every model call in the
+    ReAct loop are forwarded as soon as they arrive. The time from the
+    question to the first answer token (tool calls included) is recorded
+    as the ``answer_ttft_seconds`` metric.
+    
+    Args:
+        agent: Compiled agent from build_agent()
+        question: User question
+        config: Optional runnable config (e.g. thread_id for memory)
+    
+    Yields:
+        Text fragments of the model output
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    
+    async for event in agent.astream_events(
+        {"messages": [{"role": "user", "content": question}]},
+        config=config,
+        version="v2",
+    ):
+        if event["event"] != "on_chat_model_stream":
+            continue
+        
+        content = event["data"]["chunk"].content
+        if not content or not isinstance(content, str):
+            # Tool-call chunks carry no text
+            continue
+        
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            metrics.observe("answer_ttft_seconds", first_token_at - start)
+            logger.info(f"First token after {first_token_at - start:.2f}s")
+        
+        yield content
+    
+    metrics.observe("answer_latency_seconds", time.perf_counter() - start)
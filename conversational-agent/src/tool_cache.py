@@ -0,0 +1,244 @@
+"""TTL cache of MCP tool results for the conversational agent.
+
+The same ``get_network_event_stats`` or ``get_network_events_history``
+query for the same host and window is often asked again seconds later,
+in the same conversation or by another analyst, and each call runs over
+SSH on the target. Wrapped tools serve repeated calls from a process-wide
+cache:
+
+- Entries are keyed on the tool name and canonicalized arguments.
+- Each tool has its own TTL. Tools with a "last N minutes" argument
+  (``window_arg``) are cached per aligned time bucket of the TTL, so every
+  conversation in the same bucket sees the same window.
+- Concurrent identical calls share one MCP call (single flight).
+- Tools in ``never`` are always called.
+
+Hits, misses, coalesced calls and the saved latency are counted per tool
+in the metrics (``tool_cache_hits``, ``tool_cache_saved_seconds``, ...).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain_core.tools import BaseTool
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_args(args: Dict[str, Any]) -> str:
+    """Arguments as a stable key: sorted, None dropped, strings trimmed, 10.0 == 10."""
+    def normalize(value):
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items() if v is not None}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+    
+    return json.dumps(normalize(args), sort_keys=True, default=str, separators=(",", ":"))
+
+
+@dataclass
+class ToolPolicy:
+    """How results of one tool are cached."""
+    ttl: float
+    window_arg: Optional[str] = None
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires: float
+    latency: float
+
+
+class ToolCache:
+    """Process-wide TTL cache with single-flight coalescing."""
+    
+    def __init__(self, default_ttl: float = 30.0, policies: Optional[Dict[str, ToolPolicy]] = None,
+                 never: Iterable[str] = (), max_entries: int = 256, report_every: int = 50,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            default_ttl: TTL in seconds of tools without a policy (0: not cached)
+            policies: Tool name -> TTL and window argument
+            never: Tools that are never cached
+            max_entries: Results kept; the least recently used are evicted
+            report_every: Log hit rates every N tool calls (0: never)
+            clock: Time source (epoch seconds)
+        """
+        self.default_ttl = default_ttl
+        self.policies = policies or {}
+        self.never = set(never)
+        self.max_entries = max_entries
+        self.report_every = report_every
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._calls = 0
+        self._stats: Dict[str, Dict[str, float]] = {}
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "ToolCache":
+        settings = config.get("tool_cache", {})
+        policies = {
+            name: ToolPolicy(ttl=policy.get("ttl_seconds", settings.get("default_ttl_seconds", 30)),
+                             window_arg=policy.get("window_arg"))
+            for name, policy in (settings.get("tools") or {}).items()
+        }
+        return cls(
+            default_ttl=settings.get("default_ttl_seconds", 30),
+            policies=policies,
+            never=settings.get("never", []),
+            max_entries=settings.get("max_entries", 256),
+            report_every=settings.get("report_every", 50)
+        )
+    
+    def policy(self, name: str) -> Optional[ToolPolicy]:
+        """Cache policy of a tool, or None if it isn't cached."""
+        if name in self.never:
+            return None
+        policy = self.policies.get(name) or ToolPolicy(ttl=self.default_ttl)
+        return policy if policy.ttl > 0 else None
+    
+    def key(self, name: str, args: Dict[str, Any], policy: ToolPolicy, now: float) -> tuple:
+        """Cache key and expiry time of a call."""
+        key = f"{name}:{canonical_args(args)}"
+        if policy.window_arg and policy.window_arg in args:
+            # "Last N minutes" windows: one entry per aligned bucket
+            bucket = int(now // policy.ttl)
+            return f"{key}@{bucket}", (bucket + 1) * policy.ttl
+        return key, now + policy.ttl
+    
+    async def call(self, name: str, args: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        """
+        Return a cached result, or call ``fetch`` once for all concurrent callers.
+        
+        Args:
+            name: Tool name
+            args: Tool arguments
+            fetch: Coroutine function calling the tool
+        
+        Returns:
+            Tool result
+        """
+        policy = self.policy(name)
+        if policy is None:
+            return await fetch()
+        
+        now = self.clock()
+        key, expires = self.key(name, args, policy, now)
+        stats = self._stats.setdefault(name, {"calls": 0, "hits": 0, "coalesced": 0, "saved": 0.0})
+        stats["calls"] += 1
+        self._count_call()
+        
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > now:
+            self._entries.move_to_end(key)
+            self._record_hit(name, stats, "hits", entry.latency)
+            return entry.value
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(name, key, expires, fetch))
+            # Retrieve errors even if every caller gave up
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+            return await asyncio.shield(task)
+        
+        # Identical call already running: share its result. The call runs in
+        # its own task, so a caller that gives up doesn't cancel the others.
+        value = await asyncio.shield(task)
+        self._record_hit(name, stats, "coalesced", 0.0)
+        return value
+    
+    async def _fetch(self, name: str, key: str, expires: float, fetch: Callable[[], Any]) -> Any:
+        # Errors propagate to every concurrent caller and aren't cached
+        start = time.perf_counter()
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        latency = time.perf_counter() - start
+        metrics.incr("tool_cache_misses", tool=name)
+        metrics.observe("tool_latency_seconds", latency, tool=name)
+        self._entries[key] = _Entry(value, expires, latency)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+    
+    def _record_hit(self, name: str, stats: Dict[str, float], kind: str, saved: float):
+        stats[kind] += 1
+        stats["saved"] += saved
+        metrics.incr(f"tool_cache_{kind}", tool=name)
+        metrics.incr("tool_cache_saved_seconds", saved, tool=name)
+    
+    def _count_call(self):
+        self._calls += 1
+        if self.report_every and self._calls % self.report_every == 0:
+            self.log_summary()
+    
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Hit rates per tool.
+        
+        Returns:
+            Tool name -> calls, hits, coalesced, hit_rate and saved_seconds
+            (MCP latency avoided by cache hits)
+        """
+        return {
+            name: {
+                "calls": stats["calls"],
+                "hits": stats["hits"],
+                "coalesced": stats["coalesced"],
+                "hit_rate": (stats["hits"] + stats["coalesced"]) / stats["calls"] if stats["calls"] else 0.0,
+                "saved_seconds": stats["saved"],
+            }
+            for name, stats in self._stats.items()
+        }
+    
+    def log_summary(self):
+        """Write hit rates and saved latency to the log."""
+        for name, stats in sorted(self.report().items()):
+            logger.info(
+                f"🗄️  Tool cache {name}: {stats['hits']:.0f} hits + {stats['coalesced']:.0f} coalesced "
+                f"of {stats['calls']:.0f} calls ({stats['hit_rate']:.0%}), {stats['saved_seconds']:.1f}s saved"
+            )
+    
+    def wrap_tools(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """Wrap MCP tools so their results are served from the cache."""
+        wrapped = []
+        for tool in tools:
+            if self.policy(tool.name) is None:
+                wrapped.append(tool)
+                continue
+            wrapped.append(CachedTool(name=tool.name, description=tool.description, args_schema=tool.args_schema,
+                                      inner=tool, cache=self))
+        return wrapped
+    
+    def clear(self):
+        self._entries.clear()
+
+
+class CachedTool(BaseTool):
+    """MCP tool wrapper that serves repeated calls from a ToolCache."""
+    
+    inner: Any
+    cache: Any
+    
+    async def _arun(self, **kwargs) -> Any:
+        return await self.cache.call(self.name, kwargs, lambda: self.inner.ainvoke(kwargs))
+    
+    def _run(self, **kwargs):
+        raise NotImplementedError("MCP tools are async only")
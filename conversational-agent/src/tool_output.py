@@ -0,0 +1,305 @@
+"""Size caps for large MCP tool outputs.
+
+A busy host's ``get_network_events_history`` can return megabytes. Put
+into a ToolMessage as is, the whole text is copied into every prompt of
+the turn and sent to the LLM. ``ToolOutputLimiter.wrap`` runs inside the
+tool node's ``awrap_tool_call`` and keeps what the model sees bounded:
+
+- Tools with an integer row-limit argument (``limit_args``) get it set to
+  ``server_max_rows`` when the model leaves it out, so the MCP server
+  filters before sending.
+- An output above ``max_bytes`` or ``max_rows`` is scanned once, line by
+  line (or item by item for a JSON array), in a worker thread. Its first
+  rows within the caps become the preview for the model, with a summary:
+  rows, size and the most frequent addresses and process names (or field
+  values). The full output is written to ``spill_dir`` in chunks, and
+  ``recall_tool_output`` searches the spilled file.
+- Spilled files older than ``retention_hours`` are deleted.
+
+Output and preview sizes and spills are counted in the metrics
+(``tool_output_bytes``, ``tool_output_sent_bytes``, ``tool_output_spills``).
+With ``track_memory`` the tracemalloc peak of each call is recorded as
+``tool_output_peak_bytes`` (tracing slows every allocation while it is on,
+and concurrent calls share one peak).
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+
+from src.compaction import RECALL_TOOL
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_ADDRESS_RE = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b")
+_NAME_RE = re.compile(r"\(([A-Za-z][\w.@/-]{0,63})\)")
+
+# Text written to a spill file per write
+_CHUNK_CHARS = 1 << 20
+# Distinct values counted per JSON field
+_MAX_VALUES = 1000
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """Lines of a text, one at a time (no list of all lines)."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+
+def iter_json_items(text: str) -> Optional[Iterator[Any]]:
+    """Items of a JSON array, decoded one at a time, or None if the text isn't one."""
+    start = len(text) - len(text.lstrip())
+    if not text.startswith("[", start):
+        return None
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r"[\s,]*")
+    
+    def items():
+        index = whitespace.match(text, start + 1).end()
+        while index < len(text) and text[index] != "]":
+            item, index = decoder.raw_decode(text, index)
+            yield item
+            index = whitespace.match(text, index).end()
+    
+    return items()
+
+
+def byte_size(text: str) -> int:
+    """UTF-8 size of a text, without encoding a copy of an ASCII one."""
+    return len(text) if text.isascii() else len(text.encode())
+
+
+def _size(count: int) -> str:
+    return f"{count / 1e6:.1f} MB" if count >= 1e6 else f"{count / 1e3:.1f} KB"
+
+
+def _top(counter: Counter, count: int) -> str:
+    return ", ".join(f"{value} ({n})" for value, n in counter.most_common(count))
+
+
+class ToolOutputLimiter:
+    """Caps tool outputs sent to the model and spills large ones to disk."""
+    
+    def __init__(self, max_bytes: int = 16000, max_rows: int = 200, server_max_rows: int = 5000,
+                 limit_args: Iterable[str] = ("limit", "max_results", "max_events", "max_lines"),
+                 spill_dir: str = ".langgraph_api/tool_outputs", retention_hours: float = 24.0,
+                 summary_values: int = 5, track_memory: bool = False):
+        """
+        Args:
+            max_bytes: Largest output (UTF-8 bytes) sent to the model as is
+            max_rows: Lines (or JSON items) of a preview
+            server_max_rows: Value of a row-limit argument the model left out (0: don't set)
+            limit_args: Integer tool arguments that limit the rows returned
+            spill_dir: Directory of full outputs
+            retention_hours: Spilled outputs are deleted after this
+            summary_values: Most frequent values listed per kind
+            track_memory: Record the tracemalloc peak of each call
+        """
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.server_max_rows = server_max_rows
+        self.limit_args = list(limit_args)
+        self.spill_dir = Path(spill_dir)
+        self.retention_hours = retention_hours
+        self.summary_values = summary_values
+        self.track_memory = track_memory
+        self._last_cleanup = 0.0
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+    
+    @classmethod
+    def from_config(cls, config: Dict) -> "ToolOutputLimiter":
+        settings = config.get("tool_output", {})
+        return cls(
+            max_bytes=settings.get("max_bytes", 16000),
+            max_rows=settings.get("max_rows", 200),
+            server_max_rows=settings.get("server_max_rows", 5000),
+            limit_args=settings.get("limit_args", ["limit", "max_results", "max_events", "max_lines"]),
+            spill_dir=settings.get("spill_dir", ".langgraph_api/tool_outputs"),
+            retention_hours=settings.get("retention_hours", 24),
+            summary_values=settings.get("summary_values", 5),
+            track_memory=settings.get("track_memory", False)
+        )
+    
+    def limit_request(self, request):
+        """The request with a row-limit argument the model left out set to ``server_max_rows``."""
+        if not self.server_max_rows or request.tool is None:
+            return request
+        args = request.tool_call.get("args") or {}
+        schema = request.tool.args
+        for name in self.limit_args:
+            if name in schema and name not in args and schema[name].get("type") == "integer":
+                metrics.incr("tool_output_limit_args", tool=request.tool_call["name"])
+                return request.override(tool_call={**request.tool_call, "args": {**args, name: self.server_max_rows}})
+        return request
+    
+    async def wrap(self, request, execute: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Run one tool call and cap its output.
+        
+        Args:
+            request: ToolCallRequest from the tool node
+            execute: Runs the tool call
+        
+        Returns:
+            The tool's message, with a preview in place of an output above the caps
+        """
+        name = request.tool_call["name"]
+        if name == RECALL_TOOL:
+            # Already paged within its own limit, and reads the spilled outputs
+            return await execute(request)
+        if self.track_memory and tracemalloc.is_tracing():
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        result = await execute(self.limit_request(request))
+        if isinstance(result, ToolMessage):
+            result = await self.limit_message(result)
+        if self.track_memory and tracemalloc.is_tracing():
+            metrics.observe("tool_output_peak_bytes", max(0, tracemalloc.get_traced_memory()[1] - before), tool=name)
+        return result
+    
+    async def limit_message(self, message: ToolMessage) -> ToolMessage:
+        """A tool message with its content capped (the message itself if it is small)."""
+        content = message.content
+        if not isinstance(content, str):
+            content = "\n".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+        name = message.name or "tool"
+        # Cheap checks first: bytes <= 4 x characters, and str.count doesn't copy
+        if len(content) <= self.max_bytes // 4 or (byte_size(content) <= self.max_bytes
+                                                    and content.count("\n") < self.max_rows):
+            metrics.observe("tool_output_bytes", len(content), tool=name)
+            metrics.observe("tool_output_sent_bytes", len(content), tool=name)
+            return message
+        with metrics.timer("tool_output_seconds", tool=name):
+            preview, artifact = await asyncio.to_thread(self.limit, name, message.tool_call_id, content)
+        metrics.observe("tool_output_bytes", artifact["bytes"], tool=name)
+        metrics.observe("tool_output_sent_bytes", byte_size(preview), tool=name)
+        return message.model_copy(update={"content": preview, "artifact": artifact})
+    
+    def limit(self, name: str, call_id: str, content: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Preview of a large output, with the full output spilled to disk.
+        
+        Args:
+            name: Tool name
+            call_id: Tool call id (the reference for recall_tool_output)
+            content: The output
+        
+        Returns:
+            (preview for the model, artifact: spill path, bytes, rows)
+        """
+        path = self._spill(call_id, content)
+        items = iter_json_items(content)
+        if items is not None:
+            try:
+                head, rows, summary = self._scan_json(items)
+            except ValueError:
+                items = None
+        if items is None:
+            head, rows, summary = self._scan_lines(content)
+        size = byte_size(content)
+        footer = summary + ([f'Full output: recall_tool_output(ref="{call_id}", grep="<text>") searches all of it.']
+                            if path is not None else [])
+        # The summary and the notes count toward max_bytes: drop rows from the end to fit them
+        budget = self.max_bytes - sum(byte_size(line) + 1 for line in footer) - 200
+        used = sum(byte_size(row) + 1 for row in head)
+        while head and used > budget:
+            used -= byte_size(head.pop()) + 1
+        lines = [f"[{name} output: {rows} {'items' if items is not None else 'lines'}, {_size(size)}; "
+                 f"the first {len(head)} are shown]"] + head
+        if rows > len(head):
+            lines.append(f"… {rows - len(head)} more not shown.")
+        lines += footer
+        if path is not None:
+            metrics.incr("tool_output_spills", tool=name)
+        logger.info(f"✂️  {name} output capped: {_size(size)}, {rows} rows -> {len(head)} rows")
+        return "\n".join(lines), {"spill": str(path) if path else None, "bytes": size, "rows": rows}
+    
+    def _fits(self, row: str, head: List[str], used: int) -> bool:
+        return len(head) < self.max_rows and used + len(row) + 1 <= self.max_bytes
+    
+    def _scan_lines(self, content: str) -> Tuple[List[str], int, List[str]]:
+        head, used, rows = [], 0, 0
+        for line in iter_lines(content):
+            rows += 1
+            row = line if len(line) <= 500 else line[:500] + "…"
+            if self._fits(row, head, used):
+                head.append(row)
+                used += len(row) + 1
+        # Regex scans of the whole text, one match at a time (findall would list them all)
+        addresses = Counter(match.group() for match in _ADDRESS_RE.finditer(content))
+        names = Counter(match.group(1) for match in _NAME_RE.finditer(content))
+        summary = []
+        if addresses:
+            summary.append(f"Most frequent addresses: {_top(addresses, self.summary_values)}")
+        if names:
+            summary.append(f"Most frequent names: {_top(names, self.summary_values)}")
+        return head, rows, summary
+    
+    def _scan_json(self, items: Iterator[Any]) -> Tuple[List[str], int, List[str]]:
+        head, used, rows = [], 0, 0
+        fields: Dict[str, Counter] = {}
+        for item in items:
+            rows += 1
+            row = json.dumps(item, separators=(",", ":"), default=str)
+            if self._fits(row, head, used):
+                head.append(row)
+                used += len(row) + 1
+            if isinstance(item, dict):
+                for key, value in item.items():
+                    if isinstance(value, (str, int, float, bool)):
+                        counter = fields.setdefault(key, Counter())
+                        if value in counter or len(counter) < _MAX_VALUES:
+                            counter[value] += 1
+        # Fields whose values repeat the most (processes, destinations, ports)
+        repeated = sorted((counter for counter in fields.values() if counter.most_common(1)[0][1] > 1),
+                          key=lambda counter: -counter.most_common(1)[0][1])
+        keys = {id(counter): key for key, counter in fields.items()}
+        summary = [f"Most frequent {keys[id(counter)]}: {_top(counter, self.summary_values)}"
+                   for counter in repeated[:self.summary_values]]
+        return head, rows, summary
+    
+    def _spill(self, call_id: str, content: str) -> Optional[Path]:
+        """Write the full output to the spill directory in chunks."""
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            safe = re.sub(r"[^\w.-]", "_", call_id or "")[:80] or "call"
+            path = self.spill_dir / f"{int(time.time())}-{safe}-{uuid.uuid4().hex[:8]}.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                for start in range(0, len(content), _CHUNK_CHARS):
+                    f.write(content[start:start + _CHUNK_CHARS])
+        except OSError as e:
+            logger.warning(f"⚠️  Could not save the full tool output: {e}")
+            return None
+        self._cleanup()
+        return path
+    
+    def _cleanup(self):
+        """Delete spilled outputs older than ``retention_hours`` (at most hourly)."""
+        now = time.time()
+        if now - self._last_cleanup < 3600:
+            return
+        self._last_cleanup = now
+        cutoff = now - self.retention_hours * 3600
+        for path in self.spill_dir.glob("*.txt"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
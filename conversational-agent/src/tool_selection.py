@@ -0,0 +1,220 @@
+"""Per-question tool subsetting for the conversational agent.
+
+The MCP server exposes 24+ tools, and binding all of them sends every
+tool schema to the LLM on every turn: thousands of prompt tokens and the
+prefill time that goes with them. ``ToolSelector`` builds a BM25 index over
+tool names, descriptions and argument names once at load, and binds only
+the tools that match the user's latest question:
+
+- Tools scoring at least ``relative_score`` of the best match are bound,
+  up to ``max_tools``, plus the ``always`` tools.
+- Tools already called in the conversation stay bound for follow-ups.
+- If no tool scores ``min_score`` (a vague question, or one about
+  something the index doesn't know), all tools are bound.
+
+Every tool stays in the tool node, so a call to a tool outside the subset
+still runs. Bound tools per turn, the estimated schema tokens and the
+expansions to all tools are counted in the metrics
+(``tool_selection_tools``, ``tool_schema_tokens``, ``tool_selection_expanded``).
+"""
+
+import json
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset(
+    "a an and any are as at be been by can could do does for from get give has have how i in is it its "
+    "me my of on or our please show tell than that the their them there these this to up us was we what "
+    "when where which who why will with you your".split()
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, so "connections", "connected" and "connection" match."""
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "ches", "shes", "xes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us")) and len(word) > 3:
+        word = word[:-1]
+    for suffix in ("ing", "ion", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str, synonyms: Optional[Dict[str, str]] = None) -> List[str]:
+    """Lowercased, stemmed terms of a text; ``snake_case`` names are split into words."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower().replace("_", " ")):
+        if word in STOPWORDS:
+            continue
+        if synonyms and word in synonyms:
+            terms.extend(_stem(w) for w in synonyms[word].split())
+        else:
+            terms.append(_stem(word))
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a small set of named documents."""
+    
+    def __init__(self, documents: Dict[str, List[str]], k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            documents: Document name -> terms
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.lengths = {name: len(terms) for name, terms in documents.items()}
+        self.average_length = sum(self.lengths.values()) / max(1, len(documents))
+        self.postings: Dict[str, Dict[str, int]] = {}
+        for name, terms in documents.items():
+            for term, count in Counter(terms).items():
+                self.postings.setdefault(term, {})[name] = count
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+    
+    def scores(self, terms: Iterable[str]) -> Dict[str, float]:
+        """BM25 score of every document matching at least one term."""
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            for name, count in self.postings.get(term, {}).items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[name] / self.average_length)
+                scores[name] = scores.get(name, 0.0) + self.idf[term] * count * (self.k1 + 1) / (count + norm)
+        return scores
+
+
+class ToolSelector:
+    """Picks the tools to bind to the LLM for each question."""
+    
+    def __init__(self, tools: Sequence[BaseTool], max_tools: int = 6, min_score: float = 1.0,
+                 relative_score: float = 0.25, always: Iterable[str] = (),
+                 synonyms: Optional[Dict[str, str]] = None, name_weight: int = 3):
+        """
+        Args:
+            tools: All MCP tools
+            max_tools: Matching tools bound per question (besides ``always``)
+            min_score: Best BM25 score below which all tools are bound
+            relative_score: Bind tools scoring at least this fraction of the best
+            always: Tools bound on every turn
+            synonyms: Question word -> index words, e.g. {"talking": "connections"}
+            name_weight: Times the words of a tool's name are counted
+        """
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_tools = max_tools
+        self.min_score = min_score
+        self.relative_score = relative_score
+        self.always = [name for name in always if name in self.tools]
+        self.synonyms = {word.lower(): target for word, target in (synonyms or {}).items()}
+        self.index = BM25Index({
+            tool.name: tokenize(" ".join([tool.name] * name_weight + [tool.description or ""] + _arg_names(tool)))
+            for tool in tools
+        })
+        self._bound: OrderedDict = OrderedDict()
+    
+    @classmethod
+    def from_config(cls, tools: Sequence[BaseTool], config: Dict) -> "ToolSelector":
+        settings = config.get("tool_selection", {})
+        return cls(
+            tools,
+            max_tools=settings.get("max_tools", 6),
+            min_score=settings.get("min_score", 1.0),
+            relative_score=settings.get("relative_score", 0.25),
+            always=settings.get("always", []),
+            synonyms=settings.get("synonyms", {})
+        )
+    
+    def select(self, question: str, used: Iterable[str] = ()) -> List[str]:
+        """
+        Names of the tools to bind for a question.
+        
+        Args:
+            question: The user's latest message
+            used: Tools already called in the conversation
+        
+        Returns:
+            Tool names in index order, or all tools if nothing matches well
+        """
+        scores = self.index.scores(tokenize(question, self.synonyms))
+        best = max(scores.values(), default=0.0)
+        if best < self.min_score:
+            metrics.incr("tool_selection_expanded")
+            return list(self.tools)
+        
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        chosen = {name for name in ranked[:self.max_tools] if scores[name] >= best * self.relative_score}
+        chosen.update(self.always)
+        chosen.update(name for name in used if name in self.tools)
+        return [name for name in self.tools if name in chosen]
+    
+    def bind(self, llm, names: List[str]):
+        """The LLM with these tools bound (cached per tool set)."""
+        key = tuple(names)
+        bound = self._bound.get(key)
+        if bound is None:
+            tools = [self.tools[name] for name in names]
+            schema = json.dumps([convert_to_openai_tool(tool) for tool in tools])
+            # ~4 characters per token for JSON schemas
+            bound = self._bound[key] = (llm.bind_tools(tools), len(schema) // 4)
+            while len(self._bound) > 64:
+                self._bound.popitem(last=False)
+        else:
+            self._bound.move_to_end(key)
+        return bound
+    
+    def model(self, llm) -> Callable[[Any, Any], Any]:
+        """
+        Dynamic model for ``create_react_agent``: the LLM bound to the tools
+        selected for the conversation's latest question.
+        """
+        def select_model(state, runtime):
+            messages = state["messages"] if isinstance(state, dict) else state.messages
+            names = self.select(_latest_question(messages), _used_tools(messages))
+            model, tokens = self.bind(llm, names)
+            metrics.observe("tool_selection_tools", len(names))
+            metrics.observe("tool_schema_tokens", tokens)
+            logger.debug(f"Bound {len(names)} of {len(self.tools)} tools: {', '.join(names)}")
+            return model
+        
+        return select_model
+
+
+def _arg_names(tool: BaseTool) -> List[str]:
+    schema = tool.args_schema
+    if schema is None:
+        return []
+    properties = schema.get("properties", {}) if isinstance(schema, dict) else schema.model_json_schema().get("properties", {})
+    return list(properties)
+
+
+def _latest_question(messages: List) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            content = message.content
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+            return content
+    return ""
+
+
+def _used_tools(messages: List) -> List[str]:
+    return [call["name"] for message in messages if isinstance(message, AIMessage) for call in message.tool_calls]
@@ -0,0 +1,198 @@
+"""Test the semantic answer cache."""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.answer_cache import AnswerCache
+from src.metrics import metrics
+from src.snapshot import SituationSnapshot
+from src.streaming import stream_answer
+from test_memory import ambient_compression
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_matching_ttl_and_invalidation():
+    """Similar questions hit; different specifics, targets, expiry and new alerts miss."""
+    metrics.reset()
+    clock = Clock()
+    alerts = Path(tempfile.mkdtemp()) / "alerts.log"
+    alerts.write_text("")
+    cache = AnswerCache(ttl_seconds=120, incident_logs=[str(alerts)], clock=clock)
+    cache.store("bastion", "Is the bastion host being port scanned?", "No scan in the last 10 minutes.")
+    cache.store("bastion", "Why is curl connecting to 198.51.100.7?", "Package mirror.")
+    cache.store("bastion", "Top talkers in the last 10 minutes?", "curl, sshd.")
+    
+    assert cache.lookup("bastion", "is the bastion host being port-scanned")[1] > 0.9
+    assert cache.lookup("bastion", "is the bastion host being port scanned right now?") is not None
+    assert cache.lookup("bastion", "what are the top talkers in the last 10 minutes")[0].answer == "curl, sshd."
+    # Similar wording, different question
+    assert cache.lookup("bastion", "Why is wget connecting to 198.51.100.7?") is None
+    assert cache.lookup("bastion", "Top talkers in the last 60 minutes?") is None
+    assert cache.lookup("bastion", "Why is curl connecting to 198.51.100.8?") is None
+    assert cache.lookup("web-01", "Is the bastion host being port scanned?") is None
+    assert AnswerCache.report()["hit_ratio"] == 3 / 7
+    
+    # Expired answers are not served
+    clock.now += 121
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is None
+    
+    # A new alert (or a changed anomaly section of the snapshot) empties the cache
+    cache.store("bastion", "Is the bastion host being port scanned?", "No scan.")
+    with open(alerts, "a") as f:
+        f.write("\nAlert\n")
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is None and cache.epoch == 1
+    cache.store("bastion", "Is the bastion host being port scanned?", "No scan.")
+    cache.on_snapshot({"get_network_event_stats"})
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is not None
+    cache.on_snapshot({"detect_network_anomalies"})
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is None and cache.epoch == 2
+    # So does a new record in the compressed log written with alerts.compress
+    compressed = ambient_compression().CompressedLog(str(alerts) + ".z")
+    compressed.append("\nAlert\n")
+    cache.store("bastion", "Is the bastion host being port scanned?", "No scan.")
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is not None and cache.epoch == 3
+    compressed.append("\nAnother alert\n")
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?") is None and cache.epoch == 4
+    
+    # Lookups stay in milliseconds with a full cache
+    for i in range(256):
+        cache.store("bastion", f"question {i} about process worker-{i} and its connections", f"answer {i}")
+    start = time.perf_counter()
+    for i in range(50):
+        cache.lookup("bastion", "which connections does the backup process open?")
+    lookup = (time.perf_counter() - start) / 50
+    assert lookup < 0.02
+    print(f" Lookup with 256 answers: {lookup * 1000:.2f} ms")
+
+
+def test_agent_serves_repeated_questions():
+    """A repeated first question skips the ReAct loop; bypass and follow-ups don't."""
+    metrics.reset()
+    calls = []
+    
+    class FakeModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+    
+    async def detect_network_anomalies(minutes: int = 10) -> str:
+        calls.append(minutes)
+        return "No port scan patterns"
+    
+    def script():
+        turn = 0
+        while True:
+            turn += 1
+            yield AIMessage(content="", tool_calls=[{"name": "detect_network_anomalies", "args": {"minutes": 10},
+                                                     "id": f"call_{turn}"}])
+            yield AIMessage(content=f"No port scan in the last 10 minutes (investigation {turn}).")
+    
+    tool = StructuredTool.from_function(coroutine=detect_network_anomalies, name="detect_network_anomalies",
+                                        description="anomalies")
+    cache = AnswerCache()
+    model = FakeModel(messages=script())
+    agent = create_react_agent(cache.model(lambda state, runtime: model, "bastion"), [tool])
+    
+    async def ask(messages, **configurable):
+        result = await agent.ainvoke({"messages": messages}, {"configurable": configurable})
+        return result["messages"]
+    
+    async def run():
+        first = await ask([HumanMessage(content="Is the bastion host being port scanned?")])
+        start = time.perf_counter()
+        again = await ask([HumanMessage(content="is the bastion host being port scanned right now")])
+        hit_seconds = time.perf_counter() - start
+        streamed = "".join([chunk async for chunk in stream_answer(agent, "is bastion host being port scanned?")])
+        bypass = await ask([HumanMessage(content="/fresh is the bastion host being port scanned?")])
+        configured = await ask([HumanMessage(content="Is the bastion host being port scanned?")], answer_cache=False)
+        follow_up = await ask(first + [HumanMessage(content="is the bastion host being port scanned?")])
+        return first, again, hit_seconds, streamed, bypass, configured, follow_up
+    
+    first, again, hit_seconds, streamed, bypass, configured, follow_up = asyncio.run(run())
+    assert len(first) == 4 and len(again) == 2 and hit_seconds < 0.5
+    assert again[-1].content.startswith("No port scan in the last 10 minutes (investigation 1).")
+    assert again[-1].response_metadata["answer_cache"]["similarity"] > 0.6
+    assert streamed.startswith("No port scan") and "/fresh" in streamed
+    assert "investigation 2" in bypass[-1].content and "investigation 3" in configured[-1].content
+    assert "investigation 4" in follow_up[-1].content and calls == [10] * 4
+    # Bypassed questions refresh the cache
+    assert cache.lookup("bastion", "Is the bastion host being port scanned?")[0].answer.endswith("(investigation 3).")
+    report = AnswerCache.report()
+    assert report["hits"] == 3 and report["bypassed"] == 2
+    print(f" Cached answer in {hit_seconds * 1000:.1f} ms, {report}")
+
+
+def test_answer_from_old_epoch_not_cached():
+    """An investigation during which new anomalies arrived doesn't cache its answer."""
+    metrics.reset()
+    
+    class FakeModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+    
+    cache = AnswerCache()
+    
+    async def detect_network_anomalies(minutes: int = 10) -> str:
+        # New anomalies while the ReAct loop runs
+        cache.invalidate("snapshot")
+        return "No port scan patterns"
+    
+    tool = StructuredTool.from_function(coroutine=detect_network_anomalies, name="detect_network_anomalies",
+                                        description="anomalies")
+    model = FakeModel(messages=iter([
+        AIMessage(content="", tool_calls=[{"name": "detect_network_anomalies", "args": {}, "id": "call_1"}]),
+        AIMessage(content="No port scan."),
+    ]))
+    agent = create_react_agent(cache.model(lambda state, runtime: model, "bastion"), [tool])
+    asyncio.run(agent.ainvoke({"messages": [HumanMessage(content="Is the bastion host being port scanned?")]}))
+    assert cache.epoch == 1 and cache.lookup("bastion", "Is the bastion host being port scanned?") is None
+    assert metrics.counter("answer_cache_stale_answers") == 1
+    print(" Answer from the old epoch was not cached")
+
+
+def test_snapshot_changes_invalidate():
+    """A refresh with new anomalies empties the cache; other changes don't."""
+    anomalies = ["none"]
+    
+    async def detect_network_anomalies(minutes: int, host: str, username: str) -> str:
+        return anomalies[0]
+    
+    async def get_network_event_stats(minutes: int, host: str, username: str) -> str:
+        return f"Total events: {time.perf_counter()}"
+    
+    tools = [StructuredTool.from_function(coroutine=fn, name=fn.__name__, description=fn.__name__)
+             for fn in (detect_network_anomalies, get_network_event_stats)]
+    snapshot = SituationSnapshot("bastion", "student")
+    cache = AnswerCache()
+    snapshot.listeners.append(cache.on_snapshot)
+    asyncio.run(snapshot.refresh(tools))
+    asyncio.run(snapshot.refresh(tools))
+    assert cache.epoch == 0
+    anomalies[0] = "nc -> 203.0.113.9:4444"
+    asyncio.run(snapshot.refresh(tools))
+    assert cache.epoch == 1
+    print(" Epoch moved on with new anomalies")
+
+
+if __name__ == "__main__":
+    test_matching_ttl_and_invalidation()
+    test_agent_serves_repeated_questions()
+    test_answer_from_old_epoch_not_cached()
+    test_snapshot_changes_invalidate()
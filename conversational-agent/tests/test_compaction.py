@@ -0,0 +1,121 @@
+"""Test context compaction of long conversations."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.compaction import ContextCompactor, estimate_tokens, make_recall_tool
+from src.metrics import metrics
+
+
+def event_dump(turn: int, lines: int = 100) -> str:
+    return "\n".join(f"turn {turn} event {i}: pid {1000 + i} (curl) -> 198.51.100.{i % 250}:443" for i in range(lines))
+
+
+def conversation(turns: int) -> list:
+    messages = []
+    for turn in range(turns):
+        call_id = f"call_{turn}"
+        messages += [
+            HumanMessage(content=f"question {turn}", id=f"h{turn}"),
+            AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "args": {"minutes": 10},
+                                               "id": call_id}], id=f"a{turn}"),
+            ToolMessage(content=event_dump(turn), name="get_network_events_history", tool_call_id=call_id, id=f"t{turn}"),
+            AIMessage(content=f"answer {turn}", id=f"r{turn}"),
+        ]
+    return messages
+
+
+def test_compact_digests_and_budget():
+    """Old outputs become digests, recent turns are verbatim, and the budget holds."""
+    metrics.reset()
+    compactor = ContextCompactor(max_tokens=6000, keep_turns=2, digest_chars=400)
+    messages = conversation(30)
+    full = sum(estimate_tokens(m) for m in messages)
+    compacted = compactor.compact(messages)
+    
+    assert compacted[-8:] == messages[-8:]
+    assert sum(estimate_tokens(m) for m in compacted) <= 6000 < full
+    assert "left out" in compacted[0].content and metrics.counter("context_omitted_turns") > 0
+    
+    digests = [m for m in compacted[:-8] if isinstance(m, ToolMessage)]
+    assert digests and all('recall_tool_output(ref="call_' in m.content for m in digests)
+    assert all(len(m.content) < 700 for m in digests)
+    
+    # Every tool result still follows the AI message that called it
+    calls = set()
+    for message in compacted:
+        if isinstance(message, AIMessage):
+            calls.update(call["id"] for call in message.tool_calls)
+        elif isinstance(message, ToolMessage):
+            assert message.tool_call_id in calls
+    
+    # Digests are reused on the next turn, and a short conversation is untouched
+    count = metrics.counter("context_digests")
+    compactor.compact(messages + [HumanMessage(content="next")])
+    assert metrics.counter("context_digests") == count + 1
+    assert compactor.compact(messages[:8]) == messages[:8]
+    print(f" {full} -> {sum(estimate_tokens(m) for m in compacted)} estimated tokens")
+
+
+def test_agent_input_stays_flat_and_recall_works():
+    """The model's input stops growing, and digested outputs can be recalled."""
+    seen = []
+    
+    class RecordingModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+        
+        async def _agenerate(self, messages, *args, **kwargs):
+            seen.append(messages)
+            return await super()._agenerate(messages, *args, **kwargs)
+    
+    async def history(minutes: int = 10) -> str:
+        return event_dump(len(seen))
+    
+    tool = StructuredTool.from_function(coroutine=history, name="get_network_events_history", description="history")
+    
+    def script():
+        for turn in range(12):
+            yield AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "args": {"minutes": 10},
+                                                     "id": f"call_{turn}"}])
+            yield AIMessage(content=f"answer {turn}")
+        yield AIMessage(content="", tool_calls=[{"name": "recall_tool_output", "id": "call_recall",
+                                                 "args": {"ref": "call_0", "grep": "event 42:"}}])
+        yield AIMessage(content="done")
+    
+    compactor = ContextCompactor(max_tokens=1500, keep_turns=1, digest_chars=400)
+    model = RecordingModel(messages=script())
+    agent = create_react_agent(compactor.model(lambda state, runtime: model), [tool, make_recall_tool()])
+    
+    async def run():
+        messages = []
+        for turn in range(13):
+            result = await agent.ainvoke({"messages": messages + [HumanMessage(content=f"question {turn}")]})
+            messages = result["messages"]
+        return messages
+    
+    messages = asyncio.run(run())
+    sizes = [sum(len(str(m.content)) for m in prompt) for prompt in seen]
+    # First LLM call of each question: grows, then levels off at the budget
+    firsts = sizes[0:24:2]
+    assert firsts[1] < firsts[4] and max(firsts[-4:]) - min(firsts[-4:]) < 0.2 * max(firsts)
+    assert max(sizes) <= 1500 * 4
+    # The state keeps full outputs; recall returns lines from them
+    assert len(messages[2].content) > 5000
+    recalled = [m for m in messages if isinstance(m, ToolMessage) and m.name == "recall_tool_output"][0]
+    assert recalled.content == "turn 1 event 42: pid 1042 (curl) -> 198.51.100.42:443"
+    print(f" Model input per question: {firsts} characters")
+
+
+if __name__ == "__main__":
+    test_compact_digests_and_budget()
+    test_agent_input_stays_flat_and_recall_works()
@@ -0,0 +1,179 @@
+"""Test semantic memory of past investigations."""
+
+import asyncio
+import importlib.util
+import logging
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.memory import IVFIndex, SemanticMemory
+from src.metrics import metrics
+from src.persistence import connect
+
+AMBIENT_SRC = Path(__file__).parent.parent.parent / "ambient-agent" / "src"
+
+PROCESSES = [f"worker-{i}" for i in range(60)]
+PORTS = [22, 53, 123, 443, 5432, 8080]
+
+
+def finding(rng: random.Random) -> tuple:
+    proc, port = rng.choice(PROCESSES), rng.choice(PORTS)
+    dst = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+    return (f"Q: Why is {proc} connecting to {dst}?\nA: {proc} opened {rng.randrange(2, 300)} connections "
+            f"to {dst}:{port}. It is expected.", proc, dst, port)
+
+
+def ambient_compression():
+    """The ambient agent's compression module (its ``src`` package loaded under another name)."""
+    if "ambient_src" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("ambient_src", AMBIENT_SRC / "__init__.py",
+                                                      submodule_search_locations=[str(AMBIENT_SRC)])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules["ambient_src"] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module("ambient_src.compression")
+
+
+def test_index_recall_and_restart():
+    """Paraphrases find their finding in a trained index, before and after a restart."""
+    path = str(Path(tempfile.mkdtemp()) / "agent.sqlite")
+    memory = SemanticMemory(connect(path), index=IVFIndex(min_train=256))
+    rng = random.Random(3)
+    findings = [finding(rng) for _ in range(1200)]
+    ids = [memory.remember("answer", text) for text, *_ in findings]
+    memory.load()
+    assert len(memory.index) == 1200 and len(memory.index.cells) > 1
+    
+    # Paraphrased questions recall the finding they are about
+    questions = [(ids[i], f"seen {proc} talking to {dst} on port {port} before?")
+                 for i, (_, proc, dst, port) in enumerate(findings[:50])]
+    hits = sum(any(m.id == entry for m in memory.recall(question, k=3, min_score=0.0))
+               for entry, question in questions)
+    assert hits >= 45
+    
+    # Unrelated text doesn't reach the context threshold
+    assert memory.recall("disk usage of /var on the target host") == []
+    
+    # A repeated finding replaces the earlier one and counts it
+    text = findings[0][0]
+    repeated = memory.remember("answer", text)
+    assert repeated != ids[0] and len(memory.index) == 1200
+    assert memory.recall(text, k=1)[0].metadata["seen"] == 2
+    
+    # A restart restores the saved cells instead of retraining
+    restarted = SemanticMemory(connect(path), index=IVFIndex(min_train=256))
+    restarted.load()
+    assert restarted.index.centroids == memory.index.centroids and len(restarted.index) == 1200
+    assert [m.id for m in restarted.recall(questions[1][1], k=3)] == [m.id for m in memory.recall(questions[1][1], k=3)]
+    print(f" {hits}/50 paraphrases recalled from {len(memory.index.cells)} cells")
+
+
+def test_agent_remembers_answers_and_incidents():
+    """An answer that needed tools and an alert log report reach later questions."""
+    metrics.reset()
+    directory = Path(tempfile.mkdtemp())
+    alerts = directory / "alerts.log"
+    rule = "=" * 80
+    alerts.write_text(f"\n{rule}\nAlert at 2025-10-22T03:12:00\n{rule}\n"
+                      "Severity HIGH: sshd accepted 40 logins from 203.0.113.77 in 2 minutes\n")
+    memory = SemanticMemory(connect(str(directory / "agent.sqlite")), incident_logs=[str(alerts)])
+    memory.load()
+    seen = []
+    
+    class RecordingModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+        
+        async def _agenerate(self, messages, *args, **kwargs):
+            seen.append(messages)
+            return await super()._agenerate(messages, *args, **kwargs)
+    
+    async def history(minutes: int = 10) -> str:
+        return "pid 4242 (chronyd) -> 198.51.100.7:123 x 60"
+    
+    tool = StructuredTool.from_function(coroutine=history, name="get_network_events_history", description="history")
+    script = iter([
+        AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "args": {"minutes": 10},
+                                           "id": "call_1"}]),
+        AIMessage(content="chronyd polls the NTP server 198.51.100.7 on port 123 every minute; that is expected."),
+        AIMessage(content="It is the NTP server, as found before."),
+        AIMessage(content="Those were the sshd logins from 203.0.113.77."),
+    ])
+    model = RecordingModel(messages=script)
+    agent = create_react_agent(memory.model(lambda state, runtime: model), [tool])
+    
+    async def ask(question: str):
+        return await agent.ainvoke({"messages": [HumanMessage(content=question)]})
+    
+    asyncio.run(ask("Why is chronyd talking to 198.51.100.7?"))
+    assert [m.kind for m in memory.recall("chronyd 198.51.100.7", k=5, min_score=0.0)][0] == "answer"
+    
+    # A related question gets the earlier answer before it; the note is not kept in the state
+    result = asyncio.run(ask("chronyd connections to 198.51.100.7 port 123 again, normal?"))
+    note = seen[-1][-2].content
+    assert "earlier investigations" in note and "chronyd polls the NTP server" in note
+    assert not any("earlier investigations" in str(m.content) for m in result["messages"])
+    
+    # Answers without tool calls are not remembered; the incident report is recalled
+    assert len(memory.index) == 2
+    asyncio.run(ask("who logged in over ssh from 203.0.113.77?"))
+    assert "[incident," in seen[-1][-2].content and "sshd accepted 40 logins" in seen[-1][-2].content
+    
+    # Only reports appended since the last read are added
+    with open(alerts, "a") as f:
+        f.write(f"\n{rule}\nAlert at 2025-10-22T04:00:00\n{rule}\nSeverity MEDIUM: curl beaconing to 192.0.2.9\n")
+    assert memory.ingest_incidents() == 1 and memory.ingest_incidents() == 0
+    assert metrics.samples("memory_recall_seconds")
+    print(f" Note: {note[:120]!r}")
+
+
+def test_compressed_and_missing_incident_logs():
+    """Incidents are read from the ambient agent's compressed log; a missing log is reported."""
+    compression = ambient_compression()
+    directory = Path(tempfile.mkdtemp())
+    rule = "=" * 80
+    
+    def block(when: str, text: str) -> str:
+        return f"\n{rule}\nAlert at {when}\n{rule}\n{text}\n"
+    
+    # As written by the ambient agent with alerts.compress (zstd and zlib files)
+    for codec in ("zstd", "zlib"):
+        log = compression.CompressedLog(str(directory / f"{codec}.log.z"), codec=codec)
+        log.append(block("2025-10-22T03:12:00", f"Severity HIGH: sshd brute force from 203.0.113.77 ({codec})"))
+        log.append(block("2025-10-22T03:20:00", f"Severity MEDIUM: curl beaconing to 192.0.2.9 ({codec})"))
+    
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    logging.getLogger("src.alert_log").addHandler(handler)
+    memory = SemanticMemory(connect(str(directory / "agent.sqlite")),
+                            incident_logs=[str(directory / "zstd.log"), str(directory / "zlib.log"),
+                                           str(directory / "missing.log")])
+    memory.load()
+    assert memory.ingest_incidents() == 4
+    assert [w for w in warnings if "missing.log" in w and "not found" in w]
+    assert "sshd brute force" in memory.recall("brute force from 203.0.113.77", k=1)[0].text
+    
+    # Appended records are read once; a record still being written waits for the next call
+    log.append(block("2025-10-22T04:00:00", "Severity HIGH: nc listening on 4444"))
+    with open(log.path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+    assert memory.ingest_incidents() == 1 and memory.ingest_incidents() == 0
+    logging.getLogger("src.alert_log").removeHandler(handler)
+    print(f" {len(memory.index)} incidents from compressed logs")
+
+
+if __name__ == "__main__":
+    test_index_recall_and_restart()
+    test_agent_remembers_answers_and_incidents()
+    test_compressed_and_missing_incident_logs()
@@ -0,0 +1,90 @@
+"""Test concurrent tool calls with a per-turn cap and deadline."""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import ToolNode, create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.metrics import metrics
+from src.parallel_tools import ToolTurnLimiter
+
+
+class FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def run_turn(limiter: ToolTurnLimiter, delays: dict):
+    """One question whose first LLM turn asks for every tool at once."""
+    active = {"now": 0, "peak": 0}
+    
+    def make(name, delay):
+        async def run(minutes: int = 10) -> str:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                active["now"] -= 1
+            return f"{name} done"
+        return StructuredTool.from_function(coroutine=run, name=name, description=name)
+    
+    tools = [make(name, delay) for name, delay in delays.items()]
+    calls = [{"name": name, "args": {"minutes": 10}, "id": f"call_{name}"} for name in delays]
+    model = FakeModel(messages=iter([AIMessage(content="", tool_calls=calls), AIMessage(content="answer")]))
+    agent = create_react_agent(model, ToolNode(tools, awrap_tool_call=limiter.wrap))
+    
+    async def run():
+        start = time.perf_counter()
+        result = await agent.ainvoke({"messages": [{"role": "user", "content": "what's happening?"}]})
+        return result, time.perf_counter() - start
+    
+    result, elapsed = asyncio.run(run())
+    results = {m.name: m for m in result["messages"] if isinstance(m, ToolMessage)}
+    return results, elapsed, active["peak"]
+
+
+def test_calls_run_concurrently_under_cap():
+    """A turn takes about as long as its slowest call, with at most max_concurrency running."""
+    metrics.reset()
+    delays = {"get_network_event_stats": 0.2, "detect_network_anomalies": 0.3,
+              "analyze_process_network_behavior": 0.2, "get_system_info": 0.1}
+    results, elapsed, peak = run_turn(ToolTurnLimiter(max_concurrency=4, deadline_seconds=5), delays)
+    assert all(m.content == f"{name} done" for name, m in results.items()) and len(results) == 4
+    assert peak == 4 and elapsed < 0.6
+    
+    # Capped at 2: two waves
+    results, elapsed, peak = run_turn(ToolTurnLimiter(max_concurrency=2, deadline_seconds=5), delays)
+    assert len(results) == 4 and peak == 2 and 0.4 <= elapsed < 0.8
+    assert metrics.samples("tool_turn_calls") == [4, 4]
+    print(f" 4 tool calls in {elapsed:.2f}s with cap 2")
+
+
+def test_deadline_returns_partial_results():
+    """Calls unfinished at the deadline return an error; the others' results are kept."""
+    metrics.reset()
+    delays = {"get_network_event_stats": 0.05, "detect_network_anomalies": 2.0, "get_system_info": 0.05}
+    limiter = ToolTurnLimiter(max_concurrency=4, deadline_seconds=0.3)
+    results, elapsed, _ = run_turn(limiter, delays)
+    
+    assert elapsed < 1.0
+    assert results["get_network_event_stats"].content == "get_network_event_stats done"
+    assert results["get_system_info"].status == "success"
+    assert results["detect_network_anomalies"].status == "error"
+    assert "deadline" in results["detect_network_anomalies"].content
+    assert metrics.counter("tool_turn_timeouts", tool="detect_network_anomalies") == 1
+    assert limiter._turns == {}
+    print(f" Partial results after {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    test_calls_run_concurrently_under_cap()
+    test_deadline_returns_partial_results()
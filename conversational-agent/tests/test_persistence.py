@@ -0,0 +1,109 @@
+"""Test SQLite checkpoints, store and retention."""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.persistence import SqliteSaver, SqliteStore, apply_retention, connect
+
+
+class FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+async def history(minutes: int = 10) -> str:
+    return "\n".join(f"event {i}: pid {1000 + i} (curl) -> 198.51.100.{i % 250}:443" for i in range(100))
+
+
+def script():
+    turn = 0
+    while True:
+        turn += 1
+        yield AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "args": {"minutes": 10},
+                                                 "id": f"call_{turn}"}])
+        yield AIMessage(content=f"answer {turn}")
+
+
+def make_agent(saver: SqliteSaver):
+    tool = StructuredTool.from_function(coroutine=history, name="get_network_events_history", description="history")
+    return create_react_agent(FakeModel(messages=script()), [tool], checkpointer=saver)
+
+
+def test_threads_resume_from_database():
+    """A thread continues after reconnecting, and pruning keeps its state."""
+    path = str(Path(tempfile.mkdtemp()) / "agent.sqlite")
+    saver = SqliteSaver(connect(path), compress_min_bytes=1024)
+    config = {"configurable": {"thread_id": "investigation-1"}}
+    
+    async def run():
+        agent = make_agent(saver)
+        for turn in range(3):
+            await agent.ainvoke({"messages": [HumanMessage(content=f"question {turn}")]}, config)
+        history = [state async for state in agent.aget_state_history(config)]
+        
+        # A new connection (a restarted server) sees the same conversation
+        resumed = make_agent(SqliteSaver(connect(path)))
+        state = await resumed.aget_state(config)
+        assert len(state.values["messages"]) == 12 and state.values["messages"][-1].content == "answer 3"
+        
+        # Old checkpoints are pruned; the latest state and new turns still work
+        assert apply_retention(saver, thread_days=30, keep_checkpoints=2)["pruned_threads"] == 1
+        assert saver.conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0] == 2
+        result = await resumed.ainvoke({"messages": [HumanMessage(content="question 3")]}, config)
+        return history, result["messages"]
+    
+    history, messages = asyncio.run(run())
+    assert len(history) > 10 and len(messages) == 16
+    assert [m.content for m in messages if isinstance(m, HumanMessage)] == [f"question {i}" for i in range(4)]
+    
+    # Tool outputs above the threshold are stored compressed
+    kinds = {kind for (kind,) in saver.conn.execute("SELECT type FROM blobs")}
+    assert any(kind.endswith(("+zstd", "+zlib")) for kind in kinds)
+    print(f" {len(history)} checkpoints, resumed with {len(messages)} messages")
+
+
+def test_store_and_retention():
+    """Store items are searchable and expire; idle threads are deleted."""
+    conn = connect(str(Path(tempfile.mkdtemp()) / "agent.sqlite"))
+    saver = SqliteSaver(conn)
+    store = SqliteStore(conn, saver.lock)
+    
+    store.put(("memories", "alice"), "dns", {"text": "resolver is 10.0.0.53", "kind": "fact"})
+    store.put(("memories", "alice"), "ssh", {"text": "ssh runs on 2222", "kind": "fact"})
+    store.put(("memories", "bob"), "todo", {"text": "check cron", "kind": "task"}, ttl=1)
+    store.put(("memories_archive",), "other", {"text": "not under memories"})
+    
+    assert store.get(("memories", "alice"), "dns").value["text"] == "resolver is 10.0.0.53"
+    assert {item.key for item in store.search(("memories",))} == {"dns", "ssh", "todo"}
+    assert [item.key for item in store.search(("memories",), filter={"kind": "task"})] == ["todo"]
+    assert store.list_namespaces(prefix=("memories",)) == [("memories", "alice"), ("memories", "bob")]
+    store.delete(("memories", "alice"), "ssh")
+    assert store.get(("memories", "alice"), "ssh") is None
+    
+    # Expired items and idle threads are removed by retention
+    conn.execute("UPDATE store SET expires_at = ? WHERE key = 'todo'", (time.time() - 1,))
+    asyncio.run(make_agent(saver).ainvoke({"messages": [HumanMessage(content="hi")]},
+                                          {"configurable": {"thread_id": "old"}}))
+    conn.execute("UPDATE threads SET updated_at = ?", (time.time() - 40 * 86400,))
+    result = apply_retention(saver, thread_days=30, keep_checkpoints=20)
+    assert result == {"deleted_threads": 1, "pruned_threads": 0, "expired_items": 1}
+    assert store.get(("memories", "bob"), "todo") is None
+    for table in ("checkpoints", "blobs", "writes", "threads"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    print(f" Retention: {result}")
+
+
+if __name__ == "__main__":
+    test_threads_resume_from_database()
+    test_store_and_retention()
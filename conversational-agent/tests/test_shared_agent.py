@@ -0,0 +1,120 @@
+"""Test the process-wide shared agent and MCP session."""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src import agent as agent_module
+from src.mcp_tools import MCPSession
+from src.metrics import metrics
+
+
+class FakeSession:
+    healthy = True
+    
+    async def close(self):
+        self.healthy = False
+
+
+def test_agent_built_once_per_config_version():
+    """Concurrent callers share one build; a changed config file rebuilds."""
+    builds = []
+    
+    async def fake_build(version):
+        builds.append(version)
+        await asyncio.sleep(0.05)
+        return agent_module._SharedAgent(version=version, agent=object(), http_client=httpx.AsyncClient(),
+                                         mcp=FakeSession(), loop=asyncio.get_running_loop(), retire_after=0)
+    
+    async def run():
+        metrics.reset()
+        first = await asyncio.gather(*(agent_module.build_agent() for _ in range(10)))
+        assert len(builds) == 1 and len({id(a) for a in first}) == 1
+        assert metrics.counter("agent_reuses") == 9
+        
+        # Touching config.yaml is a new version
+        os.utime("config.yaml", ns=(time.time_ns(), time.time_ns() + 10**9))
+        second = await agent_module.build_agent()
+        assert len(builds) == 2 and second is not first[0]
+        
+        # A closed MCP session is rebuilt too
+        agent_module._shared.mcp.healthy = False
+        assert await agent_module.build_agent() is not second
+        await asyncio.sleep(0.01)
+        await agent_module.close_agent()
+    
+    original, cwd = agent_module._build_shared_agent, os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        Path(tmp, "config.yaml").write_text("llm: {}\n")
+        os.chdir(tmp)
+        agent_module._build_shared_agent = fake_build
+        try:
+            asyncio.run(run())
+        finally:
+            agent_module._build_shared_agent = original
+            os.chdir(cwd)
+    assert len(builds) == 3
+    print(" Agent built once per config version")
+
+
+def test_mcp_session_shared_by_concurrent_calls():
+    """Tools loaded on one MCP session serve concurrent calls until it's closed."""
+    server = FastMCP("test", log_level="WARNING", json_response=True)
+    
+    @server.tool()
+    async def get_network_event_stats(minutes: int = 10, host: str = "") -> str:
+        """Network event statistics."""
+        await asyncio.sleep(0.01)
+        return f"Total events: {minutes}"
+    
+    peers = set()
+    app = server.streamable_http_app()
+    
+    async def counting_app(scope, receive, send):
+        if scope["type"] == "http":
+            peers.add(tuple(scope["client"]))
+        await app(scope, receive, send)
+    
+    async def run():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        http = uvicorn.Server(uvicorn.Config(counting_app, port=port, log_level="error"))
+        serving = asyncio.create_task(http.serve())
+        while not http.started:
+            await asyncio.sleep(0.02)
+        try:
+            session = MCPSession(f"http://127.0.0.1:{port}/mcp", {"max_keepalive_connections": 5})
+            tools = await session.start()
+            assert session.healthy and [t.name for t in tools] == ["get_network_event_stats"]
+            results = await asyncio.gather(*(tools[0].ainvoke({"minutes": i}) for i in range(30)))
+            assert [r[0]["text"] for r in results] == [f"Total events: {i}" for i in range(30)]
+            # Later calls reuse the session's keep-alive connections
+            opened = len(peers)
+            for i in range(10):
+                await tools[0].ainvoke({"minutes": i})
+            assert len(peers) == opened
+            await session.close()
+            assert not session.healthy
+        finally:
+            http.should_exit = True
+            await serving
+    
+    asyncio.run(run())
+    print(f" 30 concurrent MCP calls on one session over {len(peers)} connections")
+
+
+if __name__ == "__main__":
+    test_agent_built_once_per_config_version()
+    test_mcp_session_shared_by_concurrent_calls()
@@ -0,0 +1,157 @@
+"""Test the background situation snapshot."""
+
+import asyncio
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.metrics import metrics
+from src.snapshot import SNAPSHOT_TOOL, SituationSnapshot
+from test_memory import ambient_compression
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2025, 10, 22, 12, 0).timestamp()
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def mcp_tools(calls: list) -> list:
+    async def get_network_event_stats(minutes: int, host: str, username: str) -> str:
+        calls.append(("stats", minutes, host))
+        return "Total events: 1234\nTop Processes:\n" + "\n".join(f"  proc-{i}: {100 - i}" for i in range(100))
+    
+    async def detect_network_anomalies(minutes: int, host: str, username: str) -> str:
+        calls.append(("anomalies", minutes, host))
+        return "1 anomaly: nc (pid 4242) -> 203.0.113.9:4444"
+    
+    return [StructuredTool.from_function(coroutine=fn, name=fn.__name__, description=fn.__name__)
+            for fn in (get_network_event_stats, detect_network_anomalies)]
+
+
+def alert_log(clock: Clock, compressed: bool = False) -> str:
+    rule = "=" * 80
+    path = Path(tempfile.mkdtemp()) / "alerts.log"
+    blocks = [f"\n{rule}\nAlert at {(datetime.fromtimestamp(clock()) - timedelta(hours=hours)).isoformat()}\n{rule}\n"
+              f"{text}\nsecond line\n"
+              for hours, text in ((30, "old: curl to 192.0.2.1"), (2, "Severity HIGH: nc beaconing to 203.0.113.9"))]
+    if compressed:
+        # With alerts.compress the ambient agent writes alerts.log.z instead
+        log = ambient_compression().CompressedLog(str(path) + ".z")
+        for block in blocks:
+            log.append(block)
+    else:
+        path.write_text("".join(blocks))
+    return str(path)
+
+
+def test_refresh_freshness_and_idle():
+    """Refreshes call the tools once each; stale snapshots and idle pauses."""
+    metrics.reset()
+    clock, calls = Clock(), []
+    snapshot = SituationSnapshot("bastion", "student", minutes=10, max_age_seconds=120, section_chars=300,
+                                 incident_logs=[alert_log(clock)], clock=clock)
+    tools = mcp_tools(calls)
+    assert "No situation snapshot" in snapshot.render()
+    
+    asyncio.run(snapshot.refresh(tools))
+    text = snapshot.render()
+    assert sorted(calls) == [("anomalies", 10, "bastion"), ("stats", 10, "bastion")]
+    assert "(0s ago)" in text and "nc (pid 4242)" in text and "proc-0: 100" in text
+    assert "more characters" in text and len(snapshot.sections["get_network_event_stats"]) < 400
+    assert "nc beaconing" in text and "old: curl" not in text and "second line" not in text
+    
+    # The same from a compressed alert log
+    snapshot.incident_logs = [alert_log(clock, compressed=True)]
+    assert snapshot._open_incidents().endswith("Severity HIGH: nc beaconing to 203.0.113.9")
+    
+    # Too old: the model is sent to the live tools
+    clock.now += 121
+    assert "call the live tools" in snapshot.render() and metrics.counter("snapshot_stale") == 1
+    
+    async def run():
+        snapshot.refresh_seconds, snapshot.idle_seconds = 0.01, 600
+        snapshot.start(tools)
+        await asyncio.sleep(0.1)
+        refreshed = len(calls)
+        # No question for idle_seconds: refreshing pauses until the next one
+        clock.now += 601
+        await asyncio.sleep(0.05)
+        paused = len(calls)
+        # Waiting for a long interval: only the wake-up from a question resumes it
+        snapshot.refresh_seconds = 60
+        await asyncio.sleep(0.1)
+        assert len(calls) == paused
+        # Questions may arrive on an executor thread
+        await asyncio.to_thread(snapshot._touch)
+        await asyncio.sleep(0.05)
+        resumed = len(calls)
+        await snapshot.stop()
+        return refreshed, paused, resumed
+    
+    refreshed, paused, resumed = asyncio.run(run())
+    assert refreshed >= 4 and resumed > paused
+    print(f" {refreshed // 2 - 1} background refreshes, paused at {paused // 2}, resumed")
+
+
+def test_questions_answered_from_snapshot():
+    """The tool and prompt modes, and the share of questions without live calls."""
+    metrics.reset()
+    clock, calls = Clock(), []
+    seen = []
+    
+    class RecordingModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+        
+        async def _agenerate(self, messages, *args, **kwargs):
+            seen.append(messages)
+            return await super()._agenerate(messages, *args, **kwargs)
+    
+    snapshot = SituationSnapshot("bastion", "student", clock=clock)
+    tools = mcp_tools(calls)
+    asyncio.run(snapshot.refresh(tools))
+    calls.clear()
+    
+    def call(name: str, id: str, **args) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": id}])
+    
+    script = iter([
+        call(SNAPSHOT_TOOL, "call_1"), AIMessage(content="One anomaly: nc to 203.0.113.9:4444."),
+        call("get_network_event_stats", "call_2", minutes=60, host="bastion", username="student"),
+        AIMessage(content="Top talker over the last hour: proc-0."),
+        AIMessage(content="Still the nc anomaly."),
+    ])
+    model = RecordingModel(messages=script)
+    agent = create_react_agent(snapshot.model(lambda state, runtime: model), tools + [snapshot.make_tool()])
+    
+    async def ask(question: str):
+        return await agent.ainvoke({"messages": [HumanMessage(content=question)]})
+    
+    result = asyncio.run(ask("anything suspicious right now?"))
+    assert "Situation snapshot of bastion" in result["messages"][2].content and calls == []
+    asyncio.run(ask("top talkers in the last hour?"))
+    assert calls == [("stats", 60, "bastion")]
+    
+    # Prompt mode: the snapshot comes before the question, no tool call needed
+    snapshot.mode = "prompt"
+    asyncio.run(ask("and now?"))
+    assert seen[-1][-1].content == "and now?" and "Situation snapshot" in seen[-1][-2].content
+    assert SituationSnapshot.report() == {"questions": 3, "answered_without_live_calls": 2, "share": 2 / 3}
+    print(f" {SituationSnapshot.report()}")
+
+
+if __name__ == "__main__":
+    test_refresh_freshness_and_idle()
+    test_questions_answered_from_snapshot()
@@ -0,0 +1,85 @@
+"""Test time-to-first-token metrics and the periodic metrics log."""
+
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+import httpx
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.llm_client import get_llm
+from src.metrics import metrics
+from src.streaming import TTFTCallback, stream_answer
+
+
+class StreamingModel(GenericFakeChatModel):
+    """Fake model that can stream like ChatOpenAI with ``streaming: true``."""
+    streaming: bool = False
+    
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def test_ttft_recorded_on_served_runs():
+    """Runs invoked without stream_answer (as the server does) record llm_ttft_seconds."""
+    metrics.reset()
+    model = StreamingModel(messages=iter([AIMessage(content="No anomalies found."),
+                                          AIMessage(content="Still none.")]),
+                           streaming=True, callbacks=[TTFTCallback()])
+    agent = create_react_agent(model, [])
+    
+    result = asyncio.run(agent.ainvoke({"messages": [HumanMessage(content="any anomalies?")]}))
+    assert result["messages"][-1].content == "No anomalies found."
+    assert len(metrics.samples("llm_ttft_seconds")) == 1
+    
+    async def stream():
+        return "".join([token async for token in stream_answer(agent, "and now?")])
+    
+    assert asyncio.run(stream()) == "Still none."
+    assert len(metrics.samples("llm_ttft_seconds")) == 2
+    assert len(metrics.samples("answer_ttft_seconds")) == 1
+    
+    # The served LLM carries the callback
+    config = {"llm": {"base_url": "http://localhost:1/v1", "model": "m", "api_key": "x", "temperature": 0,
+                      "max_tokens": 10}}
+    llm = get_llm(config, httpx.AsyncClient())
+    assert any(isinstance(callback, TTFTCallback) for callback in llm.callbacks)
+    print(f" TTFT {metrics.samples('llm_ttft_seconds')[0] * 1000:.1f}ms")
+
+
+def test_metrics_logged_periodically():
+    """log_every writes a summary at each interval until cancelled."""
+    metrics.reset()
+    metrics.incr("agent_builds")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger("src.metrics")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    
+    async def run():
+        task = asyncio.create_task(metrics.log_every(0.02))
+        await asyncio.sleep(0.07)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    
+    try:
+        asyncio.run(run())
+    finally:
+        logger.removeHandler(handler)
+    summaries = [record for record in records if "Metrics:" in record.getMessage()]
+    assert 2 <= len(summaries) <= 4
+    assert any("agent_builds: 1" in record.getMessage() for record in records)
+    print(f" {len(summaries)} summaries logged")
+
+
+if __name__ == "__main__":
+    test_ttft_recorded_on_served_runs()
+    test_metrics_logged_periodically()
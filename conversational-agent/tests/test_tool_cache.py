@@ -0,0 +1,112 @@
+"""Test the MCP tool result cache."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from langchain_core.tools import StructuredTool
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.metrics import metrics
+from src.tool_cache import ToolCache, ToolPolicy, canonical_args
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_020.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_tool(name: str, calls: list, delay: float = 0.05):
+    async def run(minutes: int = 10, host: str = "", username: str = "") -> str:
+        calls.append((name, minutes, host))
+        await asyncio.sleep(delay)
+        if host == "broken":
+            raise RuntimeError("ssh failed")
+        return f"{name} {minutes} {host} #{len(calls)}"
+    return StructuredTool.from_function(coroutine=run, name=name, description=name)
+
+
+def test_ttl_and_window_buckets():
+    """Repeated calls are served until the TTL or window bucket ends."""
+    assert canonical_args({"minutes": 10.0, "host": " a ", "x": None}) == canonical_args({"host": "a", "minutes": 10})
+    
+    async def run():
+        metrics.reset()
+        calls = []
+        clock = FakeClock()
+        cache = ToolCache(
+            policies={"get_network_event_stats": ToolPolicy(ttl=60, window_arg="minutes"),
+                      "get_system_info": ToolPolicy(ttl=600)},
+            never=["get_process_info"], max_entries=2, clock=clock
+        )
+        tools = {t.name: t for t in cache.wrap_tools([
+            make_tool(name, calls, delay=0) for name in ("get_network_event_stats", "get_system_info", "get_process_info")
+        ])}
+        stats = tools["get_network_event_stats"]
+        
+        first = await stats.ainvoke({"minutes": 10, "host": "a"})
+        assert await stats.ainvoke({"host": "a", "minutes": 10.0}) == first
+        assert await stats.ainvoke({"minutes": 5, "host": "a"}) != first
+        # The window bucket ends at the next multiple of the TTL
+        clock.now = 1_000_079.0
+        assert await stats.ainvoke({"minutes": 10, "host": "a"}) == first
+        clock.now = 1_000_080.0
+        assert await stats.ainvoke({"minutes": 10, "host": "a"}) != first
+        assert len(calls) == 3
+        
+        # Never-cached tools always run
+        await tools["get_process_info"].ainvoke({"host": "a"})
+        await tools["get_process_info"].ainvoke({"host": "a"})
+        assert len(calls) == 5
+        
+        # Least recently used entries are evicted
+        await tools["get_system_info"].ainvoke({"host": "a"})
+        assert len(cache._entries) == 2
+        assert metrics.total("tool_cache_hits") == 2
+        assert metrics.total("tool_cache_misses", tool="get_network_event_stats") == 3
+        assert cache.report()["get_network_event_stats"]["hit_rate"] == 2 / 5
+    
+    asyncio.run(run())
+    print(" TTLs, window buckets and the never list respected")
+
+
+def test_single_flight():
+    """Concurrent identical calls share one MCP call; errors aren't cached."""
+    async def run():
+        metrics.reset()
+        calls = []
+        cache = ToolCache(policies={"get_network_events_history": ToolPolicy(ttl=30, window_arg="minutes")})
+        tool = cache.wrap_tools([make_tool("get_network_events_history", calls, delay=0.1)])[0]
+        
+        results = await asyncio.gather(*(tool.ainvoke({"minutes": 10, "host": "a"}) for _ in range(20)))
+        assert len(set(results)) == 1 and len(calls) == 1
+        assert metrics.total("tool_cache_coalesced") == 19
+        
+        # A caller that gives up doesn't cancel the shared call
+        waiter = asyncio.ensure_future(tool.ainvoke({"minutes": 15, "host": "a"}))
+        other = asyncio.ensure_future(tool.ainvoke({"minutes": 15, "host": "a"}))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        assert (await other).startswith("get_network_events_history 15")
+        
+        errors = await asyncio.gather(*(tool.ainvoke({"minutes": 10, "host": "broken"}) for _ in range(3)),
+                                      return_exceptions=True)
+        assert all(isinstance(e, RuntimeError) for e in errors) and len(calls) == 3
+        await asyncio.gather(tool.ainvoke({"minutes": 10, "host": "broken"}), return_exceptions=True)
+        assert len(calls) == 4
+        assert cache.report()["get_network_events_history"]["saved_seconds"] == 0
+        await tool.ainvoke({"minutes": 10, "host": "a"})
+        assert cache.report()["get_network_events_history"]["saved_seconds"] >= 0.1
+    
+    asyncio.run(run())
+    print(" Concurrent identical calls coalesced")
+
+
+if __name__ == "__main__":
+    test_ttl_and_window_buckets()
+    test_single_flight()
@@ -0,0 +1,127 @@
+"""Test size caps for large tool outputs."""
+
+import asyncio
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import ToolNode, create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.compaction import make_recall_tool
+from src.metrics import metrics
+from src.tool_output import ToolOutputLimiter
+
+
+def event_dump(lines: int) -> str:
+    return "\n".join(f"event {i}: pid {1000 + i % 7} ({'curl' if i % 3 else 'sshd'}) -> 198.51.100.{i % 4}:443"
+                     for i in range(lines))
+
+
+def test_preview_spill_and_summary():
+    """Large text and JSON outputs become capped previews; small ones are unchanged."""
+    metrics.reset()
+    limiter = ToolOutputLimiter(max_bytes=2000, max_rows=20, spill_dir=tempfile.mkdtemp())
+    
+    def limit(content: str) -> ToolMessage:
+        message = ToolMessage(content=content, name="get_network_events_history", tool_call_id="call_1")
+        return asyncio.run(limiter.limit_message(message))
+    
+    small = limit(event_dump(5))
+    assert small.content == event_dump(5) and small.artifact is None
+    
+    capped = limit(event_dump(10000))
+    lines = capped.content.splitlines()
+    assert lines[0].startswith("[get_network_events_history output: 10000 lines") and lines[1].startswith("event 0:")
+    assert "… 9980 more not shown." in capped.content and len(capped.content) < 3000
+    assert "Most frequent addresses: 198.51.100.0:443 (2500)" in capped.content
+    assert "Most frequent names: curl (6666), sshd (3334)" in capped.content
+    assert 'recall_tool_output(ref="call_1"' in capped.content
+    assert Path(capped.artifact["spill"]).read_text() == event_dump(10000)
+    assert capped.artifact["rows"] == 10000
+    
+    # JSON arrays are decoded item by item and summarized per field
+    events = [{"pid": 1000 + i % 7, "process": "curl" if i % 3 else "sshd", "dport": 443} for i in range(5000)]
+    capped = limit(json.dumps(events, indent=1))
+    assert "5000 items" in capped.content and json.loads(capped.content.splitlines()[1]) == events[0]
+    assert "Most frequent dport: 443 (5000)" in capped.content and "Most frequent process: curl (3333)" in capped.content
+    
+    assert metrics.counter("tool_output_spills", tool="get_network_events_history") == 2
+    sent = metrics.samples("tool_output_sent_bytes", tool="get_network_events_history")
+    assert max(sent) < 3000
+    print(f" {max(metrics.samples('tool_output_bytes', tool='get_network_events_history'))} bytes -> "
+          f"{max(sent)} sent")
+
+
+def test_agent_limit_args_recall_and_memory():
+    """Row limits are filled in, the model sees previews, and recall searches the spill."""
+    metrics.reset()
+    calls = []
+    
+    class RecordingModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+    
+    async def get_network_events_history(minutes: int, limit: int = 100) -> str:
+        calls.append(limit)
+        return event_dump(min(limit, 20000))
+    
+    tool = StructuredTool.from_function(coroutine=get_network_events_history, name="get_network_events_history",
+                                        description="events")
+    script = iter([
+        AIMessage(content="", tool_calls=[{"name": "get_network_events_history", "args": {"minutes": 10},
+                                           "id": "call_events"}]),
+        AIMessage(content="", tool_calls=[{"name": "recall_tool_output", "id": "call_recall",
+                                           "args": {"ref": "call_events", "grep": "event 4242:"}}]),
+        AIMessage(content="pid 1000 (curl) is the top talker."),
+    ])
+    spill_dir = tempfile.mkdtemp()
+    limiter = ToolOutputLimiter(max_bytes=4000, server_max_rows=20000, spill_dir=spill_dir, track_memory=True)
+    node = ToolNode([tool, make_recall_tool(spill_dir=spill_dir)], awrap_tool_call=limiter.wrap)
+    agent = create_react_agent(lambda state, runtime: RecordingModel(messages=script), node)
+    
+    result = asyncio.run(agent.ainvoke({"messages": [HumanMessage(content="top talkers?")]}))
+    messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert calls == [20000] and metrics.counter("tool_output_limit_args", tool="get_network_events_history") == 1
+    assert len(messages[0].content) < 5000 and "20000 lines" in messages[0].content
+    assert messages[1].content == "event 4242: pid 1000 (sshd) -> 198.51.100.2:443"
+    peak = metrics.samples("tool_output_peak_bytes", tool="get_network_events_history")
+    tracemalloc.stop()
+    assert len(peak) == 1 and peak[0] > len(event_dump(20000))
+    print(f" peak {peak[0] / 1e6:.1f} MB for a {len(event_dump(20000)) / 1e6:.1f} MB output")
+
+
+def test_recall_reads_only_spill_dir():
+    """Spill paths outside the spill directory fall back to the message text."""
+    metrics.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        spill_dir = Path(tmp) / "tool_outputs"
+        spill_dir.mkdir()
+        (spill_dir / "out.txt").write_text("spilled line\n")
+        secret = Path(tmp) / "secret.txt"
+        secret.write_text("secret line\n")
+        recall = make_recall_tool(spill_dir=str(spill_dir))
+        
+        def recall_spill(spill: str) -> str:
+            message = ToolMessage(content="preview line", tool_call_id="call_1", artifact={"spill": spill})
+            return recall.func(ref="call_1", state={"messages": [message]})
+        
+        assert recall_spill(str(spill_dir / "out.txt")) == "spilled line"
+        assert recall_spill(str(secret)) == "preview line"
+        assert recall_spill(str(spill_dir / ".." / "secret.txt")) == "preview line"
+        assert recall_spill("/etc/passwd") == "preview line"
+        assert metrics.counter("recall_rejected_spills") == 3
+    print(" Spill paths outside the spill directory are not read")
+
+
+if __name__ == "__main__":
+    test_preview_spill_and_summary()
+    test_agent_limit_args_recall_and_memory()
+    test_recall_reads_only_spill_dir()
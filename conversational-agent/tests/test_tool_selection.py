@@ -0,0 +1,90 @@
+"""Test per-question tool subsetting."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.metrics import metrics
+from src.tool_selection import ToolSelector, tokenize
+
+TOOLS = {
+    "get_system_info": "Get basic system information: hostname, OS version, kernel and uptime.",
+    "get_memory_info": "Get memory and swap usage.",
+    "get_service_status": "Get the status of a systemd service.",
+    "get_listening_ports": "List ports listening for incoming connections.",
+    "get_network_event_stats": "Get statistics of network events: top processes, destinations and ports.",
+    "detect_network_anomalies": "Detect anomalous network behaviour: port scans and unusual destinations.",
+}
+
+
+def make_tools():
+    def make(name, description):
+        async def run(minutes: int = 10, host: str = "") -> str:
+            return f"{name} result"
+        return StructuredTool.from_function(coroutine=run, name=name, description=description)
+    return [make(name, description) for name, description in TOOLS.items()]
+
+
+class RecordingModel(GenericFakeChatModel):
+    """Fake chat model that records the tools bound for each turn."""
+    bound: list = []
+    
+    def bind_tools(self, tools, **kwargs):
+        self.bound.append([tool.name for tool in tools])
+        return self
+
+
+def test_select_tools_for_question():
+    """The best matches are bound; vague questions bind every tool."""
+    metrics.reset()
+    assert tokenize("Listening_ports connections") == ["listen", "port", "connect"]
+    selector = ToolSelector(make_tools(), max_tools=3, min_score=1.0, always=["get_system_info"],
+                            synonyms={"scanning": "anomalous scans"})
+    
+    assert selector.select("Is anyone scanning us?") == ["get_system_info", "detect_network_anomalies"]
+    assert selector.select("How much swap is used?") == ["get_system_info", "get_memory_info"]
+    names = selector.select("Which ports are listening?")
+    assert "get_listening_ports" in names and len(names) <= 4
+    
+    # Follow-ups keep the tools already called
+    assert "get_memory_info" in selector.select("Which ports are listening?", used=["get_memory_info"])
+    
+    # Nothing matches well: all tools
+    assert selector.select("What's going on?") == list(TOOLS)
+    assert metrics.counter("tool_selection_expanded") == 1
+    print(" Tools selected per question")
+
+
+def test_agent_binds_subset_per_question():
+    """The agent's model sees the selected tools; every tool stays callable."""
+    metrics.reset()
+    tools = make_tools()
+    selector = ToolSelector(tools, max_tools=2)
+    model = RecordingModel(messages=iter([
+        # Calls a tool outside the bound subset
+        AIMessage(content="", tool_calls=[{"name": "get_memory_info", "args": {}, "id": "call_1"}]),
+        AIMessage(content="answer"),
+    ]))
+    agent = create_react_agent(selector.model(model), tools)
+    
+    result = asyncio.run(agent.ainvoke({"messages": [{"role": "user", "content": "Show network event statistics"}]}))
+    first = model.bound[0]
+    assert "get_network_event_stats" in first and len(first) <= 2
+    # The called tool ran and is bound for the next turn
+    assert [m.content for m in result["messages"] if isinstance(m, ToolMessage)] == ["get_memory_info result"]
+    assert "get_memory_info" in model.bound[1]
+    assert 0 < metrics.samples("tool_schema_tokens")[0] < 400
+    print(f" Bound {len(first)} of {len(tools)} tools: {first}")
+
+
+if __name__ == "__main__":
+    test_select_tools_for_question()
+    test_agent_binds_subset_per_question()